@@ -8,14 +8,27 @@
 
 
 import json
-import course_resource
+import course_resource, exam_resource
 
 from flask import Flask, request, Response, g, jsonify
 from flask.ext.restful import Resource, Api, abort
 
-from exam_archive import ExamDatabaseError, ExamDatabaseErrorExists
+from exam_archive import ExamDatabaseError, ExamDatabaseErrorExists, ExamDatabaseErrorNotFound, \
+    ExamDatabaseErrorModified, SORT_KEYS
 from resources_common import auth, app, api, error_response, API_VERSION, COLLECTIONJSON, ARCHIVE_PROFILE, \
-    DEFAULTJSON, EXAM_ARCHIVE
+    DEFAULTJSON, EXAM_ARCHIVE, entity_tag, precondition_failed, if_match_modified, expand_parameter, href, \
+    dumps, fragment, page_parameters, next_page_link
+
+ARCHIVE_TEMPLATE = fragment({
+    "data" : [
+        {"prompt" : "Archive ID", "name" : "archiveId", "value" : "", "required":False},
+        {"prompt" : "Archive name", "name" : "name", "value" : "", "required":True},
+        {"prompt" : "Organisation name", "name" : "organisationName", "value" : "", "required":True},
+        {"prompt" : "Whether authorization is required from basic users to view exams",
+         "name" : "identificationNeeded", "value" : "", "required":True}
+    ]
+})
+''' Pre-encoded Collection+JSON template of the ArchiveList and Archive resources. '''
 
 # Define the resources
 class ArchiveList(Resource):
@@ -30,7 +43,11 @@ class ArchiveList(Resource):
 
         INPUT:
 
-        * `None`
+        * `sort`: Optional query parameter. Sort the archives by last_modified, e.g. ?sort=-last_modified for the
+        most recently modified archives first.
+        * `limit`: Optional query parameter. The maximum number of archives read. If there are more archives, the
+        collection has a link with relation next to the next page.
+        * `after`: Optional query parameter. The cursor of the next page, set by the next link.
 
         HEADERS:
 
@@ -48,6 +65,7 @@ class ArchiveList(Resource):
         RETURN CODES:
 
         `200` A list of archives in database was returned succesfully.
+        `400` Invalid paging parameter. The sort key, limit or cursor is not valid.
         `401` Not logged in. You are not logged in, unable to get archive information.
 
         In case of error, the response media type Problem+JSON is returned with the error message above. If there are
@@ -59,8 +77,17 @@ class ArchiveList(Resource):
         if not g.user_logged_in:
             return error_response(403, "Access forbidden", "You are not authorizated to access the archive information")
 
-        # Extract archives from the database
-        archives = g.db.browse_archives()
+        page = page_parameters(SORT_KEYS['archive'])
+        if page is None:
+            return error_response(400, "Invalid paging parameter", "The sort key, limit or cursor is not valid")
+
+        # Extract archives and the number of their courses and exams from the database, reading the summaries of
+        # only the archives listed to the user
+        archives = g.db.browse_archives(**page)
+        archive_ids = [archive['archive_id'] for archive in archives
+                       if g.user_type == 'super' or (g.user_type in ['basic','admin'] and
+                                                     g.user_archive == archive['archive_id'])]
+        summaries = dict((summary['archive_id'], summary) for summary in g.db.browse_archive_summaries(archive_ids))
 
         # FILTER AND GENERATE RESPONSE
 
@@ -69,17 +96,9 @@ class ArchiveList(Resource):
         collection = {}
         envelope["collection"] = collection
         collection['version'] = API_VERSION
-        collection['href'] = api.url_for(ArchiveList)
-
-        collection['template'] = {
-            "data" : [
-                {"prompt" : "Archive ID", "name" : "archiveId", "value" : "", "required":False},
-                {"prompt" : "Archive name", "name" : "name", "value" : "", "required":True},
-                {"prompt" : "Organisation name", "name" : "organisationName", "value" : "", "required":True},
-                {"prompt" : "Whether authorization is required from basic users to view exams",
-                 "name" : "identificationNeeded", "value" : "", "required":True}
-            ]
-        }
+        collection['href'] = href(ArchiveList)
+
+        collection['template'] = ARCHIVE_TEMPLATE
 
         # Create the items
         items = []
@@ -94,7 +113,7 @@ class ArchiveList(Resource):
                 item = {}
                 data = []
                 links = []
-                item['href'] = api.url_for(Archive, archive=archive_id)
+                item['href'] = href(Archive, archive=archive_id)
                 item['read-only'] = True
                 item['data'] = data
                 item['links'] = links
@@ -106,25 +125,33 @@ class ArchiveList(Resource):
                 data.append({'name':'identificationNeeded', 'value':identification_needed})
                 data.append({'name':'dateModified', 'value':archive['last_modified']})
 
+                summary = summaries.get(archive_id, {'course_count': 0, 'exam_count': 0, 'latest_exam_date': None})
+                data.append({'name':'courseCount', 'value':summary['course_count']})
+                data.append({'name':'examCount', 'value':summary['exam_count']})
+                data.append({'name':'latestExamDate', 'value':summary['latest_exam_date']})
+
                 modifier_id = archive['modifier_id']
                 if modifier_id:
                     modifier = g.db.get_user(modifier_id)
                     modifier_name = modifier['username']
                     data.append({'name':'modifier', 'value':modifier_name})
 
-                courses = g.db.browse_courses(archive_id)
-                if courses:
+                if summary['course_count']:
                     link = {'name':"course_list",
                             'prompt':'Courses of archive %s' % archive_name,
-                            'rel':'courses','href': api.url_for(course_resource.CourseList, archive_id=archive_id)}
+                            'rel':'courses','href': href(course_resource.CourseList, archive_id=archive_id)}
                     links.append(link)
 
                 items.append(item)
 
         collection['items'] = items
 
+        next_link = next_page_link(collection['href'], archives, page, 'archive_id')
+        if next_link:
+            collection['links'] = [next_link]
+
         # Return the response with status code 200 and Collection+JSON mime type and URL to Archive profile
-        return Response (json.dumps(envelope), 200, mimetype=COLLECTIONJSON+";"+ARCHIVE_PROFILE)
+        return Response (dumps(envelope), 200, mimetype=COLLECTIONJSON+";"+ARCHIVE_PROFILE)
 
     @auth.login_required
     def post(self):
@@ -222,7 +249,7 @@ class ArchiveList(Resource):
             return error_response(500, "Database error", "Please, contact the administrator")
 
         # Create the location header with the archivename of the newly added archive
-        url = api.url_for(Archive, archive=new_archive_id)
+        url = href(Archive, archive=new_archive_id)
 
         # Return the response with status code 201 and location header with URL pointing to new resource
         return Response(status=201, headers={'Location':url}, mimetype=DEFAULTJSON)
@@ -241,6 +268,9 @@ class Archive(Resource):
         INPUT:
 
         * `archive`: Identifier of the archive.
+        * `expand`: Optional query parameter. With ?expand=courses, the courses of the archive are embedded to the
+        archive item as a list of course items under the key 'courses'. With ?expand=courses.exams, also the exams of
+        each course are embedded to the course items under the key 'exams'.
 
         HEADERS:
 
@@ -258,9 +288,12 @@ class Archive(Resource):
         RETURN CODES:
 
         `200` Archive information was returned succesfully.
+        `400` Invalid expand parameter. Only courses and courses.exams can be expanded.
+        `400` Too many items to expand. The response would contain too many courses and exams.
         `401` Not logged in. You are not logged in, unable to get archive information.
         `404` Not found. Archive not found.
 
+        The response has an ETag header, which can be given in If-Match header of PUT and DELETE requests.
         In case of error, the response media type Problem+JSON is returned with the error message above.
         '''
 
@@ -269,6 +302,10 @@ class Archive(Resource):
         if not g.user_logged_in or (g.user_type in ['basic','admin'] and g.user_archive != archive):
             return error_response(403, "Access forbidden", "You are not authorizated to access the archive information")
 
+        expand = expand_parameter(['courses', 'courses.exams'])
+        if expand is None:
+            return error_response(400, "Invalid expand parameter", "Only courses and courses.exams can be expanded")
+
         # Extract the archive from the database
         archive = g.db.get_archive(archive)
 
@@ -283,22 +320,14 @@ class Archive(Resource):
         collection_links = []
         envelope["collection"] = collection
         collection['version'] = API_VERSION
-        collection['href'] = api.url_for(Archive, archive=archive['archive_id'])
+        collection['href'] = href(Archive, archive=archive['archive_id'])
         collection['links'] = collection_links
 
         collection_links.append({'name':"archive_list",
                                  'prompt':'Archive list',
-                                 'rel':'archives','href': api.url_for(ArchiveList)})
-
-        collection['template'] = {
-            "data" : [
-                {"prompt" : "Archive ID", "name" : "archiveId", "value" : "", "required":False},
-                {"prompt" : "Archive name", "name" : "name", "value" : "", "required":True},
-                {"prompt" : "Organisation name", "name" : "organisationName", "value" : "", "required":True},
-                {"prompt" : "Whether authorization is required from basic users to view exams",
-                 "name" : "identificationNeeded", "value" : "", "required":True}
-            ]
-        }
+                                 'rel':'archives','href': href(ArchiveList)})
+
+        collection['template'] = ARCHIVE_TEMPLATE
 
         # Create the items
         items = []
@@ -311,7 +340,7 @@ class Archive(Resource):
         item = {}
         data = []
         links = []
-        item['href'] = api.url_for(Archive, archive=archive_id)
+        item['href'] = href(Archive, archive=archive_id)
         item['read-only'] = True
         item['data'] = data
         item['links'] = links
@@ -331,15 +360,31 @@ class Archive(Resource):
 
         link = {'name':"course_list",
                 'prompt':'Courses of archive %s' % archive_name,
-                   'rel':'courses','href': api.url_for(course_resource.CourseList, archive_id=archive_id)}
+                   'rel':'courses','href': href(course_resource.CourseList, archive_id=archive_id)}
         links.append(link)
 
+        link = {'name':"exam_list",
+                'prompt':'Exams of archive %s by date' % archive_name,
+                   'rel':'exams','href': href(exam_resource.ArchiveExamList, archive_id=archive_id)}
+        links.append(link)
+
+        # Embed the courses, and the exams of the courses if requested
+        if 'courses' in expand:
+            course_expand = set(relation.split('.', 1)[1] for relation in expand if '.' in relation)
+            item['courses'] = course_resource.course_items(archive_id, course_expand)
+            if item['courses'] is None:
+                return error_response(400, "Too many items to expand",
+                                      "The response would contain more than %d courses and exams, follow the links "
+                                      "instead" % app.config['MAX_EXPANDED_ITEMS'])
+
         items.append(item)
 
         collection['items'] = items
 
         # Return the response with status code 200 and Collection+JSON mime type and URL to Archive profile
-        return Response (json.dumps(envelope), 200, mimetype=DEFAULTJSON)
+        response = Response (dumps(envelope), 200, mimetype=DEFAULTJSON)
+        response.set_etag(entity_tag(archive))
+        return response
 
     @auth.login_required
     def put(self, archive):
@@ -354,6 +399,7 @@ class Archive(Resource):
 
         * `Accept`: application/json
         * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+        * `If-Match`: Optional ETag of the archive as returned by GET. The archive is updated only if it matches.
 
         ENTITY BODY OUTPUT FORMAT:
 
@@ -373,6 +419,7 @@ class Archive(Resource):
         `404` Archive not found. Given archive id was not found.
         `404` Modifier not found. Given mofifier id was not found.
         `409` Error updating archive. Archive with the same archive and organisation name already exists.
+        `412` Precondition failed. The archive has been modified since it was fetched.
         `415` Unsupported media type: Use a JSON compatible format.
         `500` Database error. Please, contact the administrator.
 
@@ -391,6 +438,10 @@ class Archive(Resource):
         if not archive:
             return error_response(404, "Archive not found", "Given archive id was not found")
 
+        # Check that the archive has not been modified since the client fetched it
+        if precondition_failed(archive):
+            return error_response(412, "Precondition failed", "The archive has been modified since it was fetched")
+
         # Convert the request body to JSON. If it fails get_json method throws an exception. Catch it and report it to
         # the user as an error. Set silent = True to let us replace '400 bad request' with more detailed error message.
         input = request.get_json(force=True, silent=True)
@@ -429,7 +480,10 @@ class Archive(Resource):
 
         # Try to create the new archive
         try:
-            success = g.db.edit_archive(archive_id, archive_name, organisation_name, identification_needed, modifier_id)
+            success = g.db.edit_archive(archive_id, archive_name, organisation_name, identification_needed, modifier_id,
+                                        if_match_modified(archive))
+        except ExamDatabaseErrorModified:
+            return error_response(412, "Precondition failed", "The archive has been modified since it was fetched")
         except ExamDatabaseErrorExists:
             return error_response(409, "Error adding new archive",
                                   "Archive with the same archive and organisation name already exists")
@@ -441,7 +495,7 @@ class Archive(Resource):
             return error_response(500, "Database error", "Please, contact the administrator")
 
         # Create the location header with the archivename of the newly added archive
-        url = api.url_for(Archive, archive=archive_id)
+        url = href(Archive, archive=archive_id)
 
         # Return the response with status code 201 and location header with URL pointing to new resource
         return Response(status=200, headers={'Location':url}, mimetype=DEFAULTJSON)
@@ -460,6 +514,7 @@ class Archive(Resource):
 
         * `Accept`: application/json
         * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+        * `If-Match`: Optional ETag of the archive as returned by GET. The archive is deleted only if it matches.
 
         RETURN CODES:
 
@@ -467,6 +522,7 @@ class Archive(Resource):
         `401` Not logged in. You are not logged in, unable delete the archive.
         `403` Access forbidden. You are not authorizated (must be a user of type 'super')
         `404` Archive not found. Given archive was not found.
+        `412` Precondition failed. The archive has been modified since it was fetched.
         `500` Database error. Please, contact the adminnistrator.
 
         In case of error, the response media type Problem+JSON is returned with the error message above.
@@ -483,8 +539,15 @@ class Archive(Resource):
         if not archive:
             return error_response(404, "Archive not found", "Given archive was not found")
 
+        # Check that the archive has not been modified since the client fetched it
+        if precondition_failed(archive):
+            return error_response(412, "Precondition failed", "The archive has been modified since it was fetched")
+
         # Try to delete the archive
-        success = g.db.remove_archive(archive['archive_id'])
+        try:
+            success = g.db.remove_archive(archive['archive_id'], if_match_modified(archive))
+        except ExamDatabaseErrorModified:
+            return error_response(412, "Precondition failed", "The archive has been modified since it was fetched")
 
         if not success:
             return error_response(500, "Database error", "Please, contact the adminnistrator")
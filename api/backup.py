@@ -0,0 +1,463 @@
+# coding=UTF-8
+#
+# Provides online backups of the exam archive database and the exam files.
+#
+# @authors: Ari Kairala, Petteri Ponsimaa
+
+import sqlite3
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import hashlib
+import tempfile
+import arrow
+from exam_archive import ExamArchiveDatabase, ExamDatabaseError
+from sharded_exam_archive import ShardedExamArchiveDatabase
+
+DEFAULT_BACKUP_FOLDER = 'db/backups'
+''' Default folder for the backups. '''
+
+DEFAULT_UPLOAD_FOLDER = 'api/exams'
+''' Default folder of the exam files included in the backups. '''
+
+DEFAULT_RETENTION = 10
+''' Default number of the newest backups kept, when older backups are removed. '''
+
+BACKUP_PAGES = 64
+''' Number of database pages copied at a time by the online backup. '''
+
+BACKUP_SLEEP = 0.01
+''' Seconds to sleep between the copied pages, letting the requests access the database. '''
+
+BACKUP_ATTEMPTS = 5
+''' Number of times the page by page copy is started over, when the database is modified during the copy. '''
+
+MANIFEST = 'manifest.json'
+''' Name of the file listing the contents and checksums of a backup. '''
+
+VERIFICATION = 'verification.json'
+''' Name of the file holding the result of the last verification of a backup. '''
+
+BACKUP_TABLES = ['user', 'archive', 'course', 'exam', 'teacher', 'language']
+''' Tables, whose row counts are stored to the manifest and compared when verifying a backup. '''
+
+SHARD_TABLES = ['course', 'exam']
+''' Tables of the archive databases, whose foreign keys are checked when verifying a backup. The other tables of an
+archive database are partial copies of the catalog, e.g. users referring to archives not copied to the database. '''
+
+
+def _checksum(path):
+    '''
+    Calculate the SHA-256 checksum of a file.
+    '''
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _row_counts(db_path):
+    '''
+    Return a dictionary containing the number of rows in each of the BACKUP_TABLES of a database.
+    '''
+    counts = {}
+    con = sqlite3.connect(db_path)
+    with con:
+        cur = con.cursor()
+        for table in BACKUP_TABLES:
+            cur.execute('SELECT COUNT(*) FROM %s' % table)
+            counts[table] = cur.fetchone()[0]
+    con.close()
+    return counts
+
+
+def _copy_pages(con, source_path, target_path, pages, sleep):
+    '''
+    Copy the file of a database the given number of pages at a time. Each step holds a read transaction of its own,
+    which keeps the writers from modifying the file only while the pages are read, and the requests can write to the
+    database during the sleep between the steps. Returns False, if the database was modified by another connection
+    during the copy, so that the copy is not consistent.
+    '''
+    version = None
+    offset = 0
+    with open(source_path, 'rb') as source:
+        with open(target_path, 'wb') as target:
+            while True:
+                con.execute('BEGIN')
+                try:
+                    # Reading the schema takes the shared lock for the rest of the transaction
+                    con.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+                    current = con.execute('PRAGMA data_version').fetchone()[0]
+                    if version is None:
+                        version = current
+                    elif current != version:
+                        return False
+                    page_size = con.execute('PRAGMA page_size').fetchone()[0]
+                    size = page_size * con.execute('PRAGMA page_count').fetchone()[0]
+                    source.seek(offset)
+                    data = source.read(min(pages * page_size, size - offset))
+                finally:
+                    con.execute('COMMIT')
+                target.write(data)
+                offset += len(data)
+                if offset >= size:
+                    return True
+                time.sleep(sleep)
+
+
+def _copy_database(source_path, target_path, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP, attempts=BACKUP_ATTEMPTS):
+    '''
+    Copy a database that may be in use to a new file. The database file is copied the given number of pages at a
+    time, sleeping between the steps so that the requests can access the database meanwhile. If the database is
+    modified during the copy, the copy is started over, like the online backup API of SQLite does. If it is still
+    modified after the given number of attempts, or if the database is in WAL mode, where the database file alone is
+    not consistent, the database is copied with a single VACUUM INTO statement, which keeps the writers waiting until
+    the copy is done.
+    '''
+    con = sqlite3.connect(source_path, isolation_level=None)
+    try:
+        if con.execute('PRAGMA journal_mode').fetchone()[0].lower() != 'wal':
+            for attempt in range(attempts):
+                if _copy_pages(con, source_path, target_path, pages, sleep):
+                    return
+        _vacuum_into(con, target_path)
+    finally:
+        con.close()
+
+
+def _vacuum_into(con, target_path):
+    '''
+    Copy the database of a connection to a new file at once with VACUUM INTO.
+    '''
+    if os.path.exists(target_path):
+        os.remove(target_path)
+    con.execute('VACUUM INTO ?', (target_path,))
+
+
+def _copy_sharded_database(db, backup_path):
+    '''
+    Copy the catalog database and the archive databases of a sharded database at the same moment. The writes to all
+    the databases are locked out with BEGIN IMMEDIATE, until every database has been copied with VACUUM INTO, so that
+    the copies are consistent with each other; the reads continue meanwhile. The archive databases created while the
+    databases are locked are locked and copied as well. Returns a list of (path in backup, path of copy) tuples.
+    '''
+    locks = []
+    try:
+        files = [(os.path.basename(db.db_path), db.db_path)]
+        locked = set()
+        while len(locked) < len(files):
+            for name_in_backup, db_path in files:
+                if db_path not in locked:
+                    con = sqlite3.connect(db_path, isolation_level=None)
+                    locks.append(con)
+                    con.execute('BEGIN IMMEDIATE')
+                    locked.add(db_path)
+            files += [('shards/' + os.path.basename(shard_path), shard_path)
+                      for shard_path in sorted(db._shard_paths()) if shard_path not in locked]
+
+        copies = []
+        for name_in_backup, db_path in files:
+            target_path = os.path.join(backup_path, name_in_backup)
+            if not os.path.exists(os.path.dirname(target_path)):
+                os.makedirs(os.path.dirname(target_path))
+            con = sqlite3.connect(db_path, isolation_level=None)
+            try:
+                _vacuum_into(con, target_path)
+            finally:
+                con.close()
+            copies.append((name_in_backup, target_path))
+        return copies
+    finally:
+        # Closing the connections rolls back the transactions and releases the locks
+        for con in locks:
+            con.close()
+
+
+def create_backup(db, backup_folder=None, upload_folder=None, retention=DEFAULT_RETENTION):
+    '''
+    Create a backup of the database and the exam files without stopping the server.
+
+    INPUT:
+
+    * `db`: ExamArchiveDatabase or ShardedExamArchiveDatabase object of the database.
+    * `backup_folder`: Folder, where the backup is created. If None, DEFAULT_BACKUP_FOLDER is used instead.
+    * `upload_folder`: Folder of the exam files. If None, DEFAULT_UPLOAD_FOLDER is used instead.
+    * `retention`: Number of the newest backups kept. Older backups are removed. If None, no backups are removed.
+
+    OUTPUT:
+
+    * The manifest of the new backup, a dictionary containing the following keys:
+        * `backup`: Name of the backup
+        * `created`: The date and time of the backup.
+        * `files`: A dictionary of the files in the backup and their SHA-256 checksums.
+        * `rows`: A dictionary of the database files in the backup and the row counts of their tables.
+
+    Raises exception ExamDatabaseError, if the backup could not be created.
+    '''
+    if backup_folder is None:
+        backup_folder = DEFAULT_BACKUP_FOLDER
+    if upload_folder is None:
+        upload_folder = DEFAULT_UPLOAD_FOLDER
+
+    created = arrow.now()
+    name = 'backup_%s' % created.format('YYYYMMDD-HHmmss-SSSSSS')
+    backup_path = os.path.join(backup_folder, name)
+    manifest = {'backup': name, 'created': created.isoformat(' '), 'files': {}, 'rows': {}}
+
+    try:
+        os.makedirs(backup_path)
+
+        # Copy the database files
+        if isinstance(db, ShardedExamArchiveDatabase):
+            copies = _copy_sharded_database(db, backup_path)
+        else:
+            copies = [(os.path.basename(db.db_path), os.path.join(backup_path, os.path.basename(db.db_path)))]
+            _copy_database(db.db_path, copies[0][1])
+        for name_in_backup, target_path in copies:
+            manifest['rows'][name_in_backup] = _row_counts(target_path)
+
+        # Copy the exam files
+        if os.path.isdir(upload_folder):
+            shutil.copytree(upload_folder, os.path.join(backup_path, 'exams'))
+
+        for root, dirs, files in os.walk(backup_path):
+            for filename in files:
+                path = os.path.join(root, filename)
+                manifest['files'][os.path.relpath(path, backup_path).replace(os.sep, '/')] = _checksum(path)
+
+        with open(os.path.join(backup_path, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+    except (OSError, IOError, sqlite3.Error) as e:
+        if os.path.isdir(backup_path):
+            shutil.rmtree(backup_path)
+        raise ExamDatabaseError("Backup failed: %s" % e)
+
+    if retention is not None:
+        prune_backups(backup_folder, retention)
+    return manifest
+
+
+def list_backups(backup_folder=None):
+    '''
+    List the backups in the backup folder, newest first.
+
+    INPUT:
+
+    * `backup_folder`: Folder of the backups. If None, DEFAULT_BACKUP_FOLDER is used instead.
+
+    OUTPUT:
+
+    * A list of manifests of the backups as returned by create_backup. Folders without a manifest are not listed.
+    '''
+    if backup_folder is None:
+        backup_folder = DEFAULT_BACKUP_FOLDER
+
+    backups = []
+    for backup_path in sorted(glob.glob(os.path.join(backup_folder, 'backup_*')), reverse=True):
+        backup = get_backup(backup_path)
+        if backup is not None:
+            backups.append(backup)
+    return backups
+
+
+def get_backup(backup_path):
+    '''
+    Return the manifest of the backup in the given folder, or None if the backup does not exist.
+    '''
+    try:
+        with open(os.path.join(backup_path, MANIFEST)) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def prune_backups(backup_folder=None, retention=DEFAULT_RETENTION):
+    '''
+    Remove all but the `retention` newest backups from the backup folder. Returns the number of backups removed.
+    '''
+    if backup_folder is None:
+        backup_folder = DEFAULT_BACKUP_FOLDER
+
+    removed = 0
+    for backup_path in sorted(glob.glob(os.path.join(backup_folder, 'backup_*')), reverse=True)[retention:]:
+        shutil.rmtree(backup_path)
+        removed += 1
+    return removed
+
+
+def verify_backup(backup_path):
+    '''
+    Verify that a backup can be restored. The checksums of the files are compared to the manifest, and each database
+    file is restored to a temporary file, where its integrity, foreign keys and row counts are checked.
+
+    INPUT:
+
+    * `backup_path`: Folder of the backup.
+
+    OUTPUT:
+
+    * A list of problems found. If the list is empty, the backup is valid.
+    '''
+    manifest = get_backup(backup_path)
+    if manifest is None:
+        return ["Manifest is missing or invalid"]
+
+    problems = []
+    for name, checksum in sorted(manifest['files'].items()):
+        path = os.path.join(backup_path, name)
+        if not os.path.isfile(path):
+            problems.append("%s is missing" % name)
+        elif _checksum(path) != checksum:
+            problems.append("%s has an invalid checksum" % name)
+
+    for name, rows in sorted(manifest['rows'].items()):
+        path = os.path.join(backup_path, name)
+        if not os.path.isfile(path):
+            continue
+
+        # Restore to a temporary file, so that the backup itself is not modified
+        handle, restore_path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        try:
+            shutil.copyfile(path, restore_path)
+            con = sqlite3.connect(restore_path)
+            with con:
+                cur = con.cursor()
+                cur.execute('PRAGMA integrity_check')
+                result = cur.fetchone()[0]
+                if result != 'ok':
+                    problems.append("%s failed integrity check: %s" % (name, result))
+                tables = SHARD_TABLES if name.startswith('shards/') else [None]
+                for table in tables:
+                    cur.execute('PRAGMA foreign_key_check(%s)' % table if table else 'PRAGMA foreign_key_check')
+                    if cur.fetchone() is not None:
+                        problems.append("%s failed foreign key check" % name)
+                        break
+            con.close()
+            if _row_counts(restore_path) != rows:
+                problems.append("%s has different row counts than when backed up" % name)
+        except sqlite3.Error as e:
+            problems.append("%s could not be restored: %s" % (name, e))
+        finally:
+            os.remove(restore_path)
+
+    return problems
+
+
+def record_verification(backup_path):
+    '''
+    Verify a backup with verify_backup and store the result in the backup folder, so that it can be read with
+    get_verification without verifying the backup again. The result is not stored, if the backup does not exist.
+
+    INPUT:
+
+    * `backup_path`: Folder of the backup.
+
+    OUTPUT:
+
+    * The result of the verification, a dictionary containing the following keys:
+        * `verified`: The date and time of the verification.
+        * `problems`: A list of problems found. If the list is empty, the backup is valid.
+    '''
+    result = {'verified': arrow.now().isoformat(' '), 'problems': verify_backup(backup_path)}
+    if get_backup(backup_path) is not None:
+        with open(os.path.join(backup_path, VERIFICATION), 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+    return result
+
+
+def get_verification(backup_path):
+    '''
+    Return the result of the last verification of a backup as returned by record_verification, or None if the
+    backup has not been verified.
+    '''
+    try:
+        with open(os.path.join(backup_path, VERIFICATION)) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def restore_backup(backup_path, db, upload_folder=None):
+    '''
+    Restore the database and the exam files from a backup. The backup is verified before restoring. The server
+    must be stopped while restoring. The archive databases, which are not in the backup, are removed.
+
+    INPUT:
+
+    * `backup_path`: Folder of the backup.
+    * `db`: ExamArchiveDatabase or ShardedExamArchiveDatabase object of the database to restore.
+    * `upload_folder`: Folder of the exam files. If None, DEFAULT_UPLOAD_FOLDER is used instead.
+
+    Raises exception ExamDatabaseError, if the backup is not valid.
+    '''
+    if upload_folder is None:
+        upload_folder = DEFAULT_UPLOAD_FOLDER
+
+    problems = verify_backup(backup_path)
+    if problems:
+        raise ExamDatabaseError("Backup is not valid: %s" % ", ".join(problems))
+
+    manifest = get_backup(backup_path)
+    if isinstance(db, ShardedExamArchiveDatabase):
+        for shard_path in db._shard_paths():
+            if 'shards/' + os.path.basename(shard_path) not in manifest['rows']:
+                ExamArchiveDatabase(shard_path).close_connections()
+                os.remove(shard_path)
+
+    for name_in_backup in manifest['rows']:
+        if name_in_backup.startswith('shards/'):
+            if not os.path.isdir(db.shard_folder):
+                os.makedirs(db.shard_folder)
+            target_path = os.path.join(db.shard_folder, os.path.basename(name_in_backup))
+        else:
+            target_path = db.db_path
+        ExamArchiveDatabase(target_path).close_connections()
+        shutil.copyfile(os.path.join(backup_path, name_in_backup), target_path)
+
+    if os.path.isdir(os.path.join(backup_path, 'exams')):
+        if os.path.isdir(upload_folder):
+            shutil.rmtree(upload_folder)
+        shutil.copytree(os.path.join(backup_path, 'exams'), upload_folder)
+
+    # The teachers may have changed
+    db.invalidate_lookups()
+
+
+# Manage the backups from command line
+if __name__ == '__main__':
+    usage = 'Usage:\n' \
+            '  python backup.py backup [<db> [<backup folder>]]\n' \
+            '  python backup.py list [<backup folder>]\n' \
+            '  python backup.py verify <backup>\n' \
+            '  python backup.py restore <backup> [<db>]'
+
+    if len(sys.argv) < 2:
+        print usage
+        sys.exit(1)
+    command, args = sys.argv[1], sys.argv[2:]
+
+    if command == 'backup' and len(args) <= 2:
+        db = ExamArchiveDatabase(*args[:1])
+        manifest = create_backup(db, *args[1:])
+        print 'Created backup %s' % manifest['backup']
+    elif command == 'list' and len(args) <= 1:
+        for manifest in list_backups(*args):
+            print manifest['backup'], manifest['created']
+    elif command == 'verify' and len(args) == 1:
+        problems = record_verification(args[0])['problems']
+        for problem in problems:
+            print problem
+        print 'Backup is valid' if not problems else 'Backup is not valid'
+        sys.exit(1 if problems else 0)
+    elif command == 'restore' and len(args) in (1, 2):
+        restore_backup(args[0], ExamArchiveDatabase(*args[1:]))
+        print 'Restored backup %s' % args[0]
+    else:
+        print usage
+        sys.exit(1)
@@ -0,0 +1,245 @@
+# coding=UTF-8
+#
+# Provides the RESTful API resources for backing up the Examrium.
+#
+# @authors: Ari Kairala, Petteri Ponsimaa
+
+
+import json, os
+import backup
+
+from flask import Flask, request, Response, g, jsonify
+from flask.ext.restful import Resource, Api, abort
+
+from exam_archive import ExamDatabaseError
+from resources_common import auth, app, api, error_response, API_VERSION, COLLECTIONJSON, BACKUP_PROFILE, href, \
+    dumps
+
+def backup_item(manifest, verification=None):
+    '''
+    Create a Collection+JSON item of a backup from its manifest. If verification is not None, the result of the
+    verification as returned by backup.record_verification is included in the item.
+    '''
+    item = {}
+    data = []
+    item['href'] = href(Backup, backup_name=manifest['backup'])
+    item['read-only'] = True
+    item['data'] = data
+
+    data.append({'name':'name', 'value':manifest['backup']})
+    data.append({'name':'dateCreated', 'value':manifest['created']})
+    data.append({'name':'files', 'value':len(manifest['files'])})
+
+    if verification is not None:
+        data.append({'name':'dateVerified', 'value':verification['verified']})
+        data.append({'name':'valid', 'value':not verification['problems']})
+        data.append({'name':'problems', 'value':verification['problems']})
+    return item
+
+def backup_response(manifest, verification):
+    '''
+    Create the Collection+JSON response of the Backup resource.
+    '''
+    # Create the envelope
+    envelope = {}
+    collection = {}
+    envelope["collection"] = collection
+    collection['version'] = API_VERSION
+    collection['href'] = href(Backup, backup_name=manifest['backup'])
+    collection['links'] = [{'name':"backup_list", 'prompt':'Backup list', 'rel':'backups',
+                            'href': href(BackupList)}]
+    collection['items'] = [backup_item(manifest, verification)]
+
+    # Return the response with status code 200 and Collection+JSON mime type and URL to Backup profile
+    return Response(dumps(envelope), 200, mimetype=COLLECTIONJSON+";"+BACKUP_PROFILE)
+
+# Define the resources
+class BackupList(Resource):
+    '''
+    Resource BackupList implementation
+    '''
+
+    @auth.login_required
+    def get(self):
+        '''
+        Get a list of backups of the exam archive, newest first. Authorization is required (user must be of type
+        'super').
+
+        INPUT:
+
+        * `None`
+
+        HEADERS:
+
+        * `Accept`: application/json
+        * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+
+        ENTITY BODY OUTPUT FORMAT:
+
+        * `Media type`: Collection+JSON:
+            http://amundsen.com/media-types/collection/
+
+        * `Profile`: Backup profile
+            http://atlassian.virtues.fi:8090/display/PWP/PWP11#PWP11-Backupprofile
+
+        RETURN CODES:
+
+        `200` A list of backups was returned succesfully.
+        `401` Not logged in. You are not logged in, unable to get backup information.
+        `403` Access forbidden. You are not authorizated to access the backups.
+
+        In case of error, the response media type Problem+JSON is returned with the error message above.
+        '''
+
+        if g.no_auth_provided:
+            return error_response(401, "Not logged in", "You are not logged in, unable to get backup information")
+        if not g.user_logged_in or g.user_type != 'super':
+            return error_response(403, "Access forbidden", "You are not authorizated to access the backups")
+
+        # Create the envelope
+        envelope = {}
+        collection = {}
+        envelope["collection"] = collection
+        collection['version'] = API_VERSION
+        collection['href'] = href(BackupList)
+        collection['items'] = [backup_item(manifest) for manifest in backup.list_backups(app.config['BACKUP_FOLDER'])]
+
+        # Return the response with status code 200 and Collection+JSON mime type and URL to Backup profile
+        return Response(dumps(envelope), 200, mimetype=COLLECTIONJSON+";"+BACKUP_PROFILE)
+
+    @auth.login_required
+    def post(self):
+        '''
+        Create a new backup of the database and the exam files. The database is copied while the server keeps
+        serving requests. Authorization is required (user must be of type 'super').
+
+        INPUT:
+
+        * `None`
+
+        HEADERS:
+
+        * `Accept` : application/json
+        * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+
+        RETURN CODES:
+
+        `201` New backup was created successfully.
+        `401` Not logged in. You are not logged in, unable to create a backup.
+        `403` Access forbidden. You are not authorizated to create a backup.
+        `500` Backup failed. Please, contact the administrator.
+
+        In case of error, the response media type Problem+JSON is returned with the error message above.
+        '''
+
+        if g.no_auth_provided:
+            return error_response(401, "Not logged in", "You are not logged in, unable to create a backup")
+        if not g.user_logged_in or g.user_type != 'super':
+            return error_response(403, "Access forbidden", "You are not authorizated to create a backup")
+
+        try:
+            manifest = backup.create_backup(g.db, app.config['BACKUP_FOLDER'], app.static_folder,
+                                            app.config['BACKUP_RETENTION'])
+        except ExamDatabaseError:
+            return error_response(500, "Backup failed", "Please, contact the administrator")
+
+        # Return the response with status code 201 and location header with URL pointing to new backup
+        url = href(Backup, backup_name=manifest['backup'])
+        return Response(status=201, headers={'Location':url}, mimetype=COLLECTIONJSON+";"+BACKUP_PROFILE)
+
+class Backup(Resource):
+    '''
+    Resource Backup implementation
+    '''
+
+    @auth.login_required
+    def get(self, backup_name):
+        '''
+        Get details of a backup and the result of its last verification, if it has been verified with Backup/POST or
+        with the verify command. The backup is not verified again. Authorization is required (user must be of type
+        'super').
+
+        INPUT:
+
+        * `backup_name`: Name of the backup.
+
+        HEADERS:
+
+        * `Accept`: application/json
+        * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+
+        ENTITY BODY OUTPUT FORMAT:
+
+        * `Media type`: Collection+JSON:
+            http://amundsen.com/media-types/collection/
+
+        * `Profile`: Backup profile
+            http://atlassian.virtues.fi:8090/display/PWP/PWP11#PWP11-Backupprofile
+
+        RETURN CODES:
+
+        `200` Backup information was returned succesfully.
+        `401` Not logged in. You are not logged in, unable to get backup information.
+        `403` Access forbidden. You are not authorizated to access the backups.
+        `404` Not found. Backup not found.
+
+        In case of error, the response media type Problem+JSON is returned with the error message above.
+        '''
+
+        if g.no_auth_provided:
+            return error_response(401, "Not logged in", "You are not logged in, unable to get backup information")
+        if not g.user_logged_in or g.user_type != 'super':
+            return error_response(403, "Access forbidden", "You are not authorizated to access the backups")
+
+        backup_path = os.path.join(app.config['BACKUP_FOLDER'], os.path.basename(backup_name))
+        manifest = backup.get_backup(backup_path)
+        if not manifest:
+            return error_response(404, "Not found", "Backup not found")
+
+        return backup_response(manifest, backup.get_verification(backup_path))
+
+    @auth.login_required
+    def post(self, backup_name):
+        '''
+        Verify that a backup can be restored, and record the result of the verification. The checksums of the files
+        are checked, and each database is restored to a temporary file and checked for integrity, so the verification
+        reads the whole backup. Authorization is required (user must be of type 'super').
+
+        INPUT:
+
+        * `backup_name`: Name of the backup.
+
+        HEADERS:
+
+        * `Accept`: application/json
+        * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+
+        ENTITY BODY OUTPUT FORMAT:
+
+        * `Media type`: Collection+JSON:
+            http://amundsen.com/media-types/collection/
+
+        * `Profile`: Backup profile
+            http://atlassian.virtues.fi:8090/display/PWP/PWP11#PWP11-Backupprofile
+
+        RETURN CODES:
+
+        `200` The backup was verified, and the backup information with the result was returned succesfully.
+        `401` Not logged in. You are not logged in, unable to verify the backup.
+        `403` Access forbidden. You are not authorizated to verify the backup.
+        `404` Not found. Backup not found.
+
+        In case of error, the response media type Problem+JSON is returned with the error message above.
+        '''
+
+        if g.no_auth_provided:
+            return error_response(401, "Not logged in", "You are not logged in, unable to verify the backup")
+        if not g.user_logged_in or g.user_type != 'super':
+            return error_response(403, "Access forbidden", "You are not authorizated to verify the backup")
+
+        backup_path = os.path.join(app.config['BACKUP_FOLDER'], os.path.basename(backup_name))
+        manifest = backup.get_backup(backup_path)
+        if not manifest:
+            return error_response(404, "Not found", "Backup not found")
+
+        return backup_response(manifest, backup.record_verification(backup_path))
@@ -0,0 +1,193 @@
+# coding=UTF-8
+#
+# Provides the RESTful API resource for running many requests to the other resources of the Examrium in one HTTP
+# request.
+#
+# @authors: Ari Kairala, Petteri Ponsimaa
+
+
+import json
+import sqlite3
+
+from flask import Flask, request, Response, g, jsonify
+from flask.ext.restful import Resource, Api, abort
+from werkzeug.test import EnvironBuilder
+from werkzeug.urls import url_parse
+from exam_archive import ExamDatabaseError
+from serialization import Fragment
+from resources_common import auth, app, api, error_response, DEFAULTJSON, BATCH_ENVIRON_KEY, IDENTITY_ATTRIBUTES, \
+    REQUEST_ID_HEADER, REQUEST_ID_ENVIRON_KEY, dumps
+
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'DELETE')
+''' HTTP methods allowed in the sub-requests of a batch. '''
+
+BATCH_HEADERS = ('Accept', 'Content-Type', 'If-Match', 'If-None-Match')
+''' Headers allowed in the sub-requests of a batch. The sub-requests are authorized as the user of the batch. '''
+
+API_PATH = '/exam_archive/api/'
+''' Path of the resources of the RESTful API, relative to the URL prefix of the application. '''
+
+
+class BatchRollback(Exception):
+    '''
+    Exception rolling back the transaction of a batch, when a sub-request has failed.
+    '''
+    pass
+
+
+def batch_requests(batch):
+    '''
+    Validate the sub-requests of a batch. Returns the list of sub-requests, or None if the batch is not a dictionary
+    with a valid list under the key 'requests'.
+    '''
+    if not isinstance(batch, dict) or not isinstance(batch.get('transaction', False), bool):
+        return None
+    requests = batch.get('requests')
+    if not isinstance(requests, list) or not requests:
+        return None
+
+    for sub_request in requests:
+        if not isinstance(sub_request, dict) or sub_request.get('method') not in BATCH_METHODS:
+            return None
+        href = sub_request.get('href')
+        if not isinstance(href, basestring) or not url_parse(href).path.startswith(request.script_root + API_PATH):
+            return None
+        headers = sub_request.get('headers', {})
+        if not isinstance(headers, dict) or any(name not in BATCH_HEADERS or not isinstance(value, basestring)
+                                                for name, value in headers.items()):
+            return None
+    return requests
+
+def dispatch(sub_request, batch):
+    '''
+    Run a sub-request of a batch through the Flask application within the current request, and return its result as
+    a dictionary containing the method, href and status code of the sub-request, its headers and, if the response is
+    JSON, its body. The body of the sub-request is sent as JSON, and the sub-request has the same request ID as the
+    batch.
+    '''
+    url = url_parse(sub_request['href'])
+    body = json.dumps(sub_request['body']) if 'body' in sub_request else None
+    headers = dict(sub_request.get('headers', {}))
+    headers[REQUEST_ID_HEADER] = request.environ[REQUEST_ID_ENVIRON_KEY]
+    builder = EnvironBuilder(path=url.path[len(request.script_root):], base_url=request.url_root,
+                             query_string=url.query, method=sub_request['method'], headers=headers, data=body,
+                             content_type=headers.get('Content-Type', DEFAULTJSON if body is not None else None),
+                             environ_overrides={'REMOTE_ADDR': request.remote_addr, BATCH_ENVIRON_KEY: batch})
+    try:
+        with app.request_context(builder.get_environ()):
+            response = app.full_dispatch_request()
+    except Exception:
+        app.logger.exception("Sub-request %s %s of a batch failed", sub_request['method'], sub_request['href'])
+        response = error_response(500, "Error", "The system has failed. Please, contact the administrator")
+
+    result = {'method': sub_request['method'], 'href': sub_request['href'], 'status': response.status_code}
+    result['headers'] = dict((name, value) for name, value in response.headers.items() if name != 'Content-Length')
+    if response.mimetype.endswith('json') and not response.is_streamed:
+        data = response.get_data()
+        if data:
+            result['body'] = Fragment(data)
+    response.close()
+    return result
+
+def not_run(sub_request):
+    '''
+    Return the result of a sub-request, which was not run because an earlier sub-request of the batch failed.
+    '''
+    problem = error_response(424, "Failed dependency", "An earlier request of the batch failed, the request was not run")
+    return {'method': sub_request['method'], 'href': sub_request['href'], 'status': 424,
+            'headers': {'Content-Type': problem.headers['Content-Type']}, 'body': Fragment(problem.get_data())}
+
+# Define the resources
+class Batch(Resource):
+    '''
+    Resource Batch implementation
+    '''
+
+    @auth.login_required
+    def post(self):
+        '''
+        Run a list of requests to the other resources of the RESTful API in order, and return their responses. The user
+        is authenticated once for the whole batch, and the requests are dispatched within the server without opening
+        new connections. With transaction set to true, the database changes of the requests are made in a single
+        transaction: the batch stops at the first request failing with a status code of 400 or above, the changes of
+        the earlier requests are rolled back, and the rest of the requests get status code 424. Uploaded exam files
+        are not part of the transaction.
+
+        INPUT:
+
+        * `Media type`: application/json, containing the following keys:
+            * `requests`: List of at most MAX_BATCH_REQUESTS requests. Each request is a dictionary with the keys
+            method (GET, POST, PUT or DELETE), href (the URL of the resource including the query parameters),
+            headers (optional dictionary of the Accept, Content-Type, If-Match and If-None-Match headers) and body
+            (optional JSON body, e.g. a Collection+JSON template).
+            * `transaction`: Optional boolean. If true, the requests are run in a single database transaction.
+
+        HEADERS:
+
+        * `Accept`: application/json
+        * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+
+        ENTITY BODY OUTPUT FORMAT:
+
+        * `Media type`: application/json, containing the following keys:
+            * `responses`: List of the responses in the order of the requests. Each response is a dictionary with
+            the keys method, href, status (the status code), headers and, if the response is JSON, body.
+            * `committed`: Only with transaction. True if the transaction was committed, false if it was rolled
+            back.
+
+        RETURN CODES:
+
+        `207` The requests were run. Check the status codes of the responses.
+        `400` Invalid batch. The batch must contain a list of requests to the resources of the API.
+        `400` Too many requests. The batch contains more than MAX_BATCH_REQUESTS requests.
+        `400` Nested batch. A batch can not contain batches.
+        `400` Transaction not supported. The database does not support transactions.
+        `401` Not logged in. You are not logged in, unable to run a batch.
+        `503` Service unavailable. The database is locked by other writers, please try again later.
+
+        In case of error, the response media type Problem+JSON is returned with the error message above.
+        '''
+
+        if g.no_auth_provided:
+            return error_response(401, "Not logged in", "You are not logged in, unable to run a batch")
+        if BATCH_ENVIRON_KEY in request.environ:
+            return error_response(400, "Nested batch", "A batch can not contain batches")
+
+        batch = request.get_json(force=True, silent=True)
+        requests = batch_requests(batch)
+        if requests is None:
+            return error_response(400, "Invalid batch",
+                                  "The batch must contain a list of requests to the resources of the API")
+        if len(requests) > app.config['MAX_BATCH_REQUESTS']:
+            return error_response(400, "Too many requests",
+                                  "The batch contains more than %d requests" % app.config['MAX_BATCH_REQUESTS'])
+
+        # The sub-requests are authorized as the user of the batch
+        transaction = batch.get('transaction', False)
+        context = {'identity': dict((name, g.get(name)) for name in IDENTITY_ATTRIBUTES), 'transaction': transaction}
+        body = {}
+
+        if not transaction:
+            body['responses'] = [dispatch(sub_request, context) for sub_request in requests]
+            return Response(dumps(body), 207, mimetype=DEFAULTJSON)
+
+        responses = body['responses'] = []
+        try:
+            with g.db.transaction():
+                for sub_request in requests:
+                    responses.append(dispatch(sub_request, context))
+                    if responses[-1]['status'] >= 400:
+                        raise BatchRollback()
+            body['committed'] = True
+        except BatchRollback:
+            body['committed'] = False
+            responses.extend(not_run(sub_request) for sub_request in requests[len(responses):])
+        except ExamDatabaseError:
+            return error_response(400, "Transaction not supported", "The database does not support transactions")
+        except sqlite3.OperationalError:
+            response = error_response(503, "Service unavailable",
+                                      "The database is locked by other writers, please try again later")
+            response.headers['Retry-After'] = '1'
+            return response
+
+        return Response(dumps(body), 207, mimetype=DEFAULTJSON)
@@ -0,0 +1,128 @@
+# coding=UTF-8
+#
+# Micro-benchmarks of building and serializing the Collection+JSON responses of the Exam Archive.
+#
+# @authors: Ari Kairala, Petteri Ponsimaa
+
+import sys
+import json
+import timeit
+
+import server
+import exam_resource
+import serialization
+import compression
+from resources_common import app, api, item_fragment
+
+DEFAULT_ITEMS = 1000
+''' Default number of exams in the benchmarked ExamList. '''
+
+DEFAULT_ROUNDS = 20
+''' Default number of times the ExamList is built in each benchmark. '''
+
+
+def exam_rows(count):
+    '''
+    Return a list of the given number of exams with the same structure as returned by browse_exam_list.
+    '''
+    return [{'exam_id': exam_id, 'course_id': 1, 'archive_id': 1, 'course_code': '810136P',
+             'course_name': u'Johdatus tietojenk\xe4sittelytieteisiin', 'examiner_id': 1,
+             'examiner_name': 'Tero Testaaja', 'date': '2015-02-02', 'file_attachment': '810136P_exam%d.pdf' % exam_id,
+             'language_id': 'fi', 'last_modified': '2015-06-03 16:18:04', 'modifier_id': '1',
+             'modifier_name': 'bigboss'} for exam_id in range(1, count + 1)]
+
+
+def benchmark_items(count=DEFAULT_ITEMS, rounds=DEFAULT_ROUNDS):
+    '''
+    Measure the cost of building and serializing the items of an ExamList of the given size, with the hrefs built by
+    api.url_for on each call and by the cached format strings of href. Returns a list of (name, microseconds per
+    item) tuples.
+    '''
+    exams = exam_rows(count)
+    cached_href = exam_resource.href
+    results = []
+    with app.test_request_context():
+        for name, builder in [('api.url_for', lambda resource, **values: api.url_for(resource, **values)),
+                              ('href', cached_href)]:
+            exam_resource.href = builder
+            try:
+                seconds = timeit.timeit(lambda: json.dumps([exam_resource.exam_item(exam) for exam in exams]),
+                                        number=rounds)
+            finally:
+                exam_resource.href = cached_href
+            results.append((name, seconds * 1000000 / (rounds * count)))
+    return results
+
+
+def benchmark_encoders(count=DEFAULT_ITEMS, rounds=DEFAULT_ROUNDS):
+    '''
+    Measure the throughput of building and encoding an ExamList envelope of the given size with each installed JSON
+    module, and with the items taken from the fragment cache. Returns a list of (name, items per second, megabytes
+    per second) tuples.
+    '''
+    exams = exam_rows(count)
+    results = []
+    with app.test_request_context():
+        def envelope(items):
+            return {'collection': {'version': '1.0', 'template': exam_resource.EXAM_TEMPLATE, 'items': items}}
+
+        tests = []
+        for name in serialization.ENCODERS:
+            encoder, encode = serialization.select_encoder([name])
+            if encoder == name:
+                tests.append((name, lambda encode=encode: encode(
+                    envelope([exam_resource.exam_item(exam) for exam in exams]), serialization.Fragment.text.__get__)))
+
+        tests.append(('%s with cached fragments' % serialization.ENCODER, lambda: serialization.dumps(
+            envelope([item_fragment(exam_resource.Exam, exam['exam_id'], exam, exam_resource.exam_item)
+                      for exam in exams]))))
+
+        for name, test in tests:
+            size = len(test())
+            seconds = timeit.timeit(test, number=rounds)
+            results.append((name, rounds * count / seconds, rounds * size / seconds / 1000000))
+    return results
+
+
+def benchmark_compression(count=DEFAULT_ITEMS, rounds=DEFAULT_ROUNDS):
+    '''
+    Measure the size of an ExamList response of the given size compressed with each available content coding, and
+    the time of compressing it. Returns a list of (content coding, bytes, milliseconds) tuples, the first one for the
+    uncompressed response.
+    '''
+    with app.test_request_context():
+        items = [exam_resource.exam_item(exam) for exam in exam_rows(count)]
+        data = serialization.dumps({'collection': {'version': '1.0', 'template': exam_resource.EXAM_TEMPLATE,
+                                                   'items': items}})
+    results = [('identity', len(data), 0.0)]
+    for encoding in compression.ENCODINGS:
+        level = compression.DEFAULT_LEVELS[encoding]
+        seconds = timeit.timeit(lambda: compression.COMPRESSORS[encoding](data, level), number=rounds)
+        results.append((encoding, len(compression.compress(data, encoding)), seconds * 1000 / rounds))
+    return results
+
+
+# Run the benchmarks from command line
+if __name__ == '__main__':
+    usage = 'Usage:\n' \
+            '  python benchmark.py items [<number of items>]\n' \
+            '  python benchmark.py encoders [<number of items>]\n' \
+            '  python benchmark.py compression [<number of items>]'
+
+    if len(sys.argv) not in (2, 3):
+        print usage
+        sys.exit(1)
+    command, args = sys.argv[1], [int(arg) for arg in sys.argv[2:]]
+
+    if command == 'items':
+        for name, microseconds in benchmark_items(*args):
+            print 'Exam items with %s: %.1f microseconds per item' % (name, microseconds)
+    elif command == 'encoders':
+        for name, items, megabytes in benchmark_encoders(*args):
+            print 'Building and encoding with %s: %d items per second, %.1f MB per second' % (name, items, megabytes)
+    elif command == 'compression':
+        for encoding, size, milliseconds in benchmark_compression(*args):
+            print 'ExamList with %s: %d bytes, compressed in %.1f milliseconds' % (encoding, size, milliseconds)
+    else:
+        print usage
+        sys.exit(1)
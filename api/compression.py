@@ -0,0 +1,125 @@
+# coding=UTF-8
+#
+# Provides the compression of the responses of the Exam Archive with the content codings accepted by the client.
+#
+# @authors: Ari Kairala, Petteri Ponsimaa
+
+import re
+import zlib
+import hashlib
+import threading
+import collections
+
+
+def _gzip(data, level):
+    '''
+    Compress data to the gzip format. The header has no timestamp, so the same data is always compressed to the same
+    bytes.
+    '''
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+COMPRESSORS = {'gzip': _gzip}
+''' Functions compressing data with a content coding and level, by the names of the content codings. '''
+
+try:
+    import brotli
+    COMPRESSORS['br'] = lambda data, level: brotli.compress(data, quality=level)
+except ImportError:
+    pass
+
+try:
+    import zstandard
+    COMPRESSORS['zstd'] = lambda data, level: zstandard.ZstdCompressor(level=level).compress(data)
+except ImportError:
+    pass
+
+ENCODINGS = [encoding for encoding in ('br', 'zstd', 'gzip') if encoding in COMPRESSORS]
+''' Content codings available, in the order of preference when the client accepts several of them equally. '''
+
+DEFAULT_LEVELS = {'gzip': 6, 'br': 5, 'zstd': 3}
+''' Default compression levels by the content codings. '''
+
+DEFAULT_MIN_SIZE = 1024
+''' Default minimum size of a response body in bytes, below which the response is not compressed. '''
+
+COMPRESSIBLE_MIMETYPES = ['application/json', 'application/vnd.collection+json', 'application/problem+json',
+                          'text/html', 'text/plain', 'text/css', 'application/javascript']
+''' Mime types of the responses, which are compressed. '''
+
+CACHE_SIZE = 256
+''' Maximum number of compressed response bodies kept in the cache. '''
+
+CACHE = collections.OrderedDict()
+''' Least recently used cache of the compressed response bodies by the content coding, level and digest of the body. '''
+
+CACHE_LOCK = threading.Lock()
+''' Lock for accessing the cache. '''
+
+ETAG_SUFFIX = re.compile(r'-(%s)"' % '|'.join(DEFAULT_LEVELS))
+''' Pattern of the suffix of the entity tags of the compressed representations. '''
+
+
+def negotiate(accept_encodings):
+    '''
+    Return the content coding to compress a response with, or None if the response should not be compressed.
+
+    INPUT:
+
+    * `accept_encodings`: The Accept-Encoding header of the request as parsed by Werkzeug (request.accept_encodings).
+    '''
+    best, best_quality = None, 0
+    for encoding in ENCODINGS:
+        quality = accept_encodings.quality(encoding)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data, encoding, level=None):
+    '''
+    Compress a response body with the given content coding. Each distinct body is compressed only once, the
+    compressed bytes are kept in the cache and returned for the same body until evicted.
+
+    INPUT:
+
+    * `data`: The response body as a byte string.
+    * `encoding`: Name of the content coding, one of ENCODINGS.
+    * `level`: Compression level. If None, the level in DEFAULT_LEVELS is used instead.
+    '''
+    if level is None:
+        level = DEFAULT_LEVELS[encoding]
+    key = (encoding, level, hashlib.sha1(data).digest())
+
+    with CACHE_LOCK:
+        compressed = CACHE.pop(key, None)
+        if compressed is not None:
+            CACHE[key] = compressed
+            return compressed
+
+    compressed = COMPRESSORS[encoding](data, level)
+    with CACHE_LOCK:
+        CACHE[key] = compressed
+        while len(CACHE) > CACHE_SIZE:
+            CACHE.popitem(last=False)
+    return compressed
+
+
+def strip_etag_suffix(header):
+    '''
+    Remove the content coding suffixes from the entity tags of an If-Match or If-None-Match header, so that the tags
+    of the compressed representations match the tags of the resources. Returns a tuple of the header and the content
+    coding of the last suffix removed, or None if there were no suffixes.
+    '''
+    encodings = ETAG_SUFFIX.findall(header)
+    if not encodings:
+        return header, None
+    return ETAG_SUFFIX.sub('"', header), encodings[-1]
+
+
+def clear_cache():
+    '''
+    Remove all the compressed response bodies from the cache.
+    '''
+    with CACHE_LOCK:
+        CACHE.clear()
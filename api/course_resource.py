@@ -14,9 +14,164 @@ import exam_resource
 from flask import Flask, request, Response, g, jsonify
 from flask.ext.restful import Resource, Api, abort
 
-from exam_archive import ExamDatabaseError, ExamDatabaseErrorExists
+from exam_archive import ExamDatabaseError, ExamDatabaseErrorExists, ExamDatabaseErrorModified, SORT_KEYS
 from resources_common import auth, app, api, error_response, EXAM_ARCHIVE, API_VERSION, COLLECTIONJSON, \
-    COURSE_PROFILE, DEFAULTJSON
+    COURSE_PROFILE, DEFAULTJSON, entity_tag, precondition_failed, if_match_modified, expand_parameter, href, \
+    dumps, fragment, item_fragment, coalesced_response, page_parameters, next_page_link, fields_parameter, \
+    selected_columns
+
+COURSE_LIST_TEMPLATE = fragment({
+    "data" : [
+        {"prompt" : "Insert course code", "name" : "courseCode", "value" : "", "required":False},
+        {"prompt" : "Insert course name", "name" : "name", "value" : "", "required":True},
+        {"prompt" : "Insert description", "name" : "description", "value" : "", "required":False},
+        {"prompt" : "Insert teacher ID", "name" : "teacherId", "value" : "", "required":False},
+        {"prompt" : "Insert course url", "name" : "url", "value" : "", "required":False},
+        {"prompt" : "Insert course credit points", "name" : "creditPoints", "value" : "", "required":False},
+        {"prompt" : "Insert course language id", "name" : "inLanguage", "value" : "", "required":False}
+    ]
+})
+''' Pre-encoded Collection+JSON template of the CourseList resource. '''
+
+COURSE_TEMPLATE = fragment({
+    "data" : [
+        {"prompt" : "Insert course ID", "name" : "courseId", "value" : "", "required":True},
+        {"prompt" : "Insert archive ID", "name" : "archiveId", "value" : "", "required":True},
+        {"prompt" : "Insert course code", "name" : "courseCode", "value" : "", "required":False},
+        {"prompt" : "Insert course name", "name" : "name", "value" : "", "required":True},
+        {"prompt" : "Insert description", "name" : "description", "value" : "", "required":False},
+        {"prompt" : "Insert teacher ID", "name" : "teacherId", "value" : "", "required":False},
+        {"prompt" : "Insert course url", "name" : "url", "value" : "", "required":False},
+        {"prompt" : "Insert course credit points", "name" : "creditPoints", "value" : "", "required":False},
+        {"prompt" : "Insert course language id", "name" : "inLanguage", "value" : "", "required":False}
+    ]
+})
+''' Pre-encoded Collection+JSON template of the Course resource. '''
+
+COURSE_FIELDS = {
+    'courseId': ('course_id',),
+    'archiveId': ('archive_id',),
+    'courseCode': ('course_code',),
+    'name': ('course_name',),
+    'description': ('description',),
+    'url': ('url',),
+    'inLanguage': ('language_id',),
+    'creditPoints': ('credit_points',),
+    'dateModified': ('last_modified',),
+    'examCount': ('exam_count',),
+    'latestExamDate': ('latest_exam_date',),
+    'teacherId': ('teacher_id',),
+    'teacherName': ('teacher_id', 'teacher_name'),
+    'modifier': ('modifier_id', 'modifier_name'),
+    'links': ('exam_count', 'course_name'),
+}
+''' Columns of the course list view needed by each field of the course items, for the fields query parameter. '''
+
+COURSE_COLUMNS = ('course_id', 'archive_id')
+''' Columns of the course list view needed by every course item. '''
+
+def course_item(course, exams=None, fields=None):
+    '''
+    Create a Collection+JSON item of a course.
+
+    INPUT:
+
+    * `course`: The course as returned by browse_course_list.
+    * `exams`: List of the exams of the course as returned by browse_exam_list. If given, the exams are embedded to
+    the item as a list of pre-encoded exam items under the key 'exams'.
+    * `fields`: The names of the data fields and 'links' to include in the item, or None for all of them. The course
+    needs to contain only the columns of COURSE_FIELDS of the fields.
+    '''
+    if fields is None:
+        fields = COURSE_FIELDS
+
+    course_id = course['course_id']
+    archive_id = course['archive_id']
+
+    item = {}
+    data = []
+    links = []
+    item['href'] = href(Course, archive_id=archive_id, course_id=course_id)
+    item['read-only'] = True
+    item['data'] = data
+    item['links'] = links
+
+    # Append proper fields with values to items
+    if 'courseId' in fields:
+        data.append({'name':'courseId', 'value':course_id})
+    if 'archiveId' in fields:
+        data.append({'name':'archiveId', 'value':archive_id})
+    if 'courseCode' in fields:
+        data.append({'name':'courseCode', 'value':course['course_code']})
+    if 'name' in fields:
+        data.append({'name':'name', 'value':course['course_name']})
+    if 'description' in fields:
+        data.append({'name':'description', 'value':course['description']})
+    if 'url' in fields:
+        data.append({'name':'url', 'value':course['url']})
+    if 'inLanguage' in fields:
+        data.append({'name':'inLanguage', 'value':course['language_id']})
+    if 'creditPoints' in fields:
+        data.append({'name':'creditPoints', 'value':course['credit_points']})
+    if 'dateModified' in fields:
+        data.append({'name':'dateModified', 'value':course['last_modified']})
+    if 'examCount' in fields:
+        data.append({'name':'examCount', 'value':course['exam_count']})
+    if 'latestExamDate' in fields:
+        data.append({'name':'latestExamDate', 'value':course['latest_exam_date']})
+
+    teacher_id = course.get('teacher_id')
+    if teacher_id:
+        if 'teacherId' in fields:
+            data.append({'name':'teacherId', 'value':teacher_id})
+        if 'teacherName' in fields:
+            data.append({'name':'teacherName', 'value':course['teacher_name']})
+
+    if 'modifier' in fields and course['modifier_id']:
+        data.append({'name':'modifier', 'value':course['modifier_name']})
+
+    if 'links' in fields and course['exam_count']:
+        link = {'name':"exam_list",
+                'prompt':'Exams of the course %s' % course['course_name'],
+                'rel':'exams',
+                'href': href(exam_resource.ExamList, archive_id=archive_id, course_id=course_id)}
+
+        links.append(link)
+
+    if exams is not None:
+        item['exams'] = [item_fragment(exam_resource.Exam, exam['exam_id'], exam, exam_resource.exam_item)
+                         for exam in exams]
+
+    return item
+
+def course_items(archive_id, expand, courses=None, fields=None):
+    '''
+    Create the Collection+JSON items of the courses of an archive. The courses, including the names of the teachers
+    and modifiers and the number of exams, are read from the course list view with one query, unless a page of
+    courses is given. If 'exams' is in the set expand, the exams of all the courses are read from the exam list view
+    with one query and embedded to the course items. Items without embedded exams are returned as pre-encoded
+    fragments. If fields is not None, the items contain only the given fields.
+
+    Returns the list of items, or None if there are more courses and embedded exams than allowed by
+    MAX_EXPANDED_ITEMS.
+    '''
+    if courses is None:
+        courses = g.db.browse_course_list(archive_id)
+
+    exam_count = sum(course['exam_count'] for course in courses) if 'exams' in expand else 0
+    if len(courses) + exam_count > app.config['MAX_EXPANDED_ITEMS']:
+        return None
+
+    course_exams = None
+    if 'exams' in expand:
+        # Group the exams by their course
+        course_exams = dict((course['course_id'], []) for course in courses)
+        for exam in g.db.browse_archive_exam_list(archive_id):
+            course_exams.setdefault(exam['course_id'], []).append(exam)
+
+    if course_exams is None:
+        return [item_fragment(Course, course['course_id'], course, course_item, fields) for course in courses]
+    return [course_item(course, course_exams[course['course_id']], fields) for course in courses]
 
 # Define the resources
 class CourseList(Resource):
@@ -31,7 +186,15 @@ class CourseList(Resource):
 
         INPUT:
 
-        * `None`
+        * `expand`: Optional query parameter. With ?expand=exams, the exams of each course are embedded to the
+        course item as a list of exam items under the key 'exams'.
+        * `sort`: Optional query parameter. Sort the courses by course_name, course_code or last_modified, e.g.
+        ?sort=course_name. A minus sign before the key sorts in descending order, e.g. ?sort=-last_modified.
+        * `limit`: Optional query parameter. The maximum number of courses returned. If there are more courses, the
+        collection has a link with relation next to the next page.
+        * `after`: Optional query parameter. The cursor of the next page, set by the next link.
+        * `fields`: Optional query parameter. Comma separated names of the data fields included in the course items,
+        e.g. ?fields=courseId,name. The links of the items are included only with the name links.
 
         HEADERS:
 
@@ -50,6 +213,10 @@ class CourseList(Resource):
 
         `200` A list of courses in database was returned succesfully.
         `400` No archive id. The archive id was not specified.
+        `400` Invalid expand parameter. Only exams can be expanded.
+        `400` Invalid paging parameter. The sort key, limit or cursor is not valid.
+        `400` Invalid fields parameter. Only the data fields of the course items and links can be selected.
+        `400` Too many items to expand. The response would contain too many courses and exams.
         `401` Not logged in. You are not logged in, unable to get course list information.
         `403` Access forbidden. You are not authorizated to access the course list.
         `404` Not found. Given archive was not found.
@@ -66,105 +233,68 @@ class CourseList(Resource):
         if not archive_id:
             return error_response(400, "No archive id", "The archive id was not specified")
 
-        # Extract the archive from the database
-        archive = g.db.get_archive(archive_id)
-
-        if not archive:
-            return error_response(404, "Not found", "Given archive was not found")
-
-        # Extract courses from the database
-        courses = g.db.browse_courses(archive_id)
-
-        # Create the envelope
-        envelope = {}
-        collection = {}
-        collection_links = []
-        envelope["collection"] = collection
-        collection['version'] = API_VERSION
-        collection['href'] = api.url_for(CourseList, archive_id=archive_id)
-        collection['links'] = collection_links
-
-        # Add link to the parent archive list
-        collection_links.append({'name':"%s" % EXAM_ARCHIVE.lower().replace(' ','_'),
-                              'prompt':'Archive list',
-                              'rel':'archives','href': api.url_for(archive_resource.ArchiveList)})
-
-        collection_links.append({'name':"parent_archive",
-                                 'prompt':'Archive %s' % archive['archive_name'],
-                                 'rel':'archive','href': api.url_for(archive_resource.Archive, archive=archive_id)})
-
-        collection['template'] = {
-            "data" : [
-                {"prompt" : "Insert course code", "name" : "courseCode", "value" : "", "required":False},
-                {"prompt" : "Insert course name", "name" : "name", "value" : "", "required":True},
-                {"prompt" : "Insert description", "name" : "description", "value" : "", "required":False},
-                {"prompt" : "Insert teacher ID", "name" : "teacherId", "value" : "", "required":False},
-                {"prompt" : "Insert course url", "name" : "url", "value" : "", "required":False},
-                {"prompt" : "Insert course credit points", "name" : "creditPoints", "value" : "", "required":False},
-                {"prompt" : "Insert course language id", "name" : "inLanguage", "value" : "", "required":False}
-            ]
-        }
-
-        # Create the items
-        items = []
-        for course in courses:
-            course_id = course['course_id']
-            archive_id = course['archive_id']
-            course_code = course['course_code']
-            course_name = course['course_name']
-            description = course['description']
-            teacher_id = course['teacher_id']
-            url = course['url']
-            credit_points = course['credit_points']
-            lang = course['language_id']
-
-            item = {}
-            data = []
-            links = []
-            item['href'] = api.url_for(Course, archive_id=archive_id, course_id=course_id)
-            item['read-only'] = True
-            item['data'] = data
-            item['links'] = links
-
-            # Append proper fields with values to items
-            data.append({'name':'courseId', 'value':course_id})
-            data.append({'name':'archiveId', 'value':archive_id})
-            data.append({'name':'courseCode', 'value':course_code})
-            data.append({'name':'name', 'value':course_name})
-            data.append({'name':'description', 'value':description})
-            data.append({'name':'url', 'value':url})
-            data.append({'name':'inLanguage', 'value':lang})
-            data.append({'name':'creditPoints', 'value':credit_points})
-            data.append({'name':'dateModified', 'value':course['last_modified']})
-
-            teacher_id = course['teacher_id']
-            if teacher_id:
-                teacher = g.db.get_teacher(teacher_id)
-                teacher_name = "%s %s" % (teacher['first_name'], teacher['last_name'])
-                data.append({'name':'teacherId', 'value':teacher_id})
-                data.append({'name':'teacherName', 'value':teacher_name})
-
-            modifier_id = course['modifier_id']
-            if modifier_id:
-                modifier = g.db.get_user(modifier_id)
-                modifier_name = modifier['username']
-                data.append({'name':'modifier', 'value':modifier_name})
-
-            exams = g.db.browse_exams(course_id)
-            if exams:
-                link = {'name':"exam_list",
-                        'prompt':'Exams of the course %s' % course_name,
-                        'rel':'exams',
-                        'href': api.url_for(exam_resource.ExamList, archive_id=archive_id, course_id=course_id)}
-
-                links.append(link)
-
-            items.append(item)
-
-        collection['items'] = items
-
-        # Return the response with status code 200 and Collection+JSON mime type and URL to Course profile
-        return Response (json.dumps(envelope), 200, mimetype=COLLECTIONJSON+";"+COURSE_PROFILE)
+        expand = expand_parameter(['exams'])
+        if expand is None:
+            return error_response(400, "Invalid expand parameter", "Only exams can be expanded")
+
+        page = page_parameters(SORT_KEYS['course_list_view'])
+        if page is None:
+            return error_response(400, "Invalid paging parameter", "The sort key, limit or cursor is not valid")
+
+        fields = fields_parameter(COURSE_FIELDS)
+        if fields is False:
+            return error_response(400, "Invalid fields parameter",
+                                  "Only the data fields of the course items and links can be selected")
+        # The number of exams is needed for limiting the expanded items
+        required = COURSE_COLUMNS + (('exam_count',) if 'exams' in expand else ())
+        columns = selected_columns(fields, COURSE_FIELDS, required)
+
+        def build():
+            # Extract the archive from the database
+            archive = g.db.get_archive(archive_id)
+
+            if not archive:
+                return error_response(404, "Not found", "Given archive was not found")
+
+            # Create the envelope
+            envelope = {}
+            collection = {}
+            collection_links = []
+            envelope["collection"] = collection
+            collection['version'] = API_VERSION
+            collection['href'] = href(CourseList, archive_id=archive_id)
+            collection['links'] = collection_links
+
+            # Add link to the parent archive list
+            collection_links.append({'name':"%s" % EXAM_ARCHIVE.lower().replace(' ','_'),
+                                  'prompt':'Archive list',
+                                  'rel':'archives','href': href(archive_resource.ArchiveList)})
+
+            collection_links.append({'name':"parent_archive",
+                                     'prompt':'Archive %s' % archive['archive_name'],
+                                     'rel':'archive','href': href(archive_resource.Archive, archive=archive_id)})
+
+            collection['template'] = COURSE_LIST_TEMPLATE
+
+            # Create the items of the requested page of the courses
+            courses = g.db.browse_course_list(archive_id, columns=columns, **page)
+            items = course_items(archive_id, expand, courses, fields)
+            if items is None:
+                return error_response(400, "Too many items to expand",
+                                      "The response would contain more than %d courses and exams, follow the links "
+                                      "instead" % app.config['MAX_EXPANDED_ITEMS'])
+
+            collection['items'] = items
+
+            next_link = next_page_link(collection['href'], courses, page, 'course_id')
+            if next_link:
+                collection_links.append(next_link)
+
+            # Return the response with status code 200 and Collection+JSON mime type and URL to Course profile
+            return Response (dumps(envelope), 200, mimetype=COLLECTIONJSON+";"+COURSE_PROFILE)
+
+        # Concurrent identical requests share one build of the list
+        return coalesced_response(CourseList, (archive_id,), build)
 
     
     @auth.login_required
@@ -272,7 +402,7 @@ class CourseList(Resource):
             return error_response(500, "Database error", "Please, contact the administrator")
 
         # Create the location header with the coursename of the newly added course
-        url = api.url_for(Course, archive_id=archive_id, course_id=new_course_id)
+        url = href(Course, archive_id=archive_id, course_id=new_course_id)
 
         # Return the response with status code 201 and location header with URL pointing to new resource
         return Response(status=201, headers={'Location':url}, mimetype=DEFAULTJSON)
@@ -315,6 +445,7 @@ class Course(Resource):
         `403` Access forbidden. You are not authorizated to access the course information.
         `404` Not found. No archive/course found.
 
+        The response has an ETag header, which can be given in If-Match header of PUT and DELETE requests.
         In case of error, the response media type Problem+JSON is returned with the error message above.
         '''
 
@@ -347,31 +478,19 @@ class Course(Resource):
         collection_links = []
         envelope["collection"] = collection
         collection['version'] = API_VERSION
-        collection['href'] = api.url_for(Course, archive_id=archive_id, course_id=course_id)
+        collection['href'] = href(Course, archive_id=archive_id, course_id=course_id)
 
         collection['links'] = collection_links
 
         collection_links.append({'name':"parent_archive",
                                  'prompt':'Archive %s' % archive['archive_name'],
-                                 'rel':'archive','href': api.url_for(archive_resource.Archive, archive=archive_id)})
+                                 'rel':'archive','href': href(archive_resource.Archive, archive=archive_id)})
 
         collection_links.append({'name':"course_list",
                                  'prompt':'List of all courses in the archive %s' % archive['archive_name'],
-                                 'rel':'courses','href': api.url_for(CourseList, archive_id=archive_id)})
-
-        collection['template'] = {
-            "data" : [
-                {"prompt" : "Insert course ID", "name" : "courseId", "value" : "", "required":True},
-                {"prompt" : "Insert archive ID", "name" : "archiveId", "value" : "", "required":True},
-                {"prompt" : "Insert course code", "name" : "courseCode", "value" : "", "required":False},
-                {"prompt" : "Insert course name", "name" : "name", "value" : "", "required":True},
-                {"prompt" : "Insert description", "name" : "description", "value" : "", "required":False},
-                {"prompt" : "Insert teacher ID", "name" : "teacherId", "value" : "", "required":False},
-                {"prompt" : "Insert course url", "name" : "url", "value" : "", "required":False},
-                {"prompt" : "Insert course credit points", "name" : "creditPoints", "value" : "", "required":False},
-                {"prompt" : "Insert course language id", "name" : "inLanguage", "value" : "", "required":False}
-            ]
-        }
+                                 'rel':'courses','href': href(CourseList, archive_id=archive_id)})
+
+        collection['template'] = COURSE_TEMPLATE
 
         # Create the items
         items = []
@@ -388,7 +507,7 @@ class Course(Resource):
         item = {}
         data = []
         links = []
-        item['href'] = api.url_for(Course, archive_id=archive_id, course_id=course_id)
+        item['href'] = href(Course, archive_id=archive_id, course_id=course_id)
         item['read-only'] = True
         item['data'] = data
         item['links'] = links
@@ -406,7 +525,7 @@ class Course(Resource):
 
         teacher_id = course['teacher_id']
         if teacher_id:
-            teacher = g.db.get_teacher(teacher_id)
+            teacher = g.db.get_lookups().teachers_by_id[unicode(teacher_id)]
             teacher_name = "%s %s" % (teacher['first_name'], teacher['last_name'])
             data.append({'name':'teacherId', 'value':teacher_id})
             data.append({'name':'teacherName', 'value':teacher_name})
@@ -418,7 +537,7 @@ class Course(Resource):
             data.append({'name':'modifier', 'value':modifier_name})
 
         link = {'name':"exam_list", 'prompt':'Exams of the course %s' % course_name,
-                'rel':'exams','href': api.url_for(exam_resource.ExamList, archive_id=archive_id, course_id=course_id)}
+                'rel':'exams','href': href(exam_resource.ExamList, archive_id=archive_id, course_id=course_id)}
         links.append(link)
 
         items.append(item)
@@ -426,7 +545,9 @@ class Course(Resource):
         collection['items'] = items
 
         # Return the response with Collection+JSON mime type and URL to Course profile
-        return Response (json.dumps(envelope), 200, mimetype=COLLECTIONJSON+";"+COURSE_PROFILE)
+        response = Response (dumps(envelope), 200, mimetype=COLLECTIONJSON+";"+COURSE_PROFILE)
+        response.set_etag(entity_tag(course))
+        return response
 
     
     @auth.login_required
@@ -443,6 +564,7 @@ class Course(Resource):
 
         * `Accept`: application/json
         * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+        * `If-Match`: Optional ETag of the course as returned by GET. The course is updated only if it matches.
 
         ENTITY BODY OUTPUT FORMAT:
 
@@ -461,6 +583,7 @@ class Course(Resource):
         `403` Access forbidden. You are not authorizated.
         `404` Course not found. Given course id was not found.
         `409` Error updating course. Course with the same course name and language id already exists.
+        `412` Precondition failed. The course has been modified since it was fetched.
         `415` Unsupported media type: Use a JSON compatible format.
         `500` Database error. Please, contact the administrator.
 
@@ -479,6 +602,10 @@ class Course(Resource):
         if not course:
             return error_response(404, "Course not found", "Given course id was not found")
 
+        # Check that the course has not been modified since the client fetched it
+        if precondition_failed(course):
+            return error_response(412, "Precondition failed", "The course has been modified since it was fetched")
+
         # Convert the request body to JSON. If it fails get_json method throws an exception. Catch it and report it to
         # the user as an error. Set silent = True to let us replace '400 bad request' with more detailed error message.
         input = request.get_json(force=True, silent=True)
@@ -526,7 +653,10 @@ class Course(Resource):
 
         # Try to create the new course
         try:
-            success = g.db.edit_course(course_id, course_code, course_name, description, teacher_id, url, credit_points, language_id, modifier_id)
+            success = g.db.edit_course(course_id, course_code, course_name, description, teacher_id, url, credit_points,
+                                       language_id, modifier_id, if_match_modified(course))
+        except ExamDatabaseErrorModified:
+            return error_response(412, "Precondition failed", "The course has been modified since it was fetched")
         except ExamDatabaseErrorExists as e:
             return error_response(409, "Error updating course", "Course with the same course name and language id already exists")
 
@@ -534,7 +664,7 @@ class Course(Resource):
             return error_response(500, "Database error", "Please, contact the administrator")
 
         # Create the location header with the coursename of the newly added course
-        url = api.url_for(Course, archive_id=archive_id, course_id=course_id)
+        url = href(Course, archive_id=archive_id, course_id=course_id)
 
         # Return the response with status code 201 and location header with URL pointing to new resource
         return Response(status=200, headers={'Location':url}, mimetype=DEFAULTJSON)
@@ -554,6 +684,7 @@ class Course(Resource):
 
         * `Accept`: application/json
         * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+        * `If-Match`: Optional ETag of the course as returned by GET. The course is deleted only if it matches.
 
         RETURN CODES:
 
@@ -561,6 +692,7 @@ class Course(Resource):
         `401` Not logged in. You are not logged in, unable delete the course.
         `403` Access forbidden. You are not authorizated (must be a user of type 'super')
         `404` Course not found. Given course was not found.
+        `412` Precondition failed. The course has been modified since it was fetched.
         `500` Database error. Please, contact the adminnistrator.
 
         In case of error, the response media type Problem+JSON is returned with the error message above.
@@ -578,8 +710,15 @@ class Course(Resource):
         if not course:
             return error_response(404, "Course not found", "Given course was not found")
 
+        # Check that the course has not been modified since the client fetched it
+        if precondition_failed(course):
+            return error_response(412, "Precondition failed", "The course has been modified since it was fetched")
+
         # Try to delete the course
-        success = g.db.remove_course(course_id)
+        try:
+            success = g.db.remove_course(course_id, if_match_modified(course))
+        except ExamDatabaseErrorModified:
+            return error_response(412, "Precondition failed", "The course has been modified since it was fetched")
 
         if not success:
             return error_response(500, "Database error", "Please, contact the adminnistrator")
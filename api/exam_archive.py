@@ -10,7 +10,14 @@ import sqlite3
 from sqlite3 import IntegrityError
 import re
 import os
+import sys
+import json
+import hashlib
+import threading
+import contextlib
+import collections
 import arrow
+import tracing
 
 # Default paths for .db and .sql files to create and populate the database.
 DEFAULT_DB_PATH = 'db/exam_archive.db'
@@ -20,29 +27,110 @@ DEFAULT_SCHEMA = "db/exam_archive_schema_dump.sql"
 DEFAULT_DATA_DUMP = "db/exam_archive_data_dump.sql"
 ''' SQL create and insert clauses for testing. '''
 
+CACHED_STATEMENTS = 256
+''' Number of prepared statements cached by each pooled connection. Larger than the number of statements in use. '''
+
+FOREIGN_KEYS_ON = 'PRAGMA foreign_keys = ON'
+''' SQL statement executed by the functions of the database API for activating foreign keys. '''
+
+MODIFYING_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+''' Statements beginning a transaction of a pooled connection, like the implicit transactions of the sqlite3 module. '''
+
+POOL = threading.local()
+''' Pooled connections of the current thread by the absolute paths of their databases. '''
+POOL_CONNECTIONS = {}
+''' All the pooled connections of the process by the absolute paths of their databases. '''
+POOL_LOCK = threading.Lock()
+''' Lock for adding and closing the pooled connections. '''
+
+STATEMENTS = {}
+''' Registry of the SQL statements built from table names, so that they are formatted only once. '''
+
+TABLE_GENERATIONS = {}
+''' Latest generations of the tables seen by the process, by the absolute paths of their databases. '''
+
+TABLE_COLUMNS = {}
+''' Column names of the tables and list views by the table names, read once from the schema. '''
+
+LOOKUPS = {}
+''' Lookup snapshots of the databases by their absolute paths, shared by all the database API objects of the process.
+Each snapshot is stored with the generations of the tables it was read from. '''
+LOOKUPS_LOCK = threading.Lock()
+''' Lock for building and discarding the lookup snapshots and the token generation snapshots. '''
+TOKEN_GENERATIONS = {}
+''' Snapshots of the access token generations of the users by the absolute paths of their databases, stored with the
+generation of the user table they were read from. '''
+
+SORT_KEYS = {
+    'archive': ('last_modified',),
+    'course': ('course_name', 'course_code', 'last_modified'),
+    'exam': ('date', 'last_modified'),
+    'teacher': ('last_modified',),
+    'user': ('username', 'last_modified'),
+    'course_list_view': ('course_name', 'course_code', 'last_modified'),
+    'exam_list_view': ('date', 'last_modified'),
+}
+''' Columns the rows of the tables and list views can be sorted by. Each column is backed by an index together with
+the parent ID of the table, so that a sorted page is read from the index without sorting the rows. '''
+
+# SQL select clauses calculating the contents of the summary tables from the course and exam tables. The summary
+# tables are kept up to date by triggers, these are used only for rebuilding and verifying them.
+SUMMARY_QUERIES = [
+    ('archive_summary',
+     'SELECT a.archive_id, COUNT(DISTINCT c.course_id), COUNT(e.exam_id), MAX(e.date) FROM archive a '
+     'LEFT JOIN course c ON c.archive_id = a.archive_id LEFT JOIN exam e ON e.course_id = c.course_id '
+     'GROUP BY a.archive_id'),
+    ('course_summary',
+     'SELECT c.course_id, COUNT(e.exam_id), MAX(e.date) FROM course c '
+     'LEFT JOIN exam e ON e.course_id = c.course_id GROUP BY c.course_id'),
+    ('exam_summary',
+     "SELECT course_id, COALESCE(language_id, ''), COALESCE(substr(date, 1, 4), ''), COUNT(*) FROM exam "
+     "GROUP BY course_id, COALESCE(language_id, ''), COALESCE(substr(date, 1, 4), '')")]
+
+# SQL select clauses calculating the contents of the list view tables from the course, exam, teacher, user and
+# course_summary tables. Like the summary tables, the list view tables are kept up to date by triggers.
+LIST_VIEW_QUERIES = [
+    ('course_list_view',
+     "SELECT c.course_id, c.archive_id, c.course_code, c.course_name, c.description, c.url, c.language_id, "
+     "c.credit_points, c.last_modified, c.teacher_id, t.first_name || ' ' || t.last_name, c.modifier_id, u.username, "
+     "COALESCE(s.exam_count, 0), s.latest_exam_date FROM course c "
+     "LEFT JOIN teacher t ON t.teacher_id = c.teacher_id LEFT JOIN user u ON u.user_id = c.modifier_id "
+     "LEFT JOIN course_summary s ON s.course_id = c.course_id"),
+    ('exam_list_view',
+     "SELECT e.exam_id, e.course_id, c.archive_id, c.course_code, c.course_name, e.examiner_id, "
+     "t.first_name || ' ' || t.last_name, e.date, e.file_attachment, e.language_id, e.last_modified, e.modifier_id, "
+     "u.username FROM exam e JOIN course c ON c.course_id = e.course_id "
+     "LEFT JOIN teacher t ON t.teacher_id = e.examiner_id LEFT JOIN user u ON u.user_id = e.modifier_id")]
+
+@tracing.trace_methods('db.')
 class ExamArchiveDatabase(object):
     '''
     API to access the exam archive database.
 
     '''
 
-    def __init__(self, db_path=None):
+    def __init__(self, db_path=None, pooled=True):
         '''
         db_path is the address of the path with respect to the calling script.
-        If db_path is None, DEFAULT_DB_PATH is used instead.
+        If db_path is None, DEFAULT_DB_PATH is used instead. If pooled is True, each thread reuses one connection to
+        the database, keeping the prepared statements cached between the calls. Otherwise every call opens a new
+        connection.
         '''
         super(ExamArchiveDatabase, self).__init__()
         if db_path is not None:
             self.db_path = db_path
         else:
             self.db_path = DEFAULT_DB_PATH
+        self.pooled = pooled
 
     # Setting up the database. Used for the tests. Setup, populate and delete the database
     def clean(self):
         '''
         Purge the database removing old values.
         '''
+        self.close_connections()
         os.remove(self.db_path)
+        self.invalidate_lookups()
 
     def load_init_values(self):
         '''
@@ -64,6 +152,42 @@ class ExamArchiveDatabase(object):
             sql = f.read()
             cur = con.cursor()
             cur.executescript(sql)
+        self.invalidate_lookups()
+
+    def find_duplicate_exams(self):
+        '''
+        Find the exams sharing a course and a date, which violate the unique index exam_course_date of the schema.
+        They may exist in a database created before the index was added to the schema.
+
+        OUTPUT:
+
+        * A list of (course_id, date, number of exams) tuples. If the list is empty, there are no duplicates.
+        '''
+        rows = self._query('SELECT course_id, date, COUNT(*) AS exams FROM exam GROUP BY course_id, date '
+                           'HAVING COUNT(*) > 1 ORDER BY course_id, date')
+        return [(row['course_id'], row['date'], row['exams']) for row in rows]
+
+    def upgrade_schema(self, schema=None):
+        '''
+        Upgrade an existing database to the schema by running the schema file, which creates only the tables, indexes
+        and triggers missing from the database. Can be run any number of times. schema contains the path to the .sql
+        schema file. If it is None, DEFAULT_SCHEMA is used instead. If the summary or list view tables were missing,
+        their contents are calculated from the course and exam tables after they have been created.
+
+        Raises exception ExamDatabaseError listing the duplicate exams returned by find_duplicate_exams, if there are
+        any. The database is not modified then, because the unique index exam_course_date could not be created.
+        '''
+        duplicates = self.find_duplicate_exams()
+        if duplicates:
+            raise ExamDatabaseError("Exams with the same course and date must be removed before upgrading: %s" %
+                                    ", ".join("course %s on %s (%d exams)" % duplicate for duplicate in duplicates))
+
+        tables = set(row['name'] for row in self._query("SELECT name FROM sqlite_master WHERE type = 'table'"))
+        derived = set(table for table, sql_query in SUMMARY_QUERIES + LIST_VIEW_QUERIES)
+        self.create_tables_from_schema(schema)
+        if not derived <= tables:
+            self.rebuild_summaries()
+            self.rebuild_list_views()
 
     def load_table_values_from_dump(self, dump=None):
         '''
@@ -78,6 +202,136 @@ class ExamArchiveDatabase(object):
             sql = f.read()
             cur = con.cursor()
             cur.executescript(sql)
+        self.invalidate_lookups()
+
+    # Connection pool of the database API
+
+    def _connect(self):
+        '''
+        Return a connection to the database. If the database API is pooled, the connection of the current thread is
+        reused, otherwise a new connection is opened. A pooled connection commits only when the outermost with
+        statement using it exits, so the functions of the database API can be called within each other.
+        '''
+        if not self.pooled:
+            return sqlite3.connect(self.db_path)
+
+        key = os.path.abspath(self.db_path)
+        connections = POOL.__dict__.setdefault('connections', {})
+        con = connections.get(key)
+        if con is None or con.closed:
+            con = sqlite3.connect(self.db_path, factory=PooledConnection, cached_statements=CACHED_STATEMENTS,
+                                  check_same_thread=False, isolation_level=None)
+            connections[key] = con
+            with POOL_LOCK:
+                POOL_CONNECTIONS.setdefault(key, []).append(con)
+
+        # Give the connection out as if it was a new one, unless it is used by an outer call
+        if not con.depth:
+            con.row_factory = None
+        return con
+
+    def close_connections(self):
+        '''
+        Close the pooled connections of all threads to the database. Must be called before the database file is
+        removed or replaced, and only when no other thread is using the database.
+        '''
+        with POOL_LOCK:
+            connections = POOL_CONNECTIONS.pop(os.path.abspath(self.db_path), [])
+            TABLE_GENERATIONS.pop(os.path.abspath(self.db_path), None)
+        for con in connections:
+            con.close()
+
+    def table_generations(self):
+        '''
+        Get the generations of the user, archive, course, exam, teacher and language tables. The generation of a table
+        is incremented by triggers whenever its rows change, so an in-process cache built from a table is up to date
+        as long as the generation of the table stays the same, even if other processes write to the database.
+
+        The changes are detected with PRAGMA data_version and the number of changes made by the connection of the
+        current thread, so the generations are read from the database only after someone has written to it. The
+        generations are never decreased, unless the database file is replaced and close_connections called. Within
+        an outer call, e.g. a transaction, the PRAGMA is not run, because the sqlite3 module would commit the
+        transaction before it, and the generations are read from the database including the changes of the
+        transaction.
+
+        OUTPUT:
+
+        * A dictionary of the generations by the table names. The dictionary must not be modified.
+        '''
+        key = os.path.abspath(self.db_path)
+        con = self._connect()
+        outer = getattr(con, 'depth', 0)
+        with con:
+            cur = con.cursor()
+            if not outer:
+                cur.execute('PRAGMA data_version')
+                version = (cur.fetchone()[0], con.total_changes)
+                generations = TABLE_GENERATIONS.get(key)
+                if generations is not None and getattr(con, 'data_version', None) == version:
+                    return generations
+
+            cur.execute('SELECT table_name, generation FROM table_generation')
+            rows = cur.fetchall()
+
+        # The changes of an outer call are not committed yet, so they are not seen by the other connections
+        if outer:
+            return dict(rows)
+        with POOL_LOCK:
+            generations = dict(TABLE_GENERATIONS.get(key, {}))
+            for table, generation in rows:
+                generations[table] = max(generation, generations.get(table, generation))
+            TABLE_GENERATIONS[key] = generations
+        if self.pooled:
+            con.data_version = version
+        return generations
+
+    def statement_stats(self):
+        '''
+        Get statistics of the prepared statements of the pooled connections to the database.
+
+        OUTPUT is a dictionary containing the following keys:
+
+        * `connections`: Number of the open pooled connections.
+        * `hits`: Number of statements executed, which were already prepared in the connection.
+        * `misses`: Number of statements executed, which were prepared for the first time in the connection.
+        * `statements`: Number of statements in the registry of the SQL statements built from table names.
+        '''
+        with POOL_LOCK:
+            connections = list(POOL_CONNECTIONS.get(os.path.abspath(self.db_path), []))
+        return {'connections': len(connections),
+                'hits': sum(con.hits for con in connections),
+                'misses': sum(con.misses for con in connections),
+                'statements': len(STATEMENTS)}
+
+    @contextlib.contextmanager
+    def transaction(self):
+        '''
+        Run the calls of the database API made by the current thread within the with statement in a single
+        transaction, e.g.
+
+            with db.transaction():
+                db.edit_exam(...)
+                db.edit_exam(...)
+
+        The transaction takes the write lock of the database when it begins, and it is committed when the with
+        statement exits, or rolled back if an exception is raised. The calls see the changes made before them in the
+        same transaction, but the other threads and processes do not see them until the transaction is committed.
+        The lookup snapshots are discarded on rollback, in case they were read from the rolled back changes.
+
+        Raises ExamDatabaseError, if the database API is not pooled, because the calls would not share a connection.
+        '''
+        if not self.pooled:
+            raise ExamDatabaseError("Transactions require a pooled database API")
+
+        con = self._connect()
+        if not con.depth:
+            con.immediate = True
+        try:
+            with con:
+                yield
+        except:
+            self.invalidate_lookups()
+            raise
 
     # Helper functions for public database API functions.
 
@@ -106,11 +360,13 @@ class ExamArchiveDatabase(object):
         if value is None:
             return True
 
-        # Sanitize the table name before using it
-        table_name = self._scrub(table_name)
-
-        # SQL Statement for checking that the user does not yet exist
-        sql_query = 'SELECT * from %s WHERE %s_id = ?' % (table_name, table_name)
+        # SQL Statement for checking that the user does not yet exist, built only once for each table
+        sql_query = STATEMENTS.get(('exists', table_name))
+        if sql_query is None:
+            # Sanitize the table name before using it
+            scrubbed = self._scrub(table_name)
+            sql_query = 'SELECT * from %s WHERE %s_id = ?' % (scrubbed, scrubbed)
+            STATEMENTS[('exists', table_name)] = sql_query
         pvalue = (value,)
         db_connection.execute(sql_query, pvalue)
         row = db_connection.fetchone()
@@ -119,6 +375,41 @@ class ExamArchiveDatabase(object):
         else:
             return False
 
+    def _raise_integrity_error(self, db_connection, foreign_keys, exists_message):
+        '''
+        Map the IntegrityError being handled, risen by an INSERT or UPDATE statement, into ExamDatabaseErrorNotFound
+        or ExamDatabaseErrorExists. SQLite does not tell which foreign key failed, so the given foreign keys are
+        checked one by one. This is done only after the statement has failed, keeping the successful writes at one
+        statement. Only a failed UNIQUE constraint is mapped into ExamDatabaseErrorExists; other IntegrityErrors, e.g.
+        a failed NOT NULL constraint, are risen again as they are.
+
+        INPUT:
+
+        * `db_connection`: Cursor of the failed statement.
+        * `foreign_keys`: List of (table_name, value, message) tuples in the order they are checked.
+        * `exists_message`: Message of ExamDatabaseErrorExists risen, if all the foreign keys were valid.
+        '''
+        error = sys.exc_info()
+        message = str(error[1]).lower()
+        # Older SQLite versions report a failed UNIQUE constraint as e.g. "column course_name is not unique"
+        unique = 'unique' in message
+        if unique or 'foreign key' in message:
+            for table_name, value, foreign_key_message in foreign_keys:
+                if not self._valid_foreign_key(db_connection, table_name, value):
+                    raise ExamDatabaseErrorNotFound(foreign_key_message)
+            if unique:
+                raise ExamDatabaseErrorExists(exists_message)
+        raise error[0], error[1], error[2]
+
+    def _raise_if_modified(self, db_connection, table_name, key_value, expected_modified):
+        '''
+        Called when a conditional UPDATE or DELETE statement did not match any rows. If expected_modified was given
+        and the row still exists, the row has been modified after the caller read it and ExamDatabaseErrorModified
+        is risen. Otherwise the row does not exist and the caller returns as before.
+        '''
+        if expected_modified is not None and self._valid_foreign_key(db_connection, table_name, key_value):
+            raise ExamDatabaseErrorModified("%s has been modified by another user" % table_name.capitalize())
+
     # Database API - functions to handle database
 
     def create_archive(self, archive_name, organisation_name, identification_needed=False, modifier_id=None):
@@ -157,7 +448,7 @@ class ExamArchiveDatabase(object):
         last_modified = arrow.now().isoformat(' ')
 
         # Connect to the database and get a connection object
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             # Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -190,7 +481,7 @@ class ExamArchiveDatabase(object):
                       language_id, modifier_id=None):
         '''
         Create an course to the archive. Archive can include multiple courses under same name and other information,
-        but there can't be be two courses with same name and language.
+        but there can't be be two courses with same name and language in the same archive.
 
         INPUT:
         
@@ -208,7 +499,8 @@ class ExamArchiveDatabase(object):
 
         * ID of the new course entity, if the course was created successfully, None otherwise.
 
-        Raises exception ExamDatabaseErrorExists, if course with given course_name and language_id combination already exists.
+        Raises exception ExamDatabaseErrorExists, if course with given course_name and language_id combination already exists
+        in the archive.
         Raises ExamDatabaseErrorNotFound if given archive, teacher, language or modifier were not found in the database.
 
         '''
@@ -216,10 +508,8 @@ class ExamArchiveDatabase(object):
         # SQL Statement for activating foreign keys
         keys_on = 'PRAGMA foreign_keys = ON'
 
-        # SQL Statement for checking that the course does not yet exist
-        sql_course_query = 'SELECT * from course WHERE course_name = ? AND language_id = ?'
-
-        # SQL Statement to create the row in archive table
+        # SQL Statement to create the row in course table. The UNIQUE and FOREIGN KEY constraints of the course table
+        # take care of checking that the course does not yet exist and that the referenced rows do exist.
         sql_insert = 'INSERT INTO course (archive_id, course_code, course_name, description, teacher_id, url, ' \
                      'credit_points, language_id, modifier_id, last_modified) ' \
                      'VALUES (?,?,?,?,?,?,?,?,?,?)'
@@ -228,7 +518,7 @@ class ExamArchiveDatabase(object):
         last_modified = arrow.now().isoformat(' ')
 
         # Connect to the database and get a connection object
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             # Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -236,35 +526,19 @@ class ExamArchiveDatabase(object):
             # Provide support for foreign keys
             cur.execute(keys_on)
 
-            # Check that the given user_id exists in the user table
-            if not self._valid_foreign_key(cur, "user", modifier_id):
-                raise ExamDatabaseErrorNotFound("Modifier does not exist")
-
-            # Check that the given teacher_id exists in the teacher table
-            if not self._valid_foreign_key(cur, "teacher", teacher_id):
-                raise ExamDatabaseErrorNotFound("Teacher does not exist")
-
-            # Check that the given archive_id exists in the archive table
-            if not self._valid_foreign_key(cur, "archive", archive_id):
-                raise ExamDatabaseErrorNotFound("Archive does not exist")
-
-            # Check that the given language_id exists in the language table
-            if not self._valid_foreign_key(cur, "language", language_id):
-                raise ExamDatabaseErrorNotFound("Language does not exist")
-
-            # Execute the statement to find out the archive does not yet exist
-            pvalue = (course_name, language_id)
-            cur.execute(sql_course_query, pvalue)
-            row = cur.fetchone()
-            if row is not None:
-                raise ExamDatabaseErrorExists("Course already exists with the same name and language")
-
-            # Add the row to archive table by executing the statement
+            # Add the row to course table by executing the statement
             pvalue = (
                 archive_id, course_code, course_name, description, teacher_id, url, credit_points, language_id,
                 modifier_id,
                 last_modified)
-            cur.execute(sql_insert, pvalue)
+            try:
+                cur.execute(sql_insert, pvalue)
+            except IntegrityError:
+                self._raise_integrity_error(cur, [("user", modifier_id, "Modifier does not exist"),
+                                                  ("teacher", teacher_id, "Teacher does not exist"),
+                                                  ("archive", archive_id, "Archive does not exist"),
+                                                  ("language", language_id, "Language does not exist")],
+                                            "Course already exists with the same name and language")
             lid = cur.lastrowid
             # Return the last row's ID
             return lid
@@ -303,10 +577,8 @@ class ExamArchiveDatabase(object):
         # SQL Statement for activating foreign keys
         keys_on = 'PRAGMA foreign_keys = ON'
 
-        # SQL Statement for checking that the exam does not yet exist
-        sql_course_query = 'SELECT * from exam WHERE course_id = ? AND date = ?'
-
-        # SQL Statement to create the row in archive table
+        # SQL Statement to create the row in exam table. The UNIQUE and FOREIGN KEY constraints of the exam table take
+        # care of checking that the exam does not yet exist and that the referenced rows do exist.
         sql_insert = 'INSERT INTO exam (course_id, examiner_id, date, file_attachment, language_id, ' \
                      'modifier_id, last_modified)' \
                      'VALUES (?,?,?,?,?,?,?)'
@@ -315,7 +587,7 @@ class ExamArchiveDatabase(object):
         last_modified = arrow.now().isoformat(' ')
 
         # Connect to the database and get a connection object
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             # Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -323,39 +595,24 @@ class ExamArchiveDatabase(object):
             # Provide support for foreign keys
             cur.execute(keys_on)
 
-            # Check that the given course_id exists in the course table
-            if not self._valid_foreign_key(cur, "course", course_id):
-                raise ExamDatabaseErrorNotFound("Course does not exist")
-
-            # Check that the given user_id exists in the user table
-            if not self._valid_foreign_key(cur, "user", modifier_id):
-                raise ExamDatabaseErrorNotFound("Modifier does not exist")
-
-            # Check that the given examiner_id exists in the teacher table
-            if not self._valid_foreign_key(cur, "teacher", examiner_id):
-                raise ExamDatabaseErrorNotFound("Examiner does not exist")
-
-            # Check that the given language_id exists in the language table
-            if not self._valid_foreign_key(cur, "language", language_id):
-                raise ExamDatabaseErrorNotFound("Language does not exist")
-
-            # Execute the statement to find out the archive does not yet exist
-            pvalue = (course_id, date)
-            cur.execute(sql_course_query, pvalue)
-            row = cur.fetchone()
-            if row is not None:
-                raise ExamDatabaseErrorExists("Exam already exists within the same course and date")
-
-            # Add the row to archive table by executing the statement
+            # Add the row to exam table by executing the statement
             pvalue = (course_id, examiner_id, date, file_attachment, language_id, modifier_id, last_modified)
-            cur.execute(sql_insert, pvalue)
+            try:
+                cur.execute(sql_insert, pvalue)
+            except IntegrityError:
+                self._raise_integrity_error(cur, [("course", course_id, "Course does not exist"),
+                                                  ("user", modifier_id, "Modifier does not exist"),
+                                                  ("teacher", examiner_id, "Examiner does not exist"),
+                                                  ("language", language_id, "Language does not exist")],
+                                            "Exam already exists within the same course and date")
             lid = cur.lastrowid
 
             # Return the last row's ID
             return lid
 
 
-    def edit_archive(self, archive_id, archive_name, organisation_name, identification_needed=False, modifier_id=None):
+    def edit_archive(self, archive_id, archive_name, organisation_name, identification_needed=False, modifier_id=None,
+                     expected_modified=None):
         '''
         Update an archive in the database. An archive can be specified by giving archive id.
 
@@ -366,6 +623,8 @@ class ExamArchiveDatabase(object):
         * `organisation_name`: The name of the organisation, such as faculty, department or school, owning the archive.
         * `identification_needed`:  Whether authorization is required from basic users to view archive.
         * `modifier_id`: The creator or last modifier of the archive or None if not specified.
+        * `expected_modified`: The last_modified value of the archive as read by the caller. If given, the archive is
+        updated only if it has not been modified since.
 
         OUTPUT:
 
@@ -374,27 +633,30 @@ class ExamArchiveDatabase(object):
 
         Raises exception ExamDatabaseErrorExists, if the an archive already exists with the given name.
         Raises exception ExamDatabaseErrorNotFound, if given modifier does not exist.
+        Raises exception ExamDatabaseErrorModified, if the archive has been modified after expected_modified.
         '''
 
         # Create the SQL Statements
         # SQL Statement for activating foreign keys
         keys_on = 'PRAGMA foreign_keys = ON'
 
-        # SQL Statement for checking that the archive does exist
-        sql_query1 = "SELECT archive_id FROM archive WHERE archive_id = ?"
-
-        # SQL Statement for checking that another archive does not yet exist with the same name and organisation
-        sql_query2 = 'SELECT * from archive WHERE archive_id <> ? AND archive_name = ? AND organisation_name = ?'
-
+        # SQL Statement for updating the archive. The UNIQUE and FOREIGN KEY constraints of the archive table take
+        # care of checking the archive name and the modifier, so no separate queries are needed.
         sql_update = 'UPDATE archive SET archive_name = ?, organisation_name = ?, identification_needed = ?, ' \
                      'modifier_id = ?, last_modified = ? ' \
                      'WHERE archive_id = ?'
 
         # Get current timestamp and format it into ISO string.
         last_modified = arrow.now().isoformat(' ')
+        pvalue = (archive_name, organisation_name, identification_needed, modifier_id, last_modified, archive_id)
+
+        # Update only the version of the archive the caller has seen
+        if expected_modified is not None:
+            sql_update += ' AND last_modified = ?'
+            pvalue += (expected_modified, )
 
         # Connect to the database and get a connection object
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             # Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -402,45 +664,23 @@ class ExamArchiveDatabase(object):
             # Provide support for foreign keys
             cur.execute(keys_on)
 
-            # Execute a query statement to find out whether the archive exists in the database
-            pvalue = (archive_id, )
-            cur.execute(sql_query1, pvalue)
-            # Only one value expected
-            row = cur.fetchone()
+            # Execute the main update statement
+            try:
+                cur.execute(sql_update, pvalue)
+            except IntegrityError:
+                self._raise_integrity_error(cur, [("user", modifier_id, "Modifier does not exist")],
+                                            "Another archive already exists with the same archive and organisation name")
 
-            # If the archive does not exist, return None
-            if row is None:
+            # Check to see that the database was successfully modified
+            if cur.rowcount < 1:
+                self._raise_if_modified(cur, "archive", archive_id, expected_modified)
                 return None
-            else:
-                # Execute a query statement to check that another archive does not yet exist with the same name and organisation
-                pvalue = (archive_id, archive_name, organisation_name)
-                cur.execute(sql_query2, pvalue)
-                # Only one value expected
-                row = cur.fetchone()
-
-                # If the archive exists, raise an exception
-                if row is not None:
-                    raise ExamDatabaseErrorExists(
-                        "Another archive already exists with the same archive and organisation name")
-                else:
-                    # Check that the given modifier_id exists in the user table
-                    if not self._valid_foreign_key(cur, "user", modifier_id):
-                        raise ExamDatabaseErrorNotFound("Modifier does not exist")
 
-                    # Execute the main update statement
-                    pvalue = (archive_name, organisation_name, identification_needed, modifier_id, last_modified,
-                              archive_id)
-                    cur.execute(sql_update, pvalue)
-
-                    # Check to see that the database was successfully modified
-                    if cur.rowcount < 1:
-                        return None
-                    # Return message id with 'msg-' in the beginning
-                    return archive_id
+            return archive_id
 
 
     def edit_course(self, course_id, course_code, course_name, description, teacher_id, url, credit_points, language_id,
-                    modifier_id=None):
+                    modifier_id=None, expected_modified=None):
         '''
         Update an course in the archive identified by a course ID. Archive can include multiple courses under same name 
         and other information, but there cannot be be two courses with same name and language.
@@ -456,6 +696,8 @@ class ExamArchiveDatabase(object):
         * `credit_points`: Amount of credit points, that can be earned from the course.
         * `language_id`: Language identifier of the language used in the course.
         * `modifier_id`: The creator or last modifier of the course or None if not specified.
+        * `expected_modified`: The last_modified value of the course as read by the caller. If given, the course is
+        updated only if it has not been modified since.
         
         OUTPUT:
 
@@ -464,6 +706,7 @@ class ExamArchiveDatabase(object):
         
         Raises exception ExamDatabaseErrorExists, if course with given course_name and language_id combination already 
         exists. Raises ExamDatabaseErrorNotFound, if given teacher, language or modifier does not exist.
+        Raises exception ExamDatabaseErrorModified, if the course has been modified after expected_modified.
 
         '''
 
@@ -471,23 +714,25 @@ class ExamArchiveDatabase(object):
         # SQL Statement for activating foreign keys
         keys_on = 'PRAGMA foreign_keys = ON'
 
-        # SQL Statement for checking that the course does exist and also for fetching the archive_id
-        sql_query1 = "SELECT archive_id FROM course WHERE course_id = ?"
-
-        # SQL Statement for checking that another course does not yet exist with the same name and language,
-        # within the same archive.
-        sql_query2 = 'SELECT * from course WHERE course_id <> ? AND archive_id = ? AND course_name = ? AND ' \
-                     'language_id = ?'
-
+        # SQL Statement for updating the course. The UNIQUE and FOREIGN KEY constraints of the course table take care
+        # of checking that another course does not exist with the same name and language within the same archive, and
+        # that the referenced rows do exist.
         sql_update = 'UPDATE course SET course_code = ?, course_name = ?, description = ?, ' \
                      'teacher_id = ?, url = ?, credit_points = ?, language_id = ?, modifier_id = ?, ' \
                      'last_modified = ? WHERE course_id = ?'
 
         # Get current timestamp and format it into ISO string.
         last_modified = arrow.now().isoformat(' ')
+        pvalue = (course_code, course_name, description, teacher_id, url, credit_points,
+                  language_id, modifier_id, last_modified, course_id)
+
+        # Update only the version of the course the caller has seen
+        if expected_modified is not None:
+            sql_update += ' AND last_modified = ?'
+            pvalue += (expected_modified, )
 
         # Connect to the database and get a connection object
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             # Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -495,55 +740,27 @@ class ExamArchiveDatabase(object):
             # Provide support for foreign keys
             cur.execute(keys_on)
 
-            # Execute a query statement to find out whether the course exists in the database
-            pvalue = (course_id, )
-            cur.execute(sql_query1, pvalue)
-            # Only one value expected
-            row = cur.fetchone()
-
-            # If the course does not exist, return None
-            if row is None:
+            # Execute the main update statement
+            try:
+                cur.execute(sql_update, pvalue)
+            except IntegrityError:
+                self._raise_integrity_error(cur, [("teacher", teacher_id, "Teacher does not exist"),
+                                                  ("language", language_id, "Language does not exist"),
+                                                  ("user", modifier_id, "Modifier does not exist")],
+                                            "Another course already exists with the same name and language combination")
+
+            # Check to see that the database was successfully modified. If not, the course did not exist or it has
+            # been modified after expected_modified.
+            if cur.rowcount < 1:
+                self._raise_if_modified(cur, "course", course_id, expected_modified)
                 return None
-            else:
-                # Get the course's archive id from the previous query response
-                archive_id = row['archive_id']
-                # Execute a query statement to check that another course does not yet exist with the same name and language
-                pvalue = (course_id, archive_id, course_name, language_id)
-                cur.execute(sql_query2, pvalue)
-                # Only one value expected
-                row = cur.fetchone()
-
-                # If the archive exists, raise an exception
-                if row is not None:
-                    raise ExamDatabaseErrorExists(
-                        "Another course already exists with the same name and language combination")
-                else:
-                    # Check that the given examiner_id exists in the teacher table
-                    if not self._valid_foreign_key(cur, "teacher", teacher_id):
-                        raise ExamDatabaseErrorNotFound("Teacher does not exist")
-
-                    # Check that the given modifier_id exists in the user table
-                    if not self._valid_foreign_key(cur, "language", language_id):
-                        raise ExamDatabaseErrorNotFound("Language does not exist")
-
-                    # Check that the given modifier_id exists in the user table
-                    if not self._valid_foreign_key(cur, "user", modifier_id):
-                        raise ExamDatabaseErrorNotFound("Modifier does not exist")
-
-                    # Execute the main update statement
-                    pvalue = (course_code, course_name, description, teacher_id, url, credit_points,
-                              language_id, modifier_id, last_modified, course_id)
-                    cur.execute(sql_update, pvalue)
-
-                    # Check to see that the database was successfully modified
-                    if cur.rowcount < 1:
-                        return None
 
-                    # Everything succeeded * return the course id
-                    return course_id
+            # Everything succeeded * return the course id
+            return course_id
 
 
-    def edit_exam(self, exam_id, course_id, examiner_id, date, file_attachment, language_id, modifier_id=None):
+    def edit_exam(self, exam_id, course_id, examiner_id, date, file_attachment, language_id, modifier_id=None,
+                  expected_modified=None):
         '''
         Update an exam in the archive.
 
@@ -556,14 +773,17 @@ class ExamArchiveDatabase(object):
         * `file_attachment`: Identifier for the file attachment.
         * `language_id`: Language identifier for the exam.
         * `modifier_id`: The creator or last modifier of the exam or None if not specified.
+        * `expected_modified`: The last_modified value of the exam as read by the caller. If given, the exam is
+        updated only if it has not been modified since.
 
         OUTPUT:
 
         * True, if the exam was created successfully, False otherwise.
 
-        Raises exception ExamDatabaseErrorExists, if the an exam already exists with the given course, date and language.
+        Raises exception ExamDatabaseErrorExists, if the an exam already exists with the given course and date.
         Raises exception ValueError if the date was not given in format YYYY-MM-DD. Raises ExamDatabaseErrorNotFound if
-        course, modifier, language or examiner do not exist.
+        course, modifier, language or examiner do not exist. Raises exception ExamDatabaseErrorModified, if the exam
+        has been modified after expected_modified.
 
         '''
 
@@ -577,21 +797,24 @@ class ExamArchiveDatabase(object):
         # SQL Statement for activating foreign keys
         keys_on = 'PRAGMA foreign_keys = ON'
 
-        # SQL Statement for checking that the exam does exist
-        sql_query1 = "SELECT exam_id FROM exam WHERE exam_id = ?"
-
-        # SQL Statement for checking that another exam does not yet exist with the same course, date and language.
-        sql_query2 = 'SELECT * from exam WHERE exam_id <> ? AND course_id = ? AND date = ? AND language_id = ?'
-
+        # SQL Statement for updating the exam. The UNIQUE and FOREIGN KEY constraints of the exam table take care of
+        # checking that another exam does not exist within the same course and date, and that the referenced rows do
+        # exist.
         sql_update = 'UPDATE exam SET course_id = ?, examiner_id = ?, date = ?, file_attachment = ?, language_id = ?, ' \
                      'modifier_id = ?, last_modified = ? ' \
                      'WHERE exam_id = ?'
 
         # Get current timestamp and format it into ISO string.
         last_modified = arrow.now().isoformat(' ')
+        pvalue = (course_id, examiner_id, date, file_attachment, language_id, modifier_id, last_modified, exam_id)
+
+        # Update only the version of the exam the caller has seen
+        if expected_modified is not None:
+            sql_update += ' AND last_modified = ?'
+            pvalue += (expected_modified, )
 
         # Connect to the database and get a connection object
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             # Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -599,55 +822,24 @@ class ExamArchiveDatabase(object):
             # Provide support for foreign keys
             cur.execute(keys_on)
 
-            # Execute a query statement to find out whether the exam exists in the database
-            pvalue = (exam_id, )
-            cur.execute(sql_query1, pvalue)
-            # Only one value expected
-            row = cur.fetchone()
-
-            # If the course does not exist, return None
-            if row is None:
+            # Execute the main update statement
+            try:
+                cur.execute(sql_update, pvalue)
+            except IntegrityError:
+                self._raise_integrity_error(cur, [("course", course_id, "Course does not exist"),
+                                                  ("teacher", examiner_id, "Examiner does not exist"),
+                                                  ("language", language_id, "Language does not exist"),
+                                                  ("user", modifier_id, "Modifier does not exist")],
+                                            "Another exam already exists within the same course and date")
+
+            # Check to see that the database was successfully modified. If not, the exam did not exist or it has
+            # been modified after expected_modified.
+            if cur.rowcount < 1:
+                self._raise_if_modified(cur, "exam", exam_id, expected_modified)
                 return None
-            else:
-                # Execute a query statement to check that another exam does not yet exist within the same course
-                # and with the same language
-                pvalue = (exam_id, course_id, date, language_id)
-                cur.execute(sql_query2, pvalue)
-                # Only one value expected
-                row = cur.fetchone()
-
-                # If the archive exists, raise an exception
-                if row is not None:
-                    raise ExamDatabaseErrorExists(
-                        "Another exam already exists with the same course, date and language")
-                else:
-                    # Check that the given course_id exists in the course table
-                    if not self._valid_foreign_key(cur, "course", course_id):
-                        raise ExamDatabaseErrorNotFound("Course does not exist")
-
-                    # Check that the given examiner_id exists in the teacher table
-                    if not self._valid_foreign_key(cur, "teacher", examiner_id):
-                        raise ExamDatabaseErrorNotFound("Examiner does not exist")
-
-                    # Check that the given modifier_id exists in the user table
-                    if not self._valid_foreign_key(cur, "language", language_id):
-                        raise ExamDatabaseErrorNotFound("Language does not exist")
-
-                    # Check that the given modifier_id exists in the user table
-                    if not self._valid_foreign_key(cur, "user", modifier_id):
-                        raise ExamDatabaseErrorNotFound("Modifier does not exist")
 
-                    # Execute the main update statement
-                    pvalue = (course_id, examiner_id, date, file_attachment, language_id, modifier_id,
-                              last_modified, exam_id)
-                    cur.execute(sql_update, pvalue)
-
-                    # Check to see that the database was successfully modified
-                    if cur.rowcount < 1:
-                        return None
-
-                    # Everything succeeded - return the exam id
-                    return exam_id
+            # Everything succeeded - return the exam id
+            return exam_id
 
 
     def edit_exam_file(self, exam_id, file_attachment, modifier_id=None):
@@ -683,7 +875,7 @@ class ExamArchiveDatabase(object):
         last_modified = arrow.now().isoformat(' ')
 
         # Connect to the database and get a connection object
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             # Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -719,7 +911,93 @@ class ExamArchiveDatabase(object):
 
     # Browsing functions of database API
 
-    def _browse(self, table, parent_id=None, limit=-1, offset=0, offset_represents_ids=False):
+    def _select_list(self, table, columns=None, required=()):
+        '''
+        Return the select list of a query reading only the given columns of a table or list view, or '*' if columns is
+        None. The required columns, e.g. the primary key and the sort column, are always read. The select list is
+        built and the columns are checked against the table only once for each combination. The columns of the table
+        are read from the result of an empty SELECT instead of PRAGMA table_info, so that the check does not commit
+        the transaction of an outer call.
+
+        Raises exception ValueError if the table does not have one of the columns.
+        '''
+        if columns is None:
+            return '*'
+
+        columns = tuple(sorted(set(columns) | set(column for column in required if column)))
+        statement_key = ('select', table, columns)
+        select_list = STATEMENTS.get(statement_key)
+        if select_list is None:
+            table_columns = TABLE_COLUMNS.get(table)
+            if table_columns is None:
+                con = self._connect()
+                with con:
+                    cur = con.cursor()
+                    cur.execute('SELECT * FROM %s LIMIT 0' % table)
+                    table_columns = TABLE_COLUMNS[table] = frozenset(column[0] for column in cur.description)
+            unknown = sorted(set(columns) - table_columns)
+            if unknown:
+                raise ValueError("Table %s does not have columns %s" % (table, ', '.join(unknown)))
+            select_list = ', '.join(columns)
+            STATEMENTS[statement_key] = select_list
+        return select_list
+
+    def _sort_clauses(self, table, table_id, sort=None, descending=False, after=None):
+        '''
+        Build the ORDER BY clause of a browse query and the conditions of its keyset pagination. The rows are ordered
+        by the sort column and the primary key, so the order is total and a page continues right after the last row of
+        the previous page, however many rows were before it.
+
+        The rows after the key are returned as one or two ranges, which are read in order until the page is full. NULL
+        values are sorted before all the other values, so in descending order the rows with a value come first and the
+        rows without a value after them. Each range is an index range of the sort column, which a row value
+        comparison ORed with IS NULL would not be.
+
+        INPUT:
+
+        * `table`: The table or list view, a key of SORT_KEYS.
+        * `table_id`: The primary key column of the table.
+        * `sort`: The column to sort by, one of SORT_KEYS[table], or None to sort by the primary key.
+        * `descending`: If true, the rows are sorted in descending order.
+        * `after`: The key of the last row of the previous page, or None for the first page. If sort is None, the key
+        is the primary key of the row, otherwise a tuple of the value of the sort column and the primary key.
+
+        OUTPUT:
+
+        * A tuple (ranges, order), where ranges is a list of tuples (condition, pvalue) of the SQL conditions
+        selecting the rows after the key, or None for all the rows, and their parameters, and order is the ORDER BY
+        clause.
+
+        Raises exception ValueError if the table can not be sorted by the column.
+        '''
+        if sort is not None and sort not in SORT_KEYS.get(table, ()):
+            raise ValueError("Table %s can not be sorted by %s" % (table, sort))
+
+        direction = ' DESC' if descending else ''
+        comparison = '<' if descending else '>'
+        if sort is None:
+            order = ' ORDER BY %s%s' % (table_id, direction)
+            if after is None:
+                return [(None, ())], order
+            return [('%s %s ?' % (table_id, comparison), (after,))], order
+
+        order = ' ORDER BY %s%s, %s%s' % (sort, direction, table_id, direction)
+        if after is None:
+            return [(None, ())], order
+
+        value, row_id = after
+        if value is None:
+            ranges = [('%s IS NULL AND %s %s ?' % (sort, table_id, comparison), (row_id,))]
+            if not descending:
+                ranges.append(('%s IS NOT NULL' % sort, ()))
+        else:
+            ranges = [('(%s, %s) %s (?, ?)' % (sort, table_id, comparison), (value, row_id))]
+            if descending:
+                ranges.append(('%s IS NULL' % sort, ()))
+        return ranges, order
+
+    def _browse(self, table, parent_id=None, limit=-1, offset=0, offset_represents_ids=False, sort=None,
+                descending=False, after=None, columns=None):
         '''
         List all rows in a table, or only the first rows specified by the parameter limit starting from offset.
 
@@ -732,7 +1010,12 @@ class ExamArchiveDatabase(object):
         * `offset`: skip the amount of offset rows from the beginning, offset being the first returned row
         (zero means to start from the beginning)
         * `offset_represents_ids`: if false, the amount of rows specified by the `offset` parameter are skipped (e.g. for paging). If true, only the XXX are returned having XXX_id greater or equal than `offset`.  the table id (the primary key of the table)
-        * `parent_id`: if
+        * `sort`: the column to sort the rows by, one of SORT_KEYS[table], or None to sort by the primary key
+        * `descending`: if true, the rows are sorted in descending order
+        * `after`: the key of the last row of the previous page as described in _sort_clauses, or None. Unlike
+        offset, the rows before the key are not read at all, so it can not be used together with offset.
+        * `columns`: the columns to read, or None to read all the columns. The primary key and the sort column are
+        always read.
 
         OUTPUT:
 
@@ -740,59 +1023,32 @@ class ExamArchiveDatabase(object):
         dictionary containing the same structure as returned by _create_object.
 
         Raises exception ExamDatabaseError if there was an error accessing the database. Raises exception ValueError
-        if table is not archive, course or exam.
+        if table is not archive, course or exam, if the table can not be sorted by the column sort, if the table does
+        not have one of the columns, or if both offset and after are given.
         '''
 
-        # Sanitize the table name and based on it, formulate the primary key attribute
-        table = self._scrub(table)
-        table_id = "%s_id" % table
-        pvalue = ()
+        if after is not None and offset > 0:
+            raise ValueError("Parameters offset and after can not be used together")
 
-        if table not in ('archive', 'course', 'exam', 'user', 'teacher'):
-            raise ValueError("Given table is not archive, course, exam, user nor teacher")
+        parent_pvalue = ()
 
-        # Create the SQL Statement
-        keys_on = 'PRAGMA foreign_keys = ON'
-        sql_query = 'SELECT * FROM %s' % table
-        sql_limit = ''
-        sql_where = []
-
-        # If parent_id is speficied, limit the id accordingly:
-        # - if table == 'course', add where clause 'WHERE archive_id = <parent_id>'
-        # - if table == 'exam', add where clause 'WHERE course_id = <parent_id>'
-        if table in ['course', 'exam'] and parent_id is not None:
-            if table == 'course':
-                sql_where.append('archive_id = ?')
-                pvalue = (parent_id,)
-            else:
-                # table is 'exam'
-                sql_where.append('course_id = ?')
-                pvalue = (parent_id,)
+        # If parent_id is speficied, limit the id accordingly
+        by_parent = table in ('course', 'exam') and parent_id is not None
+        if by_parent:
+            parent_pvalue = (parent_id,)
 
-        # If limit or offset were defined and add WHERE or LIMIT clauses to the query
+        # If limit or offset were defined, add the paging parameters
+        paging = None
         if limit > -1 or offset > 0:
-            if offset_represents_ids:
-                sql_where.append('%s >= ?' % table_id)
-                sql_limit = ' LIMIT ?'
-                pvalue = pvalue + (offset, limit)
-            else:
-                # In SQLite, 'LIMIT -1 OFFSET 0' is allowed so we do not need to check
-                # whether limit or offset or both of them were defined
-                sql_limit = ' LIMIT ? OFFSET ?'
-                pvalue = pvalue + (limit, offset)
-
-        # According to PEP 8, empty strings are false
-        if sql_where:
-            sql_query += ' WHERE ' + ' AND '.join(sql_where)
+            paging = 'ids' if offset_represents_ids else 'offset'
 
-        # For the time being, sort by primary key (more complex functionality implemented later)
-        sql_query += ' ORDER BY %s' % table_id
-
-        if sql_limit:
-            sql_query += sql_limit
+        # Continue after the last row of the previous page in the sort order
+        ranges, order = self._sort_clauses(table, "%s_id" % table, sort, descending, after)
+        select_list = self._select_list(table, columns, ("%s_id" % table, sort))
 
         # Connect to the database
-        con = sqlite3.connect(self.db_path)
+        keys_on = 'PRAGMA foreign_keys = ON'
+        con = self._connect()
         with con:
             #Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -801,20 +1057,73 @@ class ExamArchiveDatabase(object):
             #Provide support for foreign keys
             cur.execute(keys_on)
 
-            #Execute main SQL Statement
-            cur.execute(sql_query, pvalue)
-
-            #Get results
-            rows = cur.fetchall()
-
-            # Build a list of objects containing the table rows
+            # Build a list of objects containing the table rows, reading the ranges until the page is full
             list = []
-            for row in rows:
-                obj = self._create_object(row)
-                list.append(obj)
+            for keyset, keyset_pvalue in ranges:
+                remaining = limit - len(list) if limit > -1 else -1
+                if remaining == 0:
+                    break
+
+                if paging == 'ids':
+                    pvalue = parent_pvalue + (offset,) + keyset_pvalue + (remaining,)
+                elif paging == 'offset':
+                    pvalue = parent_pvalue + keyset_pvalue + (remaining, offset)
+                else:
+                    pvalue = parent_pvalue + keyset_pvalue
+
+                # Create the SQL Statement, built only once for each combination of table, columns, parent, paging
+                # and order
+                statement_key = ('browse', table, select_list, by_parent, paging, keyset, order)
+                sql_query = STATEMENTS.get(statement_key)
+                if sql_query is None:
+                    # Sanitize the table name and based on it, formulate the primary key attribute
+                    table = self._scrub(table)
+                    table_id = "%s_id" % table
+
+                    if table not in ('archive', 'course', 'exam', 'user', 'teacher'):
+                        raise ValueError("Given table is not archive, course, exam, user nor teacher")
+
+                    sql_query = 'SELECT %s FROM %s' % (select_list, table)
+                    sql_limit = ''
+                    sql_where = []
+
+                    # - if table == 'course', add where clause 'WHERE archive_id = <parent_id>'
+                    # - if table == 'exam', add where clause 'WHERE course_id = <parent_id>'
+                    if by_parent:
+                        if table == 'course':
+                            sql_where.append('archive_id = ?')
+                        else:
+                            # table is 'exam'
+                            sql_where.append('course_id = ?')
+
+                    if paging == 'ids':
+                        sql_where.append('%s >= ?' % table_id)
+                        sql_limit = ' LIMIT ?'
+                    elif paging == 'offset':
+                        # In SQLite, 'LIMIT -1 OFFSET 0' is allowed so we do not need to check
+                        # whether limit or offset or both of them were defined
+                        sql_limit = ' LIMIT ? OFFSET ?'
+
+                    if keyset:
+                        sql_where.append(keyset)
+
+                    # According to PEP 8, empty strings are false
+                    if sql_where:
+                        sql_query += ' WHERE ' + ' AND '.join(sql_where)
+
+                    sql_query += order + sql_limit
+                    STATEMENTS[statement_key] = sql_query
+
+                #Execute main SQL Statement
+                cur.execute(sql_query, pvalue)
+
+                #Get results
+                for row in cur.fetchall():
+                    list.append(self._create_object(row))
             return list
 
-    def browse_archives(self, limit=-1, offset=0, offset_represents_ids=False):
+    def browse_archives(self, limit=-1, offset=0, offset_represents_ids=False, sort=None, descending=False,
+                        after=None, columns=None):
         '''
         List all the archives in the database, or only the first archives specified by the parameters limit and offset.
 
@@ -825,6 +1134,10 @@ class ExamArchiveDatabase(object):
         (zero means to start from the beginning)
         * `offset_represents_ids`: if false, the amount of rows specified by the `offset` parameter are skipped
         (e.g. for paging). If true, only the archives are returned having archive_id greater or equal than `offset`.
+        * `sort`: the column to sort the archives by, one of SORT_KEYS['archive'], or None to sort by archive_id
+        * `descending`: if true, the archives are sorted in descending order
+        * `after`: the key of the last archive of the previous page as described in _sort_clauses, or None
+        * `columns`: the columns of the archives to read, or None to read all the columns
 
         OUTPUT:
 
@@ -832,9 +1145,11 @@ class ExamArchiveDatabase(object):
         dictionary containing the same structure as returned by get_archive.
 
         '''
-        return self._browse("archive", None, limit, offset, offset_represents_ids)
+        return self._browse("archive", None, limit, offset, offset_represents_ids, sort, descending, after,
+                            columns)
 
-    def browse_courses(self, archive_id, limit=-1, offset=0, offset_represents_ids=False):
+    def browse_courses(self, archive_id, limit=-1, offset=0, offset_represents_ids=False, sort=None, descending=False,
+                       after=None, columns=None):
         '''
         List all the course in an archive, or only the first courses specified by the parameters limit and offset.
 
@@ -846,15 +1161,21 @@ class ExamArchiveDatabase(object):
         (zero means to start from the beginning)
         * `offset_represents_ids`: if false, the amount of rows specified by the `offset` parameter are skipped
         (e.g. for paging). If true, only the courses are returned having course_id greater or equal than `offset`.
+        * `sort`: the column to sort the courses by, one of SORT_KEYS['course'], or None to sort by course_id
+        * `descending`: if true, the courses are sorted in descending order
+        * `after`: the key of the last course of the previous page as described in _sort_clauses, or None
+        * `columns`: the columns of the courses to read, or None to read all the columns
 
         OUTPUT:
 
         * A list of courses, if one or more archives were found, empty list otherwise. Each course in the list is a
         dictionary containing the same structure as returned by get_course.
         '''
-        return self._browse("course", archive_id, limit, offset, offset_represents_ids)
+        return self._browse("course", archive_id, limit, offset, offset_represents_ids, sort, descending, after,
+                            columns)
 
-    def browse_exams(self, course_id, limit=-1, offset=0, offset_represents_ids=False):
+    def browse_exams(self, course_id, limit=-1, offset=0, offset_represents_ids=False, sort=None, descending=False,
+                     after=None, columns=None):
         '''
         List all the exams of a course, or only the first exams specified by the parameters limit and offset.
 
@@ -866,6 +1187,10 @@ class ExamArchiveDatabase(object):
         (zero means to start from the beginning)
         * `offset_represents_ids`: if false, the amount of rows specified by the `offset` parameter are skipped
         (e.g. for paging). If true, only the exams are returned having exam_id greater or equal than `offset`.
+        * `sort`: the column to sort the exams by, one of SORT_KEYS['exam'], or None to sort by exam_id
+        * `descending`: if true, the exams are sorted in descending order
+        * `after`: the key of the last exam of the previous page as described in _sort_clauses, or None
+        * `columns`: the columns of the exams to read, or None to read all the columns
 
         OUTPUT:
 
@@ -873,7 +1198,43 @@ class ExamArchiveDatabase(object):
         dictionary containing the same structure as returned by get_exam.
 
         '''
-        return self._browse("exam", course_id, limit, offset, offset_represents_ids)
+        return self._browse("exam", course_id, limit, offset, offset_represents_ids, sort, descending, after,
+                            columns)
+
+    def browse_archive_exams(self, archive_id):
+        '''
+        List all the exams of all the courses in an archive with a single query.
+
+        INPUT:
+
+        * `archive_id`: the ID of the archive
+
+        OUTPUT:
+
+        * A list of exams ordered by course_id and exam_id, if one or more exams were found, empty list otherwise.
+        Each exam in the list is a dictionary containing the same structure as returned by get_exam.
+
+        '''
+        # Create the SQL Statement
+        keys_on = 'PRAGMA foreign_keys = ON'
+        sql_query = 'SELECT exam.* FROM exam JOIN course ON exam.course_id = course.course_id ' \
+                    'WHERE course.archive_id = ? ORDER BY exam.course_id, exam.exam_id'
+
+        # Connect to the database
+        con = self._connect()
+        with con:
+            # Cursor and row initialization
+            con.row_factory = sqlite3.Row
+            cur = con.cursor()
+            # Provide support for foreign keys
+            cur.execute(keys_on)
+
+            # Execute main SQL Statement
+            pvalue = (archive_id,)
+            cur.execute(sql_query, pvalue)
+
+            # Build a list of objects containing the table rows
+            return [self._create_object(row) for row in cur.fetchall()]
 
     # Get functions of database API
 
@@ -894,20 +1255,23 @@ class ExamArchiveDatabase(object):
         if table is not archive, course or exam.
         '''
 
-        # Sanitize the table name and based on it, formulate the primary key attribute
-        table = self._scrub(table)
-        table_id = "%s_id" % table
+        # Create the SQL Statement, built only once for each table
+        keys_on = 'PRAGMA foreign_keys = ON'
+        sql_query = STATEMENTS.get(('get', table))
+        if sql_query is None:
+            # Sanitize the table name and based on it, formulate the primary key attribute
+            scrubbed = self._scrub(table)
+            table_id = "%s_id" % scrubbed
 
-        if table not in ('archive', 'course', 'exam', 'user', 'teacher'):
-            raise ValueError("Given table is not archive, course, exam, user nor teacher")
+            if scrubbed not in ('archive', 'course', 'exam', 'user', 'teacher'):
+                raise ValueError("Given table is not archive, course, exam, user nor teacher")
 
-        # Create the SQL Statement
-        keys_on = 'PRAGMA foreign_keys = ON'
-        sql_query = 'SELECT * FROM %s WHERE %s = ?' % (table, table_id)
+            sql_query = 'SELECT * FROM %s WHERE %s = ?' % (scrubbed, table_id)
+            STATEMENTS[('get', table)] = sql_query
         pvalue = (key_value,)
 
         # Connect to the database
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             #Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -978,7 +1342,7 @@ class ExamArchiveDatabase(object):
         sql_query = 'SELECT * from archive WHERE archive_name = ?'
 
         # Connect to the database and get a connection object
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             # Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -1053,7 +1417,7 @@ class ExamArchiveDatabase(object):
         sql_query = 'SELECT * from course WHERE course_name = ?'
 
         # Connect to the database and get a connection object
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             # Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -1097,24 +1461,33 @@ class ExamArchiveDatabase(object):
 
     # Remove functions of the database API
 
-    def remove_archive(self, archive_id):
+    def remove_archive(self, archive_id, expected_modified=None):
         '''
         Remove an archive from the database. An archive can be specified by giving archive id. Note: Removing an archive deletes all the courses and all the exams attached to it!
 
         INPUT:
 
         * `archive_id`: ID of the archive to be removed
+        * `expected_modified`: The last_modified value of the archive as read by the caller. If given, the archive is
+        removed only if it has not been modified since.
 
         OUTPUT:
 
         * If the archive was successfully deleted True is returned, otherwise False.
 
+        Raises exception ExamDatabaseErrorModified, if the archive has been modified after expected_modified.
         '''
         keys_on = 'PRAGMA foreign_keys = ON'
         delete_query = 'DELETE FROM archive WHERE archive_id = ?'
 
+        # Remove only the version of the archive the caller has seen
+        pvalue = (archive_id,)
+        if expected_modified is not None:
+            delete_query += ' AND last_modified = ?'
+            pvalue += (expected_modified, )
+
         # Connect to the database
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             # Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -1122,32 +1495,45 @@ class ExamArchiveDatabase(object):
             #Provide support for foreign keys
             cur.execute(keys_on)
             #Execute the statement to delete
-            pvalue = (archive_id,)
             cur.execute(delete_query, pvalue)
             #Check that it has been deleted
             if cur.rowcount < 1:
+                self._raise_if_modified(cur, "archive", archive_id, expected_modified)
                 return False
+
+            # The archive of the users of the archive is set to NULL, which revokes their access tokens
+            self.invalidate_token_generations()
             return True
 
 
-    def remove_course(self, course_id):
+    def remove_course(self, course_id, expected_modified=None):
         '''
         Remove a course from the database. A course is specified by giving course id. Note: Removing a course deletes all the exams attached to it!
 
         INPUT:
 
         * `course_id`: ID of the course
+        * `expected_modified`: The last_modified value of the course as read by the caller. If given, the course is
+        removed only if it has not been modified since.
 
         OUTPUT:
 
         * If the course successfully deleted True is returned, otherwise False.
+
+        Raises exception ExamDatabaseErrorModified, if the course has been modified after expected_modified.
         '''
 
         keys_on = 'PRAGMA foreign_keys = ON'
         delete_query = 'DELETE FROM course WHERE course_id = ?'
 
+        # Remove only the version of the course the caller has seen
+        pvalue = (course_id,)
+        if expected_modified is not None:
+            delete_query += ' AND last_modified = ?'
+            pvalue += (expected_modified, )
+
         # Connect to the database
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             # Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -1155,31 +1541,41 @@ class ExamArchiveDatabase(object):
             #Provide support for foreign keys
             cur.execute(keys_on)
             #Execute the statement to delete
-            pvalue = (course_id,)
             cur.execute(delete_query, pvalue)
             #Check that it has been deleted
             if cur.rowcount < 1:
+                self._raise_if_modified(cur, "course", course_id, expected_modified)
                 return False
             return True
 
 
-    def remove_exam(self, exam_id):
+    def remove_exam(self, exam_id, expected_modified=None):
         '''
         Remove exam details from the database. An exam is specified by giving exam id. File attachments do not get deleted automatically as they are not part of the database.
 
         INPUT:
 
         * `exam_id`: ID of the exam
+        * `expected_modified`: The last_modified value of the exam as read by the caller. If given, the exam is
+        removed only if it has not been modified since.
 
         OUTPUT:
 
         * If the exam successfully deleted True is returned, otherwise False.
+
+        Raises exception ExamDatabaseErrorModified, if the exam has been modified after expected_modified.
         '''
         keys_on = 'PRAGMA foreign_keys = ON'
         delete_query = 'DELETE FROM exam WHERE exam_id = ?'
 
+        # Remove only the version of the exam the caller has seen
+        pvalue = (exam_id,)
+        if expected_modified is not None:
+            delete_query += ' AND last_modified = ?'
+            pvalue += (expected_modified, )
+
         # Connect to the database
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             # Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -1187,10 +1583,10 @@ class ExamArchiveDatabase(object):
             #Provide support for foreign keys
             cur.execute(keys_on)
             #Execute the statement to delete
-            pvalue = (exam_id,)
             cur.execute(delete_query, pvalue)
             #Check that it has been deleted
             if cur.rowcount < 1:
+                self._raise_if_modified(cur, "exam", exam_id, expected_modified)
                 return False
             return True
 
@@ -1241,7 +1637,7 @@ class ExamArchiveDatabase(object):
         last_modified = arrow.now().isoformat(' ')
 
         # Connect to the database and get a connection object
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             # Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -1258,6 +1654,7 @@ class ExamArchiveDatabase(object):
                       email, other_info, modifier_id, last_modified)
             cur.execute(sql_insert, pvalue)
             lid = cur.lastrowid
+            self.invalidate_lookups()
 
             # Return the last row's ID
             return lid
@@ -1313,7 +1710,7 @@ class ExamArchiveDatabase(object):
         last_modified = arrow.now().isoformat(' ')
 
         # Connect to the database and get a connection object
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             # Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -1343,11 +1740,13 @@ class ExamArchiveDatabase(object):
                 # Check to see that the database was successfully modified, otherwise return None
                 if cur.rowcount < 1:
                     return None
+                self.invalidate_lookups()
 
                 # Return taecher id of the updated message
                 return teacher_id
 
-    def browse_teachers(self, limit=-1, offset=0, offset_represents_ids=False):
+    def browse_teachers(self, limit=-1, offset=0, offset_represents_ids=False, sort=None, descending=False,
+                        after=None, columns=None):
         '''
         List all the teachers in the database, or only the first teachers specified by the parameters limit and offset.
 
@@ -1359,6 +1758,10 @@ class ExamArchiveDatabase(object):
         (zero means to start from the beginning)
         * `offset_represents_ids`: if false, the amount of rows specified by the `offset` parameter are skipped
         (e.g. for paging). If true, only the teachers are returned having teacher_id greater or equal than `offset`.
+        * `sort`: the column to sort the teachers by, one of SORT_KEYS['teacher'], or None to sort by teacher_id
+        * `descending`: if true, the teachers are sorted in descending order
+        * `after`: the key of the last teacher of the previous page as described in _sort_clauses, or None
+        * `columns`: the columns of the teachers to read, or None to read all the columns
 
         OUTPUT:
 
@@ -1366,7 +1769,8 @@ class ExamArchiveDatabase(object):
         dictionary containing the same structure as returned by _create_object.
 
         '''
-        return self._browse("teacher", None, limit, offset, offset_represents_ids)
+        return self._browse("teacher", None, limit, offset, offset_represents_ids, sort, descending, after,
+                            columns)
 
     def get_teacher(self, teacher_id):
         '''
@@ -1428,7 +1832,7 @@ class ExamArchiveDatabase(object):
         sql_query = 'SELECT * from teacher WHERE first_name = ? AND last_name = ?'
 
         # Connect to the database and get a connection object
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             # Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -1466,7 +1870,7 @@ class ExamArchiveDatabase(object):
         delete_query = 'DELETE FROM teacher WHERE teacher_id = ?'
 
         # Connect to the database
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             # Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -1481,8 +1885,91 @@ class ExamArchiveDatabase(object):
             #Check that it has been deleted
             if cur.rowcount < 1:
                 return False
+            self.invalidate_lookups()
             return True
 
+    # Language related functions of database API
+
+    def browse_languages(self):
+        '''
+        List all the languages in the database ordered by the language ID.
+
+        OUTPUT:
+
+        * A list of languages, each language being a dictionary containing the keys `language_id` and
+        `language_name`.
+        '''
+        return self._query('SELECT * FROM language ORDER BY language_id')
+
+    # Lookup snapshot of teachers and languages
+
+    def get_lookups(self):
+        '''
+        Get a snapshot of all the teachers and languages. The snapshot is read from the database only on the first
+        call and after the teachers have been created, edited or removed, so that the names of teachers can be
+        resolved without querying the database.
+
+        OUTPUT:
+
+        * A LookupSnapshot object. The snapshot is never modified; it is replaced by a new one when the teachers
+        change.
+        '''
+        key = os.path.abspath(self.db_path)
+        generations = self.table_generations()
+        version = (generations.get('teacher'), generations.get('language'))
+        entry = LOOKUPS.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        with LOOKUPS_LOCK:
+            entry = LOOKUPS.get(key)
+            if entry is None or entry[0] != version:
+                entry = LOOKUPS[key] = (version, LookupSnapshot(self.browse_teachers(), self.browse_languages()))
+            return entry[1]
+
+    def invalidate_lookups(self):
+        '''
+        Discard the snapshot returned by get_lookups, so that it is read again from the database on the next call.
+        Called by the functions modifying teachers, and needed otherwise only if the teacher or language tables are
+        modified outside of the database API. The snapshot returned by get_token_generations is discarded as well.
+        '''
+        with LOOKUPS_LOCK:
+            LOOKUPS.pop(os.path.abspath(self.db_path), None)
+            TOKEN_GENERATIONS.pop(os.path.abspath(self.db_path), None)
+
+    def get_token_generations(self):
+        '''
+        Get a snapshot of the access token generations of all the users, so that access tokens can be verified
+        without querying the database. The generation of a user is incremented by a trigger whenever the username,
+        password, user type or archive of the user changes. The snapshot is read from the database only on the first
+        call and after users have been created, edited or removed.
+
+        OUTPUT:
+
+        * A dictionary of the generations by the user IDs. Removed users are not in the dictionary. The dictionary
+        must not be modified.
+        '''
+        key = os.path.abspath(self.db_path)
+        version = self.table_generations().get('user')
+        entry = TOKEN_GENERATIONS.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        with LOOKUPS_LOCK:
+            entry = TOKEN_GENERATIONS.get(key)
+            if entry is None or entry[0] != version:
+                rows = self._query('SELECT u.user_id, COALESCE(t.generation, 0) AS generation FROM user u '
+                                   'LEFT JOIN user_token_generation t ON t.user_id = u.user_id')
+                entry = TOKEN_GENERATIONS[key] = (version, dict((row['user_id'], row['generation']) for row in rows))
+            return entry[1]
+
+    def invalidate_token_generations(self):
+        '''
+        Discard the snapshot returned by get_token_generations, so that it is read again from the database on the next
+        call. Called by the functions modifying users and archives.
+        '''
+        with LOOKUPS_LOCK:
+            TOKEN_GENERATIONS.pop(os.path.abspath(self.db_path), None)
 
     # User handling functions of database API
     def create_user(self, username, password, user_type='basic', archive_id=None, modifier_id=None):
@@ -1528,7 +2015,7 @@ class ExamArchiveDatabase(object):
         last_modified = arrow.now().isoformat(' ')
 
         # Connect to the database and get a connection object
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             # Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -1555,10 +2042,12 @@ class ExamArchiveDatabase(object):
             pvalue = (username, password, user_type, archive_id, modifier_id, last_modified)
             cur.execute(sql_insert, pvalue)
             lid = cur.lastrowid
+            self.invalidate_token_generations()
             # Return the last row's ID
             return lid
 
-    def edit_user(self, user_id, username, password, user_type='basic', archive_id=None, modifier_id=None):
+    def edit_user(self, user_id, username, password, user_type='basic', archive_id=None, modifier_id=None,
+                  expected_modified=None):
         '''
         Update user details. The user is identified by the given user ID.
 
@@ -1570,39 +2059,44 @@ class ExamArchiveDatabase(object):
         * `user_type`: User type identifies whether the user in superuser, admin or regular view-only user. The user_type must be one of the values 'super', 'admin' or 'basic'.
         * `archive_id`: The ID of an archive where the user has access to.
         * `modifier_id`: The creator or of the user or None if not specified.
+        * `expected_modified`: The last_modified value of the user as read by the caller. If given, the user is
+        updated only if it has not been modified since.
 
         OUTPUT:
 
         * True, if the user details were modified successfully or False, if not.
 
         Raises exception ExamDatabaseErrorExists, if user with the same username already exists. Raises exception ExamDatabaseError if there was an error creating new user.
-        ExamDatabaseErrorNotFound if modifier does not exist.
+        ExamDatabaseErrorNotFound if modifier or archive does not exist.
         Raises exception ValueError if the user_type was not one of the defined values.
+        Raises exception ExamDatabaseErrorModified, if the user has been modified after expected_modified.
         '''
 
         # Create the SQL Statements
         # SQL Statement for activating foreign keys
         keys_on = 'PRAGMA foreign_keys = ON'
 
-        # SQL Statement for checking that the user does exist
-        sql_query1 = "SELECT user_id FROM user WHERE user_id = ?"
-
-        # SQL Statement for checking that another user does not yet exist with the same username
-        sql_query2 = 'SELECT * from user WHERE user_id <> ? AND username = ?'
-
         # Validation of user type
         if user_type not in ['basic','admin','super']:
             raise ValueError("User type is not basic, admin or super")
 
+        # SQL Statement for updating the user. The UNIQUE and FOREIGN KEY constraints of the user table take care of
+        # checking the username, archive and modifier, so no separate queries are needed.
         sql_update = 'UPDATE user SET user_type = ?, username = ?, password = ?, ' \
                      'modifier_id = ?, last_modified = ?, archive_id = ? ' \
                      'WHERE user_id = ?'
 
         # Get current timestamp and format it into ISO string.
         last_modified = arrow.now().isoformat(' ')
+        pvalue = (user_type, username, password, modifier_id, last_modified, archive_id, user_id)
+
+        # Update only the version of the user the caller has seen
+        if expected_modified is not None:
+            sql_update += ' AND last_modified = ?'
+            pvalue += (expected_modified, )
 
         # Connect to the database and get a connection object
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             # Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -1610,36 +2104,27 @@ class ExamArchiveDatabase(object):
             # Provide support for foreign keys
             cur.execute(keys_on)
 
-            # Execute a query statement to find out whether the user exists in the database
-            pvalue = (user_id, )
-            cur.execute(sql_query1, pvalue)
-            # Only one value expected
-            row = cur.fetchone()
-
-            # If the user does not exist, return None
-            if row is None:
+            try:
+                # Execute the main update statement
+                cur.execute(sql_update, pvalue)
+            except IntegrityError:
+                # Expect IntegrityError risen when new username already exists in the database or when a foreign key
+                # is not valid
+                self._raise_integrity_error(cur, [("user", modifier_id, "Modifier does not exist"),
+                                                  ("archive", archive_id, "Archive does not exist")],
+                                            "The given username already exists")
+
+            # Check to see that the database was successfully modified
+            if cur.rowcount < 1:
+                self._raise_if_modified(cur, "user", user_id, expected_modified)
                 return None
 
-            else:
-                # Check that the given modifier_id exists in the user table
-                if not self._valid_foreign_key(cur, "user", modifier_id):
-                    raise ExamDatabaseErrorNotFound("Modifier does not exist")
-
-                try:
-                    # Execute the main update statement
-                    pvalue = (user_type, username, password, modifier_id, last_modified, archive_id, user_id)
-                    cur.execute(sql_update, pvalue)
-                except IntegrityError:
-                    # Expect IntegrityError risen when new username already exists in the database
-                    raise ExamDatabaseErrorExists("The given username already exists")
-
-                # Check to see that the database was successfully modified
-                if cur.rowcount < 1:
-                    return None
-
-                return user_id
+            # The access tokens of the user are revoked
+            self.invalidate_token_generations()
+            return user_id
 
-    def browse_users(self, limit=-1, offset=0, offset_represents_ids=False):
+    def browse_users(self, limit=-1, offset=0, offset_represents_ids=False, sort=None, descending=False,
+                     after=None, columns=None):
         '''
         List all the users in the database, or only the first users specified by the parameters limit and offset.
 
@@ -1650,6 +2135,10 @@ class ExamArchiveDatabase(object):
         (zero means to start from the beginning)
         * `offset_represents_ids`: if false, the amount of rows specified by the `offset` parameter are skipped
         (e.g. for paging). If true, only the users are returned having user_id greater or equal than `offset`.
+        * `sort`: the column to sort the users by, one of SORT_KEYS['user'], or None to sort by user_id
+        * `descending`: if true, the users are sorted in descending order
+        * `after`: the key of the last user of the previous page as described in _sort_clauses, or None
+        * `columns`: the columns of the users to read, or None to read all the columns
 
         OUTPUT:
 
@@ -1657,7 +2146,8 @@ class ExamArchiveDatabase(object):
         dictionary containing the same structure as returned by get_user.
 
         '''
-        return self._browse("user", None, limit, offset, offset_represents_ids)
+        return self._browse("user", None, limit, offset, offset_represents_ids, sort, descending, after,
+                            columns)
 
     def get_user(self, user_id):
         '''
@@ -1706,7 +2196,7 @@ class ExamArchiveDatabase(object):
         sql_query = 'SELECT * from user WHERE username = ?'
 
         # Connect to the database and get a connection object
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             # Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -1745,7 +2235,7 @@ class ExamArchiveDatabase(object):
         sql_query = 'SELECT user_id from user WHERE username = ? AND password = ?'
 
         # Connect to the database and get a connection object
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             # Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -1783,7 +2273,7 @@ class ExamArchiveDatabase(object):
         sql_query1 = 'SELECT user_type FROM user WHERE user_id = ?'
 
         # Connect to the database and get a connection object
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             # Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -1805,7 +2295,7 @@ class ExamArchiveDatabase(object):
                 sql_query2 = 'SELECT identification_needed FROM archive WHERE archive_id = ?'
 
                 # Connect to the database and get a connection object
-                con = sqlite3.connect(self.db_path)
+                con = self._connect()
                 with con:
                     # Cursor and row initialization
                     con.row_factory = sqlite3.Row
@@ -1829,7 +2319,7 @@ class ExamArchiveDatabase(object):
                         sql_query3 = 'SELECT user_id, archive_id FROM user WHERE user_id = ? AND archive_id = ?'
 
                         # Connect to the database and get a connection object
-                        con = sqlite3.connect(self.db_path)
+                        con = self._connect()
                         with con:
                             # Cursor and row initialization
                             con.row_factory = sqlite3.Row
@@ -1853,25 +2343,35 @@ class ExamArchiveDatabase(object):
                     else:
                         return True
 
-    def remove_user(self, user_id):
+    def remove_user(self, user_id, expected_modified=None):
         '''
         Remove user from the database.
 
         INPUT:
 
         * `user_id`: ID of the user to be deleted.
+        * `expected_modified`: The last_modified value of the user as read by the caller. If given, the user is
+        removed only if it has not been modified since.
 
         OUTPUT:
 
         * True, if a user with the given user_id was removed, False otherwise.
 
         Returns true, if the delete succeeded, otherwise false if there was an error deleting the user from the database.
+
+        Raises exception ExamDatabaseErrorModified, if the user has been modified after expected_modified.
         '''
         keys_on = 'PRAGMA foreign_keys = ON'
         delete_query = 'DELETE FROM user WHERE user_id = ?'
 
+        # Remove only the version of the user the caller has seen
+        pvalue = (user_id,)
+        if expected_modified is not None:
+            delete_query += ' AND last_modified = ?'
+            pvalue += (expected_modified, )
+
         # Connect to the database
-        con = sqlite3.connect(self.db_path)
+        con = self._connect()
         with con:
             # Cursor and row initialization
             con.row_factory = sqlite3.Row
@@ -1880,14 +2380,489 @@ class ExamArchiveDatabase(object):
             cur.execute(keys_on)
 
             #Execute the statement to delete
-            pvalue = (user_id,)
             cur.execute(delete_query, pvalue)
 
             #Check that it has been deleted
             if cur.rowcount < 1:
+                self._raise_if_modified(cur, "user", user_id, expected_modified)
                 return False
+            self.invalidate_token_generations()
             return True
 
+    # Summary functions of database API
+
+    def get_archive_summary(self, archive_id):
+        '''
+        Get the number of courses and exams in an archive. The summary is read from the archive_summary table, which
+        is updated by triggers whenever courses and exams are created, modified or removed.
+
+        INPUT:
+
+        * `archive_id`: The ID of the archive.
+
+        OUTPUT is a dictionary containing the following keys:
+
+        * `archive_id`: The ID of the archive.
+        * `course_count`: Number of courses in the archive.
+        * `exam_count`: Number of exams in the courses of the archive.
+        * `latest_exam_date`: Date of the latest exam in the archive, or None if there are no exams.
+
+        If archive was not found, None is returned.
+        '''
+        rows = self._query('SELECT * FROM archive_summary WHERE archive_id = ?', (archive_id,))
+        return rows[0] if rows else None
+
+    def browse_archive_summaries(self, archive_ids=None):
+        '''
+        List the summaries of all the archives, or only of the given archives, with a single query for every 500
+        archives.
+
+        INPUT:
+
+        * `archive_ids`: A list of the IDs of the archives, e.g. the archives of a page of browse_archives, or None
+        for all the archives.
+
+        OUTPUT:
+
+        * A list of archive summaries ordered by archive_id. Each summary in the list is a dictionary containing the
+        same structure as returned by get_archive_summary.
+        '''
+        if archive_ids is None:
+            return self._query('SELECT * FROM archive_summary ORDER BY archive_id')
+
+        archive_ids = sorted(set(archive_ids))
+        summaries = []
+        for start in range(0, len(archive_ids), 500):
+            chunk = tuple(archive_ids[start:start + 500])
+            summaries += self._query('SELECT * FROM archive_summary WHERE archive_id IN (%s) ORDER BY archive_id'
+                                     % ','.join('?' * len(chunk)), chunk)
+        return summaries
+
+    def get_course_summary(self, course_id):
+        '''
+        Get the number of exams in a course, including the number of exams per language and year. The summary is read
+        from the course_summary and exam_summary tables, which are updated by triggers.
+
+        INPUT:
+
+        * `course_id`: The ID of the course.
+
+        OUTPUT is a dictionary containing the following keys:
+
+        * `course_id`: The ID of the course.
+        * `exam_count`: Number of exams in the course.
+        * `latest_exam_date`: Date of the latest exam in the course, or None if there are no exams.
+        * `exam_counts`: A list of dictionaries with keys `language_id`, `year` and `exam_count`, ordered by
+        language and year. Language and year are None for exams without a language or date.
+
+        If course was not found, None is returned.
+        '''
+        rows = self._query('SELECT * FROM course_summary WHERE course_id = ?', (course_id,))
+        if not rows:
+            return None
+        summary = rows[0]
+
+        counts = self._query('SELECT language_id, year, exam_count FROM exam_summary WHERE course_id = ? '
+                             'ORDER BY language_id, year', (course_id,))
+        for count in counts:
+            count['language_id'] = count['language_id'] or None
+            count['year'] = count['year'] or None
+        summary['exam_counts'] = counts
+        return summary
+
+    def browse_course_summaries(self, archive_id):
+        '''
+        List the summaries of all the courses of an archive with a single query.
+
+        INPUT:
+
+        * `archive_id`: The ID of the archive.
+
+        OUTPUT:
+
+        * A list of course summaries ordered by course_id. Each summary in the list is a dictionary containing the
+        keys `course_id`, `exam_count` and `latest_exam_date` as returned by get_course_summary.
+        '''
+        return self._query('SELECT s.* FROM course_summary s JOIN course c ON c.course_id = s.course_id '
+                           'WHERE c.archive_id = ? ORDER BY s.course_id', (archive_id,))
+
+    def rebuild_summaries(self):
+        '''
+        Recalculate the contents of the summary tables from the course and exam tables in a single transaction.
+        Needed only if the summary tables have been modified by hand or verify_summaries reports differences.
+        '''
+        self._rebuild_tables(SUMMARY_QUERIES)
+
+    def verify_summaries(self):
+        '''
+        Check that the summary tables match the course and exam tables.
+
+        OUTPUT:
+
+        * A list of the names of the summary tables, whose contents differ from the course and exam tables. If the
+        list is empty, the summary tables are up to date.
+        '''
+        return self._verify_tables(SUMMARY_QUERIES)
+
+    # List view functions of database API
+
+    def _browse_list_view(self, table, table_id, parent_column, parent_id, sort, descending, limit, after, columns):
+        '''
+        List the rows of a list view table with the given parent ID, sorted and paged as described in _sort_clauses.
+        Only the given columns and the required columns are read, or all the columns if columns is None.
+        '''
+        ranges, order = self._sort_clauses(table, table_id, sort, descending, after)
+        select_list = self._select_list(table, columns, (table_id, sort))
+        rows = []
+        for keyset, pvalue in ranges:
+            remaining = limit - len(rows) if limit > -1 else -1
+            if remaining == 0:
+                break
+            sql_query = 'SELECT %s FROM %s WHERE %s = ?%s%s LIMIT ?' % (select_list, table, parent_column,
+                                                                       ' AND ' + keyset if keyset else '', order)
+            rows += self._query(sql_query, (parent_id,) + pvalue + (remaining,))
+        return rows
+
+    def browse_course_list(self, archive_id, sort=None, descending=False, limit=-1, after=None, columns=None):
+        '''
+        List the courses of an archive from the course_list_view table with a single indexed query. The table is
+        updated by triggers whenever courses, exams, teachers or users are created, modified or removed.
+
+        INPUT:
+
+        * `archive_id`: The ID of the archive.
+        * `sort`: The column to sort the courses by, one of SORT_KEYS['course_list_view'], or None.
+        * `descending`: If true, the courses are sorted in descending order.
+        * `limit`: The maximum number of courses returned (-1 means no limit).
+        * `after`: The key of the last course of the previous page as described in _sort_clauses, or None.
+        * `columns`: The columns to read, or None to read all the columns. The course_id and the sort column are
+        always read.
+
+        OUTPUT:
+
+        * A list of courses ordered by the column sort and course_id, or only by course_id. Each course in the list is a dictionary containing the same keys as
+        returned by get_course except `modifier_id`, and in addition the following keys:
+            * `teacher_name`: First and last name of the teacher, or None if the course has no teacher.
+            * `modifier_name`: Username of the last modifier, or None if there is no modifier.
+            * `exam_count`: Number of exams in the course.
+            * `latest_exam_date`: Date of the latest exam in the course, or None if there are no exams.
+        '''
+        return self._browse_list_view('course_list_view', 'course_id', 'archive_id', archive_id, sort, descending,
+                                      limit, after, columns)
+
+    def browse_exam_list(self, course_id, sort=None, descending=False, limit=-1, after=None, columns=None):
+        '''
+        List the exams of a course from the exam_list_view table with a single indexed query. The table is updated by
+        triggers whenever courses, exams, teachers or users are created, modified or removed.
+
+        INPUT:
+
+        * `course_id`: The ID of the course.
+        * `sort`: The column to sort the exams by, one of SORT_KEYS['exam_list_view'], or None.
+        * `descending`: If true, the exams are sorted in descending order.
+        * `limit`: The maximum number of exams returned (-1 means no limit).
+        * `after`: The key of the last exam of the previous page as described in _sort_clauses, or None.
+        * `columns`: The columns to read, or None to read all the columns. The exam_id and the sort column are always
+        read.
+
+        OUTPUT:
+
+        * A list of exams ordered by the column sort and exam_id, or only by exam_id. Each exam in the list is a dictionary containing the same keys as
+        returned by get_exam, and in addition the following keys:
+            * `archive_id`: The ID of the archive of the course.
+            * `course_code`: Code of the course.
+            * `course_name`: Name of the course.
+            * `examiner_name`: First and last name of the examiner, or None if the exam has no examiner.
+            * `modifier_name`: Username of the last modifier, or None if there is no modifier.
+        '''
+        return self._browse_list_view('exam_list_view', 'exam_id', 'course_id', course_id, sort, descending, limit,
+                                      after, columns)
+
+    def browse_archive_exam_list(self, archive_id):
+        '''
+        List the exams of all the courses in an archive from the exam_list_view table with a single indexed query.
+
+        INPUT:
+
+        * `archive_id`: The ID of the archive.
+
+        OUTPUT:
+
+        * A list of exams ordered by course_id and exam_id. Each exam in the list is a dictionary containing the same
+        structure as returned by browse_exam_list.
+        '''
+        return self._query('SELECT * FROM exam_list_view WHERE archive_id = ? ORDER BY course_id, exam_id',
+                           (archive_id,))
+
+    def search_exams(self, archive_id=None, course_id=None, date_from=None, date_to=None, language_id=None,
+                     examiner_id=None, columns=None, descending=False, limit=-1, after=None):
+        '''
+        Find the exams matching all the given filters across the courses, from the exam_list_view table. The
+        combinations of the archive, language, examiner and date filters are served by the composite indexes of the
+        table, without sorting the results. The results are paged by the keyset of the date and exam_id, like the
+        sorted pages of browse_exam_list.
+
+        INPUT:
+
+        * `archive_id`: The ID of the archive of the exams, or None for all the archives.
+        * `course_id`: The ID of the course of the exams, or None for all the courses.
+        * `date_from`: The earliest date of the exams as an ISO date string, e.g. '2013-01-01', or None.
+        * `date_to`: The latest date of the exams as an ISO date string, e.g. '2015-12-31', or None.
+        * `language_id`: The language of the exams, e.g. 'fi', or None for all the languages.
+        * `examiner_id`: The ID of the examiner of the exams, or None for all the examiners.
+        * `columns`: The columns to read, or None to read all the columns. The exam_id and date are always read.
+        * `descending`: If true, the exams are ordered by date and exam_id in descending order.
+        * `limit`: The maximum number of exams returned, or -1 for all the exams.
+        * `after`: The tuple of the date and exam_id of the last exam of the previous page, or None for the first
+        page.
+
+        OUTPUT:
+
+        * A list of exams ordered by date and exam_id. Each exam in the list is a dictionary containing the same
+        structure as returned by browse_exam_list.
+        '''
+        conditions, pvalue = [], ()
+        for column, operator, value in [('archive_id', '=', archive_id), ('course_id', '=', course_id),
+                                        ('language_id', '=', language_id), ('examiner_id', '=', examiner_id),
+                                        ('date', '>=', date_from), ('date', '<=', date_to)]:
+            if value is not None:
+                conditions.append('%s %s ?' % (column, operator))
+                pvalue += (value,)
+
+        # Continue after the last exam of the previous page, reading the ranges until the page is full
+        ranges, order = self._sort_clauses('exam_list_view', 'exam_id', 'date', descending, after)
+        select = 'SELECT %s FROM exam_list_view' % self._select_list('exam_list_view', columns, ('exam_id', 'date'))
+        exams = []
+        for keyset, keyset_pvalue in ranges:
+            remaining = limit - len(exams) if limit > -1 else -1
+            if remaining == 0:
+                break
+            where = conditions + [keyset] if keyset is not None else conditions
+            sql_query = select + (' WHERE ' + ' AND '.join(where) if where else '') + order + ' LIMIT ?'
+            exams += self._query(sql_query, pvalue + keyset_pvalue + (remaining,))
+        return exams
+
+    def rebuild_list_views(self):
+        '''
+        Recalculate the contents of the list view tables in a single transaction. The exam counts are read from the
+        course_summary table, so the summary tables should be rebuilt first, if they are out of date. Needed only if the
+        list view tables have been modified by hand or verify_list_views reports differences.
+        '''
+        self._rebuild_tables(LIST_VIEW_QUERIES)
+
+    def verify_list_views(self):
+        '''
+        Check that the list view tables match the course, exam, teacher, user and course_summary tables.
+
+        OUTPUT:
+
+        * A list of the names of the list view tables, whose contents differ from the tables they are calculated
+        from. If the list is empty, the list view tables are up to date.
+        '''
+        return self._verify_tables(LIST_VIEW_QUERIES)
+
+    def _rebuild_tables(self, queries):
+        '''
+        Replace the contents of the tables in the list of (table, sql_query) tuples with the results of the queries in
+        a single transaction.
+        '''
+        # Connect to the database and get a connection object
+        con = self._connect()
+        with con:
+            cur = con.cursor()
+            for table, sql_query in queries:
+                cur.execute('DELETE FROM %s' % table)
+                cur.execute('INSERT INTO %s %s' % (table, sql_query))
+
+    def _verify_tables(self, queries):
+        '''
+        Return a list of the names of the tables in the list of (table, sql_query) tuples, whose contents differ from
+        the results of the queries.
+        '''
+        invalid = []
+
+        # Connect to the database and get a connection object
+        con = self._connect()
+        with con:
+            cur = con.cursor()
+            for table, sql_query in queries:
+                cur.execute(sql_query)
+                expected = set(cur.fetchall())
+                cur.execute('SELECT * FROM %s' % table)
+                if set(cur.fetchall()) != expected:
+                    invalid.append(table)
+        return invalid
+
+    def _query(self, sql_query, pvalue=()):
+        '''
+        Execute a SQL query and return the rows as a list of dictionaries as returned by _create_object.
+        '''
+        # Connect to the database and get a connection object
+        con = self._connect()
+        with con:
+            # Cursor and row initialization
+            con.row_factory = sqlite3.Row
+            cur = con.cursor()
+            cur.execute(sql_query, pvalue)
+            return [self._create_object(row) for row in cur.fetchall()]
+
+class LookupSnapshot(object):
+    '''
+    Immutable snapshot of the teachers and languages returned by ExamArchiveDatabase.get_lookups. The snapshot has
+    the following attributes, which must not be modified:
+
+    * `teachers`: Tuple of the teachers as returned by browse_teachers.
+    * `teachers_by_id`: Dictionary of the teachers by their IDs converted to unicode.
+    * `teachers_etag`: Strong entity tag calculated from the contents of the teachers.
+    * `languages`: Tuple of the languages as returned by browse_languages.
+    * `languages_by_id`: Dictionary of the languages by their IDs.
+    * `languages_etag`: Strong entity tag calculated from the contents of the languages.
+    '''
+    __slots__ = ('teachers', 'teachers_by_id', 'teachers_etag', 'languages', 'languages_by_id', 'languages_etag')
+
+    def __init__(self, teachers, languages):
+        set_attribute = super(LookupSnapshot, self).__setattr__
+        set_attribute('teachers', tuple(teachers))
+        set_attribute('teachers_by_id', dict((unicode(teacher['teacher_id']), teacher) for teacher in teachers))
+        set_attribute('teachers_etag', self._etag(teachers))
+        set_attribute('languages', tuple(languages))
+        set_attribute('languages_by_id', dict((language['language_id'], language) for language in languages))
+        set_attribute('languages_etag', self._etag(languages))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("LookupSnapshot is immutable")
+
+    @staticmethod
+    def _etag(rows):
+        '''
+        Calculate a SHA-256 digest of the contents of a list of rows.
+        '''
+        return hashlib.sha256(json.dumps(rows, sort_keys=True)).hexdigest()
+
+class PooledConnection(sqlite3.Connection):
+    '''
+    Connection of the connection pool of ExamArchiveDatabase. The connection counts the statements prepared for the
+    first time (misses) and reused from the statement cache of the connection (hits). Foreign keys are turned on once
+    when the connection is opened.
+
+    The connection is opened with isolation_level None, so the sqlite3 module never begins or commits transactions
+    on its own, e.g. it would commit the transaction of an outer call before a PRAGMA statement. Instead, within a
+    with statement a transaction is begun before the first INSERT, UPDATE, DELETE or REPLACE statement, like the
+    sqlite3 module does, and it is committed or rolled back only when the outermost with statement exits. If
+    immediate is set, the transaction is begun with the write lock when the outermost with statement is entered.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super(PooledConnection, self).__init__(*args, **kwargs)
+        sqlite3.Cursor(self).execute(FOREIGN_KEYS_ON)
+        self.depth = 0
+        self.closed = False
+        self.hits = 0
+        self.misses = 0
+        self.prepared = collections.OrderedDict()
+        self.cache_size = kwargs.get('cached_statements', CACHED_STATEMENTS)
+        self.data_version = None
+        self.immediate = False
+        self.in_transaction = False
+
+    def cursor(self, factory=None):
+        return super(PooledConnection, self).cursor(factory or PooledCursor)
+
+    def close(self):
+        self.closed = True
+        super(PooledConnection, self).close()
+
+    def prepare(self, sql):
+        '''
+        Count a statement executed with the connection as a hit, if it is in the statement cache of the connection.
+        The cache is least recently used, like the statement cache of the sqlite3 module.
+        '''
+        if self.prepared.pop(sql, None):
+            self.hits += 1
+        else:
+            self.misses += 1
+            if len(self.prepared) >= self.cache_size:
+                self.prepared.popitem(last=False)
+        self.prepared[sql] = True
+
+    def begin(self, immediate=False):
+        '''
+        Begin a transaction, unless one is already in progress.
+        '''
+        if not self.in_transaction:
+            sqlite3.Cursor(self).execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+            self.in_transaction = True
+
+    def __enter__(self):
+        if not self.depth and self.immediate:
+            self.immediate = False
+            self.begin(immediate=True)
+        self.depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.depth -= 1
+        if self.depth or not self.in_transaction:
+            return False
+        self.in_transaction = False
+        cur = sqlite3.Cursor(self)
+        if exc_type is None:
+            try:
+                cur.execute('COMMIT')
+                return False
+            except sqlite3.Error:
+                self._rollback(cur)
+                raise
+        self._rollback(cur)
+        return False
+
+    def _rollback(self, cur):
+        '''
+        Roll back the transaction, unless SQLite has already rolled it back because of the error.
+        '''
+        try:
+            cur.execute('ROLLBACK')
+        except sqlite3.OperationalError:
+            pass
+
+class PooledCursor(sqlite3.Cursor):
+    '''
+    Cursor of PooledConnection, counting the statements executed and beginning the transaction of the connection
+    before the first modifying statement executed within a with statement. Turning the foreign keys on is skipped,
+    because they are already on, and because the PRAGMA statement has no effect within a transaction.
+    '''
+
+    def _prepare(self, sql):
+        con = self.connection
+        con.prepare(sql)
+        if con.depth and not con.in_transaction and sql.lstrip()[:7].upper().startswith(MODIFYING_STATEMENTS):
+            con.begin()
+
+    def execute(self, sql, *args):
+        if sql == FOREIGN_KEYS_ON:
+            return self
+        self._prepare(sql)
+        return super(PooledCursor, self).execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        self._prepare(sql)
+        return super(PooledCursor, self).executemany(sql, *args)
+
+def reset_pool():
+    '''
+    Discard the pooled connections and the lookup snapshots inherited from the parent process. Must be called in a
+    process created with fork before the database API is used, because SQLite connections must not be shared between
+    processes, and the locks may have been held by the other threads of the parent when it forked.
+    '''
+    global POOL, POOL_LOCK, LOOKUPS_LOCK
+    POOL = threading.local()
+    POOL_LOCK = threading.Lock()
+    POOL_CONNECTIONS.clear()
+    LOOKUPS_LOCK = threading.Lock()
+    LOOKUPS.clear()
+    TOKEN_GENERATIONS.clear()
+    TABLE_GENERATIONS.clear()
+
 class ExamDatabaseError(Exception):
     '''
     Exception for general exam archive database error.
@@ -1905,3 +2880,71 @@ class ExamDatabaseErrorNotFound(Exception):
     Exception for an error, when a given entity was not found from the database.
     '''
     pass
+
+class ExamDatabaseErrorModified(Exception):
+    '''
+    Exception for an error, when an entity has been modified by someone else after the caller read it.
+    '''
+    pass
+
+
+# Rebuild or verify the summary and list view tables, or benchmark the connection pool from command line
+if __name__ == '__main__':
+    usage = 'Usage:\n' \
+            '  python exam_archive.py upgrade [<db>]\n' \
+            '  python exam_archive.py rebuild-summaries [<db>]\n' \
+            '  python exam_archive.py verify-summaries [<db>]\n' \
+            '  python exam_archive.py rebuild-list-views [<db>]\n' \
+            '  python exam_archive.py verify-list-views [<db>]\n' \
+            '  python exam_archive.py benchmark [<db>]'
+
+    if len(sys.argv) not in (2, 3):
+        print usage
+        sys.exit(1)
+    command, db = sys.argv[1], ExamArchiveDatabase(*sys.argv[2:])
+
+    if command == 'upgrade':
+        try:
+            db.upgrade_schema()
+        except ExamDatabaseError as e:
+            print e
+            sys.exit(1)
+        print 'Upgraded the database to the schema'
+    elif command in ('rebuild-summaries', 'rebuild-list-views'):
+        # The tables are created first, if the database was created with an earlier version of the schema
+        try:
+            db.upgrade_schema()
+        except ExamDatabaseError as e:
+            print e
+            sys.exit(1)
+        db.rebuild_summaries()
+        if command == 'rebuild-summaries':
+            print 'Rebuilt the summary tables'
+        else:
+            db.rebuild_list_views()
+            print 'Rebuilt the summary and list view tables'
+    elif command == 'verify-summaries':
+        invalid = db.verify_summaries()
+        for table in invalid:
+            print '%s is out of date' % table
+        print 'Summary tables are up to date' if not invalid else 'Summary tables are out of date'
+        sys.exit(1 if invalid else 0)
+    elif command == 'verify-list-views':
+        invalid = db.verify_list_views()
+        for table in invalid:
+            print '%s is out of date' % table
+        print 'List view tables are up to date' if not invalid else 'List view tables are out of date'
+        sys.exit(1 if invalid else 0)
+    elif command == 'benchmark':
+        import timeit
+        calls = 2000
+        for pooled in (False, True):
+            bench_db = ExamArchiveDatabase(db.db_path, pooled)
+            seconds = timeit.timeit(lambda: (bench_db.get_course(1), bench_db.get_exam(1)), number=calls)
+            print '%s connections: %.1f microseconds per get_course and get_exam' % \
+                  ('Pooled' if pooled else 'New', seconds * 1000000 / calls)
+        stats = db.statement_stats()
+        print 'Prepared statements: %d hits, %d misses' % (stats['hits'], stats['misses'])
+    else:
+        print usage
+        sys.exit(1)
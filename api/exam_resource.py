@@ -8,15 +8,103 @@
 
 
 import json, os
-import course_resource
+import tracing
+import archive_resource, course_resource, export_resource
 
 from flask import Flask, request, Response, g, jsonify, send_from_directory
 from flask.ext.restful import Resource, Api, abort
 from werkzeug import secure_filename
 
-from exam_archive import ExamDatabaseErrorExists
+from exam_archive import ExamDatabaseErrorExists, ExamDatabaseErrorModified, SORT_KEYS
 from resources_common import auth, app, api, error_response, API_VERSION, COLLECTIONJSON, EXAM_PROFILE, \
-    allowed_file, file_extension, DEFAULTJSON
+    allowed_file, file_extension, DEFAULTJSON, entity_tag, precondition_failed, if_match_modified, href, \
+    dumps, fragment, item_fragment, coalesced_response, exam_filters, page_parameters, next_page_link, \
+    fields_parameter, selected_columns
+
+EXAM_TEMPLATE = fragment({
+    "data" : [
+        {"prompt" : "Insert examiner ID", "name" : "examinerId", "value" : "", "required":False},
+        {"prompt" : "Insert exam date (YYYY-MM-DD)", "name" : "date", "value" : "", "required":False},
+        {"prompt" : "Insert exam file attachment", "name" : "associatedMedia", "value" : "", "required":False},
+        {"prompt" : "Insert exam language ID", "name" : "inLanguage", "value" : "", "required":False}
+    ]
+})
+''' Pre-encoded Collection+JSON template of the ExamList and Exam resources. '''
+
+EXAM_FIELDS = {
+    'examId': ('exam_id',),
+    'courseId': ('course_id',),
+    'date': ('date',),
+    'associatedMedia': ('file_attachment',),
+    'inLanguage': ('language_id',),
+    'dateModified': ('last_modified',),
+    'examinerId': ('examiner_id',),
+    'examinerName': ('examiner_id', 'examiner_name'),
+    'modifier': ('modifier_id', 'modifier_name'),
+    'links': ('course_code', 'course_name'),
+}
+''' Columns of the exam list view needed by each field of the exam items, for the fields query parameter. '''
+
+EXAM_COLUMNS = ('exam_id', 'course_id', 'archive_id')
+''' Columns of the exam list view needed by every exam item. '''
+
+def exam_item(exam, fields=None):
+    '''
+    Create a Collection+JSON item of an exam.
+
+    INPUT:
+
+    * `exam`: The exam as returned by browse_exam_list.
+    * `fields`: The names of the data fields and 'links' to include in the item, or None for all of them. The exam
+    needs to contain only the columns of EXAM_FIELDS of the fields.
+    '''
+    if fields is None:
+        fields = EXAM_FIELDS
+
+    # Get the needed attributes from the exam object
+    exam_id = exam['exam_id']
+    course_id = exam['course_id']
+    archive_id = exam['archive_id']
+
+    item = {}
+    data = []
+    links = []
+    item['href'] = href(Exam, archive_id=archive_id, course_id=course_id, exam_id=exam_id)
+    item['read-only'] = True
+    item['data'] = data
+    item['links'] = links
+
+    # Append proper fields with values to items
+    if 'examId' in fields:
+        data.append({'name':'examId', 'value':exam_id})
+    if 'courseId' in fields:
+        data.append({'name':'courseId', 'value':course_id})
+    if 'date' in fields:
+        data.append({'name':'date', 'value':exam['date']})
+    if 'associatedMedia' in fields:
+        data.append({'name':'associatedMedia', 'value':exam['file_attachment']})
+    if 'inLanguage' in fields:
+        data.append({'name':'inLanguage', 'value':exam['language_id']})
+    if 'dateModified' in fields:
+        data.append({'name':'dateModified', 'value':exam['last_modified']})
+
+    examiner_id = exam.get('examiner_id')
+    if examiner_id:
+        if 'examinerId' in fields:
+            data.append({'name':'examinerId', 'value':examiner_id})
+        if 'examinerName' in fields:
+            data.append({'name':'examinerName', 'value':exam['examiner_name']})
+
+    if 'modifier' in fields and exam['modifier_id']:
+        data.append({'name':'modifier', 'value':exam['modifier_name']})
+
+    if 'links' in fields:
+        # Get some course properties for forming a proper link resource URL
+        link = {'name':"%s_exams" % exam['course_code'], 'prompt':'Other exams of the course %s' % exam['course_name'],
+                   'rel':'exams','href': href(ExamList, archive_id=archive_id, course_id=course_id)}
+        links.append(link)
+
+    return item
 
 # Define the resources
 class ExamList(Resource):
@@ -34,6 +122,24 @@ class ExamList(Resource):
         * `archive_id`: Identifier of the archive in which the exam belongs to
         * `course_id`: Identifier of the course, in which the exam belongs to
 
+        QUERY PARAMETERS:
+
+        * `date_from`: Optional earliest date of the exams (YYYY-MM-DD).
+        * `date_to`: Optional latest date of the exams (YYYY-MM-DD).
+        * `language_id`: Optional language of the exams, e.g. fi.
+        * `examiner_id`: Optional identifier of the examiner of the exams.
+
+        If any of the filters is given, the exams are ordered by date instead of identifier.
+
+        * `sort`: Optional sort key, date or last_modified. A minus sign before the key sorts in descending order,
+        e.g. ?sort=-date. With the filters, the exams can be sorted only by date.
+        * `limit`: Optional maximum number of exams returned. If there are more exams, the collection has a link with
+        relation next to the next page.
+        * `after`: Optional cursor of the next page, set by the next link.
+
+        * `fields`: Optional comma separated names of the data fields included in the exam items, e.g.
+        ?fields=examId,date. The links of the items are included only with the name links.
+
         HEADERS:
 
         * `Accept`: application/json
@@ -52,6 +158,9 @@ class ExamList(Resource):
         `200` A list of exams was fetched and returned successfully.
         `400` No archive id. The archive id was not specified.
         `400` No course id. The course id was not specified.
+        `400` Invalid filter parameter. The dates must be given as YYYY-MM-DD and the examiner id as an integer.
+        `400` Invalid paging parameter. The sort key, limit or cursor is not valid.
+        `400` Invalid fields parameter. Only the data fields of the exam items and links can be selected.
         `401` Not logged in. You are not logged in, unable to get exam list information.
         `403` Access forbidden. You are not authorizated to access the exam list.
         `404` Course not found. The course was not found.
@@ -70,96 +179,79 @@ class ExamList(Resource):
         if not course_id:
             return error_response(400, "No course id", "The course id was not specified")
 
-        # Get course from the database
-        course = g.db.get_course(course_id)
-        if not course:
-            return error_response(404, "Course not found", "The course was not found")
-
-        # Extract exams from the database
-        exams = g.db.browse_exams(course_id)
-
-        # FILTER AND GENERATE RESPONSE
-
-        # Create the envelope
-        envelope = {}
-        collection = {}
-        collection_links = []
-        envelope["collection"] = collection
-        collection['version'] = API_VERSION
-        collection['href'] = api.url_for(ExamList, archive_id=archive_id, course_id=course_id)
-        collection['links'] = collection_links
-
-        collection_links.append({'name':"parent_course",
-                                 'prompt':'Course %s' % course['course_name'],
-                                 'rel':'course','href': api.url_for(course_resource.Course, archive_id=archive_id,
-                                                                    course_id=course_id)})
-
-        collection_links.append({'name':"course_list",
-                                 'prompt':'Course list',
-                                 'rel':'courses','href': api.url_for(course_resource.CourseList, archive_id=archive_id)})
-
-        collection['template'] = {
-            "data" : [
-                {"prompt" : "Insert examiner ID", "name" : "examinerId", "value" : "", "required":False},
-                {"prompt" : "Insert exam date (YYYY-MM-DD)", "name" : "date", "value" : "", "required":False},
-                {"prompt" : "Insert exam file attachment", "name" : "associatedMedia", "value" : "", "required":False},
-                {"prompt" : "Insert exam language ID", "name" : "inLanguage", "value" : "", "required":False}
-            ]
-        }
-
-        # Create the items
-        items = []
-        for exam in exams:
-            # Get the needed attributes from the exam object
-            exam_id = exam['exam_id']
-            course_id = exam['course_id']
-            date = exam['date']
-            file_attachment = exam['file_attachment']
-            lang = exam['language_id']
-
-            # Get some course properties for forming a proper link resource URL
-            course_name = course['course_name']
-            course_code = course['course_code']
-
-            item = {}
-            data = []
-            links = []
-            item['href'] = api.url_for(Exam, archive_id=archive_id, course_id=course_id, exam_id=exam_id)
-            item['read-only'] = True
-            item['data'] = data
-            item['links'] = links
-
-            # Append proper fields with values to items
-            data.append({'name':'examId', 'value':exam_id})
-            data.append({'name':'courseId', 'value':course_id})
-            data.append({'name':'date', 'value':date})
-            data.append({'name':'associatedMedia', 'value':file_attachment})
-            data.append({'name':'inLanguage', 'value':lang})
-            data.append({'name':'dateModified', 'value':exam['last_modified']})
-
-            examiner_id = exam['examiner_id']
-            if examiner_id:
-                teacher = g.db.get_teacher(examiner_id)
-                teacher_name = "%s %s" % (teacher['first_name'], teacher['last_name'])
-                data.append({'name':'examinerId', 'value':examiner_id})
-                data.append({'name':'examinerName', 'value':teacher_name})
-
-            modifier_id = exam['modifier_id']
-            if modifier_id:
-                modifier = g.db.get_user(modifier_id)
-                modifier_name = modifier['username']
-                data.append({'name':'modifier', 'value':modifier_name})
-
-            link = {'name':"%s_exams" % course_code, 'prompt':'Other exams of the course %s' % course_name,
-                       'rel':'exams','href': api.url_for(ExamList, archive_id=archive_id, course_id=course_id)}
-            links.append(link)
-
-            items.append(item)
-
-        collection['items'] = items
+        filters = exam_filters()
+        if filters is None:
+            return error_response(400, "Invalid filter parameter",
+                                  "The dates must be given as YYYY-MM-DD and the examiner id as an integer")
 
-        # Return the response with status code 200 and Collection+JSON mime type and URL to Course profile
-        return Response (json.dumps(envelope), 200, mimetype=COLLECTIONJSON+";"+EXAM_PROFILE)
+        # The filtered exams are paged by date like the exams of ArchiveExamList
+        if filters:
+            page = page_parameters(('date',), 'date')
+        else:
+            page = page_parameters(SORT_KEYS['exam_list_view'])
+        if page is None:
+            return error_response(400, "Invalid paging parameter", "The sort key, limit or cursor is not valid")
+
+        fields = fields_parameter(EXAM_FIELDS)
+        if fields is False:
+            return error_response(400, "Invalid fields parameter",
+                                  "Only the data fields of the exam items and links can be selected")
+        columns = selected_columns(fields, EXAM_FIELDS, EXAM_COLUMNS)
+
+        def build():
+            # Get course from the database
+            course = g.db.get_course(course_id)
+            if not course:
+                return error_response(404, "Course not found", "The course was not found")
+
+            # Extract exams from the exam list view of the database
+            if filters:
+                exams = g.db.search_exams(course_id=course_id, columns=columns, descending=page['descending'],
+                                          limit=page.get('limit', -1), after=page.get('after'), **filters)
+            else:
+                exams = g.db.browse_exam_list(course_id, columns=columns, **page)
+
+            # FILTER AND GENERATE RESPONSE
+
+            # Create the envelope
+            envelope = {}
+            collection = {}
+            collection_links = []
+            envelope["collection"] = collection
+            collection['version'] = API_VERSION
+            collection['href'] = href(ExamList, archive_id=archive_id, course_id=course_id)
+            collection['links'] = collection_links
+
+            collection_links.append({'name':"parent_course",
+                                     'prompt':'Course %s' % course['course_name'],
+                                     'rel':'course','href': href(course_resource.Course, archive_id=archive_id,
+                                                                 course_id=course_id)})
+
+            collection_links.append({'name':"course_list",
+                                     'prompt':'Course list',
+                                     'rel':'courses','href': href(course_resource.CourseList, archive_id=archive_id)})
+
+            collection_links.append({'name':"exam_export",
+                                     'prompt':'Download the exams of the course as a ZIP file',
+                                     'rel':'export','href': href(export_resource.CourseExport,
+                                                                 archive_id=archive_id, course_id=course_id)})
+
+            collection['template'] = EXAM_TEMPLATE
+
+            # Create the items
+            items = [item_fragment(Exam, exam['exam_id'], exam, exam_item, fields) for exam in exams]
+
+            collection['items'] = items
+
+            next_link = next_page_link(collection['href'], exams, page, 'exam_id')
+            if next_link:
+                collection_links.append(next_link)
+
+            # Return the response with status code 200 and Collection+JSON mime type and URL to Course profile
+            return Response (dumps(envelope), 200, mimetype=COLLECTIONJSON+";"+EXAM_PROFILE)
+
+        # Concurrent identical requests share one build of the list
+        return coalesced_response(ExamList, (archive_id, course_id), build)
 
     
     @auth.login_required
@@ -268,12 +360,133 @@ class ExamList(Resource):
             return error_response(500, "Database error", "Please, contact the administrator")
 
         # Create the location header with the examname of the newly added exam
-        url = api.url_for(Exam, archive_id=archive_id, course_id=course_id, exam_id=new_exam_id)
+        url = href(Exam, archive_id=archive_id, course_id=course_id, exam_id=new_exam_id)
 
         # Return the response with status code 201 and location header with URL pointing to new resource
         return Response(status=201, headers={'Location':url}, mimetype=DEFAULTJSON)
 
 # Define the resources
+class ArchiveExamList(Resource):
+    '''
+    Resource ArchiveExamList implementation
+    '''
+
+    @auth.login_required
+    def get(self, archive_id):
+        '''
+        Get a list of exams of all the courses in the archive, ordered by date.
+
+        INPUT:
+
+        * `archive_id`: Identifier of the archive in which the exams belong to
+
+        QUERY PARAMETERS:
+
+        * `date_from`: Optional earliest date of the exams (YYYY-MM-DD).
+        * `date_to`: Optional latest date of the exams (YYYY-MM-DD).
+        * `language_id`: Optional language of the exams, e.g. fi.
+        * `examiner_id`: Optional identifier of the examiner of the exams.
+        * `sort`: Optional sort key date. A minus sign before the key sorts in descending order, e.g. ?sort=-date.
+        * `limit`: Optional maximum number of exams returned. If there are more exams, the collection has a link with
+        relation next to the next page.
+        * `after`: Optional cursor of the next page, set by the next link.
+        * `fields`: Optional comma separated names of the data fields included in the exam items, e.g.
+        ?fields=examId,date. The links of the items are included only with the name links.
+
+        HEADERS:
+
+        * `Accept`: application/json
+        * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+
+        ENTITY BODY OUTPUT FORMAT:
+
+        * `Media type`: Collection+JSON:
+            http://amundsen.com/media-types/collection/
+
+        * `Profile`: Exam profile
+            http://atlassian.virtues.fi:8090/display/PWP/PWP11#Exam+profile
+
+        RETURN CODES:
+
+        `200` A list of exams was fetched and returned successfully.
+        `400` No archive id. The archive id was not specified.
+        `400` Invalid filter parameter. The dates must be given as YYYY-MM-DD and the examiner id as an integer.
+        `400` Invalid paging parameter. The sort key, limit or cursor is not valid.
+        `400` Invalid fields parameter. Only the data fields of the exam items and links can be selected.
+        `401` Not logged in. You are not logged in, unable to get exam list information.
+        `403` Access forbidden. You are not authorizated to access the exam list.
+        `404` Archive not found. The archive was not found.
+
+        In case of error, the response media type Problem+JSON is returned with the error message above. If no exams
+        match the filters, a collection with empty items container is returned.
+        '''
+
+        if g.no_auth_provided:
+            return error_response(401, "Not logged in", "You are not logged in, unable to get exam list information")
+        if not g.user_logged_in or (g.user_type in ['basic','admin'] and g.user_archive != archive_id):
+            return error_response(403, "Access forbidden", "You are not authorizated to access the exam list")
+
+        if not archive_id:
+            return error_response(400, "No archive id", "The archive id was not specified")
+
+        filters = exam_filters()
+        if filters is None:
+            return error_response(400, "Invalid filter parameter",
+                                  "The dates must be given as YYYY-MM-DD and the examiner id as an integer")
+
+        page = page_parameters(('date',), 'date')
+        if page is None:
+            return error_response(400, "Invalid paging parameter", "The sort key, limit or cursor is not valid")
+
+        fields = fields_parameter(EXAM_FIELDS)
+        if fields is False:
+            return error_response(400, "Invalid fields parameter",
+                                  "Only the data fields of the exam items and links can be selected")
+        columns = selected_columns(fields, EXAM_FIELDS, EXAM_COLUMNS)
+
+        def build():
+            # Get archive from the database
+            archive = g.db.get_archive(archive_id)
+            if not archive:
+                return error_response(404, "Archive not found", "The archive was not found")
+
+            # Extract the matching exams of all the courses from the exam list view of the database
+            exams = g.db.search_exams(archive_id=archive_id, columns=columns, descending=page['descending'],
+                                      limit=page.get('limit', -1), after=page.get('after'), **filters)
+
+            # FILTER AND GENERATE RESPONSE
+
+            # Create the envelope
+            envelope = {}
+            collection = {}
+            collection_links = []
+            envelope["collection"] = collection
+            collection['version'] = API_VERSION
+            collection['href'] = href(ArchiveExamList, archive_id=archive_id)
+            collection['links'] = collection_links
+
+            collection_links.append({'name':"parent_archive",
+                                     'prompt':'Archive %s' % archive['archive_name'],
+                                     'rel':'archive','href': href(archive_resource.Archive, archive=archive_id)})
+
+            collection_links.append({'name':"course_list",
+                                     'prompt':'Course list',
+                                     'rel':'courses','href': href(course_resource.CourseList, archive_id=archive_id)})
+
+            # Create the items
+            collection['items'] = [item_fragment(Exam, exam['exam_id'], exam, exam_item, fields) for exam in exams]
+
+            next_link = next_page_link(collection['href'], exams, page, 'exam_id')
+            if next_link:
+                collection_links.append(next_link)
+
+            # Return the response with status code 200 and Collection+JSON mime type and URL to Exam profile
+            return Response (dumps(envelope), 200, mimetype=COLLECTIONJSON+";"+EXAM_PROFILE)
+
+        # Concurrent identical requests share one build of the list
+        return coalesced_response(ArchiveExamList, (archive_id,), build)
+
+
 class Exam(Resource):
     '''
     Resource Exam implementation
@@ -314,6 +527,7 @@ class Exam(Resource):
         `404` Course not found. The course was not found.
         `404` Not found. Given exam not found.
 
+        The response has an ETag header, which can be given in If-Match header of PUT and DELETE requests.
         In case of error, the response media type Problem+JSON is returned with the error message above.
         '''
 
@@ -346,26 +560,19 @@ class Exam(Resource):
         collection_links = []
         envelope["collection"] = collection
         collection['version'] = API_VERSION
-        collection['href'] = api.url_for(Exam, archive_id=archive_id, course_id=course_id, exam_id=exam_id)
+        collection['href'] = href(Exam, archive_id=archive_id, course_id=course_id, exam_id=exam_id)
         collection['links'] = collection_links
 
         collection_links.append({'name':"parent_course",
                                  'prompt':'Course %s' % course['course_name'],
-                                 'rel':'course','href': api.url_for(course_resource.Course, archive_id=archive_id,
-                                                                    course_id=course_id)})
+                                 'rel':'course','href': href(course_resource.Course, archive_id=archive_id,
+                                                             course_id=course_id)})
 
         collection_links.append({'name':"exam_list",
                                  'prompt':'List of all exams in the course %s' % course['course_name'],
-                                 'rel':'exams','href': api.url_for(ExamList, archive_id=archive_id, course_id=course_id)})
+                                 'rel':'exams','href': href(ExamList, archive_id=archive_id, course_id=course_id)})
 
-        collection['template'] = {
-            "data" : [
-                {"prompt" : "Insert examiner ID", "name" : "examinerId", "value" : "", "required":False},
-                {"prompt" : "Insert exam date (YYYY-MM-DD)", "name" : "date", "value" : "", "required":False},
-                {"prompt" : "Insert exam file attachment", "name" : "associatedMedia", "value" : "", "required":False},
-                {"prompt" : "Insert exam language ID", "name" : "inLanguage", "value" : "", "required":False}
-            ]
-        }
+        collection['template'] = EXAM_TEMPLATE
 
         # Create the items
         items = []
@@ -384,7 +591,7 @@ class Exam(Resource):
         item = {}
         data = []
         links = []
-        item['href'] = api.url_for(Exam, archive_id=archive_id, course_id=course_id, exam_id=exam_id)
+        item['href'] = href(Exam, archive_id=archive_id, course_id=course_id, exam_id=exam_id)
         item['read-only'] = True
         item['data'] = data
         item['links'] = links
@@ -398,7 +605,7 @@ class Exam(Resource):
 
         examiner_id = exam['examiner_id']
         if examiner_id:
-            teacher = g.db.get_teacher(examiner_id)
+            teacher = g.db.get_lookups().teachers_by_id[unicode(examiner_id)]
             teacher_name = "%s %s" % (teacher['first_name'], teacher['last_name'])
             data.append({'name':'examinerId', 'value':examiner_id})
             data.append({'name':'examinerName', 'value':teacher_name})
@@ -410,7 +617,7 @@ class Exam(Resource):
             data.append({'name':'modifier', 'value':modifier_name})
 
         link = {'name':"%s_exams" % course_code, 'prompt':'Other exams of the course %s' % course_name,
-                   'rel':'exams','href': api.url_for(ExamList, archive_id=archive_id, course_id=course_id)}
+                   'rel':'exams','href': href(ExamList, archive_id=archive_id, course_id=course_id)}
         links.append(link)
 
         items.append(item)
@@ -418,7 +625,9 @@ class Exam(Resource):
         collection['items'] = items
 
         # Return the response with status code 200 and Collection+JSON mime type and URL to Course profile
-        return Response (json.dumps(envelope), 200, mimetype=COLLECTIONJSON+";"+EXAM_PROFILE)
+        response = Response (dumps(envelope), 200, mimetype=COLLECTIONJSON+";"+EXAM_PROFILE)
+        response.set_etag(entity_tag(exam))
+        return response
 
     
     @auth.login_required
@@ -436,6 +645,7 @@ class Exam(Resource):
 
         * `Accept`: application/json
         * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+        * `If-Match`: Optional ETag of the exam as returned by GET. The exam is updated only if it matches.
 
         ENTITY BODY OUT FORMAT:
 
@@ -458,6 +668,7 @@ class Exam(Resource):
         `404` Course not found. The course was not found.
         `404` Exam not found. The exam was not found.
         `409` Error adding new exam. Another exam already exists within the same course, with same date and language.
+        `412` Precondition failed. The exam has been modified since it was fetched.
         `415` Unsupported media type. Use a JSON compatible format.
         `500` Database error. Please, contact the administrator.
 
@@ -490,9 +701,13 @@ class Exam(Resource):
 
         # Get the given exam from the database
         exam = g.db.get_exam(exam_id)
-        if not course:
+        if not exam:
             return error_response(404, "Exam not found", "The exam was not found")
 
+        # Check that the exam has not been modified since the client fetched it
+        if precondition_failed(exam):
+            return error_response(412, "Precondition failed", "The exam has been modified since it was fetched")
+
         # Get the date from template. If the template is malformed, catch the exception and report an error.
         try:
             data = input['template']['data']
@@ -520,8 +735,11 @@ class Exam(Resource):
 
         # Try to create the new exam
         try:
-            new_exam_id = g.db.edit_exam(exam_id, course_id, examiner_id, date, file_attachment, language_id, modifier_id)
+            new_exam_id = g.db.edit_exam(exam_id, course_id, examiner_id, date, file_attachment, language_id, modifier_id,
+                                         if_match_modified(exam))
 
+        except ExamDatabaseErrorModified:
+            return error_response(412, "Precondition failed", "The exam has been modified since it was fetched")
         except ExamDatabaseErrorExists as e:
             return error_response(409, "Error adding new exam", "Another exam already exists within the same course, with same date and language")
         except ValueError:
@@ -531,7 +749,7 @@ class Exam(Resource):
             return error_response(500, "Database error", "Please, contact the administrator")
 
         # Create the location header with the examname of the newly added exam
-        url = api.url_for(Exam, archive_id=archive_id, course_id=course_id, exam_id=new_exam_id)
+        url = href(Exam, archive_id=archive_id, course_id=course_id, exam_id=new_exam_id)
 
         # Return the response with status code 200 and location header with URL pointing to new resource
         return Response(status=200, headers={'Location':url}, mimetype=DEFAULTJSON)
@@ -552,6 +770,7 @@ class Exam(Resource):
 
         * `Accept`: application/json
         * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+        * `If-Match`: Optional ETag of the exam as returned by GET. The exam is deleted only if it matches.
 
         RETURN CODES:
 
@@ -559,6 +778,7 @@ class Exam(Resource):
         `401` Not logged in. You are not logged in, unable delete the user.
         `403` Access forbidden. You are not authorizated. (must be a user of type 'super')
         `404` Exam not found. Given exam was not found.
+        `412` Precondition failed. The exam has been modified since it was fetched.
         `500` Database error. Please, contact the adminnistrator.
 
         In case of error, the response media type Problem+JSON is returned with the error message above.
@@ -575,8 +795,15 @@ class Exam(Resource):
         if not exam:
             return error_response(404, "Exam not found", "Given exam was not found")
 
+        # Check that the exam has not been modified since the client fetched it
+        if precondition_failed(exam):
+            return error_response(412, "Precondition failed", "The exam has been modified since it was fetched")
+
         # Try to delete the exam
-        success = g.db.remove_exam(exam_id)
+        try:
+            success = g.db.remove_exam(exam_id, if_match_modified(exam))
+        except ExamDatabaseErrorModified:
+            return error_response(412, "Precondition failed", "The exam has been modified since it was fetched")
 
         if not success:
             return error_response(500, "Database error", "Please, contact the adminnistrator")
@@ -703,13 +930,15 @@ class ExamUpload(Resource):
             start_bytes = int(range_str.split(' ')[1].split('-')[0])
 
             # append chunk to the file on disk, or create new
-            with open(pathname, 'a') as f:
-                f.seek(start_bytes)
-                f.write(file.stream.read())
+            with tracing.span('file.write', path=pathname, offset=start_bytes):
+                with open(pathname, 'a') as f:
+                    f.seek(start_bytes)
+                    f.write(file.stream.read())
 
         else:
             # This is not a chunked request, so just save the whole file
-            file.save(pathname)
+            with tracing.span('file.write', path=pathname):
+                file.save(pathname)
 
         # Update to filename to database
         try:
@@ -0,0 +1,173 @@
+# coding=UTF-8
+#
+# Provides the RESTful API resources for exporting the exams of a course or an archive as a ZIP file.
+#
+# @authors: Ari Kairala, Petteri Ponsimaa
+
+
+import json, os, hashlib
+
+from flask import Flask, request, Response, g, jsonify
+from flask.ext.restful import Resource, Api, abort
+from werkzeug import secure_filename
+
+from zip_stream import stream_zip
+from resources_common import auth, app, api, error_response, trace_body
+
+MANIFEST = 'manifest.json'
+''' Name of the file describing the exams in the exported ZIP file. '''
+
+def export_response(archive_id, courses, exams, filename):
+    '''
+    Create a response streaming the exam files of the given courses as a ZIP file, with a manifest of the exams.
+    The ZIP file is built while it is sent. The response has a strong ETag calculated from the exams and the sizes
+    and modification times of their files, and status code 304 is returned if it matches the If-None-Match header.
+
+    INPUT:
+
+    * `archive_id`: ID of the archive of the courses.
+    * `courses`: List of the courses as returned by browse_courses.
+    * `exams`: List of the exams of the courses as returned by browse_exams.
+    * `filename`: Name of the ZIP file suggested to the client.
+    '''
+    teachers = g.db.get_lookups().teachers_by_id
+    courses = dict((course['course_id'], course) for course in courses)
+
+    entries = []
+    manifest = {'archiveId': archive_id, 'exams': []}
+    files = []
+    names = set()
+    for exam in exams:
+        course = courses[exam['course_id']]
+        examiner = teachers.get(unicode(exam['examiner_id']))
+
+        # Find the file of the exam from the upload folder
+        name = None
+        attachment = exam['file_attachment']
+        path = os.path.join(app.static_folder, secure_filename(os.path.basename(attachment))) if attachment else None
+        if path and os.path.isfile(path):
+            name = "%s/%s" % (secure_filename(course['course_code']) or course['course_id'], os.path.basename(path))
+            if name in names:
+                name = "%s/%s_%s" % (name.split('/')[0], exam['exam_id'], os.path.basename(path))
+            names.add(name)
+            entries.append((name, path, None))
+            stat = os.stat(path)
+            files.append((name, stat.st_size, stat.st_mtime))
+
+        manifest['exams'].append({'examId': exam['exam_id'],
+                                  'courseId': exam['course_id'],
+                                  'courseCode': course['course_code'],
+                                  'courseName': course['course_name'],
+                                  'date': exam['date'],
+                                  'inLanguage': exam['language_id'],
+                                  'examinerName': "%s %s" % (examiner['first_name'], examiner['last_name'])
+                                                  if examiner else None,
+                                  'dateModified': exam['last_modified'],
+                                  'file': name})
+
+    data = json.dumps(manifest, indent=2, sort_keys=True)
+    etag = hashlib.sha256(data + json.dumps(files)).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    # The manifest has the time of the newest file, so that the same exams always produce the same ZIP file
+    timestamp = max([mtime for name, size, mtime in files] or [315532800])
+    entries.insert(0, (MANIFEST, None, data))
+
+    trace_body('zip.write', entries=len(entries))
+    response = Response(stream_zip(entries, timestamp), 200, mimetype='application/zip', direct_passthrough=True)
+    response.headers['Content-Disposition'] = 'attachment; filename=%s' % filename
+    response.set_etag(etag)
+    return response
+
+# Define the resources
+class CourseExport(Resource):
+    '''
+    Resource CourseExport implementation
+    '''
+
+    @auth.login_required
+    def get(self, archive_id, course_id):
+        '''
+        Download all the exams of a course as a ZIP file. The exam files are stored in the ZIP file as such, and a
+        manifest.json file describes the exams.
+
+        INPUT:
+
+        * `archive_id`: Identifier of the archive in which the course belongs to
+        * `course_id`: Identifier of the course
+
+        HEADERS:
+
+        * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+        * `If-None-Match`: Optional ETag of the ZIP file as returned by GET. If the exams have not changed, status
+        code 304 is returned without a body.
+
+        RETURN CODES:
+
+        `200` The ZIP file is streamed in the body of the response.
+        `304` Not modified. The exams have not changed since the ETag given in If-None-Match header.
+        `401` Not logged in. You are not logged in, unable to get the exams.
+        `403` Access forbidden. You are not authorizated to access the exams.
+        `404` Course not found. The course was not found.
+
+        In case of error, the response media type Problem+JSON is returned with the error message above.
+        '''
+
+        if g.no_auth_provided:
+            return error_response(401, "Not logged in", "You are not logged in, unable to get the exams")
+        if not g.user_logged_in or (g.user_type in ['basic','admin'] and g.user_archive != archive_id):
+            return error_response(403, "Access forbidden", "You are not authorizated to access the exams")
+
+        course = g.db.get_course(course_id)
+        if not course or course['archive_id'] != archive_id:
+            return error_response(404, "Course not found", "The course was not found")
+
+        filename = "%s_exams.zip" % (secure_filename(course['course_code']) or course_id)
+        return export_response(archive_id, [course], g.db.browse_exams(course_id), filename)
+
+class ArchiveExport(Resource):
+    '''
+    Resource ArchiveExport implementation
+    '''
+
+    @auth.login_required
+    def get(self, archive_id):
+        '''
+        Download all the exams of an archive as a ZIP file, the exams of each course in a folder named by the course
+        code. The exam files are stored in the ZIP file as such, and a manifest.json file describes the exams.
+
+        INPUT:
+
+        * `archive_id`: Identifier of the archive
+
+        HEADERS:
+
+        * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+        * `If-None-Match`: Optional ETag of the ZIP file as returned by GET. If the exams have not changed, status
+        code 304 is returned without a body.
+
+        RETURN CODES:
+
+        `200` The ZIP file is streamed in the body of the response.
+        `304` Not modified. The exams have not changed since the ETag given in If-None-Match header.
+        `401` Not logged in. You are not logged in, unable to get the exams.
+        `403` Access forbidden. You are not authorizated to access the exams.
+        `404` Archive not found. The archive was not found.
+
+        In case of error, the response media type Problem+JSON is returned with the error message above.
+        '''
+
+        if g.no_auth_provided:
+            return error_response(401, "Not logged in", "You are not logged in, unable to get the exams")
+        if not g.user_logged_in or (g.user_type in ['basic','admin'] and g.user_archive != archive_id):
+            return error_response(403, "Access forbidden", "You are not authorizated to access the exams")
+
+        if not g.db.get_archive(archive_id):
+            return error_response(404, "Archive not found", "The archive was not found")
+
+        filename = "archive_%s_exams.zip" % archive_id
+        return export_response(archive_id, g.db.browse_courses(archive_id), g.db.browse_archive_exams(archive_id),
+                               filename)
@@ -0,0 +1,145 @@
+# coding=UTF-8
+#
+# Provides the RESTful API resources for listing the languages of the Examrium.
+#
+# @authors: Ari Kairala, Petteri Ponsimaa
+
+
+import json
+
+from flask import Flask, request, Response, g, jsonify
+from flask.ext.restful import Resource, Api, abort
+from resources_common import auth, app, api, error_response, API_VERSION, LANGUAGE_PROFILE, snapshot_response, \
+    href
+
+def language_item(language):
+    '''
+    Create a Collection+JSON item of a language as returned by browse_languages.
+    '''
+    item = {}
+    data = []
+    item['href'] = href(Language, language_id=language['language_id'])
+    item['read-only'] = True
+    item['data'] = data
+
+    data.append({'name':'inLanguage', 'value':language['language_id']})
+    data.append({'name':'name', 'value':language['language_name']})
+    return item
+
+# Define the resources
+class LanguageList(Resource):
+    '''
+    Resource LanguageList implementation
+    '''
+
+    @auth.login_required
+    def get(self):
+        '''
+        Get a list of the languages of courses and exams. The list is served from the lookup snapshot of the database
+        API.
+
+        INPUT:
+
+        * `None`
+
+        HEADERS:
+
+        * `Accept`: application/json
+        * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+        * `If-None-Match`: Optional ETag of the list as returned by GET. If the list has not changed, status code 304
+        is returned without a body.
+
+        ENTITY BODY OUTPUT FORMAT:
+
+        * `Media type`: Collection+JSON:
+            http://amundsen.com/media-types/collection/
+
+        * `Profile`: Language profile
+            http://atlassian.virtues.fi:8090/display/PWP/PWP11#PWP11-Languageprofile
+
+        The response has a strong ETag header, which changes only when the languages change.
+
+        RETURN CODES:
+
+        `200` A list of languages was returned succesfully.
+        `304` Not modified. The list has not changed since the ETag given in If-None-Match header.
+        `401` Not logged in. You are not logged in, unable to get language information.
+
+        In case of error, the response media type Problem+JSON is returned with the error message above.
+        '''
+
+        if g.no_auth_provided:
+            return error_response(401, "Not logged in", "You are not logged in, unable to get language information")
+
+        lookups = g.db.get_lookups()
+
+        # Create the envelope
+        envelope = {}
+        collection = {}
+        envelope["collection"] = collection
+        collection['version'] = API_VERSION
+        collection['href'] = href(LanguageList)
+        collection['items'] = [language_item(language) for language in lookups.languages]
+
+        # Return the response with Collection+JSON mime type, URL to Language profile and the ETag of the languages
+        return snapshot_response(envelope, lookups.languages_etag, LANGUAGE_PROFILE)
+
+class Language(Resource):
+    '''
+    Resource Language implementation
+    '''
+
+    @auth.login_required
+    def get(self, language_id):
+        '''
+        Get the details of a language from the lookup snapshot of the database API.
+
+        INPUT:
+
+        * `language_id`: Language identifier, e.g. 'fi'.
+
+        HEADERS:
+
+        * `Accept`: application/json
+        * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+        * `If-None-Match`: Optional ETag of the language as returned by GET. If the languages have not changed,
+        status code 304 is returned without a body.
+
+        ENTITY BODY OUTPUT FORMAT:
+
+        * `Media type`: Collection+JSON:
+            http://amundsen.com/media-types/collection/
+
+        * `Profile`: Language profile
+            http://atlassian.virtues.fi:8090/display/PWP/PWP11#PWP11-Languageprofile
+
+        RETURN CODES:
+
+        `200` Language information was returned succesfully.
+        `304` Not modified. The languages have not changed since the ETag given in If-None-Match header.
+        `401` Not logged in. You are not logged in, unable to get language information.
+        `404` Not found. Language not found.
+
+        In case of error, the response media type Problem+JSON is returned with the error message above.
+        '''
+
+        if g.no_auth_provided:
+            return error_response(401, "Not logged in", "You are not logged in, unable to get language information")
+
+        lookups = g.db.get_lookups()
+        language = lookups.languages_by_id.get(language_id)
+        if language is None:
+            return error_response(404, "Not found", "Language not found")
+
+        # Create the envelope
+        envelope = {}
+        collection = {}
+        envelope["collection"] = collection
+        collection['version'] = API_VERSION
+        collection['href'] = href(Language, language_id=language_id)
+        collection['links'] = [{'name':"language_list", 'prompt':'Language list', 'rel':'languages',
+                                'href': href(LanguageList)}]
+        collection['items'] = [language_item(language)]
+
+        # Return the response with Collection+JSON mime type, URL to Language profile and the ETag of the languages
+        return snapshot_response(envelope, lookups.languages_etag, LANGUAGE_PROFILE)
@@ -0,0 +1,286 @@
+# coding=UTF-8
+#
+# Provides the RESTful API resources for profiling the live requests of the Examrium.
+#
+# @authors: Ari Kairala, Petteri Ponsimaa
+
+
+import profiler
+
+from flask import Flask, request, Response, g, jsonify
+from flask.ext.restful import Resource, Api, abort
+from resources_common import auth, app, api, error_response, API_VERSION, COLLECTIONJSON, DEFAULTJSON, href, dumps, \
+    fragment
+
+PROFILE_TEMPLATE = fragment({
+    "data" : [
+        {"prompt" : "Insert fraction of the requests profiled (0-1)", "name" : "fraction", "value" : "",
+         "required":True},
+        {"prompt" : "Insert profiling mode (cprofile or sampler)", "name" : "mode", "value" : "", "required":False}
+    ]
+})
+''' Pre-encoded Collection+JSON template of the Profile resource. '''
+
+PROFILE_FORMATS = {'pstats': 'application/octet-stream', 'collapsed': 'text/plain'}
+''' Media types of the downloadable profile formats. '''
+
+def request_profiler():
+    '''
+    Return the profiler of the application.
+    '''
+    return profiler.profiler(app.config['PROFILE_FOLDER'], app.config['PROFILE_SAMPLE_INTERVAL'])
+
+def profile_item(endpoint, switch, requests):
+    '''
+    Create a Collection+JSON item of the profiling of an endpoint.
+
+    INPUT:
+
+    * `endpoint`: The name of the endpoint, e.g. examlist.
+    * `switch`: The (fraction, mode) list of the profiling switch of the endpoint, or None if it is switched off.
+    * `requests`: The number of requests profiled.
+    '''
+    item = {}
+    data = []
+    links = []
+    item['href'] = href(Profile, endpoint_name=endpoint)
+    item['read-only'] = True
+    item['data'] = data
+    item['links'] = links
+
+    data.append({'name':'endpoint', 'value':endpoint})
+    data.append({'name':'fraction', 'value':switch[0] if switch else 0})
+    data.append({'name':'mode', 'value':switch[1] if switch else None})
+    data.append({'name':'requests', 'value':requests})
+
+    for profile_format in sorted(PROFILE_FORMATS):
+        links.append({'name':profile_format, 'prompt':'Profile of %s as %s' % (endpoint, profile_format),
+                      'rel':'profile', 'href': item['href'] + '?format=' + profile_format})
+    return item
+
+# Define the resources
+class ProfileList(Resource):
+    '''
+    Resource ProfileList implementation
+    '''
+
+    @auth.login_required
+    def get(self):
+        '''
+        Get a list of the endpoints profiled or having profiles. Authorization is required (user must be of type
+        'super').
+
+        INPUT:
+
+        * `None`
+
+        HEADERS:
+
+        * `Accept`: application/json
+        * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+
+        ENTITY BODY OUTPUT FORMAT:
+
+        * `Media type`: Collection+JSON:
+            http://amundsen.com/media-types/collection/
+
+        RETURN CODES:
+
+        `200` A list of profiles was returned succesfully.
+        `401` Not logged in. You are not logged in, unable to get profiling information.
+        `403` Access forbidden. You are not authorizated to access the profiles.
+
+        In case of error, the response media type Problem+JSON is returned with the error message above.
+        '''
+
+        if g.no_auth_provided:
+            return error_response(401, "Not logged in", "You are not logged in, unable to get profiling information")
+        if not g.user_logged_in or g.user_type != 'super':
+            return error_response(403, "Access forbidden", "You are not authorizated to access the profiles")
+
+        switches = request_profiler().get_switches()
+        requests = request_profiler().profiles()
+
+        # Create the envelope
+        envelope = {}
+        collection = {}
+        envelope["collection"] = collection
+        collection['version'] = API_VERSION
+        collection['href'] = href(ProfileList)
+        collection['items'] = [profile_item(endpoint, switches.get(endpoint), requests.get(endpoint, 0))
+                               for endpoint in sorted(set(switches) | set(requests))]
+
+        # Return the response with status code 200 and Collection+JSON mime type
+        return Response(dumps(envelope), 200, mimetype=COLLECTIONJSON)
+
+class Profile(Resource):
+    '''
+    Resource Profile implementation
+    '''
+
+    @auth.login_required
+    def get(self, endpoint_name):
+        '''
+        Get the profiling switch of an endpoint, or download the profile of the endpoint merged over all the worker
+        processes. Authorization is required (user must be of type 'super').
+
+        INPUT:
+
+        * `endpoint_name`: Name of the endpoint, e.g. examlist.
+        * `format`: Optional query parameter. With ?format=pstats, the cProfile profile is returned in the format of
+        pstats.Stats.dump_stats, to be read with pstats or e.g. snakeviz. With ?format=collapsed, the sampled stacks
+        are returned as collapsed stacks to be read with flamegraph.pl or speedscope.
+
+        HEADERS:
+
+        * `Accept`: application/json
+        * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+
+        ENTITY BODY OUTPUT FORMAT:
+
+        * `Media type`: Collection+JSON:
+            http://amundsen.com/media-types/collection/
+        * `Media type`: application/octet-stream with ?format=pstats, text/plain with ?format=collapsed.
+
+        RETURN CODES:
+
+        `200` The profiling information or the profile was returned succesfully.
+        `400` Invalid format parameter. The format must be pstats or collapsed.
+        `401` Not logged in. You are not logged in, unable to get profiling information.
+        `403` Access forbidden. You are not authorizated to access the profiles.
+        `404` Not found. The endpoint does not exist, or it has no profile in the given format.
+
+        In case of error, the response media type Problem+JSON is returned with the error message above.
+        '''
+
+        if g.no_auth_provided:
+            return error_response(401, "Not logged in", "You are not logged in, unable to get profiling information")
+        if not g.user_logged_in or g.user_type != 'super':
+            return error_response(403, "Access forbidden", "You are not authorizated to access the profiles")
+
+        if endpoint_name not in app.view_functions:
+            return error_response(404, "Not found", "The endpoint does not exist")
+
+        profile_format = request.args.get('format')
+        if profile_format is not None:
+            if profile_format not in PROFILE_FORMATS:
+                return error_response(400, "Invalid format parameter", "The format must be pstats or collapsed")
+            if profile_format == 'pstats':
+                data = request_profiler().pstats_profile(endpoint_name)
+            else:
+                data = request_profiler().collapsed_stacks(endpoint_name)
+            if data is None:
+                return error_response(404, "Not found", "The endpoint has no profile in the given format")
+            filename = '%s.%s' % (endpoint_name, profile_format)
+            return Response(data, 200, mimetype=PROFILE_FORMATS[profile_format],
+                            headers={'Content-Disposition': 'attachment; filename=%s' % filename})
+
+        # Create the envelope
+        envelope = {}
+        collection = {}
+        envelope["collection"] = collection
+        collection['version'] = API_VERSION
+        collection['href'] = href(Profile, endpoint_name=endpoint_name)
+        collection['links'] = [{'name':"profile_list", 'prompt':'Profile list', 'rel':'profiles',
+                                'href': href(ProfileList)}]
+        collection['template'] = PROFILE_TEMPLATE
+        collection['items'] = [profile_item(endpoint_name, request_profiler().get_switches().get(endpoint_name),
+                                            request_profiler().profiles().get(endpoint_name, 0))]
+
+        # Return the response with status code 200 and Collection+JSON mime type
+        return Response(dumps(envelope), 200, mimetype=COLLECTIONJSON)
+
+    @auth.login_required
+    def put(self, endpoint_name):
+        '''
+        Switch the profiling of an endpoint on or off. The given fraction of the requests to the endpoint is profiled
+        with the given mode by all the worker processes within a second. A fraction of 0 switches the profiling off,
+        but keeps the profiles. Authorization is required (user must be of type 'super').
+
+        INPUT:
+
+        * `endpoint_name`: Name of the endpoint, e.g. examlist.
+        * `Media type`: Collection+JSON template containing the fraction of the requests profiled (0-1) and the
+        optional mode: cprofile (default) records every function call, sampler records the stacks of the request
+        every PROFILE_SAMPLE_INTERVAL seconds with less overhead.
+
+        HEADERS:
+
+        * `Accept`: application/json
+        * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+
+        RETURN CODES:
+
+        `200` The profiling switch was set successfully.
+        `400` Error in request format. Request format does not follow the template.
+        `401` Not logged in. You are not logged in, unable to profile the endpoint.
+        `403` Access forbidden. You are not authorizated to profile the endpoint.
+        `404` Not found. The endpoint does not exist.
+        `415` Unsupported media type: Use a JSON compatible format.
+
+        In case of error, the response media type Problem+JSON is returned with the error message above.
+        '''
+
+        if g.no_auth_provided:
+            return error_response(401, "Not logged in", "You are not logged in, unable to profile the endpoint")
+        if not g.user_logged_in or g.user_type != 'super':
+            return error_response(403, "Access forbidden", "You are not authorizated to profile the endpoint")
+
+        if endpoint_name not in app.view_functions:
+            return error_response(404, "Not found", "The endpoint does not exist")
+
+        input = request.get_json(force=True, silent=True)
+        if not input:
+            return error_response(415, "Unsupported media type", "Use a JSON compatible format")
+
+        try:
+            fraction = None
+            mode = 'cprofile'
+            for d in input['template']['data']:
+                if d['name'] == 'fraction':
+                    fraction = float(d['value'])
+                elif d['name'] == 'mode':
+                    mode = d['value']
+            request_profiler().set_switch(endpoint_name, fraction, mode)
+        except (KeyError, TypeError, ValueError):
+            return error_response(400, "Error in request format", "Request format does not follow the template")
+
+        url = href(Profile, endpoint_name=endpoint_name)
+        return Response(status=200, headers={'Location':url}, mimetype=DEFAULTJSON)
+
+    @auth.login_required
+    def delete(self, endpoint_name):
+        '''
+        Switch the profiling of an endpoint off and remove its profiles. Authorization is required (user must be of
+        type 'super').
+
+        INPUT:
+
+        * `endpoint_name`: Name of the endpoint, e.g. examlist.
+
+        HEADERS:
+
+        * `Accept`: application/json
+        * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+
+        RETURN CODES:
+
+        `204` The profiling was switched off and the profiles removed successfully.
+        `401` Not logged in. You are not logged in, unable to remove the profiles.
+        `403` Access forbidden. You are not authorizated to remove the profiles.
+        `404` Not found. The endpoint does not exist.
+
+        In case of error, the response media type Problem+JSON is returned with the error message above.
+        '''
+
+        if g.no_auth_provided:
+            return error_response(401, "Not logged in", "You are not logged in, unable to remove the profiles")
+        if not g.user_logged_in or g.user_type != 'super':
+            return error_response(403, "Access forbidden", "You are not authorizated to remove the profiles")
+
+        if endpoint_name not in app.view_functions:
+            return error_response(404, "Not found", "The endpoint does not exist")
+
+        request_profiler().set_switch(endpoint_name, 0)
+        request_profiler().clear(endpoint_name)
+        return Response(status=204)
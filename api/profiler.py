@@ -0,0 +1,312 @@
+# coding=UTF-8
+#
+# Provides the on-demand profiling of the live requests of the Exam Archive. A fraction of the requests to an endpoint
+# is profiled with cProfile or with a stack sampler, and the profiles are aggregated by the endpoints in a folder
+# shared by the worker processes.
+#
+# @authors: Ari Kairala, Petteri Ponsimaa
+
+import os
+import sys
+import glob
+import json
+import time
+import pstats
+import random
+import marshal
+import cProfile
+import tempfile
+import threading
+import collections
+
+DEFAULT_FOLDER = os.path.join(tempfile.gettempdir(), 'exam_archive_profiles')
+''' Default folder of the profiling switches and the profiles. '''
+
+DEFAULT_SAMPLE_INTERVAL = 0.005
+''' Default number of seconds between the samples of the stack sampler. '''
+
+MODES = ('cprofile', 'sampler')
+''' Profiling modes. cprofile records every function call and produces pstats profiles, sampler records the stacks
+of the request threads at intervals and produces collapsed stacks for flame graphs. '''
+
+SWITCH_CHECK_INTERVAL = 1.0
+''' Number of seconds the profiling switches read from the switch file are used before checking it again. '''
+
+SWITCH_FILE = 'switches.json'
+''' Name of the file holding the profiling switches in the profile folder. '''
+
+PROFILERS = {}
+''' Profilers by the absolute paths of their folders. '''
+
+PROFILERS_LOCK = threading.Lock()
+''' Lock for creating the profilers. '''
+
+
+def _write(path, data):
+    '''
+    Replace a file atomically, so that the other processes never read it half written.
+    '''
+    temp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.rename(temp_path, path)
+
+def _frame_name(code):
+    '''
+    Name a frame of a collapsed stack by its function, file and line.
+    '''
+    return '%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+class StackSampler(object):
+    '''
+    Sampler recording the stacks of the registered threads at intervals in a background thread. The background
+    thread waits without sampling while no threads are registered.
+    '''
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.threads = {}
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def start(self, stacks):
+        '''
+        Start sampling the current thread, counting the collapsed stacks in the Counter stacks.
+        '''
+        with self.lock:
+            self.threads[threading.current_thread().ident] = stacks
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='StackSampler')
+                self.thread.daemon = True
+                self.thread.start()
+        self.wakeup.set()
+
+    def stop(self):
+        '''
+        Stop sampling the current thread. The stacks are not modified after stop returns.
+        '''
+        with self.lock:
+            self.threads.pop(threading.current_thread().ident, None)
+
+    def _run(self):
+        while True:
+            self.wakeup.clear()
+            with self.lock:
+                if self.threads:
+                    frames = sys._current_frames()
+                    for ident, stacks in self.threads.items():
+                        frame = frames.get(ident)
+                        names = []
+                        while frame is not None:
+                            names.append(_frame_name(frame.f_code))
+                            frame = frame.f_back
+                        if names:
+                            stacks[';'.join(reversed(names))] += 1
+                    sleep = True
+                else:
+                    sleep = False
+            if sleep:
+                time.sleep(self.interval)
+            else:
+                self.wakeup.wait()
+
+
+class RequestProfile(object):
+    '''
+    Profile of a single request, started with Profiler.start and finished with Profiler.finish.
+    '''
+    __slots__ = ('endpoint', 'mode', 'profile', 'stacks')
+
+    def __init__(self, endpoint, mode):
+        self.endpoint = endpoint
+        self.mode = mode
+        self.profile = cProfile.Profile() if mode == 'cprofile' else None
+        self.stacks = collections.Counter() if mode == 'sampler' else None
+
+
+class Profiler(object):
+    '''
+    Profiler of the requests of the worker processes sharing a folder. The switch file in the folder tells the
+    fraction of the requests profiled and the profiling mode by the endpoints, and it is read again only when it has
+    changed, at most once per SWITCH_CHECK_INTERVAL seconds. Each process aggregates the profiles of its requests by
+    the endpoints, and writes them to files of its own in the folder. The files of all the processes are merged when
+    the profiles are read.
+    '''
+
+    def __init__(self, folder, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.folder = folder
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.sampler = StackSampler(interval)
+        self.switches = {}
+        self.switches_checked = 0
+        self.switches_mtime = None
+        self.stats = {}
+        self.stacks = {}
+        self.requests = collections.Counter()
+
+    def _path(self, name):
+        return os.path.join(self.folder, name)
+
+    def _read_switches(self):
+        '''
+        Read the switch file, if it has changed since it was read last time.
+        '''
+        try:
+            mtime = os.stat(self._path(SWITCH_FILE)).st_mtime
+        except OSError:
+            mtime = None
+        if mtime != self.switches_mtime:
+            try:
+                with open(self._path(SWITCH_FILE)) as f:
+                    self.switches = json.load(f)
+            except (IOError, ValueError):
+                self.switches = {}
+            self.switches_mtime = mtime
+
+    def get_switches(self, now=None):
+        '''
+        Get the profiling switches as a dictionary of (fraction, mode) lists by the endpoints. The dictionary must not
+        be modified.
+        '''
+        if now is None:
+            now = time.time()
+        if now - self.switches_checked >= SWITCH_CHECK_INTERVAL:
+            with self.lock:
+                self._read_switches()
+                self.switches_checked = now
+        return self.switches
+
+    def set_switch(self, endpoint, fraction, mode='cprofile'):
+        '''
+        Profile the given fraction of the requests to an endpoint with the given mode, or stop profiling the endpoint
+        if fraction is 0. The switch is seen by all the processes within SWITCH_CHECK_INTERVAL seconds.
+        '''
+        if mode not in MODES or not 0 <= fraction <= 1:
+            raise ValueError("Invalid profiling switch")
+        with self.lock:
+            if not os.path.isdir(self.folder):
+                os.makedirs(self.folder)
+            self._read_switches()
+            switches = dict(self.switches)
+            if fraction:
+                switches[endpoint] = [fraction, mode]
+            else:
+                switches.pop(endpoint, None)
+            _write(self._path(SWITCH_FILE), json.dumps(switches))
+            self.switches, self.switches_checked = switches, 0
+
+    def start(self, endpoint):
+        '''
+        Start profiling the request of the current thread to an endpoint, if the endpoint is switched on and the
+        request is sampled. Returns the RequestProfile, or None if the request is not profiled. A request made while
+        another one is profiled in the same thread, e.g. a sub-request of a batch, is not profiled on its own.
+        '''
+        switch = self.get_switches().get(endpoint)
+        if switch is None or getattr(self.local, 'active', False) or random.random() >= switch[0]:
+            return None
+
+        profile = RequestProfile(endpoint, switch[1])
+        self.local.active = True
+        if profile.profile is not None:
+            profile.profile.enable()
+        else:
+            self.sampler.start(profile.stacks)
+        return profile
+
+    def finish(self, profile):
+        '''
+        Stop profiling a request, add its profile to the profile of the endpoint, and write the profile of the
+        endpoint of the process to the folder.
+        '''
+        if profile.profile is not None:
+            profile.profile.disable()
+        else:
+            self.sampler.stop()
+        self.local.active = False
+
+        endpoint = profile.endpoint
+        with self.lock:
+            self.requests[endpoint] += 1
+            prefix = self._path('%s.%d' % (endpoint, os.getpid()))
+            if profile.profile is not None:
+                if endpoint in self.stats:
+                    self.stats[endpoint].add(profile.profile)
+                else:
+                    self.stats[endpoint] = pstats.Stats(profile.profile)
+                _write(prefix + '.pstats', marshal.dumps(self.stats[endpoint].stats))
+            else:
+                self.stacks.setdefault(endpoint, collections.Counter()).update(profile.stacks)
+            _write(prefix + '.json', json.dumps({'requests': self.requests[endpoint],
+                                                 'stacks': self.stacks.get(endpoint, {})}))
+
+    def profiles(self):
+        '''
+        Get the number of profiled requests of all the processes by the endpoints.
+        '''
+        requests = collections.Counter()
+        for path in glob.glob(self._path('*.json')):
+            if os.path.basename(path) == SWITCH_FILE:
+                continue
+            try:
+                with open(path) as f:
+                    requests[os.path.basename(path).split('.')[0]] += json.load(f)['requests']
+            except (IOError, ValueError, KeyError):
+                continue
+        return dict(requests)
+
+    def pstats_profile(self, endpoint):
+        '''
+        Get the cProfile profiles of an endpoint merged over all the processes, in the format of the files written by
+        pstats.Stats.dump_stats, or None if there are no profiles.
+        '''
+        paths = glob.glob(self._path('%s.*.pstats' % endpoint))
+        if not paths:
+            return None
+        stats = pstats.Stats(*paths)
+        return marshal.dumps(stats.stats)
+
+    def collapsed_stacks(self, endpoint):
+        '''
+        Get the sampled stacks of an endpoint merged over all the processes as collapsed stacks, one line per stack
+        with the frames separated by semicolons and followed by the number of samples, as read by flamegraph.pl.
+        Returns None if there are no samples.
+        '''
+        stacks = collections.Counter()
+        for path in glob.glob(self._path('%s.*.json' % endpoint)):
+            try:
+                with open(path) as f:
+                    stacks.update(json.load(f)['stacks'])
+            except (IOError, ValueError, KeyError):
+                continue
+        if not stacks:
+            return None
+        return ''.join('%s %d\n' % (stack, count) for stack, count in sorted(stacks.items()))
+
+    def clear(self, endpoint):
+        '''
+        Remove the profiles of an endpoint written by all the processes. The processes still profiling the endpoint
+        keep adding to their own profiles.
+        '''
+        with self.lock:
+            self.stats.pop(endpoint, None)
+            self.stacks.pop(endpoint, None)
+            self.requests.pop(endpoint, None)
+            for path in glob.glob(self._path('%s.*.pstats' % endpoint)) + glob.glob(self._path('%s.*.json' % endpoint)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def profiler(folder=None, interval=DEFAULT_SAMPLE_INTERVAL):
+    '''
+    Return the shared Profiler object of a folder. If folder is None, DEFAULT_FOLDER is used instead.
+    '''
+    key = os.path.abspath(folder or DEFAULT_FOLDER)
+    with PROFILERS_LOCK:
+        if key not in PROFILERS:
+            PROFILERS[key] = Profiler(key, interval)
+        return PROFILERS[key]
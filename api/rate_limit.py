@@ -0,0 +1,137 @@
+# coding=UTF-8
+#
+# Provides the admission control of the Exam Archive: token buckets limiting the request rate of each user, shared by
+# the worker processes through a local SQLite database, and a limit of the concurrent requests of a process.
+#
+# @authors: Ari Kairala, Petteri Ponsimaa
+
+import os
+import time
+import sqlite3
+import tempfile
+import threading
+
+DEFAULT_STORE = os.path.join(tempfile.gettempdir(), 'exam_archive_rate_limits.db')
+''' Default path of the SQLite database holding the token buckets. '''
+
+DEFAULT_RATES = {'read': (50.0, 200), 'write': (5.0, 50), 'upload': (0.5, 10), 'download': (1.0, 10)}
+''' Default rates (tokens per second) and burst sizes (maximum tokens) of the token buckets by the endpoint classes. '''
+
+DEFAULT_MAX_CONCURRENT = 64
+''' Default maximum number of requests served at the same time by a process. '''
+
+PRUNE_INTERVAL = 1000
+''' Number of requests admitted between removing the buckets, which have been full for a while. '''
+
+STORES = {}
+''' Token bucket stores by the absolute paths of their databases. '''
+
+STORES_LOCK = threading.Lock()
+''' Lock for creating the token bucket stores and concurrency limits. '''
+
+LIMITS = {}
+''' Concurrency limits of the process by their sizes. '''
+
+
+class TokenBuckets(object):
+    '''
+    Token buckets stored in a SQLite database, so that all the worker processes of the server share them. Each
+    bucket is updated in its own transaction. The database is not synced to disk, because losing the buckets in a
+    crash only resets the limits.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.taken = 0
+
+    def _connect(self):
+        '''
+        Return the connection of the current thread. A new connection is opened after forking, because SQLite
+        connections must not be shared between processes.
+        '''
+        con = getattr(self.local, 'con', None)
+        if con is None or self.local.pid != os.getpid():
+            con = sqlite3.connect(self.path, timeout=1, isolation_level=None, check_same_thread=False)
+            con.execute('PRAGMA journal_mode = WAL')
+            con.execute('PRAGMA synchronous = OFF')
+            con.execute('CREATE TABLE IF NOT EXISTS bucket(key TEXT PRIMARY KEY, tokens REAL NOT NULL, '
+                        'updated REAL NOT NULL)')
+            self.local.con, self.local.pid = con, os.getpid()
+        return con
+
+    def take(self, key, rate, burst, now=None):
+        '''
+        Take a token from a bucket. The bucket is refilled at the given rate up to burst tokens, and a new bucket is
+        full.
+
+        INPUT:
+
+        * `key`: Key of the bucket, e.g. the endpoint class and the username.
+        * `rate`: Number of tokens added to the bucket per second.
+        * `burst`: Maximum number of tokens in the bucket.
+        * `now`: The current time as seconds since the epoch. If None, the current time is used.
+
+        OUTPUT:
+
+        * 0 if a token was taken, otherwise the number of seconds until the bucket has a token.
+        '''
+        if now is None:
+            now = time.time()
+        con = self._connect()
+        cur = con.cursor()
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            cur.execute('SELECT tokens, updated FROM bucket WHERE key = ?', (key,))
+            row = cur.fetchone()
+            tokens = burst if row is None else min(burst, row[0] + max(now - row[1], 0) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            cur.execute('INSERT OR REPLACE INTO bucket (key, tokens, updated) VALUES (?, ?, ?)', (key, tokens, now))
+            cur.execute('COMMIT')
+        except sqlite3.Error:
+            cur.execute('ROLLBACK')
+            raise
+
+        self.taken += 1
+        if self.taken % PRUNE_INTERVAL == 0:
+            self.prune(now)
+        return wait
+
+    def prune(self, now=None, max_age=3600):
+        '''
+        Remove the buckets not used for max_age seconds. A bucket is created full, so removing it does not change the
+        limit as long as the rate fills it in max_age seconds.
+        '''
+        if now is None:
+            now = time.time()
+        self._connect().execute('DELETE FROM bucket WHERE updated < ?', (now - max_age,))
+
+    def clear(self):
+        '''
+        Remove all the buckets.
+        '''
+        self._connect().execute('DELETE FROM bucket')
+
+
+def token_buckets(path=None):
+    '''
+    Return the shared TokenBuckets object of a database. If path is None, DEFAULT_STORE is used instead.
+    '''
+    key = os.path.abspath(path or DEFAULT_STORE)
+    with STORES_LOCK:
+        if key not in STORES:
+            STORES[key] = TokenBuckets(key)
+        return STORES[key]
+
+
+def concurrency_limit(size):
+    '''
+    Return the semaphore limiting the concurrent requests of the process to the given number. Acquire it without
+    blocking, a request is refused instead of queued when the limit is reached.
+    '''
+    with STORES_LOCK:
+        if size not in LIMITS:
+            LIMITS[size] = threading.BoundedSemaphore(size)
+        return LIMITS[size]
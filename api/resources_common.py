@@ -6,14 +6,25 @@
 # The class is based on code made by Ivan Sanchez (from exercise 4 code of resources.py).
 
 
-import json
+import os, re, json, math, uuid, base64, hashlib, sqlite3
 
 from flask import Flask, request, Response, g, jsonify
 from flask.ext.restful import Resource, Api, abort
 from flask.ext.httpauth import HTTPBasicAuth
 from werkzeug.exceptions import NotFound, UnsupportedMediaType
+from werkzeug.urls import url_quote, url_encode
+from werkzeug.wsgi import ClosingIterator
 from functools import wraps
+from datetime import datetime
 import exam_archive
+import sharded_exam_archive
+import compression
+import tokens
+import rate_limit
+import profiler
+import tracing
+from serialization import dumps, fragment, cached_fragment
+from single_flight import SingleFlight
 
 DEFAULT_DB_PATH = 'db/exam_archive.db'
 ''' Default path for exam archive SQLite database. '''
@@ -40,6 +51,15 @@ COURSE_PROFILE = "http://atlassian.virtues.fi:8090/display/PWP/PWP11#PWP11-Cours
 EXAM_PROFILE = "http://atlassian.virtues.fi:8090/display/PWP/PWP11#PWP11-Examprofile"
 ''' Link to profile Exam_profile. '''
 
+BACKUP_PROFILE = "http://atlassian.virtues.fi:8090/display/PWP/PWP11#PWP11-Backupprofile"
+''' Link to profile Backup_profile. '''
+
+TEACHER_PROFILE = "http://atlassian.virtues.fi:8090/display/PWP/PWP11#PWP11-Teacherprofile"
+''' Link to profile Teacher_profile. '''
+
+LANGUAGE_PROFILE = "http://atlassian.virtues.fi:8090/display/PWP/PWP11#PWP11-Languageprofile"
+''' Link to profile Language_profile. '''
+
 EXAM_ARCHIVE = "Exam Archive"
 ''' Name of the RESTful API implementation. '''
 
@@ -55,17 +75,167 @@ UPLOAD_FOLDER = 'exams'
 ALLOWED_EXTENSIONS = ['txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif']
 ''' Define the allowed file extension of the exam files. '''
 
+MAX_EXPANDED_ITEMS = 1000
+''' Define the maximum number of courses and exams embedded in a response with the expand parameter. '''
+
+MAX_BATCH_REQUESTS = 50
+''' Define the maximum number of sub-requests in a request to the Batch resource. '''
+
+BACKUP_FOLDER = 'db/backups'
+''' Define the folder for the backups of the database and the exam files. '''
+
+BACKUP_RETENTION = 10
+''' Define the number of the newest backups kept. '''
+
+SETTINGS_ENVVAR = 'EXAM_ARCHIVE_SETTINGS'
+''' Environment variable naming a Python file of settings, which override the default configuration below. '''
+
+HREF_FORMATS = {}
+''' Format strings of the URLs built by href by the resource, script root and names of the URL parameters. '''
+
+HREF_SENTINEL = 9000000000
+''' First number used in place of the URL parameters, when the format string of a resource is built. '''
+
+LIST_BUILDS = SingleFlight()
+''' Builds of the list responses in flight, shared by the concurrent identical requests. '''
+
+RATE_LIMIT_CLASSES = {'examupload': 'upload', 'courseexport': 'download', 'archiveexport': 'download',
+                      'download_file': 'download'}
+''' Endpoint classes of the rate limits by the endpoints. The other endpoints are read endpoints for GET and write
+endpoints for the other methods. '''
+
+RATE_LIMIT_EXEMPT = ('batch',)
+''' Endpoints not limited by the rate limits themselves, because each of their sub-requests is limited instead. '''
+
+BATCH_ENVIRON_KEY = 'exam_archive.batch'
+''' Key of the WSGI environment of the sub-requests of a batch, holding a dictionary with the keys identity (the
+authentication attributes of flask.g set for the batch) and transaction (True if the batch is run in a transaction). '''
+
+REQUEST_ID_HEADER = 'X-Request-Id'
+''' Header of the ID of a request, which is the ID of its trace. A valid ID sent by the client is used as such,
+otherwise a new ID is generated. The ID is returned in the same header of the response. '''
+
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+''' Pattern of the valid request IDs sent by the clients. '''
+
+REQUEST_ID_ENVIRON_KEY = 'exam_archive.request_id'
+''' Key of the WSGI environment holding the ID of the request. '''
+
+TRACE_ENVIRON_KEY = 'exam_archive.trace'
+''' Key of the WSGI environment of a traced request, holding the span of the request. '''
+
+TRACE_BODY_ENVIRON_KEY = 'exam_archive.trace_body'
+''' Key of the WSGI environment of a traced request, holding the name and the attributes of the span of sending the
+response body, if set by the endpoint with trace_body. '''
+
+PROFILE_ENVIRON_KEY = 'exam_archive.profile'
+''' Key of the WSGI environment of a profiled request, holding its profiler.RequestProfile object. '''
+
+IDENTITY_ATTRIBUTES = ('user_logged_in', 'user_type', 'user_archive', 'no_auth_provided', 'username', 'token_claims')
+''' Attributes of flask.g set by the authentication of a request. '''
+
 # Define the application and the API
 app = Flask(__name__, static_folder=UPLOAD_FOLDER, static_url_path='')
-app.debug = True
 
-# Set the database API and upload folder for exams.
-app.config.update({'DATABASE':exam_archive.ExamArchiveDatabase(DEFAULT_DB_PATH)})
+# Set the path of the database and upload folder for exams. Set SHARD_FOLDER to the folder of the archive databases,
+# e.g. 'db/shards', to use the catalog database in DATABASE_PATH split with sharded_exam_archive.py. The database API
+# is created from these after reading the settings file, unless the settings file sets DATABASE itself.
+app.config.update({'DATABASE_PATH': DEFAULT_DB_PATH, 'SHARD_FOLDER': None})
 app.config.update({'UPLOAD_FOLDER': UPLOAD_FOLDER})
+app.config.update({'BACKUP_FOLDER': BACKUP_FOLDER, 'BACKUP_RETENTION': BACKUP_RETENTION})
+app.config.update({'MAX_EXPANDED_ITEMS': MAX_EXPANDED_ITEMS, 'MAX_BATCH_REQUESTS': MAX_BATCH_REQUESTS})
+app.config.update({'COMPRESS_MIN_SIZE': compression.DEFAULT_MIN_SIZE,
+                   'COMPRESS_LEVELS': dict(compression.DEFAULT_LEVELS)})
+
+# Set the key signing the access tokens. The random default is shared by the workers forked by serve.py, but set
+# SECRET_KEY in the settings file to keep the tokens valid over restarts.
+app.config.update({'SECRET_KEY': os.urandom(32), 'TOKEN_LIFETIME': tokens.DEFAULT_LIFETIME})
+
+# Set the rate limits of each user by the endpoint classes as (tokens per second, burst) tuples, and the limit of the
+# concurrent requests of each process. Set RATE_LIMITS or MAX_CONCURRENT_REQUESTS to None to turn the limit off.
+app.config.update({'RATE_LIMITS': dict(rate_limit.DEFAULT_RATES), 'RATE_LIMIT_STORE': rate_limit.DEFAULT_STORE,
+                   'MAX_CONCURRENT_REQUESTS': rate_limit.DEFAULT_MAX_CONCURRENT})
+
+# Set the JSON Lines file the traces of the requests are written to, e.g. 'traces.jsonl'. The requests are not traced,
+# if TRACE_FILE is None.
+app.config.update({'TRACE_FILE': None})
+
+# Set the folder of the profiling switches and profiles shared by the worker processes, and the interval of the stack
+# sampler. Profiling is switched on for an endpoint with the Profile resource.
+app.config.update({'PROFILE_FOLDER': profiler.DEFAULT_FOLDER,
+                   'PROFILE_SAMPLE_INTERVAL': profiler.DEFAULT_SAMPLE_INTERVAL})
+
+# Override the configuration with the settings file, e.g. DEBUG = True for development.
+app.config.from_envvar(SETTINGS_ENVVAR, silent=True)
+
+if 'DATABASE' not in app.config:
+    if app.config['SHARD_FOLDER'] is not None:
+        app.config['DATABASE'] = sharded_exam_archive.ShardedExamArchiveDatabase(app.config['DATABASE_PATH'],
+                                                                                 app.config['SHARD_FOLDER'])
+    else:
+        app.config['DATABASE'] = exam_archive.ExamArchiveDatabase(app.config['DATABASE_PATH'])
+
+def admission_control(f):
+    '''
+    Decorator applying the admission control to a view function. The requests exceeding the rate limit of the user
+    and the endpoint class are refused with status code 429, and the requests exceeding the limit of concurrent
+    requests with status code 503. A streamed response, e.g. a file sent with send_file, counts as a concurrent
+    request until its body has been sent and closed.
+
+    The sub-requests of a batch are rate limited one by one, but not counted as concurrent requests, because the
+    batch already is.
+    '''
+    @wraps(f)
+    def admitted(*args, **kwargs):
+        refused = admit_request()
+        if refused is not None:
+            return refused
+
+        limit = app.config['MAX_CONCURRENT_REQUESTS']
+        if limit is None or BATCH_ENVIRON_KEY in request.environ:
+            return f(*args, **kwargs)
+        semaphore = rate_limit.concurrency_limit(limit)
+        if not semaphore.acquire(False):
+            response = error_response(503, "Service unavailable", "The server is busy, please try again later")
+            response.headers['Retry-After'] = '1'
+            return response
+        try:
+            response = f(*args, **kwargs)
+        except:
+            semaphore.release()
+            raise
+        if isinstance(response, Response) and response.is_streamed:
+            response.response = ClosingIterator(response.response, semaphore.release)
+        else:
+            semaphore.release()
+        return response
+    return admitted
+
+class AdmittingHTTPBasicAuth(HTTPBasicAuth):
+    '''
+    HTTP basic authentication, which also applies the admission control to the authenticated requests with
+    admission_control.
+
+    The sub-requests of a batch are not authenticated again, but authorized as the user of the batch.
+    '''
+
+    def login_required(self, f):
+        admitted = admission_control(f)
+        authenticated = super(AdmittingHTTPBasicAuth, self).login_required(admitted)
+
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            batch = request.environ.get(BATCH_ENVIRON_KEY)
+            if batch is None:
+                return authenticated(*args, **kwargs)
+            for name, value in batch['identity'].items():
+                setattr(g, name, value)
+            return admitted(*args, **kwargs)
+        return decorated
 
 # Start the RESTful API with Flask.
 api = Api(app)
-auth = HTTPBasicAuth()
+auth = AdmittingHTTPBasicAuth()
 
 def error_response(status_code, title, detail, mimetype=PROBLEMJSON):
     '''
@@ -79,12 +249,8 @@ def error_response(status_code, title, detail, mimetype=PROBLEMJSON):
     * `mime_type`: Mime type of the error. If not speficied Mime type 'application/problem+json' is used.
     '''
 
-    # Flask jsonify() function returns flask.Response() object that already has the content-type header
-    # 'application/json' for use with json responses
-    response = jsonify(title=title, detail=detail, status=status_code, type=API_DOCUMENTATION)
-    response.status_code = status_code
-    response.mimetype = mimetype
-    return response
+    body = {'title': title, 'detail': detail, 'status': status_code, 'type': API_DOCUMENTATION}
+    return Response(dumps(body), status_code, mimetype=mimetype)
 
 @app.errorhandler(401)
 def access_forbidden(error):
@@ -101,6 +267,102 @@ def unknown_error(error):
     ''' Error handler for client: status code 500. '''
     return error_response(500, "Error", "The system has failed. Please, contact the administrator")
 
+@app.before_request
+def begin_trace():
+    '''
+    Set the ID of the request from the X-Request-Id header, or generate a new one, and begin the span of the request,
+    if the requests are traced to TRACE_FILE.
+    '''
+    request_id = request.headers.get(REQUEST_ID_HEADER, '')
+    if not REQUEST_ID_PATTERN.match(request_id):
+        request_id = uuid.uuid4().hex
+    request.environ[REQUEST_ID_ENVIRON_KEY] = request_id
+
+    span = tracing.begin_request(tracing.tracer(app.config['TRACE_FILE']), request_id, 'request',
+                                 {'method': request.method, 'path': request.path, 'endpoint': request.endpoint})
+    if span is not None:
+        request.environ[TRACE_ENVIRON_KEY] = span
+
+@app.after_request
+def set_request_id(response):
+    '''
+    Return the ID of the request in the X-Request-Id header of the response, and record the status code of the
+    response in the span of the request.
+    '''
+    request_id = request.environ.get(REQUEST_ID_ENVIRON_KEY)
+    if request_id is not None:
+        response.headers[REQUEST_ID_HEADER] = request_id
+    if TRACE_ENVIRON_KEY in request.environ:
+        tracing.annotate({'status': response.status_code}, request.environ[TRACE_ENVIRON_KEY])
+    return response
+
+@app.teardown_request
+def end_trace(exception):
+    '''
+    End the span of a sub-request of a batch. The span of the request sent by the client is ended by trace_response,
+    when the response body has been sent.
+    '''
+    span = request.environ.get(TRACE_ENVIRON_KEY)
+    if span is None:
+        return
+    attributes = {'error': type(exception).__name__} if exception is not None else None
+    if tracing.is_root(span):
+        if attributes:
+            tracing.annotate(attributes, span)
+    else:
+        tracing.end_request(span, attributes)
+
+def trace_body(name, **attributes):
+    '''
+    Record sending the response body of the current request as a span with the given name and attributes instead of
+    response.body, e.g. trace_body('file.read', path=pathname) for a file streamed with send_file.
+    '''
+    request.environ[TRACE_BODY_ENVIRON_KEY] = (name, attributes)
+
+def trace_response(wsgi_app):
+    '''
+    WSGI middleware ending the span of a traced request when the server closes the response body, so that the trace
+    covers streamed bodies, e.g. downloaded files and exported ZIP archives, which are produced only while they are
+    sent after the request context has been torn down.
+    '''
+    def traced_app(environ, start_response):
+        try:
+            app_iter = wsgi_app(environ, start_response)
+        except Exception:
+            # The error has been recorded in the span by end_trace
+            span = environ.get(TRACE_ENVIRON_KEY)
+            if span is not None and getattr(tracing.LOCAL, 'trace', None) is not None:
+                tracing.end_request(span)
+            raise
+        span = environ.get(TRACE_ENVIRON_KEY)
+        if span is None or getattr(tracing.LOCAL, 'trace', None) is None:
+            return app_iter
+        name, attributes = environ.get(TRACE_BODY_ENVIRON_KEY, ('response.body', {}))
+        return tracing.traced_body(app_iter, span, name, attributes)
+    return traced_app
+
+app.wsgi_app = trace_response(app.wsgi_app)
+
+@app.before_request
+def start_profile():
+    '''
+    Start profiling the request, if the profiling of its endpoint has been switched on with the Profile resource and
+    the request is sampled. Without switches, only the cached switches are checked.
+    '''
+    profile = profiler.profiler(app.config['PROFILE_FOLDER'], app.config['PROFILE_SAMPLE_INTERVAL']).start(
+        request.endpoint)
+    if profile is not None:
+        request.environ[PROFILE_ENVIRON_KEY] = profile
+
+@app.teardown_request
+def finish_profile(exception):
+    '''
+    Stop profiling the request and add its profile to the profile of its endpoint.
+    '''
+    profile = request.environ.get(PROFILE_ENVIRON_KEY)
+    if profile is not None:
+        profiler.profiler(app.config['PROFILE_FOLDER']).finish(profile)
+
 @app.before_request
 def set_database():
     '''
@@ -109,7 +371,50 @@ def set_database():
     '''
     g.db = app.config['DATABASE']
 
+@app.before_request
+def strip_etag_suffixes():
+    '''
+    Remove the content coding suffixes added by compress_response from the entity tags of the If-Match and
+    If-None-Match headers before the headers are parsed, so that the resources compare the tags of their rows as
+    such. The content coding is stored to flask.g for the 304 responses.
+    '''
+    g.etag_encoding = None
+    for header in ('HTTP_IF_MATCH', 'HTTP_IF_NONE_MATCH'):
+        if header in request.environ:
+            request.environ[header], encoding = compression.strip_etag_suffix(request.environ[header])
+            g.etag_encoding = g.etag_encoding or encoding
+
+@app.after_request
+def compress_response(response):
+    '''
+    Compress the body of a JSON response with the best content coding accepted by the client, if the body is at least
+    COMPRESS_MIN_SIZE bytes. The compressed bodies are cached, so each representation is compressed only once. The
+    entity tag of a compressed representation gets the content coding as a suffix, as it differs from the
+    uncompressed one.
+    '''
+    etag, weak = response.get_etag()
+    if response.status_code == 304:
+        if etag and g.get('etag_encoding'):
+            response.set_etag('%s-%s' % (etag, g.etag_encoding), weak)
+        return response
+
+    if response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers or \
+            response.mimetype not in compression.COMPRESSIBLE_MIMETYPES:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = compression.negotiate(request.accept_encodings)
+    if encoding is None or (response.content_length or 0) < app.config['COMPRESS_MIN_SIZE']:
+        return response
+
+    response.set_data(compression.compress(response.get_data(), encoding, app.config['COMPRESS_LEVELS'][encoding]))
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        response.set_etag('%s-%s' % (etag, encoding), weak)
+    return response
+
 @auth.verify_password
+@tracing.traced('verify_password')
 def verify_password(username, password):
 
     g.user_logged_in = None
@@ -117,10 +422,15 @@ def verify_password(username, password):
     g.user_archive = None
     g.no_auth_provided = False
     g.username = None
+    g.token_claims = None
 
     # If the Authentication header is not present Flask HTTPAuth will set username and password to empty strings.
     # In this case, do not prompt for them but rather let resources decide whether anonymous access is allowed.
+    # The same applies to Bearer access tokens, which Flask HTTPAuth does not parse.
     if not username and not password:
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() == 'bearer' and token.strip():
+            return verify_token(token.strip())
         g.no_auth_provided = True
         return True
 
@@ -135,6 +445,53 @@ def verify_password(username, password):
     g.username = username
     return True
 
+def verify_token(token):
+    '''
+    Verify an access token issued by the Token resource. The signature, expiry time and token generation of the user
+    are checked without querying the database, so that the requests authenticated with tokens do not touch the user
+    table. The token generations are read from the database only after the users have changed.
+    '''
+    claims = tokens.verify_token(app.config['SECRET_KEY'], token)
+    if claims is None or g.db.get_token_generations().get(claims['user_id']) != claims['generation']:
+        return False
+
+    g.user_logged_in = claims['user_id']
+    g.user_type = claims['user_type']
+    g.user_archive = claims['archive_id']
+    g.username = claims['username']
+    g.token_claims = claims
+    return True
+
+def admit_request():
+    '''
+    Take a token from the token bucket of the user and the endpoint class of the request. The anonymous requests are
+    limited by the address of the client. Returns None if the request is admitted, otherwise a response with status
+    code 429 and a Retry-After header. If the token buckets cannot be accessed, the request is admitted.
+    '''
+    rates = app.config['RATE_LIMITS']
+    if not rates or request.endpoint in RATE_LIMIT_EXEMPT:
+        return None
+
+    endpoint_class = RATE_LIMIT_CLASSES.get(request.endpoint)
+    if endpoint_class is None or (endpoint_class == 'upload' and request.method == 'GET'):
+        endpoint_class = 'read' if request.method in ('GET', 'HEAD', 'OPTIONS') else 'write'
+    if endpoint_class not in rates:
+        return None
+
+    rate, burst = rates[endpoint_class]
+    username = getattr(g, 'username', None)
+    key = '%s:%s' % (endpoint_class, username if username else 'address:%s' % request.remote_addr)
+    try:
+        wait = rate_limit.token_buckets(app.config['RATE_LIMIT_STORE']).take(key, rate, burst)
+    except sqlite3.Error:
+        return None
+    if not wait:
+        return None
+
+    response = error_response(429, "Too many requests", "You have made too many requests, please try again later")
+    response.headers['Retry-After'] = str(int(math.ceil(wait)))
+    return response
+
 @auth.error_handler
 def access_forbidden():
     ''' Error handler for API: status code 401. '''
@@ -144,4 +501,242 @@ def file_extension(filename):
     return filename.rsplit('.', 1)[1]
 
 def allowed_file(filename):
-    return '.' in filename and file_extension(filename) in ALLOWED_EXTENSIONS
\ No newline at end of file
+    return '.' in filename and file_extension(filename) in ALLOWED_EXTENSIONS
+
+def expand_parameter(allowed):
+    '''
+    Parse the comma separated relations of the expand query parameter, e.g. ?expand=courses.exams. A nested relation
+    also expands its parents, so 'courses.exams' returns set(['courses', 'courses.exams']). Returns None, if the
+    parameter contains a relation which is not in the list allowed.
+    '''
+    expand = set()
+    for relation in request.args.get('expand', '').split(','):
+        if not relation:
+            continue
+        if relation not in allowed:
+            return None
+        parts = relation.split('.')
+        for i in range(len(parts)):
+            expand.add('.'.join(parts[:i + 1]))
+    return expand
+
+def exam_filters():
+    '''
+    Parse the exam filter query parameters, e.g. ?date_from=2013-01-01&date_to=2015-12-31&language_id=fi&examiner_id=1,
+    to keyword arguments of search_exams. The dates are inclusive ISO dates. Returns None, if a parameter has an
+    invalid value.
+    '''
+    filters = {}
+    for name in ['date_from', 'date_to']:
+        if name in request.args:
+            try:
+                filters[name] = datetime.strptime(request.args[name], '%Y-%m-%d').strftime('%Y-%m-%d')
+            except ValueError:
+                return None
+    if 'language_id' in request.args:
+        filters['language_id'] = request.args['language_id']
+    if 'examiner_id' in request.args:
+        try:
+            filters['examiner_id'] = int(request.args['examiner_id'])
+        except ValueError:
+            return None
+    return filters
+
+def fields_parameter(field_columns):
+    '''
+    Parse the comma separated names of the fields query parameter, e.g. ?fields=courseId,name, which trims the data of
+    the items of a list to the given fields. The name 'links' includes the links of the items. Returns None, if the
+    parameter was not given, or False if it contains a name which is not a key of the dictionary field_columns.
+    '''
+    if 'fields' not in request.args:
+        return None
+    fields = frozenset(name for name in request.args['fields'].split(',') if name)
+    if not fields.issubset(field_columns):
+        return False
+    return fields
+
+def selected_columns(fields, field_columns, required):
+    '''
+    Return the database columns needed for building the given fields of the items, or None for all the columns if
+    fields is None.
+
+    INPUT:
+
+    * `fields`: The fields as returned by fields_parameter.
+    * `field_columns`: Dictionary of the columns needed by each field, e.g. {'name': ('course_name',)}.
+    * `required`: The columns every item is built from, e.g. the IDs in the URL of the item.
+    '''
+    if fields is None:
+        return None
+    columns = set(required)
+    for name in fields:
+        columns.update(field_columns[name])
+    return sorted(columns)
+
+def page_parameters(sort_keys, default_sort=None):
+    '''
+    Parse the sorting and paging query parameters, e.g. ?sort=-date&limit=20&after=WyIyMDE1LTAyLTI4IiwgNV0, to keyword
+    arguments of the browse functions of the database API. A minus sign before the sort key sorts in descending order.
+    If the sort key is not given, default_sort is used. The parameter after is the cursor of the next link of the
+    previous page. Returns None, if the sort key is not in the list sort_keys or a parameter has an invalid value.
+    '''
+    page = {}
+    sort = request.args.get('sort') or default_sort
+    if sort:
+        descending = sort.startswith('-')
+        sort = sort[1:] if descending else sort
+        if sort not in sort_keys:
+            return None
+        page['sort'], page['descending'] = sort, descending
+
+    if 'limit' in request.args:
+        try:
+            page['limit'] = int(request.args['limit'])
+        except ValueError:
+            return None
+        if page['limit'] < 1:
+            return None
+
+    if 'after' in request.args:
+        cursor = request.args['after']
+        try:
+            key = json.loads(base64.urlsafe_b64decode(str(cursor) + '=' * (-len(cursor) % 4)))
+        except (ValueError, TypeError, UnicodeError):
+            return None
+        if not isinstance(key, list) or len(key) != (2 if sort else 1) or not isinstance(key[-1], (int, long)):
+            return None
+        page['after'] = tuple(key) if sort else key[0]
+    return page
+
+def next_page_link(collection_href, rows, page, row_id):
+    '''
+    Return the Collection+JSON link to the next page of a list, or None if the list was not paged or the page is the
+    last one. The cursor of the link is the key of the last row of the page.
+
+    INPUT:
+
+    * `collection_href`: The URL of the list resource.
+    * `rows`: The rows of the page as returned by the database API.
+    * `page`: The paging parameters as returned by page_parameters.
+    * `row_id`: The name of the primary key of the rows, e.g. 'course_id'.
+    '''
+    if 'limit' not in page or len(rows) < page['limit']:
+        return None
+    last = rows[-1]
+    key = [last[page['sort']], last[row_id]] if 'sort' in page else [last[row_id]]
+    args = request.args.to_dict()
+    args['after'] = base64.urlsafe_b64encode(json.dumps(key)).rstrip('=')
+    return {'name':'next_page', 'prompt':'Next page', 'rel':'next',
+            'href': collection_href + '?' + url_encode(args, sort=True)}
+
+def href(resource, **values):
+    '''
+    Build the URL of a resource like api.url_for, but without going through the URL map of Werkzeug for each call.
+    The URL is built once for each resource and set of parameter names with numbers in place of the parameters, and
+    turned into a format string, which is cached in HREF_FORMATS. The values are converted like the default and int
+    converters of the routes do.
+
+    INPUT:
+
+    * `resource`: The resource class, e.g. ExamList.
+    * `values`: The values of the URL parameters of the route of the resource, e.g. archive_id=1, course_id=2.
+    '''
+    key = (resource, request.script_root, tuple(sorted(values)))
+    url_format = HREF_FORMATS.get(key)
+    if url_format is None:
+        sentinels = dict((name, HREF_SENTINEL + i) for i, name in enumerate(key[2]))
+        url_format = api.url_for(resource, **sentinels).replace('%', '%%')
+        for name, sentinel in sentinels.items():
+            url_format = url_format.replace(str(sentinel), '%%(%s)s' % name)
+        HREF_FORMATS[key] = url_format
+
+    for name, value in values.items():
+        if isinstance(value, (int, long)):
+            values[name] = str(value)
+        else:
+            values[name] = url_quote(value)
+    return url_format % values
+
+def item_fragment(resource, row_id, row, build, fields=None):
+    '''
+    Return the Collection+JSON item of a row of a list view as a pre-encoded fragment. The encoded item is cached by
+    the resource, the URL prefix of the application, the ID of the row and the fields, and rebuilt only when the row
+    changes.
+
+    INPUT:
+
+    * `resource`: The resource class of the item, e.g. Exam.
+    * `row_id`: The ID of the row.
+    * `row`: The row as returned by the database API, containing all the values the item is built from.
+    * `build`: Function building the item from the row, e.g. exam_item.
+    * `fields`: The fields of the item as returned by fields_parameter, passed to build as the keyword argument
+    fields, or None for all the fields.
+    '''
+    if fields is None:
+        return cached_fragment((resource, request.script_root, row_id), row, build)
+    return cached_fragment((resource, request.script_root, row_id, fields), row,
+                           lambda row: build(row, fields=fields))
+
+def coalesced_response(resource, values, build):
+    '''
+    Build the response of a list resource once for all the concurrent identical requests. The requests are identical,
+    if they are for the same resource with the same URL and query parameters, and the users have the same permission
+    scope, i.e. they are super users or have access to the same archive. Each request gets a copy of the response,
+    because the response is modified by the after_request functions. The sub-requests of a batch run in a transaction
+    are not coalesced, because their responses may contain uncommitted changes.
+
+    INPUT:
+
+    * `resource`: The resource class, e.g. ExamList.
+    * `values`: Tuple of the URL parameters of the resource, e.g. (archive_id, course_id).
+    * `build`: Function without parameters building the response.
+    '''
+    batch = request.environ.get(BATCH_ENVIRON_KEY)
+    if batch is not None and batch['transaction']:
+        return build()
+
+    scope = 'super' if g.user_type == 'super' else g.user_archive
+    key = (resource, request.script_root, values, tuple(sorted(request.args.iteritems(multi=True))), scope)
+    response = LIST_BUILDS.do(key, build)
+    return Response(response.get_data(), response.status_code, headers=list(response.headers))
+
+def snapshot_response(envelope, etag, profile):
+    '''
+    Create a Collection+JSON response of the contents of a lookup snapshot with a strong entity tag. If the
+    If-None-Match header of the request contains the entity tag, status code 304 is returned without a body instead,
+    so that clients can keep using their cached copy until the contents change.
+    '''
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(dumps(envelope), 200, mimetype=COLLECTIONJSON+";"+profile)
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def entity_tag(row):
+    '''
+    Create an entity tag for a database row. The tag is derived from the last_modified value of the row, which is
+    updated every time the row is modified.
+    '''
+    return hashlib.md5(unicode(row['last_modified']).encode('utf-8')).hexdigest()
+
+def precondition_failed(row):
+    '''
+    Check the If-Match header of the request against a database row. Returns True, if the header was given and none
+    of its entity tags match the current entity tag of the row.
+    '''
+    if not request.if_match or request.if_match.star_tag:
+        return False
+    return not request.if_match.contains(entity_tag(row))
+
+def if_match_modified(row):
+    '''
+    Returns the last_modified value of the row if the request was made with a matching If-Match header, None
+    otherwise. The value is given to the edit and remove functions of the database API, which check atomically that
+    the row has not been modified by another user after it was read.
+    '''
+    if not request.if_match or request.if_match.star_tag:
+        return None
+    return row['last_modified']
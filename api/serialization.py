@@ -0,0 +1,147 @@
+# coding=UTF-8
+#
+# Provides the JSON encoding of the responses of the Exam Archive, with pre-encoded fragments spliced into the output.
+#
+# @authors: Ari Kairala, Petteri Ponsimaa
+
+import os
+import re
+import json
+import threading
+import collections
+import tracing
+
+ENCODERS = ['ujson', 'simplejson', 'json']
+''' Names of the JSON modules in the order of preference. The first one installed and supporting the default hook is
+used, json of the standard library is always available. '''
+
+FRAGMENT_CACHE_SIZE = 10000
+''' Maximum number of encoded items kept in the fragment cache. '''
+
+FRAGMENTS = collections.OrderedDict()
+''' Least recently used cache of encoded items by their keys, holding (row, Fragment) tuples. '''
+
+FRAGMENTS_LOCK = threading.Lock()
+''' Lock for accessing the fragment cache. '''
+
+# Fragments are encoded as marker strings first, and the markers replaced with the fragments afterwards. The random
+# token keeps the markers from matching strings in the data.
+FRAGMENT_TOKEN = os.urandom(8).encode('hex')
+FRAGMENT_MARKER = u'\x00%s:%%d\x00' % FRAGMENT_TOKEN
+FRAGMENT_PATTERN = re.compile(r'"\\u0000%s:(\d+)\\u0000"' % FRAGMENT_TOKEN)
+
+
+class Fragment(object):
+    '''
+    Pre-encoded JSON value, which dumps inserts into its output as such. Create fragments with fragment, or with
+    cached_fragment for items, which are reused as long as their rows do not change.
+    '''
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+
+def _stdlib_dumps(module):
+    '''
+    Return a function encoding an object with the json or simplejson module, calling default for the objects the
+    module cannot encode.
+    '''
+    def encode(obj, default):
+        return module.dumps(obj, separators=(',', ':'), default=default)
+    return encode
+
+
+def _ujson_dumps(module):
+    '''
+    Return a function encoding an object with the ujson module, calling default for the objects the module cannot
+    encode.
+    '''
+    def encode(obj, default):
+        return module.dumps(obj, escape_forward_slashes=False, default=default)
+    return encode
+
+
+def select_encoder(names=None):
+    '''
+    Return a tuple of the name and the encoding function of the first JSON module in names, which is installed and
+    supports the default hook needed for the fragments. If names is None, ENCODERS is used instead.
+    '''
+    for name in names or ENCODERS:
+        try:
+            module = __import__(name)
+        except ImportError:
+            continue
+        encode = _ujson_dumps(module) if name == 'ujson' else _stdlib_dumps(module)
+        try:
+            if encode([Fragment('0')], lambda obj: obj.text) != '["0"]':
+                continue
+        except TypeError:
+            # The module does not support the default hook
+            continue
+        return name, encode
+    return 'json', _stdlib_dumps(json)
+
+ENCODER, _encode = select_encoder()
+''' Name of the JSON module used for encoding, and the function calling it. '''
+
+
+@tracing.traced('json.dumps')
+def dumps(obj):
+    '''
+    Encode an object to a JSON string with the fastest JSON module installed. The object may contain Fragment objects
+    anywhere, whose text is inserted into the output as such.
+    '''
+    fragments = []
+
+    def default(value):
+        if not isinstance(value, Fragment):
+            raise TypeError("%r is not JSON serializable" % (value,))
+        fragments.append(value.text)
+        return FRAGMENT_MARKER % (len(fragments) - 1)
+
+    text = _encode(obj, default)
+    if fragments:
+        text = FRAGMENT_PATTERN.sub(lambda match: fragments[int(match.group(1))], text)
+    return text
+
+
+def fragment(obj):
+    '''
+    Encode an object to a Fragment, e.g. a constant template inserted into many responses.
+    '''
+    return Fragment(dumps(obj))
+
+
+def cached_fragment(key, row, build):
+    '''
+    Return the encoded item of a database row from the fragment cache, or build and encode it if the row has changed
+    since it was cached.
+
+    INPUT:
+
+    * `key`: Hashable key of the item, e.g. a tuple of the resource name, the URL prefix and the ID of the row.
+    * `row`: The row as a dictionary. The cached item is reused only if the row is equal to the cached row, so the row
+    must contain all the values the item is built from, e.g. the names of the teachers and modifiers.
+    * `build`: Function building the item from the row.
+    '''
+    with FRAGMENTS_LOCK:
+        entry = FRAGMENTS.pop(key, None)
+        if entry is not None and entry[0] == row:
+            FRAGMENTS[key] = entry
+            return entry[1]
+
+    item = fragment(build(row))
+    with FRAGMENTS_LOCK:
+        FRAGMENTS[key] = (row, item)
+        while len(FRAGMENTS) > FRAGMENT_CACHE_SIZE:
+            FRAGMENTS.popitem(last=False)
+    return item
+
+
+def clear_fragments():
+    '''
+    Remove all the items from the fragment cache.
+    '''
+    with FRAGMENTS_LOCK:
+        FRAGMENTS.clear()
@@ -9,11 +9,18 @@ import os
 
 from flask import Flask, request, Response, g, jsonify, send_from_directory, send_file
 from werkzeug import secure_filename
-from resources_common import app, api
+from resources_common import app, api, trace_body, admission_control
 from user_resource import User, UserList
 from archive_resource import Archive, ArchiveList
 from course_resource import Course, CourseList
-from exam_resource import Exam, ExamList, ExamUpload
+from exam_resource import Exam, ExamList, ArchiveExamList, ExamUpload
+from backup_resource import Backup, BackupList
+from teacher_resource import Teacher, TeacherList
+from language_resource import Language, LanguageList
+from export_resource import CourseExport, ArchiveExport
+from token_resource import Token
+from batch_resource import Batch
+from profile_resource import Profile, ProfileList
 
 DEFAULT_DB_PATH = 'db/exam_archive.db'
 ''' Default path for exam archive SQLite database. '''
@@ -24,6 +31,14 @@ api.add_resource(UserList, '/exam_archive/api/users/',
 api.add_resource(User, '/exam_archive/api/users/<username>/',
                  endpoint='user')
 
+# Define the route for Token resource
+api.add_resource(Token,         '/exam_archive/api/tokens/',
+                 endpoint='token')
+
+# Define the route for Batch resource
+api.add_resource(Batch,         '/exam_archive/api/batch/',
+                 endpoint='batch')
+
 # Define the routes for Archive and ArchiveList resources
 api.add_resource(ArchiveList,   '/exam_archive/api/archives/',
                  endpoint='archivelist')
@@ -36,19 +51,52 @@ api.add_resource(CourseList,    '/exam_archive/api/archives/<int:archive_id>/cou
 api.add_resource(Course,        '/exam_archive/api/archives/<int:archive_id>/courses/<int:course_id>/',
                  endpoint='course')
 
-# Define the routes for Exam, ExamList and ExamUpload resources
+# Define the routes for Exam, ExamList, ExamUpload and ArchiveExamList resources
 api.add_resource(ExamList,      '/exam_archive/api/archives/<int:archive_id>/courses/<int:course_id>/exams/',
                  endpoint='examlist')
 api.add_resource(Exam,          '/exam_archive/api/archives/<int:archive_id>/courses/<int:course_id>/exams/<int:exam_id>/',
                  endpoint='exam')
 api.add_resource(ExamUpload,    '/exam_archive/api/archives/<int:archive_id>/courses/<int:course_id>/exams/<int:exam_id>/upload/',
                  endpoint='examupload')
+api.add_resource(ArchiveExamList, '/exam_archive/api/archives/<int:archive_id>/exams/',
+                 endpoint='archiveexamlist')
+
+# Define the routes for CourseExport and ArchiveExport resources
+api.add_resource(CourseExport,  '/exam_archive/api/archives/<int:archive_id>/courses/<int:course_id>/exams/export.zip',
+                 endpoint='courseexport')
+api.add_resource(ArchiveExport, '/exam_archive/api/archives/<int:archive_id>/export.zip',
+                 endpoint='archiveexport')
+
+# Define the routes for Backup and BackupList resources
+api.add_resource(BackupList,    '/exam_archive/api/backups/',
+                 endpoint='backuplist')
+api.add_resource(Backup,        '/exam_archive/api/backups/<backup_name>/',
+                 endpoint='backup')
+
+# Define the routes for Profile and ProfileList resources
+api.add_resource(ProfileList,   '/exam_archive/api/profiles/',
+                 endpoint='profilelist')
+api.add_resource(Profile,       '/exam_archive/api/profiles/<endpoint_name>/',
+                 endpoint='profile')
+
+# Define the routes for Teacher, TeacherList, Language and LanguageList resources
+api.add_resource(TeacherList,   '/exam_archive/api/teachers/',
+                 endpoint='teacherlist')
+api.add_resource(Teacher,       '/exam_archive/api/teachers/<int:teacher_id>/',
+                 endpoint='teacher')
+api.add_resource(LanguageList,  '/exam_archive/api/languages/',
+                 endpoint='languagelist')
+api.add_resource(Language,      '/exam_archive/api/languages/<language_id>/',
+                 endpoint='language')
 
 # Serve pdf files from static location
 @app.route('/exams/<path:filename>')
+@admission_control
 def download_file(filename):
     upload_folder = app.config['UPLOAD_FOLDER']
-    return send_file(os.path.join(upload_folder, secure_filename(filename)), as_attachment=True)
+    pathname = os.path.join(upload_folder, secure_filename(filename))
+    trace_body('file.read', path=pathname)
+    return send_file(pathname, as_attachment=True)
 
 # Start the application
 if __name__ == '__main__':
@@ -0,0 +1,569 @@
+# coding=UTF-8
+#
+# Provides a sharded variant of the database API, where the courses and
+# exams of each archive are stored in their own SQLite database file.
+#
+# @authors: Ari Kairala, Petteri Ponsimaa
+
+import sqlite3
+import os
+import sys
+import errno
+import glob
+import shutil
+import threading
+import tracing
+from exam_archive import ExamArchiveDatabase, ExamDatabaseError, ExamDatabaseErrorNotFound
+
+DEFAULT_SHARD_FOLDER = 'db/shards'
+''' Default folder for the archive specific SQLite databases. '''
+
+SHARD_ID_RANGE = 1000000000
+''' Size of the course_id and exam_id range reserved for each archive, keeping the IDs unique over the shards. The
+archive of a course or exam created in an archive database is its ID divided by SHARD_ID_RANGE. '''
+
+# SQL create clause for the routing table of the catalog database. The table tells in which archive's database each
+# course and exam moved by split_database is stored, because their IDs are below SHARD_ID_RANGE.
+SHARD_ROUTE_SCHEMA = 'CREATE TABLE IF NOT EXISTS shard_route(' \
+                     'table_name TEXT NOT NULL, ' \
+                     'key_id INTEGER NOT NULL, ' \
+                     'archive_id INTEGER NOT NULL, ' \
+                     'PRIMARY KEY(table_name, key_id))'
+
+
+@tracing.trace_methods('db.')
+class ShardedExamArchiveDatabase(ExamArchiveDatabase):
+    '''
+    API to access the exam archive database, when the courses and exams are stored in archive specific databases.
+
+    The catalog database given in db_path holds the users, archives, teachers and languages. The courses and exams of
+    each archive are stored in a database file of their own in the shard folder, so that writes to different archives
+    do not lock each other out. The class offers the same methods as ExamArchiveDatabase and routes the calls to the
+    right database by the archive_id, course_id or exam_id. The new courses and exams get their IDs from the range
+    reserved for their archive, so they are routed without touching the catalog database.
+
+    Each archive database contains a copy of the users, teachers and languages and the row of the archive itself, so
+    that the foreign keys of the courses and exams are checked in the same way as in a single database. The copies are
+    updated by the methods creating, editing and removing users and teachers.
+
+    An existing database can be split into a catalog database and archive databases with split_database.
+
+    '''
+
+    def __init__(self, db_path=None, shard_folder=None):
+        '''
+        db_path is the address of the catalog database with respect to the calling script. If db_path is None,
+        DEFAULT_DB_PATH is used instead. shard_folder is the folder of the archive databases. If shard_folder is
+        None, DEFAULT_SHARD_FOLDER is used instead.
+        '''
+        super(ShardedExamArchiveDatabase, self).__init__(db_path)
+        if shard_folder is not None:
+            self.shard_folder = shard_folder
+        else:
+            self.shard_folder = DEFAULT_SHARD_FOLDER
+
+    def transaction(self):
+        '''
+        Transactions are not supported, because the calls of a transaction may be routed to different databases.
+        Raises ExamDatabaseError.
+        '''
+        raise ExamDatabaseError("Transactions spanning the archive databases are not supported")
+
+    # Setting up the database. Used for the tests. Setup, populate and delete the database
+
+    def clean(self):
+        '''
+        Purge the catalog database and the archive databases removing old values.
+        '''
+        for shard_path in self._shard_paths():
+            ExamArchiveDatabase(shard_path).close_connections()
+            os.remove(shard_path)
+        if os.path.isdir(self.shard_folder) and not os.listdir(self.shard_folder):
+            os.rmdir(self.shard_folder)
+        super(ShardedExamArchiveDatabase, self).clean()
+
+    def create_tables_from_schema(self, schema=None):
+        '''
+        Create programmatically the tables of the catalog database from a schema file, including the routing table.
+        schema contains the path to the .sql schema file. If it is None, DEFAULT_SCHEMA is used instead.
+        '''
+        super(ShardedExamArchiveDatabase, self).create_tables_from_schema(schema)
+        con = sqlite3.connect(self.db_path)
+        with con:
+            con.execute(SHARD_ROUTE_SCHEMA)
+
+    # Helper functions for routing the calls to the archive databases.
+
+    def _shard_path(self, archive_id):
+        '''
+        Return the path of the database file of the given archive.
+        '''
+        return os.path.join(self.shard_folder, 'archive_%d.db' % int(archive_id))
+
+    def _shard_paths(self):
+        '''
+        Return the paths of all the existing archive database files.
+        '''
+        return glob.glob(os.path.join(self.shard_folder, 'archive_*.db'))
+
+    def _shard(self, archive_id):
+        '''
+        Return an ExamArchiveDatabase object accessing the database of the given archive, or None if the archive
+        does not exist. The database is created, if it does not exist yet.
+
+        A new database is built in a temporary file, and linked to its place only when its tables, the copied rows
+        and the reserved ID range are complete, so that the other threads and processes never use a database without
+        them. If another thread or process creates the database at the same time, its database is used instead.
+        '''
+        shard_path = self._shard_path(archive_id)
+        if os.path.exists(shard_path):
+            return ExamArchiveDatabase(shard_path)
+
+        if self.get_archive(archive_id) is None:
+            return None
+        try:
+            os.makedirs(self.shard_folder)
+        except OSError:
+            if not os.path.isdir(self.shard_folder):
+                raise
+
+        temp_path = '%s.%d.%d.tmp' % (shard_path, os.getpid(), threading.current_thread().ident)
+        try:
+            ExamArchiveDatabase(temp_path, pooled=False).create_tables_from_schema()
+
+            # Copy the rows the courses and exams refer to and reserve the ID range of the archive
+            con = sqlite3.connect(temp_path)
+            with con:
+                cur = con.cursor()
+                cur.execute('ATTACH DATABASE ? AS catalog', (self.db_path,))
+                for table in ('language', 'user', 'teacher'):
+                    cur.execute('INSERT OR IGNORE INTO main.%s SELECT * FROM catalog.%s' % (table, table))
+                cur.execute('INSERT OR IGNORE INTO main.archive SELECT * FROM catalog.archive WHERE archive_id = ?',
+                            (archive_id,))
+                for table in ('course', 'exam'):
+                    cur.execute('INSERT INTO sqlite_sequence (name, seq) SELECT ?, ? WHERE NOT EXISTS '
+                                '(SELECT * FROM sqlite_sequence WHERE name = ?)',
+                                (table, int(archive_id) * SHARD_ID_RANGE, table))
+            con.close()
+
+            # Linking fails, if the database already exists. On Windows, renaming fails in the same way.
+            try:
+                if hasattr(os, 'link'):
+                    os.link(temp_path, shard_path)
+                else:
+                    os.rename(temp_path, shard_path)
+            except OSError as e:
+                if e.errno != errno.EEXIST and not os.path.exists(shard_path):
+                    raise
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return ExamArchiveDatabase(shard_path)
+
+    def _route(self, table_name, key_id):
+        '''
+        Return the ID of the archive, where the row of the given table ('course' or 'exam') and ID is stored, or None
+        if the row or the database of its archive does not exist. The archive of an ID in the range of an archive is
+        derived from the ID, only the IDs moved by split_database are looked up from the routing table.
+        '''
+        if int(key_id) >= SHARD_ID_RANGE:
+            archive_id = int(key_id) // SHARD_ID_RANGE
+            if os.path.exists(self._shard_path(archive_id)):
+                return archive_id
+            return None
+
+        sql_query = 'SELECT archive_id FROM shard_route WHERE table_name = ? AND key_id = ?'
+
+        con = self._connect()
+        with con:
+            con.row_factory = sqlite3.Row
+            cur = con.cursor()
+            cur.execute(sql_query, (table_name, key_id))
+            row = cur.fetchone()
+            if row is not None:
+                return row['archive_id']
+            return None
+
+    def _routed_shard(self, table_name, key_id):
+        '''
+        Return an ExamArchiveDatabase object accessing the database where the given course or exam is stored, or
+        None if the row does not exist. The database is not created, if it does not exist.
+        '''
+        archive_id = self._route(table_name, key_id)
+        if archive_id is None:
+            return None
+        return ExamArchiveDatabase(self._shard_path(archive_id))
+
+    def _remove_routes(self, table_name, key_ids):
+        '''
+        Remove the given courses or exams from the routing table. Only the IDs moved by split_database are routed by
+        the table, so the catalog database is not written to when removing the other IDs.
+        '''
+        key_ids = [key_id for key_id in key_ids if int(key_id) < SHARD_ID_RANGE]
+        if not key_ids:
+            return
+        con = self._connect()
+        with con:
+            con.executemany('DELETE FROM shard_route WHERE table_name = ? AND key_id = ?',
+                            [(table_name, key_id) for key_id in key_ids])
+
+    def _replicate(self, table_name, key_id, shard_paths=None):
+        '''
+        Copy the current row of a user, teacher or archive table from the catalog database to the archive databases
+        given in shard_paths, or to all of them if shard_paths is None. If the row has been removed from the catalog,
+        it is removed from the archive databases too. The removal is done with the foreign keys on, so that courses
+        and exams referring to the row are updated like in a single database.
+        '''
+        table_name = self._scrub(table_name)
+        key_column = '%s_id' % table_name
+        if shard_paths is None:
+            shard_paths = self._shard_paths()
+
+        for shard_path in shard_paths:
+            con = sqlite3.connect(shard_path)
+            with con:
+                cur = con.cursor()
+                cur.execute('ATTACH DATABASE ? AS catalog', (self.db_path,))
+                cur.execute('SELECT * FROM catalog.%s WHERE %s = ?' % (table_name, key_column), (key_id,))
+                if cur.fetchone() is not None:
+                    # Foreign keys are off, so replacing the row does not touch the rows referring to it
+                    cur.execute('INSERT OR REPLACE INTO main.%s SELECT * FROM catalog.%s WHERE %s = ?'
+                                % (table_name, table_name, key_column), (key_id,))
+                else:
+                    cur.execute('PRAGMA foreign_keys = ON')
+                    try:
+                        cur.execute('DELETE FROM main.%s WHERE %s = ?' % (table_name, key_column), (key_id,))
+                    except sqlite3.IntegrityError:
+                        # The row is still referred to in the archive database, keep the copy
+                        pass
+            con.close()
+
+    # Archives
+
+    def edit_archive(self, archive_id, *args, **kwargs):
+        archive_id = super(ShardedExamArchiveDatabase, self).edit_archive(archive_id, *args, **kwargs)
+        if archive_id is not None and os.path.exists(self._shard_path(archive_id)):
+            self._replicate('archive', archive_id, [self._shard_path(archive_id)])
+        return archive_id
+    edit_archive.__doc__ = ExamArchiveDatabase.edit_archive.__doc__
+
+    def remove_archive(self, archive_id, expected_modified=None):
+        removed = super(ShardedExamArchiveDatabase, self).remove_archive(archive_id, expected_modified)
+        if removed:
+            con = self._connect()
+            with con:
+                con.execute('DELETE FROM shard_route WHERE archive_id = ?', (archive_id,))
+            if os.path.exists(self._shard_path(archive_id)):
+                ExamArchiveDatabase(self._shard_path(archive_id)).close_connections()
+                os.remove(self._shard_path(archive_id))
+        return removed
+    remove_archive.__doc__ = ExamArchiveDatabase.remove_archive.__doc__
+
+    # Courses
+
+    def create_course(self, archive_id, *args, **kwargs):
+        shard = self._shard(archive_id)
+        if shard is None:
+            raise ExamDatabaseErrorNotFound("Archive does not exist")
+        return shard.create_course(archive_id, *args, **kwargs)
+    create_course.__doc__ = ExamArchiveDatabase.create_course.__doc__
+
+    def edit_course(self, course_id, *args, **kwargs):
+        shard = self._routed_shard('course', course_id)
+        if shard is None:
+            return None
+        return shard.edit_course(course_id, *args, **kwargs)
+    edit_course.__doc__ = ExamArchiveDatabase.edit_course.__doc__
+
+    def browse_courses(self, archive_id, *args, **kwargs):
+        if not os.path.exists(self._shard_path(archive_id)):
+            return []
+        return ExamArchiveDatabase(self._shard_path(archive_id)).browse_courses(archive_id, *args, **kwargs)
+    browse_courses.__doc__ = ExamArchiveDatabase.browse_courses.__doc__
+
+    def get_course(self, course_id):
+        shard = self._routed_shard('course', course_id)
+        if shard is None:
+            return None
+        return shard.get_course(course_id)
+    get_course.__doc__ = ExamArchiveDatabase.get_course.__doc__
+
+    def get_course_by_name(self, course_name):
+        for shard_path in sorted(self._shard_paths()):
+            course = ExamArchiveDatabase(shard_path).get_course_by_name(course_name)
+            if course is not None:
+                return course
+        return None
+    get_course_by_name.__doc__ = ExamArchiveDatabase.get_course_by_name.__doc__
+
+    def remove_course(self, course_id, expected_modified=None):
+        shard = self._routed_shard('course', course_id)
+        if shard is None:
+            return False
+        exams = shard.browse_exams(course_id)
+        removed = shard.remove_course(course_id, expected_modified)
+        if removed:
+            self._remove_routes('exam', [exam['exam_id'] for exam in exams])
+            self._remove_routes('course', [course_id])
+        return removed
+    remove_course.__doc__ = ExamArchiveDatabase.remove_course.__doc__
+
+    # Exams
+
+    def create_exam(self, course_id, *args, **kwargs):
+        archive_id = self._route('course', course_id)
+        if archive_id is None:
+            raise ExamDatabaseErrorNotFound("Course does not exist")
+        return ExamArchiveDatabase(self._shard_path(archive_id)).create_exam(course_id, *args, **kwargs)
+    create_exam.__doc__ = ExamArchiveDatabase.create_exam.__doc__
+
+    def edit_exam(self, exam_id, course_id, *args, **kwargs):
+        archive_id = self._route('exam', exam_id)
+        if archive_id is None:
+            return None
+        if self._route('course', course_id) not in (None, archive_id):
+            raise ExamDatabaseError("Exam can not be moved to a course of another archive")
+        return ExamArchiveDatabase(self._shard_path(archive_id)).edit_exam(exam_id, course_id, *args, **kwargs)
+    edit_exam.__doc__ = ExamArchiveDatabase.edit_exam.__doc__
+
+    def edit_exam_file(self, exam_id, *args, **kwargs):
+        shard = self._routed_shard('exam', exam_id)
+        if shard is None:
+            return None
+        return shard.edit_exam_file(exam_id, *args, **kwargs)
+    edit_exam_file.__doc__ = ExamArchiveDatabase.edit_exam_file.__doc__
+
+    def browse_exams(self, course_id, *args, **kwargs):
+        shard = self._routed_shard('course', course_id)
+        if shard is None:
+            return []
+        return shard.browse_exams(course_id, *args, **kwargs)
+    browse_exams.__doc__ = ExamArchiveDatabase.browse_exams.__doc__
+
+    def browse_archive_exams(self, archive_id):
+        if not os.path.exists(self._shard_path(archive_id)):
+            return []
+        return ExamArchiveDatabase(self._shard_path(archive_id)).browse_archive_exams(archive_id)
+    browse_archive_exams.__doc__ = ExamArchiveDatabase.browse_archive_exams.__doc__
+
+    # Summaries
+
+    def get_archive_summary(self, archive_id):
+        if not os.path.exists(self._shard_path(archive_id)):
+            return super(ShardedExamArchiveDatabase, self).get_archive_summary(archive_id)
+        return ExamArchiveDatabase(self._shard_path(archive_id)).get_archive_summary(archive_id)
+    get_archive_summary.__doc__ = ExamArchiveDatabase.get_archive_summary.__doc__
+
+    def browse_archive_summaries(self, archive_ids=None):
+        return [self.get_archive_summary(summary['archive_id'])
+                for summary in super(ShardedExamArchiveDatabase, self).browse_archive_summaries(archive_ids)]
+    browse_archive_summaries.__doc__ = ExamArchiveDatabase.browse_archive_summaries.__doc__
+
+    def get_course_summary(self, course_id):
+        shard = self._routed_shard('course', course_id)
+        if shard is None:
+            return None
+        return shard.get_course_summary(course_id)
+    get_course_summary.__doc__ = ExamArchiveDatabase.get_course_summary.__doc__
+
+    def browse_course_summaries(self, archive_id):
+        if not os.path.exists(self._shard_path(archive_id)):
+            return []
+        return ExamArchiveDatabase(self._shard_path(archive_id)).browse_course_summaries(archive_id)
+    browse_course_summaries.__doc__ = ExamArchiveDatabase.browse_course_summaries.__doc__
+
+    def rebuild_summaries(self):
+        super(ShardedExamArchiveDatabase, self).rebuild_summaries()
+        for shard_path in self._shard_paths():
+            ExamArchiveDatabase(shard_path).rebuild_summaries()
+    rebuild_summaries.__doc__ = ExamArchiveDatabase.rebuild_summaries.__doc__
+
+    def verify_summaries(self):
+        invalid = super(ShardedExamArchiveDatabase, self).verify_summaries()
+        for shard_path in sorted(self._shard_paths()):
+            invalid += ['%s: %s' % (os.path.basename(shard_path), table)
+                        for table in ExamArchiveDatabase(shard_path).verify_summaries()]
+        return invalid
+    verify_summaries.__doc__ = ExamArchiveDatabase.verify_summaries.__doc__
+
+    # List views
+
+    def browse_course_list(self, archive_id, *args, **kwargs):
+        if not os.path.exists(self._shard_path(archive_id)):
+            return []
+        return ExamArchiveDatabase(self._shard_path(archive_id)).browse_course_list(archive_id, *args, **kwargs)
+    browse_course_list.__doc__ = ExamArchiveDatabase.browse_course_list.__doc__
+
+    def browse_exam_list(self, course_id, *args, **kwargs):
+        shard = self._routed_shard('course', course_id)
+        if shard is None:
+            return []
+        return shard.browse_exam_list(course_id, *args, **kwargs)
+    browse_exam_list.__doc__ = ExamArchiveDatabase.browse_exam_list.__doc__
+
+    def browse_archive_exam_list(self, archive_id):
+        if not os.path.exists(self._shard_path(archive_id)):
+            return []
+        return ExamArchiveDatabase(self._shard_path(archive_id)).browse_archive_exam_list(archive_id)
+    browse_archive_exam_list.__doc__ = ExamArchiveDatabase.browse_archive_exam_list.__doc__
+
+    def search_exams(self, archive_id=None, course_id=None, date_from=None, date_to=None, language_id=None,
+                     examiner_id=None, columns=None, descending=False, limit=-1, after=None):
+        filters = (archive_id, course_id, date_from, date_to, language_id, examiner_id, columns, descending, limit,
+                   after)
+        if course_id is not None:
+            shard = self._routed_shard('course', course_id)
+            return shard.search_exams(*filters) if shard is not None else []
+        if archive_id is not None:
+            if not os.path.exists(self._shard_path(archive_id)):
+                return []
+            return ExamArchiveDatabase(self._shard_path(archive_id)).search_exams(*filters)
+
+        # Merge the pages of the archives, each of which has at most limit exams
+        exams = []
+        for shard_path in self._shard_paths():
+            exams += ExamArchiveDatabase(shard_path).search_exams(*filters)
+        exams.sort(key=lambda exam: (exam['date'] is not None, exam['date'], exam['exam_id']), reverse=descending)
+        return exams[:limit] if limit > -1 else exams
+    search_exams.__doc__ = ExamArchiveDatabase.search_exams.__doc__
+
+    def rebuild_list_views(self):
+        super(ShardedExamArchiveDatabase, self).rebuild_list_views()
+        for shard_path in self._shard_paths():
+            ExamArchiveDatabase(shard_path).rebuild_list_views()
+    rebuild_list_views.__doc__ = ExamArchiveDatabase.rebuild_list_views.__doc__
+
+    def verify_list_views(self):
+        invalid = super(ShardedExamArchiveDatabase, self).verify_list_views()
+        for shard_path in sorted(self._shard_paths()):
+            invalid += ['%s: %s' % (os.path.basename(shard_path), table)
+                        for table in ExamArchiveDatabase(shard_path).verify_list_views()]
+        return invalid
+    verify_list_views.__doc__ = ExamArchiveDatabase.verify_list_views.__doc__
+
+    def get_exam(self, exam_id):
+        shard = self._routed_shard('exam', exam_id)
+        if shard is None:
+            return None
+        return shard.get_exam(exam_id)
+    get_exam.__doc__ = ExamArchiveDatabase.get_exam.__doc__
+
+    def remove_exam(self, exam_id, expected_modified=None):
+        shard = self._routed_shard('exam', exam_id)
+        if shard is None:
+            return False
+        removed = shard.remove_exam(exam_id, expected_modified)
+        if removed:
+            self._remove_routes('exam', [exam_id])
+        return removed
+    remove_exam.__doc__ = ExamArchiveDatabase.remove_exam.__doc__
+
+    # Teachers
+
+    def create_teacher(self, *args, **kwargs):
+        teacher_id = super(ShardedExamArchiveDatabase, self).create_teacher(*args, **kwargs)
+        self._replicate('teacher', teacher_id)
+        return teacher_id
+    create_teacher.__doc__ = ExamArchiveDatabase.create_teacher.__doc__
+
+    def edit_teacher(self, teacher_id, *args, **kwargs):
+        teacher_id = super(ShardedExamArchiveDatabase, self).edit_teacher(teacher_id, *args, **kwargs)
+        if teacher_id is not None:
+            self._replicate('teacher', teacher_id)
+        return teacher_id
+    edit_teacher.__doc__ = ExamArchiveDatabase.edit_teacher.__doc__
+
+    def remove_teacher(self, teacher_id):
+        removed = super(ShardedExamArchiveDatabase, self).remove_teacher(teacher_id)
+        if removed:
+            self._replicate('teacher', teacher_id)
+        return removed
+    remove_teacher.__doc__ = ExamArchiveDatabase.remove_teacher.__doc__
+
+    # Users
+
+    def create_user(self, *args, **kwargs):
+        user_id = super(ShardedExamArchiveDatabase, self).create_user(*args, **kwargs)
+        self._replicate('user', user_id)
+        return user_id
+    create_user.__doc__ = ExamArchiveDatabase.create_user.__doc__
+
+    def edit_user(self, user_id, *args, **kwargs):
+        user_id = super(ShardedExamArchiveDatabase, self).edit_user(user_id, *args, **kwargs)
+        if user_id is not None:
+            self._replicate('user', user_id)
+        return user_id
+    edit_user.__doc__ = ExamArchiveDatabase.edit_user.__doc__
+
+    def remove_user(self, user_id, expected_modified=None):
+        removed = super(ShardedExamArchiveDatabase, self).remove_user(user_id, expected_modified)
+        if removed:
+            self._replicate('user', user_id)
+        return removed
+    remove_user.__doc__ = ExamArchiveDatabase.remove_user.__doc__
+
+
+def split_database(source_path, db_path, shard_folder=None):
+    '''
+    Split an existing exam archive database into a catalog database and archive databases. The source database is
+    left untouched. The server should not be modifying the source database while it is split.
+
+    INPUT:
+
+    * `source_path`: Path of the existing exam archive database.
+    * `db_path`: Path of the new catalog database.
+    * `shard_folder`: Folder of the new archive databases. If None, DEFAULT_SHARD_FOLDER is used instead.
+
+    OUTPUT:
+
+    * A ShardedExamArchiveDatabase object accessing the new databases.
+
+    Raises exception ExamDatabaseError if the catalog database or archive databases already exist, or if the source
+    database has course or exam IDs reserved for the archive databases.
+    '''
+    db = ShardedExamArchiveDatabase(db_path, shard_folder)
+    if os.path.exists(db_path) or db._shard_paths():
+        raise ExamDatabaseError("The sharded database already exists")
+
+    con = sqlite3.connect(source_path)
+    with con:
+        cur = con.cursor()
+        cur.execute('SELECT MAX(course_id) FROM course UNION ALL SELECT MAX(exam_id) FROM exam')
+        too_large = [row[0] for row in cur.fetchall() if row[0] is not None and row[0] >= SHARD_ID_RANGE]
+    con.close()
+    if too_large:
+        raise ExamDatabaseError("The source database has IDs reserved for the archive databases")
+
+    # Start from a copy of the whole database and add the routing table
+    shutil.copyfile(source_path, db_path)
+    db.create_tables_from_schema()
+
+    for archive in db.browse_archives():
+        archive_id = archive['archive_id']
+        db._shard(archive_id)
+
+        # Move the courses and exams of the archive with their IDs, so that the URLs of the resources stay the same
+        con = sqlite3.connect(db._shard_path(archive_id))
+        with con:
+            cur = con.cursor()
+            cur.execute('ATTACH DATABASE ? AS catalog', (db_path,))
+            cur.execute('INSERT INTO main.course SELECT * FROM catalog.course WHERE archive_id = ?', (archive_id,))
+            cur.execute('INSERT INTO main.exam SELECT * FROM catalog.exam WHERE course_id IN '
+                        '(SELECT course_id FROM catalog.course WHERE archive_id = ?)', (archive_id,))
+            cur.execute('INSERT INTO catalog.shard_route SELECT \'course\', course_id, archive_id FROM main.course')
+            cur.execute('INSERT INTO catalog.shard_route SELECT \'exam\', exam_id, ? FROM main.exam', (archive_id,))
+            cur.execute('DELETE FROM catalog.exam WHERE course_id IN '
+                        '(SELECT course_id FROM catalog.course WHERE archive_id = ?)', (archive_id,))
+            cur.execute('DELETE FROM catalog.course WHERE archive_id = ?', (archive_id,))
+        con.close()
+
+    return db
+
+
+# Split a database from command line
+if __name__ == '__main__':
+    if len(sys.argv) not in (3, 4):
+        print 'Usage: python sharded_exam_archive.py <source db> <catalog db> [<shard folder>]'
+        sys.exit(1)
+    split_database(*sys.argv[1:])
+    print 'Database split into %s' % sys.argv[2]
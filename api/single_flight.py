@@ -0,0 +1,79 @@
+# coding=UTF-8
+#
+# Provides the coalescing of concurrent identical computations of the Exam Archive, so that e.g. a hot list is built
+# only once when many clients request it at the same time.
+#
+# @authors: Ari Kairala, Petteri Ponsimaa
+
+import sys
+import threading
+
+
+class _Call(object):
+    '''
+    Computation in flight, which the callers with the same key wait for.
+    '''
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight(object):
+    '''
+    Group of computations by keys. While a computation is in flight, the other callers with the same key wait for it
+    and share its result, instead of computing the same result again. The results are not cached, a computation
+    starting after the previous one has finished is run again.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, function):
+        '''
+        Call function and return its result, or wait for the call in flight with the same key and return its result.
+        If the function raises an exception, the same exception is raised to all the callers sharing the call.
+
+        INPUT:
+
+        * `key`: Hashable key identifying the computation, e.g. a tuple of the resource, its parameters and the
+        permission scope of the caller.
+        * `function`: Function without parameters computing the result.
+        '''
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error[0], call.error[1], call.error[2]
+            return call.result
+
+        try:
+            call.result = function()
+        except Exception:
+            call.error = sys.exc_info()
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result
+
+    def waiters(self, key):
+        '''
+        Return the number of callers waiting for the call in flight with the given key, or None if there is no call in
+        flight.
+        '''
+        with self.lock:
+            call = self.calls.get(key)
+            return call.waiters if call is not None else None
@@ -0,0 +1,154 @@
+# coding=UTF-8
+#
+# Provides the RESTful API resources for listing the teachers of the Examrium.
+#
+# @authors: Ari Kairala, Petteri Ponsimaa
+
+
+import json
+
+from flask import Flask, request, Response, g, jsonify
+from flask.ext.restful import Resource, Api, abort
+from resources_common import auth, app, api, error_response, API_VERSION, TEACHER_PROFILE, snapshot_response, \
+    href
+
+def teacher_item(teacher):
+    '''
+    Create a Collection+JSON item of a teacher as returned by browse_teachers.
+    '''
+    item = {}
+    data = []
+    item['href'] = href(Teacher, teacher_id=teacher['teacher_id'])
+    item['read-only'] = True
+    item['data'] = data
+
+    data.append({'name':'teacherId', 'value':teacher['teacher_id']})
+    data.append({'name':'firstName', 'value':teacher['first_name']})
+    data.append({'name':'lastName', 'value':teacher['last_name']})
+    data.append({'name':'office', 'value':teacher['office']})
+    data.append({'name':'streetAddress', 'value':teacher['street_address']})
+    data.append({'name':'postalCode', 'value':teacher['postal_code']})
+    data.append({'name':'city', 'value':teacher['city']})
+    data.append({'name':'phone', 'value':teacher['phone']})
+    data.append({'name':'email', 'value':teacher['email']})
+    data.append({'name':'otherInfo', 'value':teacher['other_info']})
+    data.append({'name':'dateModified', 'value':teacher['last_modified']})
+    return item
+
+# Define the resources
+class TeacherList(Resource):
+    '''
+    Resource TeacherList implementation
+    '''
+
+    @auth.login_required
+    def get(self):
+        '''
+        Get a list of the teachers in the exam archive. The list is served from the lookup snapshot of the database
+        API, which is read again from the database only when teachers are created, edited or removed.
+
+        INPUT:
+
+        * `None`
+
+        HEADERS:
+
+        * `Accept`: application/json
+        * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+        * `If-None-Match`: Optional ETag of the list as returned by GET. If the list has not changed, status code 304
+        is returned without a body.
+
+        ENTITY BODY OUTPUT FORMAT:
+
+        * `Media type`: Collection+JSON:
+            http://amundsen.com/media-types/collection/
+
+        * `Profile`: Teacher profile
+            http://atlassian.virtues.fi:8090/display/PWP/PWP11#PWP11-Teacherprofile
+
+        The response has a strong ETag header, which changes only when the teachers change.
+
+        RETURN CODES:
+
+        `200` A list of teachers was returned succesfully.
+        `304` Not modified. The list has not changed since the ETag given in If-None-Match header.
+        `401` Not logged in. You are not logged in, unable to get teacher information.
+
+        In case of error, the response media type Problem+JSON is returned with the error message above.
+        '''
+
+        if g.no_auth_provided:
+            return error_response(401, "Not logged in", "You are not logged in, unable to get teacher information")
+
+        lookups = g.db.get_lookups()
+
+        # Create the envelope
+        envelope = {}
+        collection = {}
+        envelope["collection"] = collection
+        collection['version'] = API_VERSION
+        collection['href'] = href(TeacherList)
+        collection['items'] = [teacher_item(teacher) for teacher in lookups.teachers]
+
+        # Return the response with Collection+JSON mime type, URL to Teacher profile and the ETag of the teachers
+        return snapshot_response(envelope, lookups.teachers_etag, TEACHER_PROFILE)
+
+class Teacher(Resource):
+    '''
+    Resource Teacher implementation
+    '''
+
+    @auth.login_required
+    def get(self, teacher_id):
+        '''
+        Get the details of a teacher from the lookup snapshot of the database API.
+
+        INPUT:
+
+        * `teacher_id`: ID of the teacher.
+
+        HEADERS:
+
+        * `Accept`: application/json
+        * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+        * `If-None-Match`: Optional ETag of the teacher as returned by GET. If the teachers have not changed, status
+        code 304 is returned without a body.
+
+        ENTITY BODY OUTPUT FORMAT:
+
+        * `Media type`: Collection+JSON:
+            http://amundsen.com/media-types/collection/
+
+        * `Profile`: Teacher profile
+            http://atlassian.virtues.fi:8090/display/PWP/PWP11#PWP11-Teacherprofile
+
+        RETURN CODES:
+
+        `200` Teacher information was returned succesfully.
+        `304` Not modified. The teachers have not changed since the ETag given in If-None-Match header.
+        `401` Not logged in. You are not logged in, unable to get teacher information.
+        `404` Not found. Teacher not found.
+
+        In case of error, the response media type Problem+JSON is returned with the error message above.
+        '''
+
+        if g.no_auth_provided:
+            return error_response(401, "Not logged in", "You are not logged in, unable to get teacher information")
+
+        lookups = g.db.get_lookups()
+        teacher = lookups.teachers_by_id.get(unicode(teacher_id))
+        if teacher is None:
+            return error_response(404, "Not found", "Teacher not found")
+
+        # Create the envelope
+        envelope = {}
+        collection = {}
+        envelope["collection"] = collection
+        collection['version'] = API_VERSION
+        collection['href'] = href(Teacher, teacher_id=teacher_id)
+        collection['links'] = [{'name':"teacher_list", 'prompt':'Teacher list', 'rel':'teachers',
+                                'href': href(TeacherList)}]
+        collection['items'] = [teacher_item(teacher)]
+
+        # Return the response with Collection+JSON mime type, URL to Teacher profile and the ETag of the teachers
+        return snapshot_response(envelope, lookups.teachers_etag, TEACHER_PROFILE)
@@ -0,0 +1,64 @@
+# coding=UTF-8
+#
+# Provides the RESTful API resource for exchanging user credentials to access tokens in the Examrium.
+#
+# @authors: Ari Kairala, Petteri Ponsimaa
+
+
+import tokens
+
+from flask import Flask, request, Response, g, jsonify
+from flask.ext.restful import Resource, Api, abort
+from resources_common import auth, app, api, error_response, DEFAULTJSON, dumps
+
+# Define the resources
+class Token(Resource):
+    '''
+    Resource Token implementation
+    '''
+
+    @auth.login_required
+    def post(self):
+        '''
+        Exchange the user name and password to a signed access token. The token can be sent in the header
+        `Authorization: Bearer <token>` instead of the user name and password, in which case the user is authorized
+        without querying the database. The token expires after TOKEN_LIFETIME seconds, and it is revoked when the
+        user name, password, user type or archive of the user changes, or the user is removed.
+
+        INPUT:
+
+        * `None`
+
+        HEADERS:
+
+        * `Accept`: application/json
+        * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
+
+        ENTITY BODY OUTPUT FORMAT:
+
+        * `Media type`: application/json, containing the following keys:
+            * `access_token`: The access token.
+            * `token_type`: Bearer
+            * `expires_in`: Number of seconds the token is valid.
+
+        RETURN CODES:
+
+        `200` An access token was issued successfully.
+        `401` Not logged in. You are not logged in, unable to get an access token.
+        `403` Access forbidden. Access tokens are issued only for user name and password.
+
+        In case of error, the response media type Problem+JSON is returned with the error message above.
+        '''
+
+        if g.no_auth_provided:
+            return error_response(401, "Not logged in", "You are not logged in, unable to get an access token")
+        if g.token_claims is not None:
+            return error_response(403, "Access forbidden", "Access tokens are issued only for user name and password")
+
+        user = g.db.get_user(g.user_logged_in)
+        generation = g.db.get_token_generations().get(user['user_id'], 0)
+        lifetime = app.config['TOKEN_LIFETIME']
+        token = tokens.issue_token(app.config['SECRET_KEY'], user, generation, lifetime)
+
+        body = {'access_token': token, 'token_type': 'Bearer', 'expires_in': lifetime}
+        return Response(dumps(body), 200, headers={'Cache-Control': 'no-store'}, mimetype=DEFAULTJSON)
@@ -0,0 +1,92 @@
+# coding=UTF-8
+#
+# Provides the signed access tokens of the Exam Archive, which are verified without querying the database.
+#
+# @authors: Ari Kairala, Petteri Ponsimaa
+
+import hmac
+import json
+import time
+import base64
+import hashlib
+
+DEFAULT_LIFETIME = 3600
+''' Default number of seconds an access token is valid. '''
+
+CLAIMS = ('user_id', 'username', 'user_type', 'archive_id', 'generation', 'expires')
+''' Names of the values embedded in an access token. '''
+
+
+def _encode(data):
+    '''
+    Encode bytes to URL safe base64 without padding.
+    '''
+    return base64.urlsafe_b64encode(data).rstrip('=')
+
+
+def _decode(text):
+    '''
+    Decode URL safe base64 without padding to bytes.
+    '''
+    return base64.urlsafe_b64decode(str(text) + '=' * (-len(text) % 4))
+
+
+def _signature(secret, payload):
+    '''
+    Calculate the HMAC-SHA256 signature of the payload of an access token.
+    '''
+    return hmac.new(secret, payload, hashlib.sha256).digest()
+
+
+def issue_token(secret, user, generation, lifetime=DEFAULT_LIFETIME, now=None):
+    '''
+    Issue a signed access token for a user.
+
+    INPUT:
+
+    * `secret`: The secret key the token is signed with.
+    * `user`: The user as returned by get_user.
+    * `generation`: The token generation of the user as returned by get_token_generations. The token is valid only
+    as long as the generation of the user stays the same.
+    * `lifetime`: Number of seconds the token is valid.
+    * `now`: The current time as seconds since the epoch. If None, the current time is used.
+
+    OUTPUT:
+
+    * The access token as a string.
+    '''
+    if now is None:
+        now = time.time()
+    claims = {'user_id': user['user_id'], 'username': user['username'], 'user_type': user['user_type'],
+              'archive_id': user['archive_id'], 'generation': generation, 'expires': int(now + lifetime)}
+    payload = _encode(json.dumps(claims, separators=(',', ':'), sort_keys=True))
+    return payload + '.' + _encode(_signature(secret, payload))
+
+
+def verify_token(secret, token, now=None):
+    '''
+    Verify the signature and the expiry time of an access token. The token generation must be compared to the
+    generation of the user by the caller.
+
+    INPUT:
+
+    * `secret`: The secret key the token was signed with.
+    * `token`: The access token as returned by issue_token.
+    * `now`: The current time as seconds since the epoch. If None, the current time is used.
+
+    OUTPUT:
+
+    * A dictionary containing the keys of CLAIMS, or None if the token is not valid or has expired.
+    '''
+    if now is None:
+        now = time.time()
+    try:
+        payload, signature = str(token).split('.')
+        if not hmac.compare_digest(_signature(secret, payload), _decode(signature)):
+            return None
+        claims = json.loads(_decode(payload))
+    except (ValueError, TypeError, UnicodeError):
+        return None
+    if not isinstance(claims, dict) or any(name not in claims for name in CLAIMS) or claims['expires'] <= now:
+        return None
+    return claims
@@ -0,0 +1,255 @@
+# coding=UTF-8
+#
+# Provides the request tracing of the Exam Archive. The spans of a request, e.g. the authentication, the calls of the
+# database API and the JSON serialization, are recorded in the request thread and written to a local JSON Lines file
+# when the request has finished.
+#
+# @authors: Ari Kairala, Petteri Ponsimaa
+
+import os
+import json
+import time
+import random
+import threading
+import functools
+
+LOCAL = threading.local()
+''' Trace of the request of the current thread in the attribute trace, if the request is traced. '''
+
+TRACERS = {}
+''' Tracers by the absolute paths of their files. '''
+
+TRACERS_LOCK = threading.Lock()
+''' Lock for creating the tracers. '''
+
+
+def _span_id():
+    '''
+    Return a random 64-bit span ID as 16 hexadecimal digits.
+    '''
+    return '%016x' % random.getrandbits(64)
+
+
+class Tracer(object):
+    '''
+    Exporter writing the spans of the finished traces to a JSON Lines file, one span per line. Each line is a complete
+    event of the Trace Event Format, so the file is opened in chrome://tracing or Perfetto after wrapping the lines in
+    a JSON array, e.g. with `jq -s . traces.jsonl`. The trace and span IDs are in the args of the events. The spans
+    of a trace are appended with one write, so the traces of the worker processes are not interleaved.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self, events):
+        '''
+        Append the events of the spans of a trace to the file.
+        '''
+        data = ''.join(json.dumps(event, separators=(',', ':')) + '\n' for event in events)
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(data)
+
+
+class Trace(object):
+    '''
+    Spans of a request. The spans in progress are kept in a stack, so that a new span is a child of the innermost
+    span in progress.
+    '''
+    __slots__ = ('tracer', 'trace_id', 'stack', 'events')
+
+    def __init__(self, tracer, trace_id):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.stack = []
+        self.events = []
+
+    def begin(self, name, attributes):
+        '''
+        Begin a span and return it.
+        '''
+        parent_id = self.stack[-1][1] if self.stack else None
+        span = (name, _span_id(), parent_id, time.time(), attributes)
+        self.stack.append(span)
+        return span
+
+    def end(self, span, attributes=None):
+        '''
+        End a span and record its event. The spans begun within the span and not ended are ended as well.
+        '''
+        end = time.time()
+        while self.stack:
+            current = self.stack.pop()
+            name, span_id, parent_id, start, span_attributes = current
+            args = {'trace_id': self.trace_id, 'span_id': span_id, 'parent_id': parent_id}
+            args.update(span_attributes)
+            if current is span and attributes:
+                args.update(attributes)
+            self.events.append({'name': name, 'ph': 'X', 'ts': int(start * 1000000),
+                                'dur': int((end - start) * 1000000), 'pid': os.getpid(),
+                                'tid': threading.current_thread().ident, 'args': args})
+            if current is span:
+                break
+
+
+def begin_request(tracer, trace_id, name, attributes):
+    '''
+    Begin the span of a request. If no request is traced in the current thread, a new trace with the given ID is
+    started with the span as its root, unless tracer is None. If a request is already traced, e.g. a batch running
+    its sub-requests, the span is a child of the innermost span in progress. Returns the span, or None if the request
+    is not traced.
+    '''
+    trace = getattr(LOCAL, 'trace', None)
+    if trace is None:
+        if tracer is None:
+            return None
+        trace = LOCAL.trace = Trace(tracer, trace_id)
+    return trace.begin(name, attributes)
+
+def end_request(span, attributes=None):
+    '''
+    End the span of a request returned by begin_request. When the root span ends, the spans of the trace are
+    exported.
+    '''
+    trace = LOCAL.trace
+    trace.end(span, attributes)
+    if not trace.stack:
+        LOCAL.trace = None
+        trace.tracer.export(trace.events)
+
+def annotate(attributes, span=None):
+    '''
+    Add attributes to the given span, or to the innermost span in progress if span is None, if the request is traced.
+    '''
+    if span is not None:
+        span[4].update(attributes)
+        return
+    trace = getattr(LOCAL, 'trace', None)
+    if trace is not None and trace.stack:
+        trace.stack[-1][4].update(attributes)
+
+def is_root(span):
+    '''
+    Return True, if the span is the root span of its trace.
+    '''
+    return span[2] is None
+
+
+class traced_body(object):
+    '''
+    Iterable wrapping the body of the response of a traced request, so that the span of the request is ended only
+    when the server has sent the body and closed it. Sending the body is recorded as a child span with the given name
+    and attributes, which covers e.g. reading a file sent with send_file or writing a ZIP archive while it is sent.
+
+    The trace is detached from the current thread, so that the next request of the thread starts a trace of its own
+    even if the server never closes the body.
+    '''
+
+    def __init__(self, iterable, span, name, attributes):
+        self.iterable = iterable
+        self.span = span
+        self.trace = LOCAL.trace
+        LOCAL.trace = None
+        self.body = self.trace.begin(name, dict(attributes))
+        self.error = None
+
+    def __iter__(self):
+        size = 0
+        try:
+            for data in self.iterable:
+                size += len(data)
+                yield data
+        except Exception as e:
+            self.error = type(e).__name__
+            raise
+        finally:
+            self.body[4]['bytes'] = size
+
+    def close(self):
+        '''
+        Close the wrapped body, end the spans and export the trace.
+        '''
+        try:
+            if hasattr(self.iterable, 'close'):
+                self.iterable.close()
+        finally:
+            if self.trace is not None:
+                trace, self.trace = self.trace, None
+                trace.end(self.body, {'error': self.error} if self.error is not None else None)
+                trace.end(self.span)
+                trace.tracer.export(trace.events)
+
+
+class span(object):
+    '''
+    Context manager recording the code within the with statement as a span of the request traced in the current
+    thread, e.g.
+
+        with tracing.span('file.write', path=pathname):
+            file.save(pathname)
+
+    Nothing is recorded, if the request is not traced.
+    '''
+    __slots__ = ('name', 'attributes', 'trace', 'span')
+
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.trace = getattr(LOCAL, 'trace', None)
+        if self.trace is not None:
+            self.span = self.trace.begin(self.name, self.attributes)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.trace is not None:
+            self.trace.end(self.span, {'error': exc_type.__name__} if exc_type is not None else None)
+        return False
+
+
+def traced(name):
+    '''
+    Decorator recording the calls of a function as spans with the given name.
+    '''
+    def decorator(function):
+        @functools.wraps(function)
+        def call(*args, **kwargs):
+            trace = getattr(LOCAL, 'trace', None)
+            if trace is None:
+                return function(*args, **kwargs)
+            span = trace.begin(name, {})
+            try:
+                result = function(*args, **kwargs)
+            except Exception as e:
+                trace.end(span, {'error': type(e).__name__})
+                raise
+            trace.end(span)
+            return result
+        return call
+    return decorator
+
+def trace_methods(prefix):
+    '''
+    Class decorator recording the calls of the public methods defined in the class as spans named by the prefix and
+    the method, e.g. db.browse_exam_list. Only the calls made within traced requests are recorded.
+    '''
+    def decorator(cls):
+        for name, value in vars(cls).items():
+            if not name.startswith('_') and callable(value) and not isinstance(value, type):
+                setattr(cls, name, traced(prefix + name)(value))
+        return cls
+    return decorator
+
+def tracer(path):
+    '''
+    Return the shared Tracer object of a file, or None if path is None.
+    '''
+    if path is None:
+        return None
+    key = os.path.abspath(path)
+    with TRACERS_LOCK:
+        if key not in TRACERS:
+            TRACERS[key] = Tracer(key)
+        return TRACERS[key]
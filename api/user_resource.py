@@ -10,10 +10,37 @@ import json
 
 from flask import Flask, request, Response, g, jsonify
 from flask.ext.restful import Resource, Api, abort
-from exam_archive import ExamDatabaseErrorExists
-from resources_common import auth, app, api, error_response, API_VERSION, COLLECTIONJSON, USER_PROFILE, DEFAULTJSON
+from exam_archive import ExamDatabaseErrorExists, ExamDatabaseErrorNotFound, ExamDatabaseErrorModified, SORT_KEYS
+from resources_common import auth, app, api, error_response, API_VERSION, COLLECTIONJSON, USER_PROFILE, DEFAULTJSON, \
+    entity_tag, precondition_failed, if_match_modified, href, dumps, fragment, page_parameters, next_page_link, \
+    fields_parameter, selected_columns
 from archive_resource import Archive, ArchiveList
 
+USER_TEMPLATE = fragment({
+    "data" : [
+        {"prompt" : "Insert user ID", "name" : "userId", "value" : "", "required":False},
+        {"prompt" : "Insert user name", "name" : "name", "value" : "", "required":True},
+        {"prompt" : "Insert user type", "name" : "userType", "value" : "", "required":False},
+        {"prompt" : "Insert user archive", "name" : "archiveId", "value" : "", "required":False},
+        {"prompt" : "Insert user password", "name" : "accessCode", "value" : "", "required":True}
+    ]
+})
+''' Pre-encoded Collection+JSON template of the UserList and User resources. '''
+
+USER_FIELDS = {
+    'userId': ('user_id',),
+    'userType': ('user_type',),
+    'name': ('username',),
+    'accessCode': ('password',),
+    'dateModified': ('last_modified',),
+    'modifier': ('modifier_id',),
+    'links': ('user_type', 'archive_id'),
+}
+''' Columns of the user table needed by each field of the user items, for the fields query parameter. '''
+
+USER_COLUMNS = ('user_id', 'username')
+''' Columns of the user table needed by every user item. '''
+
 # Define the resources
 class UserList(Resource):
     '''
@@ -27,7 +54,13 @@ class UserList(Resource):
 
         INPUT:
 
-        * `None`
+        * `sort`: Optional query parameter. Sort the users by username or last_modified, e.g. ?sort=username. A minus
+        sign before the key sorts in descending order.
+        * `limit`: Optional query parameter. The maximum number of users returned. If there are more users, the
+        collection has a link with relation next to the next page.
+        * `after`: Optional query parameter. The cursor of the next page, set by the next link.
+        * `fields`: Optional query parameter. Comma separated names of the data fields included in the user items, e.g.
+        ?fields=userId,name. The modifiers and the links to the archives are looked up only when requested.
 
         HEADERS:
 
@@ -46,6 +79,8 @@ class UserList(Resource):
         RETURN CODES:
 
         `200` A list of users having access to the exam archive was fetched and returned successfully.
+        `400` Invalid paging parameter. The sort key, limit or cursor is not valid.
+        `400` Invalid fields parameter. Only the data fields of the user items and links can be selected.
         `401` Not logged in. You are not logged in, unable to get user information.
         `403` Access forbidden. "You are not authorized to access the user list.
         `404` Not found. No users found.
@@ -58,10 +93,22 @@ class UserList(Resource):
         if not g.user_logged_in or not g.user_type in ['basic','super','admin']:
             return error_response(403, "Access forbidden", "You are not authorized to access the user list")
 
+        page = page_parameters(SORT_KEYS['user'])
+        if page is None:
+            return error_response(400, "Invalid paging parameter", "The sort key, limit or cursor is not valid")
+
+        fields = fields_parameter(USER_FIELDS)
+        if fields is False:
+            return error_response(400, "Invalid fields parameter",
+                                  "Only the data fields of the user items and links can be selected")
+        columns = selected_columns(fields, USER_FIELDS, USER_COLUMNS)
+        if fields is None:
+            fields = USER_FIELDS
+
         # Extract users from the database
-        users = g.db.browse_users()
+        users = g.db.browse_users(columns=columns, **page)
 
-        if len(users) == 0:
+        if len(users) == 0 and 'after' not in page:
             return error_response(404, "Not found", "No users found")
 
         # Create the envelope
@@ -69,64 +116,60 @@ class UserList(Resource):
         collection = {}
         envelope["collection"] = collection
         collection['version'] = API_VERSION
-        collection['href'] = api.url_for(UserList)
-
-        collection['template'] = {
-            "data" : [
-                {"prompt" : "Insert user ID", "name" : "userId", "value" : "", "required":False},
-                {"prompt" : "Insert user name", "name" : "name", "value" : "", "required":True},
-                {"prompt" : "Insert user type", "name" : "userType", "value" : "", "required":False},
-                {"prompt" : "Insert user archive", "name" : "archiveId", "value" : "", "required":False},
-                {"prompt" : "Insert user password", "name" : "accessCode", "value" : "", "required":True}
-            ]
-        }
+        collection['href'] = href(UserList)
+
+        collection['template'] = USER_TEMPLATE
 
         collection['links'] = [{'name':'user_list', 'prompt':'All the users in the exam archive',
-                                'rel':'users','href': api.url_for(UserList)},
+                                'rel':'users','href': href(UserList)},
                                {'name':'archive_list', 'prompt':'List of accessible archives',
-                                'rel':'archives','href': api.url_for(ArchiveList)}]
+                                'rel':'archives','href': href(ArchiveList)}]
         # Create the items
         items = []
         for user in users:
             user_id = user['user_id']
-            user_type = user['user_type']
             username = user['username']
-            password_hash = user['password']
 
             item = {}
             data = []
             links = []
-            item['href'] = api.url_for(User, username=username)
+            item['href'] = href(User, username=username)
             item['read-only'] = True
             item['data'] = data
             item['links'] = links
 
             # Add data fields to the item container
-            data.append({'name':'userId', 'value':user_id})
-            data.append({'name':'userType', 'value':user_type})
-            data.append({'name':'name', 'value':username})
-            data.append({'name':'accessCode', 'value':password_hash})
-            data.append({'name':'dateModified', 'value':user['last_modified']})
-
-            modifier_id = user['modifier_id']
-            if modifier_id:
+            if 'userId' in fields:
+                data.append({'name':'userId', 'value':user_id})
+            if 'userType' in fields:
+                data.append({'name':'userType', 'value':user['user_type']})
+            if 'name' in fields:
+                data.append({'name':'name', 'value':username})
+            if 'accessCode' in fields:
+                data.append({'name':'accessCode', 'value':user['password']})
+            if 'dateModified' in fields:
+                data.append({'name':'dateModified', 'value':user['last_modified']})
+
+            modifier_id = user.get('modifier_id')
+            if modifier_id and 'modifier' in fields:
                 modifier = g.db.get_user(modifier_id)
                 modifier_name = modifier['username']
                 data.append({'name':'modifier', 'value':modifier_name})
 
+            user_type = user.get('user_type') if 'links' in fields else None
             if user_type in ['basic', 'admin']:
                 archive_id = user['archive_id']
                 archive = g.db.get_archive(archive_id)
                 if(archive):
                     archive_name = archive['archive_name']
                     link = {'name':archive_name, 'prompt':'Archive accessible by user %s' % username,
-                               'rel':'archive','href': api.url_for(Archive, archive=archive_id)}
+                               'rel':'archive','href': href(Archive, archive=archive_id)}
                     links.append(link)
             elif user_type == 'super':
                 archives = g.db.browse_archives()
                 for archive in archives:
                     link = {'name':archive['archive_name'], 'prompt':'Archive accessible by user %s' % username,
-                               'rel':'archive','href': api.url_for(Archive, archive=archive['archive_id'])}
+                               'rel':'archive','href': href(Archive, archive=archive['archive_id'])}
                     links.append(link)
 
             # Add new item the the items container in the collection
@@ -134,8 +177,12 @@ class UserList(Resource):
 
         collection['items'] = items
 
+        next_link = next_page_link(collection['href'], users, page, 'user_id')
+        if next_link:
+            collection['links'].append(next_link)
+
         # Return the response with status code 200, Collection+JSON mime type and URL to User profile
-        return Response (json.dumps(envelope), 200, mimetype=COLLECTIONJSON+";"+USER_PROFILE)
+        return Response (dumps(envelope), 200, mimetype=COLLECTIONJSON+";"+USER_PROFILE)
 
     
     @auth.login_required
@@ -231,7 +278,7 @@ class UserList(Resource):
             return error_response(500, "Database error", "Please, contact the administrator")
 
         # Create the location header with the username of the newly added user
-        url = api.url_for(User, username=username)
+        url = href(User, username=username)
 
         # Return the response with status code 201 and location header with URL pointing to new resource
         return Response(status=201, headers={'Location':url}, mimetype=DEFAULTJSON)
@@ -273,6 +320,7 @@ class User(Resource):
         `404` User not found. Requested user was not found.
         `409` No userID. Not userID parameter provided.
 
+        The response has an ETag header, which can be given in If-Match header of PUT and DELETE requests.
         In case of error, the response media type Problem+JSON is returned with the error message above.
         '''
         if g.no_auth_provided:
@@ -294,21 +342,13 @@ class User(Resource):
         collection = {}
         envelope["collection"] = collection
         collection['version'] = API_VERSION
-        collection['href'] = api.url_for(User, username=username)
-
-        collection['template'] = {
-            "data" : [
-                {"prompt" : "Insert user ID", "name" : "userId", "value" : "", "required":False},
-                {"prompt" : "Insert user name", "name" : "name", "value" : "", "required":True},
-                {"prompt" : "Insert user type", "name" : "userType", "value" : "", "required":False},
-                {"prompt" : "Insert user archive", "name" : "archiveId", "value" : "", "required":False},
-                {"prompt" : "Insert user password", "name" : "accessCode", "value" : "", "required":True}
-            ]
-        }
+        collection['href'] = href(User, username=username)
+
+        collection['template'] = USER_TEMPLATE
         collection['links'] = [{'name':'user_list', 'prompt':'All the users in the exam archive',
-                                'rel':'users','href': api.url_for(UserList)},
+                                'rel':'users','href': href(UserList)},
                                {'name':'archive_list', 'prompt':'List of accessible archives',
-                                'rel':'archives','href': api.url_for(ArchiveList)}]
+                                'rel':'archives','href': href(ArchiveList)}]
         # Create the items
         items = []
 
@@ -321,7 +361,7 @@ class User(Resource):
         item = {}
         data = []
         links = []
-        item['href'] = api.url_for(User, username=username)
+        item['href'] = href(User, username=username)
         item['read-only'] = True
         item['data'] = data
         item['links'] = links
@@ -346,13 +386,13 @@ class User(Resource):
             if archive:
                 archive_name = archive['archive_name']
                 link = {'name':archive_name, 'prompt':'Archive accessible by user %s' % username,
-                           'rel':'archive','href': api.url_for(Archive, archive=archive_id)}
+                           'rel':'archive','href': href(Archive, archive=archive_id)}
                 links.append(link)
         elif user_type == 'super':
             archives = g.db.browse_archives()
             for archive in archives:
                 link = {'name':archive['archive_name'], 'prompt':'Archive accessible by user %s' % username,
-                           'rel':'archive','href': api.url_for(Archive, archive=archive['archive_id'])}
+                           'rel':'archive','href': href(Archive, archive=archive['archive_id'])}
                 links.append(link)
 
         items.append(item)
@@ -360,7 +400,9 @@ class User(Resource):
         collection['items'] = items
 
         # Return the response with status code 200 and Collection+JSON mime type with URL to User profile
-        return Response (json.dumps(envelope), 200, mimetype=COLLECTIONJSON+";"+USER_PROFILE)
+        response = Response (dumps(envelope), 200, mimetype=COLLECTIONJSON+";"+USER_PROFILE)
+        response.set_etag(entity_tag(user))
+        return response
     
     @auth.login_required
     def put(self, username):
@@ -376,6 +418,7 @@ class User(Resource):
         * `Accept`: application/json
         * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
         The User must be super admin.
+        * `If-Match`: Optional ETag of the user as returned by GET. The user is updated only if it matches.
 
         ENTITY BODY INPUT FORMAT:
 
@@ -393,7 +436,9 @@ class User(Resource):
         `401` Not logged in. You are not logged in, unable to update user information.
         `403` Access forbidden. You are not authorized. (must be a user of type 'super')
         `404` User not found. Given username was not found.
+        `404` Not found. Given archive or modifier was not found.
         `409` Error updating user.
+        `412` Precondition failed. The user has been modified since it was fetched.
         `415` Unsupported media type. Use a JSON compatible format.
         `500` Database error. Please, contact the adminnistrator.
 
@@ -411,6 +456,10 @@ class User(Resource):
         if not user:
             return error_response(404, "User not found", "Given username was not found")
 
+        # Check that the user has not been modified since the client fetched it
+        if precondition_failed(user):
+            return error_response(412, "Precondition failed", "The user has been modified since it was fetched")
+
         # Convert the request body to JSON. If it fails get_json method throws an exception. Catch it and report it to
         # the user as an error. Set silent = True to let us replace '400 bad request' with more detailed error message.
         input = request.get_json(force=True, silent=True)
@@ -451,16 +500,21 @@ class User(Resource):
 
         #Create the new message and build the response code
         try:
-            success = g.db.edit_user(user_id, username, password, user_type, archive_id, modifier_id)
+            success = g.db.edit_user(user_id, username, password, user_type, archive_id, modifier_id,
+                                     if_match_modified(user))
 
+        except ExamDatabaseErrorModified:
+            return error_response(412, "Precondition failed", "The user has been modified since it was fetched")
         except ExamDatabaseErrorExists as e:
             return error_response(409, "Error updating user", e.message)
+        except ExamDatabaseErrorNotFound as e:
+            return error_response(404, "Not found", e.message)
 
         if not success:
             return error_response(500, "Database error", "Please, contact the adminnistrator")
 
         #Create the Location header with the id of the message created
-        url = api.url_for(User, username=username)
+        url = href(User, username=username)
 
         # Return the response with status code 200 and location header
         return Response(status=200, headers={'Location':url}, mimetype=DEFAULTJSON)
@@ -480,6 +534,7 @@ class User(Resource):
         * `Accept`: application/json
         * `Authorization`: HTTP basic authentication header with user name and password as specified in RFC 2617.
         The user must be super admin.
+        * `If-Match`: Optional ETag of the user as returned by GET. The user is deleted only if it matches.
 
         RETURN CODES:
 
@@ -487,6 +542,7 @@ class User(Resource):
         `401` Not logged in. You are not logged in, unable delete the user.
         `403` Access forbidden. You are not authorized. (must be a user of type 'super')
         `404` User not found. Given username was not found.
+        `412` Precondition failed. The user has been modified since it was fetched.
         `500` Database error. Please, contact the adminnistrator.
 
         In case of error, the response media type Problem+JSON is returned with the error message above.
@@ -506,9 +562,16 @@ class User(Resource):
         if g.user_type == 'admin' and user['archive_id'] != g.user_archive:
             return error_response(403, "Access forbidden", "You are not authorized")
 
+        # Check that the user has not been modified since the client fetched it
+        if precondition_failed(user):
+            return error_response(412, "Precondition failed", "The user has been modified since it was fetched")
+
         # Try to delete the user
         user_id = user['user_id']
-        success = g.db.remove_user(user_id)
+        try:
+            success = g.db.remove_user(user_id, if_match_modified(user))
+        except ExamDatabaseErrorModified:
+            return error_response(412, "Precondition failed", "The user has been modified since it was fetched")
 
         if not success:
             return error_response(500, "Database error", "Please, contact the adminnistrator")
@@ -0,0 +1,156 @@
+# coding=UTF-8
+#
+# Provides streaming of ZIP files built on the fly, without buffering them in memory or on disk.
+#
+# @authors: Ari Kairala, Petteri Ponsimaa
+
+import os
+import time
+import zlib
+import struct
+
+CHUNK_SIZE = 65536
+''' Number of bytes read from a file at a time. '''
+
+COMPRESSED_EXTENSIONS = ['pdf', 'png', 'jpg', 'jpeg', 'gif', 'zip']
+''' File extensions of already compressed formats, which are stored in the ZIP file without compressing them again. '''
+
+COMPRESS_LEVEL = 6
+''' Compression level of the other files. '''
+
+ZIP64_LIMIT = 0xFFFFFFFF
+''' Sizes and offsets from which the ZIP64 extensions are used, because they do not fit in the 32-bit fields. '''
+
+ZIP64_COUNT_LIMIT = 0xFFFF
+''' Number of entries from which the ZIP64 end of central directory record is used. '''
+
+# Flags of the entries: sizes and CRC-32 follow the data in a data descriptor, names are UTF-8
+_FLAGS = 0x08 | 0x800
+_STORED = 0
+_DEFLATED = 8
+
+
+def _dos_time(timestamp):
+    '''
+    Convert a timestamp to the (time, date) pair of MS-DOS format used in ZIP files.
+    '''
+    t = time.localtime(timestamp)
+    year = max(t.tm_year, 1980)
+    return (t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2,
+            (year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday)
+
+
+def _chunks(path, data):
+    '''
+    Yield the contents of a file or a string in chunks.
+    '''
+    if path is None:
+        yield data
+        return
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            yield chunk
+
+
+def stream_zip(entries, timestamp=None):
+    '''
+    Build a ZIP file and yield it in chunks as it is built. Only one chunk of each file is kept in memory at a time.
+    Files with one of the COMPRESSED_EXTENSIONS are stored as such, other files are deflated.
+
+    The ZIP64 extensions are used for the entries, which may be ZIP64_LIMIT bytes or larger, for the entries starting
+    at an offset of ZIP64_LIMIT or larger, and for the end of the ZIP file, if it has ZIP64_COUNT_LIMIT entries or its
+    central directory does not fit in the 32-bit fields. Whether an entry is large is decided before it is written
+    from the size of its file, so ValueError is raised if a file grows over the limit while it is written.
+
+    INPUT:
+
+    * `entries`: Iterable of (name, path, data) tuples, where name is the name of the file in the ZIP file and
+    either path is the path of a file to include, or data is a string to include and path is None.
+    * `timestamp`: Modification time of the entries given as strings. If None, the current time is used.
+
+    OUTPUT:
+
+    * A generator yielding the bytes of the ZIP file.
+    '''
+    if timestamp is None:
+        timestamp = time.time()
+    central_directory = []
+    offset = 0
+
+    for name, path, data in entries:
+        if isinstance(name, unicode):
+            name = name.encode('utf-8')
+        extension = name.rsplit('.', 1)[-1].lower()
+        method = _STORED if extension in COMPRESSED_EXTENSIONS else _DEFLATED
+        dos_time, dos_date = _dos_time(os.path.getmtime(path) if path is not None else timestamp)
+
+        # Leave room for the deflated data being slightly larger than the file
+        expected_size = os.path.getsize(path) if path is not None else len(data)
+        zip64 = expected_size * 1.05 > ZIP64_LIMIT
+
+        # With the data descriptor, the sizes of the local header are zero, in the ZIP64 extra field as well
+        if zip64:
+            extra = struct.pack('<2H2Q', 1, 16, 0, 0)
+            header = struct.pack('<4s5H3L2H', b'PK\x03\x04', 45, _FLAGS, method, dos_time, dos_date, 0,
+                                 0xFFFFFFFF, 0xFFFFFFFF, len(name), len(extra)) + name + extra
+        else:
+            header = struct.pack('<4s5H3L2H', b'PK\x03\x04', 20, _FLAGS, method, dos_time, dos_date, 0, 0, 0,
+                                 len(name), 0) + name
+        yield header
+        header_offset = offset
+        offset += len(header)
+
+        crc = 0
+        size = 0
+        compressed_size = 0
+        compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -15) if method == _DEFLATED else None
+        for chunk in _chunks(path, data):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                compressed_size += len(chunk)
+                yield chunk
+        if compressor is not None:
+            chunk = compressor.flush()
+            compressed_size += len(chunk)
+            yield chunk
+        crc &= 0xffffffff
+
+        if zip64:
+            descriptor = struct.pack('<4sL2Q', b'PK\x07\x08', crc, compressed_size, size)
+        elif max(size, compressed_size) >= ZIP64_LIMIT:
+            raise ValueError("File %s grew too large while it was written" % name)
+        else:
+            descriptor = struct.pack('<4s3L', b'PK\x07\x08', crc, compressed_size, size)
+        yield descriptor
+        offset += compressed_size + len(descriptor)
+
+        # The ZIP64 extra field of the central directory has the values, which do not fit in their fields
+        zip64_values = []
+        if zip64:
+            zip64_values += [size, compressed_size]
+            size = compressed_size = 0xFFFFFFFF
+        if header_offset >= ZIP64_LIMIT:
+            zip64_values.append(header_offset)
+            header_offset = 0xFFFFFFFF
+        extra = struct.pack('<2H%dQ' % len(zip64_values), 1, 8 * len(zip64_values), *zip64_values) \
+            if zip64_values else b''
+        version = 45 if zip64_values else 20
+        central_directory.append(struct.pack('<4s6H3L5H2L', b'PK\x01\x02', version, version, _FLAGS, method,
+                                             dos_time, dos_date, crc, compressed_size, size, len(name), len(extra),
+                                             0, 0, 0, 0644 << 16, header_offset) + name + extra)
+
+    size = 0
+    for record in central_directory:
+        yield record
+        size += len(record)
+
+    count = len(central_directory)
+    if count >= ZIP64_COUNT_LIMIT or size >= ZIP64_LIMIT or offset >= ZIP64_LIMIT:
+        # ZIP64 end of central directory record and its locator
+        yield struct.pack('<4sQ2H2L4Q', b'PK\x06\x06', 44, 45, 45, 0, 0, count, count, size, offset)
+        yield struct.pack('<4sLQL', b'PK\x06\x07', 0, offset + size, 1)
+    yield struct.pack('<4s4H2LH', b'PK\x05\x06', 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+                      min(size, 0xFFFFFFFF), min(offset, 0xFFFFFFFF), 0)
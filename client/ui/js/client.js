@@ -23,8 +23,8 @@ Teacher_profile = "http://atlassian.virtues.fi:8090/display/PWP/PWP11#Teacher+pr
 DEFAULT_DATATYPE = "json",                  // Default datatype
 EMPTY_DATATYPE = "text",                    // Datatype for non-hypermedia
 ENTRYPOINT = "/exam_archive/api/users/"     // Entry point is UserList/GET
-TEACHERS_URL = "/client/data/teachers.json"      // As teachers resource is not implemented, json holdes a static list
-LANGUAGES_URL = "/client/data/languages.json"    // As languages resource is not implemented, json holdes a static list
+TEACHERS_URL = "/exam_archive/api/teachers/"     // TeacherList/GET
+LANGUAGES_URL = "/exam_archive/api/languages/"   // LanguageList/GET
 USERTYPES_URL = "/client/data/usertypes.json"    // Available user types are stored in a json list
 /**** END CONSTANTS ****/
 
@@ -75,6 +75,9 @@ CREATE TABLE IF NOT EXISTS exam(
 	FOREIGN KEY(modifier_id) REFERENCES user(user_id)
 );
 
+-- Create index enforcing that there is only one exam per course and date
+CREATE UNIQUE INDEX IF NOT EXISTS exam_course_date ON exam(course_id, date);
+
 -- Create teacher table
 CREATE TABLE IF NOT EXISTS teacher(
 	teacher_id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -99,6 +102,389 @@ CREATE TABLE IF NOT EXISTS language(
 	language_name TEXT NOT NULL
 );
 
+-- Create indexes for sorting the rows by the sort keys of the browse functions
+CREATE INDEX IF NOT EXISTS archive_last_modified ON archive(last_modified);
+CREATE INDEX IF NOT EXISTS course_archive_name ON course(archive_id, course_name);
+CREATE INDEX IF NOT EXISTS course_archive_code ON course(archive_id, course_code);
+CREATE INDEX IF NOT EXISTS course_archive_last_modified ON course(archive_id, last_modified);
+CREATE INDEX IF NOT EXISTS exam_course_last_modified ON exam(course_id, last_modified);
+CREATE INDEX IF NOT EXISTS teacher_last_modified ON teacher(last_modified);
+CREATE INDEX IF NOT EXISTS user_last_modified ON user(last_modified);
+
+-- Create summary tables, which are kept up to date by the triggers below
+CREATE TABLE IF NOT EXISTS archive_summary(
+	archive_id INTEGER PRIMARY KEY,
+	course_count INTEGER NOT NULL DEFAULT 0,
+	exam_count INTEGER NOT NULL DEFAULT 0,
+	latest_exam_date TEXT,
+
+	FOREIGN KEY(archive_id) REFERENCES archive(archive_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS course_summary(
+	course_id INTEGER PRIMARY KEY,
+	exam_count INTEGER NOT NULL DEFAULT 0,
+	latest_exam_date TEXT,
+
+	FOREIGN KEY(course_id) REFERENCES course(course_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS exam_summary(
+	course_id INTEGER NOT NULL,
+	language_id TEXT NOT NULL,
+	year TEXT NOT NULL,
+	exam_count INTEGER NOT NULL DEFAULT 0,
+
+	PRIMARY KEY(course_id, language_id, year),
+	FOREIGN KEY(course_id) REFERENCES course(course_id) ON DELETE CASCADE
+);
+
+CREATE TRIGGER IF NOT EXISTS archive_summary_insert AFTER INSERT ON archive
+BEGIN
+	INSERT OR IGNORE INTO archive_summary (archive_id) VALUES (NEW.archive_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS archive_summary_delete AFTER DELETE ON archive
+BEGIN
+	DELETE FROM archive_summary WHERE archive_id = OLD.archive_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS course_summary_insert AFTER INSERT ON course
+BEGIN
+	INSERT OR IGNORE INTO course_summary (course_id) VALUES (NEW.course_id);
+	UPDATE archive_summary SET course_count = course_count + 1 WHERE archive_id = NEW.archive_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS course_summary_delete AFTER DELETE ON course
+BEGIN
+	DELETE FROM course_summary WHERE course_id = OLD.course_id;
+	DELETE FROM exam_summary WHERE course_id = OLD.course_id;
+	UPDATE archive_summary SET course_count = course_count - 1,
+		exam_count = (SELECT COALESCE(SUM(s.exam_count), 0) FROM course c JOIN course_summary s
+			ON s.course_id = c.course_id WHERE c.archive_id = OLD.archive_id),
+		latest_exam_date = (SELECT MAX(s.latest_exam_date) FROM course c JOIN course_summary s
+			ON s.course_id = c.course_id WHERE c.archive_id = OLD.archive_id)
+	WHERE archive_id = OLD.archive_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS exam_summary_insert AFTER INSERT ON exam
+BEGIN
+	UPDATE course_summary SET exam_count = exam_count + 1,
+		latest_exam_date = (SELECT MAX(date) FROM exam WHERE course_id = NEW.course_id)
+	WHERE course_id = NEW.course_id;
+	INSERT OR IGNORE INTO exam_summary (course_id, language_id, year)
+		VALUES (NEW.course_id, COALESCE(NEW.language_id, ''), COALESCE(substr(NEW.date, 1, 4), ''));
+	UPDATE exam_summary SET exam_count = exam_count + 1
+	WHERE course_id = NEW.course_id AND language_id = COALESCE(NEW.language_id, '')
+		AND year = COALESCE(substr(NEW.date, 1, 4), '');
+	UPDATE archive_summary SET exam_count = exam_count + 1,
+		latest_exam_date = NULLIF(MAX(COALESCE(latest_exam_date, ''), COALESCE(NEW.date, '')), '')
+	WHERE archive_id = (SELECT archive_id FROM course WHERE course_id = NEW.course_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS exam_summary_delete AFTER DELETE ON exam
+BEGIN
+	UPDATE course_summary SET exam_count = exam_count - 1,
+		latest_exam_date = (SELECT MAX(date) FROM exam WHERE course_id = OLD.course_id)
+	WHERE course_id = OLD.course_id;
+	UPDATE exam_summary SET exam_count = exam_count - 1
+	WHERE course_id = OLD.course_id AND language_id = COALESCE(OLD.language_id, '')
+		AND year = COALESCE(substr(OLD.date, 1, 4), '');
+	DELETE FROM exam_summary WHERE course_id = OLD.course_id AND exam_count < 1;
+	UPDATE archive_summary SET exam_count = exam_count - 1,
+		latest_exam_date = (SELECT MAX(s.latest_exam_date) FROM course c JOIN course_summary s
+			ON s.course_id = c.course_id WHERE c.archive_id = archive_summary.archive_id)
+	WHERE archive_id = (SELECT archive_id FROM course WHERE course_id = OLD.course_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS exam_summary_update AFTER UPDATE OF course_id, date, language_id ON exam
+BEGIN
+	UPDATE course_summary SET exam_count = exam_count - 1,
+		latest_exam_date = (SELECT MAX(date) FROM exam WHERE course_id = OLD.course_id)
+	WHERE course_id = OLD.course_id;
+	UPDATE exam_summary SET exam_count = exam_count - 1
+	WHERE course_id = OLD.course_id AND language_id = COALESCE(OLD.language_id, '')
+		AND year = COALESCE(substr(OLD.date, 1, 4), '');
+	DELETE FROM exam_summary WHERE course_id = OLD.course_id AND exam_count < 1;
+	UPDATE archive_summary SET exam_count = exam_count - 1
+	WHERE archive_id = (SELECT archive_id FROM course WHERE course_id = OLD.course_id);
+
+	UPDATE course_summary SET exam_count = exam_count + 1,
+		latest_exam_date = (SELECT MAX(date) FROM exam WHERE course_id = NEW.course_id)
+	WHERE course_id = NEW.course_id;
+	INSERT OR IGNORE INTO exam_summary (course_id, language_id, year)
+		VALUES (NEW.course_id, COALESCE(NEW.language_id, ''), COALESCE(substr(NEW.date, 1, 4), ''));
+	UPDATE exam_summary SET exam_count = exam_count + 1
+	WHERE course_id = NEW.course_id AND language_id = COALESCE(NEW.language_id, '')
+		AND year = COALESCE(substr(NEW.date, 1, 4), '');
+	UPDATE archive_summary SET exam_count = exam_count + 1
+	WHERE archive_id = (SELECT archive_id FROM course WHERE course_id = NEW.course_id);
+
+	UPDATE archive_summary SET latest_exam_date = (SELECT MAX(s.latest_exam_date) FROM course c
+		JOIN course_summary s ON s.course_id = c.course_id WHERE c.archive_id = archive_summary.archive_id)
+	WHERE archive_id IN (SELECT archive_id FROM course WHERE course_id IN (OLD.course_id, NEW.course_id));
+END;
+
+-- Create list view tables, which hold the fields of the items of CourseList and ExamList resources including the
+-- names of the teachers and modifiers. The tables are kept up to date by the triggers below.
+CREATE TABLE IF NOT EXISTS course_list_view(
+	course_id INTEGER PRIMARY KEY,
+	archive_id INTEGER NOT NULL,
+	course_code TEXT,
+	course_name TEXT,
+	description TEXT,
+	url TEXT,
+	language_id TEXT,
+	credit_points INTEGER,
+	last_modified DATETIME,
+	teacher_id INTEGER,
+	teacher_name TEXT,
+	modifier_id TEXT,
+	modifier_name TEXT,
+	exam_count INTEGER NOT NULL DEFAULT 0,
+	latest_exam_date TEXT
+);
+
+CREATE INDEX IF NOT EXISTS course_list_view_archive ON course_list_view(archive_id, course_id);
+CREATE INDEX IF NOT EXISTS course_list_view_archive_name ON course_list_view(archive_id, course_name);
+CREATE INDEX IF NOT EXISTS course_list_view_archive_code ON course_list_view(archive_id, course_code);
+CREATE INDEX IF NOT EXISTS course_list_view_archive_last_modified ON course_list_view(archive_id, last_modified);
+
+CREATE TABLE IF NOT EXISTS exam_list_view(
+	exam_id INTEGER PRIMARY KEY,
+	course_id INTEGER NOT NULL,
+	archive_id INTEGER NOT NULL,
+	course_code TEXT,
+	course_name TEXT,
+	examiner_id INTEGER,
+	examiner_name TEXT,
+	date TEXT,
+	file_attachment TEXT,
+	language_id TEXT,
+	last_modified DATETIME,
+	modifier_id TEXT,
+	modifier_name TEXT
+);
+
+CREATE INDEX IF NOT EXISTS exam_list_view_course ON exam_list_view(course_id, exam_id);
+CREATE INDEX IF NOT EXISTS exam_list_view_archive ON exam_list_view(archive_id, course_id, exam_id);
+CREATE INDEX IF NOT EXISTS exam_list_view_course_date ON exam_list_view(course_id, date);
+CREATE INDEX IF NOT EXISTS exam_list_view_course_last_modified ON exam_list_view(course_id, last_modified);
+CREATE INDEX IF NOT EXISTS exam_list_view_archive_date ON exam_list_view(archive_id, date);
+CREATE INDEX IF NOT EXISTS exam_list_view_archive_language ON exam_list_view(archive_id, language_id, date);
+CREATE INDEX IF NOT EXISTS exam_list_view_examiner ON exam_list_view(examiner_id, date);
+CREATE INDEX IF NOT EXISTS exam_list_view_date ON exam_list_view(date);
+
+CREATE TRIGGER IF NOT EXISTS course_list_view_insert AFTER INSERT ON course
+BEGIN
+	DELETE FROM course_list_view WHERE course_id = NEW.course_id;
+	INSERT INTO course_list_view SELECT c.course_id, c.archive_id, c.course_code, c.course_name,
+		c.description, c.url, c.language_id, c.credit_points, c.last_modified, c.teacher_id,
+		t.first_name || ' ' || t.last_name, c.modifier_id, u.username, COALESCE(s.exam_count, 0), s.latest_exam_date
+	FROM course c LEFT JOIN teacher t ON t.teacher_id = c.teacher_id LEFT JOIN user u ON u.user_id = c.modifier_id
+		LEFT JOIN course_summary s ON s.course_id = c.course_id
+	WHERE c.course_id = NEW.course_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS course_list_view_update AFTER UPDATE ON course
+BEGIN
+	DELETE FROM course_list_view WHERE course_id = NEW.course_id;
+	INSERT INTO course_list_view SELECT c.course_id, c.archive_id, c.course_code, c.course_name,
+		c.description, c.url, c.language_id, c.credit_points, c.last_modified, c.teacher_id,
+		t.first_name || ' ' || t.last_name, c.modifier_id, u.username, COALESCE(s.exam_count, 0), s.latest_exam_date
+	FROM course c LEFT JOIN teacher t ON t.teacher_id = c.teacher_id LEFT JOIN user u ON u.user_id = c.modifier_id
+		LEFT JOIN course_summary s ON s.course_id = c.course_id
+	WHERE c.course_id = NEW.course_id;
+	UPDATE exam_list_view SET archive_id = NEW.archive_id, course_code = NEW.course_code,
+		course_name = NEW.course_name
+	WHERE course_id = NEW.course_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS course_list_view_delete AFTER DELETE ON course
+BEGIN
+	DELETE FROM course_list_view WHERE course_id = OLD.course_id;
+	DELETE FROM exam_list_view WHERE course_id = OLD.course_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS course_list_view_summary AFTER UPDATE ON course_summary
+BEGIN
+	UPDATE course_list_view SET exam_count = NEW.exam_count, latest_exam_date = NEW.latest_exam_date
+	WHERE course_id = NEW.course_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS exam_list_view_insert AFTER INSERT ON exam
+BEGIN
+	DELETE FROM exam_list_view WHERE exam_id = NEW.exam_id;
+	INSERT INTO exam_list_view SELECT e.exam_id, e.course_id, c.archive_id, c.course_code, c.course_name,
+		e.examiner_id, t.first_name || ' ' || t.last_name, e.date, e.file_attachment, e.language_id, e.last_modified,
+		e.modifier_id, u.username
+	FROM exam e JOIN course c ON c.course_id = e.course_id LEFT JOIN teacher t ON t.teacher_id = e.examiner_id
+		LEFT JOIN user u ON u.user_id = e.modifier_id
+	WHERE e.exam_id = NEW.exam_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS exam_list_view_update AFTER UPDATE ON exam
+BEGIN
+	DELETE FROM exam_list_view WHERE exam_id = NEW.exam_id;
+	INSERT INTO exam_list_view SELECT e.exam_id, e.course_id, c.archive_id, c.course_code, c.course_name,
+		e.examiner_id, t.first_name || ' ' || t.last_name, e.date, e.file_attachment, e.language_id, e.last_modified,
+		e.modifier_id, u.username
+	FROM exam e JOIN course c ON c.course_id = e.course_id LEFT JOIN teacher t ON t.teacher_id = e.examiner_id
+		LEFT JOIN user u ON u.user_id = e.modifier_id
+	WHERE e.exam_id = NEW.exam_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS exam_list_view_delete AFTER DELETE ON exam
+BEGIN
+	DELETE FROM exam_list_view WHERE exam_id = OLD.exam_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS list_view_teacher_insert AFTER INSERT ON teacher
+BEGIN
+	UPDATE course_list_view SET teacher_name = NEW.first_name || ' ' || NEW.last_name
+	WHERE teacher_id = NEW.teacher_id;
+	UPDATE exam_list_view SET examiner_name = NEW.first_name || ' ' || NEW.last_name
+	WHERE examiner_id = NEW.teacher_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS list_view_teacher_update AFTER UPDATE OF first_name, last_name ON teacher
+BEGIN
+	UPDATE course_list_view SET teacher_name = NEW.first_name || ' ' || NEW.last_name
+	WHERE teacher_id = NEW.teacher_id;
+	UPDATE exam_list_view SET examiner_name = NEW.first_name || ' ' || NEW.last_name
+	WHERE examiner_id = NEW.teacher_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS list_view_user_insert AFTER INSERT ON user
+BEGIN
+	UPDATE course_list_view SET modifier_name = NEW.username WHERE modifier_id = NEW.user_id;
+	UPDATE exam_list_view SET modifier_name = NEW.username WHERE modifier_id = NEW.user_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS list_view_user_update AFTER UPDATE OF username ON user
+BEGIN
+	UPDATE course_list_view SET modifier_name = NEW.username WHERE modifier_id = NEW.user_id;
+	UPDATE exam_list_view SET modifier_name = NEW.username WHERE modifier_id = NEW.user_id;
+END;
+
+-- Create user_token_generation table. The generation of a user is incremented whenever the username, password,
+-- user type or archive of the user changes, which revokes the access tokens issued for the previous generation.
+CREATE TABLE IF NOT EXISTS user_token_generation(
+	user_id INTEGER PRIMARY KEY,
+	generation INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS user_token_generation_update AFTER UPDATE OF username, password, user_type, archive_id
+	ON user
+BEGIN
+	INSERT OR IGNORE INTO user_token_generation (user_id) VALUES (OLD.user_id);
+	UPDATE user_token_generation SET generation = generation + 1 WHERE user_id = OLD.user_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_token_generation_delete AFTER DELETE ON user
+BEGIN
+	DELETE FROM user_token_generation WHERE user_id = OLD.user_id;
+END;
+
+-- Create table_generation table. The generation of a table is incremented by the triggers below whenever rows are
+-- inserted, updated or deleted, so that the caches of the server processes can detect the changes made by others.
+CREATE TABLE IF NOT EXISTS table_generation(
+	table_name TEXT PRIMARY KEY,
+	generation INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO table_generation (table_name) VALUES ('user'), ('archive'), ('course'), ('exam'), ('teacher'), ('language');
+
+CREATE TRIGGER IF NOT EXISTS table_generation_user_insert AFTER INSERT ON user
+BEGIN
+	UPDATE table_generation SET generation = generation + 1 WHERE table_name = 'user';
+END;
+
+CREATE TRIGGER IF NOT EXISTS table_generation_user_update AFTER UPDATE ON user
+BEGIN
+	UPDATE table_generation SET generation = generation + 1 WHERE table_name = 'user';
+END;
+
+CREATE TRIGGER IF NOT EXISTS table_generation_user_delete AFTER DELETE ON user
+BEGIN
+	UPDATE table_generation SET generation = generation + 1 WHERE table_name = 'user';
+END;
+
+CREATE TRIGGER IF NOT EXISTS table_generation_archive_insert AFTER INSERT ON archive
+BEGIN
+	UPDATE table_generation SET generation = generation + 1 WHERE table_name = 'archive';
+END;
+
+CREATE TRIGGER IF NOT EXISTS table_generation_archive_update AFTER UPDATE ON archive
+BEGIN
+	UPDATE table_generation SET generation = generation + 1 WHERE table_name = 'archive';
+END;
+
+CREATE TRIGGER IF NOT EXISTS table_generation_archive_delete AFTER DELETE ON archive
+BEGIN
+	UPDATE table_generation SET generation = generation + 1 WHERE table_name = 'archive';
+END;
+
+CREATE TRIGGER IF NOT EXISTS table_generation_course_insert AFTER INSERT ON course
+BEGIN
+	UPDATE table_generation SET generation = generation + 1 WHERE table_name = 'course';
+END;
+
+CREATE TRIGGER IF NOT EXISTS table_generation_course_update AFTER UPDATE ON course
+BEGIN
+	UPDATE table_generation SET generation = generation + 1 WHERE table_name = 'course';
+END;
+
+CREATE TRIGGER IF NOT EXISTS table_generation_course_delete AFTER DELETE ON course
+BEGIN
+	UPDATE table_generation SET generation = generation + 1 WHERE table_name = 'course';
+END;
+
+CREATE TRIGGER IF NOT EXISTS table_generation_exam_insert AFTER INSERT ON exam
+BEGIN
+	UPDATE table_generation SET generation = generation + 1 WHERE table_name = 'exam';
+END;
+
+CREATE TRIGGER IF NOT EXISTS table_generation_exam_update AFTER UPDATE ON exam
+BEGIN
+	UPDATE table_generation SET generation = generation + 1 WHERE table_name = 'exam';
+END;
+
+CREATE TRIGGER IF NOT EXISTS table_generation_exam_delete AFTER DELETE ON exam
+BEGIN
+	UPDATE table_generation SET generation = generation + 1 WHERE table_name = 'exam';
+END;
+
+CREATE TRIGGER IF NOT EXISTS table_generation_teacher_insert AFTER INSERT ON teacher
+BEGIN
+	UPDATE table_generation SET generation = generation + 1 WHERE table_name = 'teacher';
+END;
+
+CREATE TRIGGER IF NOT EXISTS table_generation_teacher_update AFTER UPDATE ON teacher
+BEGIN
+	UPDATE table_generation SET generation = generation + 1 WHERE table_name = 'teacher';
+END;
+
+CREATE TRIGGER IF NOT EXISTS table_generation_teacher_delete AFTER DELETE ON teacher
+BEGIN
+	UPDATE table_generation SET generation = generation + 1 WHERE table_name = 'teacher';
+END;
+
+CREATE TRIGGER IF NOT EXISTS table_generation_language_insert AFTER INSERT ON language
+BEGIN
+	UPDATE table_generation SET generation = generation + 1 WHERE table_name = 'language';
+END;
+
+CREATE TRIGGER IF NOT EXISTS table_generation_language_update AFTER UPDATE ON language
+BEGIN
+	UPDATE table_generation SET generation = generation + 1 WHERE table_name = 'language';
+END;
+
+CREATE TRIGGER IF NOT EXISTS table_generation_language_delete AFTER DELETE ON language
+BEGIN
+	UPDATE table_generation SET generation = generation + 1 WHERE table_name = 'language';
+END;
+
 -- Populating the database with some test information
 --
 -- Insert some test users
@@ -16,6 +16,8 @@ application = DispatcherMiddleware(server, {
      '/client': client
 })
 if __name__ == '__main__':
+    # Run the development server with the debugger and code reloading, see serve.py for production
+    server.debug = client.debug = True
     run_simple('localhost', 8080, application,
                use_reloader=True, use_debugger=True, use_evalex=True)
 
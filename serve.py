@@ -0,0 +1,283 @@
+# coding=UTF-8
+#
+# Runs the application in production with a pool of pre-forked worker processes, each serving the requests with a
+# pool of threads. The modules are imported once in the master process before forking, and the workers are restarted
+# gracefully on SIGHUP.
+#
+# @authors: Ari Kairala, Petteri Ponsimaa
+
+import os
+import sys
+import time
+import Queue
+import signal
+import threading
+import multiprocessing
+
+from flask import Config
+from werkzeug.serving import BaseWSGIServer
+
+ENV_PREFIX = 'EXAM_ARCHIVE_'
+''' Prefix of the environment variables overriding the settings, e.g. EXAM_ARCHIVE_WORKERS=8. '''
+
+DEFAULT_SETTINGS = {'HOST': 'localhost', 'PORT': 8080, 'WORKERS': multiprocessing.cpu_count(), 'THREADS': 8,
+                    'GRACEFUL_TIMEOUT': 30, 'DEBUG': False}
+''' Default settings of the server. '''
+
+RESPAWN_INTERVAL = 1
+''' Seconds between checking the workers, so that a worker failing at start is not respawned in a busy loop. '''
+
+
+class ThreadPoolWSGIServer(BaseWSGIServer):
+    '''
+    WSGI server handling the requests with a fixed pool of threads. Unlike a server starting a new thread for each
+    request, the threads and thus the pooled database connections of the threads are reused.
+    '''
+    multithread = True
+
+    def __init__(self, host, port, app, threads):
+        BaseWSGIServer.__init__(self, host, port, app)
+        self.threads = threads
+        self.requests = Queue.Queue()
+        self.pool = []
+
+    def start_threads(self):
+        '''
+        Start the threads of the pool. Called in the worker process, because the threads do not survive forking.
+        '''
+        for i in range(self.threads):
+            thread = threading.Thread(target=self._handle_requests)
+            thread.daemon = True
+            thread.start()
+            self.pool.append(thread)
+
+    def stop_threads(self, timeout):
+        '''
+        Let the threads of the pool finish the requests already accepted, and wait at most timeout seconds for them.
+        '''
+        for thread in self.pool:
+            self.requests.put(None)
+        deadline = time.time() + timeout
+        for thread in self.pool:
+            thread.join(max(deadline - time.time(), 0))
+
+    def process_request(self, request, client_address):
+        self.requests.put((request, client_address))
+
+    def _handle_requests(self):
+        while True:
+            item = self.requests.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+
+def _parse(value, default):
+    '''
+    Convert the value of an environment variable to the type of the default value of the setting.
+    '''
+    if isinstance(default, bool):
+        return value.lower() in ('1', 'true', 'yes', 'on')
+    if isinstance(default, int):
+        return int(value)
+    return value
+
+
+def load_settings(environ=None):
+    '''
+    Read the settings of the server. The defaults in DEFAULT_SETTINGS are overridden with the Python file named by
+    the EXAM_ARCHIVE_SETTINGS environment variable, which also configures the RESTful API, and then with the
+    environment variables prefixed with ENV_PREFIX.
+
+    OUTPUT:
+
+    * A dictionary containing the keys of DEFAULT_SETTINGS.
+    '''
+    from api.resources_common import SETTINGS_ENVVAR
+    if environ is None:
+        environ = os.environ
+
+    settings = Config(os.getcwd(), DEFAULT_SETTINGS)
+    if environ.get(SETTINGS_ENVVAR):
+        settings.from_pyfile(environ[SETTINGS_ENVVAR])
+    for key, default in DEFAULT_SETTINGS.items():
+        if environ.get(ENV_PREFIX + key):
+            settings[key] = _parse(environ[ENV_PREFIX + key], default)
+    return dict((key, settings[key]) for key in DEFAULT_SETTINGS)
+
+
+def preload():
+    '''
+    Import the applications and all the modules they use, so that the workers share them instead of importing them
+    each. Returns the WSGI application of run.py.
+    '''
+    from run import application
+    return application
+
+
+def configure(settings):
+    '''
+    Apply the settings to the applications. The settings file is read again, so that a graceful restart picks up
+    the changes made to it.
+    '''
+    from api.resources_common import app as server, SETTINGS_ENVVAR
+    from client.application import app as client
+    server.config.from_envvar(SETTINGS_ENVVAR, silent=True)
+    server.debug = client.debug = settings['DEBUG']
+
+
+def run_worker(server, settings):
+    '''
+    Serve requests in a forked worker process until SIGTERM, then finish the requests already accepted and exit.
+    '''
+    from api import exam_archive
+    from api.resources_common import app
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+    # Each worker opens database connections of its own
+    exam_archive.reset_pool()
+    app.config['DATABASE'].get_lookups()
+
+    server.start_threads()
+    listener = threading.Thread(target=server.serve_forever)
+    listener.daemon = True
+    listener.start()
+    while not stopping and listener.is_alive():
+        time.sleep(RESPAWN_INTERVAL)
+
+    server.shutdown()
+    server.stop_threads(settings['GRACEFUL_TIMEOUT'])
+
+
+def spawn_worker(server, settings):
+    '''
+    Fork a worker process and return its process ID.
+    '''
+    sys.stdout.flush()
+    pid = os.fork()
+    if pid:
+        return pid
+    status = 0
+    try:
+        run_worker(server, settings)
+    except Exception:
+        import traceback
+        traceback.print_exc()
+        status = 1
+    finally:
+        os._exit(status)
+
+
+def stop_workers(pids, timeout):
+    '''
+    Stop the workers gracefully with SIGTERM, and kill the workers still running after timeout seconds.
+    '''
+    for pid in pids:
+        _signal(pid, signal.SIGTERM)
+    deadline = time.time() + timeout
+    while pids and time.time() < deadline:
+        pids = set(pid for pid in pids if not _exited(pid))
+        time.sleep(0.1)
+    for pid in pids:
+        _signal(pid, signal.SIGKILL)
+        _exited(pid, 0)
+
+
+def _exited(pid, options=os.WNOHANG):
+    '''
+    Reap a worker process, returning True if it has exited. The master may have reaped it already.
+    '''
+    try:
+        return os.waitpid(pid, options)[0] != 0
+    except OSError:
+        return True
+
+
+def _signal(pid, signum):
+    '''
+    Send a signal to a process, which may already have exited.
+    '''
+    try:
+        os.kill(pid, signum)
+    except OSError:
+        pass
+
+
+def serve():
+    '''
+    Run the master process. The master binds the listening socket, forks the workers sharing it and respawns the
+    workers that exit. On SIGHUP the settings are read again, new workers are started and the old ones stopped
+    gracefully. On SIGTERM or SIGINT all the workers are stopped gracefully.
+
+    The code is not reloaded on SIGHUP, because the modules are imported only once before forking. Restart the
+    master process to upgrade the code, or to change the host or port.
+    '''
+    application = preload()
+    settings = load_settings()
+    configure(settings)
+
+    # The master must not keep connections open across forks
+    from api.resources_common import app
+    app.config['DATABASE'].close_connections()
+
+    server = ThreadPoolWSGIServer(settings['HOST'], settings['PORT'], application, settings['THREADS'])
+    print ' * Serving on http://%s:%d/ with %d workers of %d threads' % (settings['HOST'], settings['PORT'],
+                                                                       settings['WORKERS'], settings['THREADS'])
+    events = []
+    signal.signal(signal.SIGHUP, lambda signum, frame: events.append(signum))
+    signal.signal(signal.SIGTERM, lambda signum, frame: events.append(signum))
+    signal.signal(signal.SIGINT, lambda signum, frame: events.append(signum))
+
+    workers = set()
+    while True:
+        while len(workers) < settings['WORKERS']:
+            workers.add(spawn_worker(server, settings))
+
+        time.sleep(RESPAWN_INTERVAL)
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError:
+                break
+            if not pid:
+                break
+            workers.discard(pid)
+
+        while events:
+            signum = events.pop(0)
+            if signum == signal.SIGHUP:
+                old_workers, workers = workers, set()
+                settings = dict(load_settings(), HOST=settings['HOST'], PORT=settings['PORT'])
+                configure(settings)
+                server.threads = settings['THREADS']
+                while len(workers) < settings['WORKERS']:
+                    workers.add(spawn_worker(server, settings))
+                stop_workers(old_workers, settings['GRACEFUL_TIMEOUT'])
+                print ' * Restarted with %d workers of %d threads' % (settings['WORKERS'], settings['THREADS'])
+            else:
+                stop_workers(workers, settings['GRACEFUL_TIMEOUT'])
+                server.server_close()
+                return
+
+
+# Start the application
+if __name__ == '__main__':
+    if len(sys.argv) != 1:
+        print 'Usage:\n' \
+              '  python serve.py\n' \
+              'Settings are read from the file named by EXAM_ARCHIVE_SETTINGS and from the environment variables\n' \
+              'EXAM_ARCHIVE_HOST, EXAM_ARCHIVE_PORT, EXAM_ARCHIVE_WORKERS, EXAM_ARCHIVE_THREADS,\n' \
+              'EXAM_ARCHIVE_GRACEFUL_TIMEOUT and EXAM_ARCHIVE_DEBUG.'
+        sys.exit(1)
+    serve()
@@ -0,0 +1,206 @@
+'''
+Testing class for the backups of the database and the exam files.
+
+Authors: Ari Kairala, Petteri Ponsimaa
+'''
+
+import os, shutil, sqlite3, unittest
+
+from database_api_test_common import BaseTestCase, db, db_path
+from exam_archive import ExamArchiveDatabase, ExamDatabaseError
+from sharded_exam_archive import split_database
+import backup
+
+# Paths to the backup folder and to the exam files used in the tests
+backup_folder = 'db/exam_archive_test_backups'
+upload_folder = 'db/exam_archive_test_exams'
+
+# Paths to the catalog database and the archive databases of the sharded backups
+catalog_path = 'db/exam_archive_test_backup_catalog.db'
+shard_folder = 'db/exam_archive_test_backup_shards'
+
+
+class BackupTestCase(BaseTestCase):
+    '''
+    BackupTestCase contains unit tests of the backup functions.
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        print "Testing ", cls.__name__
+
+    def setUp(self):
+        super(BackupTestCase, self).setUp()
+        os.makedirs(upload_folder)
+        with open(os.path.join(upload_folder, '810136P_2015-02-02.pdf'), 'w') as f:
+            f.write('%PDF-1.4')
+
+    def tearDown(self):
+        shutil.rmtree(upload_folder, True)
+        shutil.rmtree(backup_folder, True)
+        super(BackupTestCase, self).tearDown()
+
+    def test_create_backup(self):
+        '''
+        Test that a backup contains the database and the exam files, and that it is verified successfully
+        '''
+        print '(' + self.test_create_backup.__name__ + ')', self.test_create_backup.__doc__
+
+        manifest = backup.create_backup(db, backup_folder, upload_folder)
+        backup_path = os.path.join(backup_folder, manifest['backup'])
+
+        self.assertItemsEqual(manifest['files'].keys(), ['exam_archive_test.db', 'exams/810136P_2015-02-02.pdf'])
+        self.assertEquals(manifest['rows']['exam_archive_test.db']['course'], 3)
+        self.assertListEqual(backup.verify_backup(backup_path), [])
+        self.assertListEqual(backup.list_backups(backup_folder), [manifest])
+
+        # The result of the verification is recorded, without changing the backup
+        self.assertIsNone(backup.get_verification(backup_path))
+        verification = backup.record_verification(backup_path)
+        self.assertListEqual(verification['problems'], [])
+        self.assertDictEqual(backup.get_verification(backup_path), verification)
+        self.assertListEqual(backup.verify_backup(backup_path), [])
+
+        # The database in the backup contains the same data
+        self.assertListEqual(ExamArchiveDatabase(os.path.join(backup_path, 'exam_archive_test.db')).browse_courses(1),
+                             db.browse_courses(1))
+
+    def test_verify_backup(self):
+        '''
+        Test that modified and missing files of a backup are detected
+        '''
+        print '(' + self.test_verify_backup.__name__ + ')', self.test_verify_backup.__doc__
+
+        manifest = backup.create_backup(db, backup_folder, upload_folder)
+        backup_path = os.path.join(backup_folder, manifest['backup'])
+
+        with open(os.path.join(backup_path, 'exams', '810136P_2015-02-02.pdf'), 'w') as f:
+            f.write('modified')
+        self.assertListEqual(backup.verify_backup(backup_path),
+                             ['exams/810136P_2015-02-02.pdf has an invalid checksum'])
+        self.assertRaises(ExamDatabaseError, backup.restore_backup, backup_path, db, upload_folder)
+
+        os.remove(os.path.join(backup_path, 'exams', '810136P_2015-02-02.pdf'))
+        self.assertListEqual(backup.verify_backup(backup_path), ['exams/810136P_2015-02-02.pdf is missing'])
+
+        self.assertListEqual(backup.verify_backup(backup_folder), ['Manifest is missing or invalid'])
+
+    def test_retention_and_restore(self):
+        '''
+        Test that only the newest backups are kept and that a backup can be restored
+        '''
+        print '(' + self.test_retention_and_restore.__name__ + ')', self.test_retention_and_restore.__doc__
+
+        first = backup.create_backup(db, backup_folder, upload_folder, retention=2)
+        backup.create_backup(db, backup_folder, upload_folder, retention=2)
+        last = backup.create_backup(db, backup_folder, upload_folder, retention=2)
+
+        backups = backup.list_backups(backup_folder)
+        self.assertEquals(len(backups), 2)
+        self.assertEquals(backups[0], last)
+        self.assertNotIn(first, backups)
+
+        # Modify the database and the exam files, then restore the backup
+        db.remove_course(1)
+        os.remove(os.path.join(upload_folder, '810136P_2015-02-02.pdf'))
+        backup.restore_backup(os.path.join(backup_folder, last['backup']), db, upload_folder)
+
+        self.assertIsNotNone(db.get_course(1))
+        self.assertTrue(os.path.exists(os.path.join(upload_folder, '810136P_2015-02-02.pdf')))
+
+    def test_copy_database(self):
+        '''
+        Test that the database is copied a few pages at a time while it is being written to, and that the copy is
+        started over or done at once, if the database is modified during the copy
+        '''
+        print '(' + self.test_copy_database.__name__ + ')', self.test_copy_database.__doc__
+
+        os.makedirs(backup_folder)
+        target_path = os.path.join(backup_folder, 'copy.db')
+        sleep = backup.time.sleep
+        steps = []
+
+        def write_between_steps(seconds):
+            # The requests can write to the database between the steps
+            steps.append(seconds)
+            if len(steps) in writes:
+                db.edit_course(1, '810136P', 'Copied course %d' % len(steps), '', None, '', 4, 'fi')
+
+        backup.time.sleep = write_between_steps
+        try:
+            # The first attempt is started over after the write, the second one is consistent
+            writes = (1,)
+            backup._copy_database(db_path, target_path, pages=1, sleep=0.5)
+            self.assertGreater(len(steps), 2)
+            self.assertEquals(ExamArchiveDatabase(target_path, pooled=False).get_course(1)['course_name'],
+                              'Copied course 1')
+
+            # When every attempt is disturbed, the database is copied at once
+            del steps[:]
+            writes = range(1, 1000)
+            backup._copy_database(db_path, target_path, pages=1, attempts=2)
+            self.assertEquals(len(steps), 2)
+            self.assertEquals(ExamArchiveDatabase(target_path, pooled=False).get_course(1)['course_name'],
+                              'Copied course 2')
+        finally:
+            backup.time.sleep = sleep
+        self.assertDictEqual(backup._row_counts(target_path), backup._row_counts(db_path))
+
+    def test_sharded_backup(self):
+        '''
+        Test that the catalog and archive databases are copied while their writes are locked out, and that restoring
+        removes the archive databases created after the backup
+        '''
+        print '(' + self.test_sharded_backup.__name__ + ')', self.test_sharded_backup.__doc__
+
+        if os.path.exists(catalog_path):
+            os.remove(catalog_path)
+        sharded_db = split_database(db_path, catalog_path, shard_folder)
+        vacuum_into = backup._vacuum_into
+        writable, copied = [], []
+
+        def check_locks(con, target_path):
+            # None of the databases can be written to while any of them is copied
+            for path in [catalog_path] + sharded_db._shard_paths():
+                con_write = sqlite3.connect(path, timeout=0, isolation_level=None)
+                try:
+                    con_write.execute('BEGIN IMMEDIATE')
+                    writable.append(path)
+                except sqlite3.OperationalError:
+                    pass
+                finally:
+                    con_write.close()
+            copied.append(target_path)
+            vacuum_into(con, target_path)
+
+        backup._vacuum_into = check_locks
+        try:
+            manifest = backup.create_backup(sharded_db, backup_folder, upload_folder)
+        finally:
+            backup._vacuum_into = vacuum_into
+        try:
+            self.assertEquals(len(copied), 4)
+            self.assertListEqual(writable, [])
+            self.assertItemsEqual(manifest['rows'].keys(), ['exam_archive_test_backup_catalog.db',
+                                                            'shards/archive_1.db', 'shards/archive_2.db',
+                                                            'shards/archive_3.db'])
+            self.assertEquals(manifest['rows']['shards/archive_1.db']['course'], 3)
+            backup_path = os.path.join(backup_folder, manifest['backup'])
+            self.assertListEqual(backup.verify_backup(backup_path), [])
+
+            # The archive created after the backup is removed with its database
+            archive_id = sharded_db.create_archive('New archive', 'University')
+            course_id = sharded_db.create_course(archive_id, "123456A", "TestCourse", "", 1, '', 5, "fi")
+            self.assertTrue(os.path.exists(os.path.join(shard_folder, 'archive_%d.db' % archive_id)))
+            backup.restore_backup(backup_path, sharded_db, upload_folder)
+            self.assertFalse(os.path.exists(os.path.join(shard_folder, 'archive_%d.db' % archive_id)))
+            self.assertIsNone(sharded_db.get_archive(archive_id))
+            self.assertIsNone(sharded_db.get_course(course_id))
+            self.assertListEqual(sharded_db.browse_courses(1), db.browse_courses(1))
+        finally:
+            sharded_db.clean()
+
+
+if __name__ == '__main__':
+    print 'Start running tests'
+    unittest.main()
@@ -1,13 +1,17 @@
 __authors__ = 'Petteri Ponsimaa, Ari Kairala'
 
-import unittest, os, hashlib
+import unittest, os, hashlib, tempfile
 import exam_archive
+import rate_limit
 import server
 
 # Path to the database file, different from the deployment db
 db_path = 'db/exam_archive_test.db'
 db = exam_archive.ExamArchiveDatabase(db_path)
 
+# Path to the token buckets of the rate limits, different from the deployment store
+rate_limit_path = os.path.join(tempfile.gettempdir(), 'exam_archive_rate_limits_test.db')
+
 class BaseTestCase(unittest.TestCase):
     '''
     Base class for all test classes. It implements the setUp and the tearDown
@@ -29,6 +33,8 @@ class BaseTestCase(unittest.TestCase):
 
         server.app.config['TESTING'] = True
         server.app.config.update({'DATABASE':exam_archive.ExamArchiveDatabase(db_path)})
+        server.app.config.update({'RATE_LIMIT_STORE': rate_limit_path})
+        rate_limit.token_buckets(rate_limit_path).clear()
         self.app = server.app.test_client()
 
     def tearDown(self):
@@ -8,7 +8,7 @@ Originally adopted from Ivan's exercise 1 test class.
 import sqlite3, unittest, pytest
 
 from database_api_test_common import BaseTestCase, db, db_path
-from exam_archive import ExamDatabaseErrorNotFound, ExamDatabaseErrorExists
+from exam_archive import ExamDatabaseErrorNotFound, ExamDatabaseErrorExists, ExamDatabaseErrorModified, SORT_KEYS
 
 
 class CourseTestCase(BaseTestCase):
@@ -149,6 +149,10 @@ class CourseTestCase(BaseTestCase):
         self.assertRaises(ExamDatabaseErrorNotFound, db.create_course, 1, "123456A", "TestCourse", "Test description", 1,
                           'http://example.com', 5, "XX")
 
+        # Check that other constraint failures are not reported as an existing course
+        self.assertRaises(sqlite3.IntegrityError, db.create_course, 1, "X1", None, "Test description", 1,
+                          'http://example.com', 5, "fi")
+
         # Check for foreign key constraints: "Teacher does not exist"
         self.assertRaises(ExamDatabaseErrorNotFound, db.create_course, 1, "123456A", "TestCourse", "Test description",
                           999, 'http://example.com', 5, "fi")
@@ -245,6 +249,109 @@ class CourseTestCase(BaseTestCase):
         self.assertEquals(len(courses), 0)
         self.assertListEqual(courses, [])
 
+    def test_edit_course_expected_modified(self):
+        '''
+        Test that a course is updated and removed only if it has not been modified after it was read
+        '''
+        print '(' + self.test_edit_course_expected_modified.__name__ + ')', \
+            self.test_edit_course_expected_modified.__doc__
+
+        course = db.get_course(2)
+
+        # Update the course with the last_modified value just read
+        ret = db.edit_course(2, "812671S", "Usability Testing 2", "Lorem ipsum", 1, 'http://weboodi.oulu.fi/', 5, "en",
+                             1, course['last_modified'])
+        self.assertEquals(ret, 2)
+
+        # The course has now been modified, so the same last_modified value must not be accepted anymore
+        self.assertRaises(ExamDatabaseErrorModified, db.edit_course, 2, "812671S", "Usability Testing 3",
+                          "Lorem ipsum", 1, 'http://weboodi.oulu.fi/', 5, "en", 1, course['last_modified'])
+        self.assertRaises(ExamDatabaseErrorModified, db.remove_course, 2, course['last_modified'])
+        self.assertEquals(db.get_course(2)['course_name'], "Usability Testing 2")
+
+        # Removing with the current last_modified value succeeds
+        self.assertTrue(db.remove_course(2, db.get_course(2)['last_modified']))
+
+        # A course that does not exist is neither updated nor removed
+        self.assertIsNone(db.edit_course(2, "812671S", "Usability Testing", "Lorem ipsum", 1, 'http://weboodi.oulu.fi/',
+                                         5, "en", 1, course['last_modified']))
+        self.assertFalse(db.remove_course(2, course['last_modified']))
+
+    def test_browse_courses_sorted(self):
+        '''
+        Test that browse_courses and browse_course_list sort the courses by the whitelisted columns in both directions,
+        and that paging with the key of the last course returns every course once, also when the values are NULL
+        '''
+        print '(' + self.test_browse_courses_sorted.__name__ + ')', self.test_browse_courses_sorted.__doc__
+
+        course_ids = lambda courses: [course['course_id'] for course in courses]
+        self.assertListEqual(course_ids(db.browse_courses(1, sort='course_name')), [1, 3, 2])
+        self.assertListEqual(course_ids(db.browse_courses(1, sort='course_name', descending=True)), [2, 3, 1])
+        self.assertListEqual(course_ids(db.browse_course_list(1, sort='course_name', limit=2)), [1, 3])
+        self.assertListEqual(course_ids(db.browse_courses(1, descending=True, limit=2, after=3)), [2, 1])
+        self.assertRaises(ValueError, db.browse_courses, 1, sort='description')
+        self.assertRaises(ValueError, db.browse_course_list, 1, sort='course_id; DROP TABLE course')
+        self.assertRaises(ValueError, db.browse_courses, 1, limit=2, offset=2, after=3)
+
+        # Courses without a code are sorted before the others
+        first_id = db.create_course(1, None, "Course without code 1", "", 1, '', 5, "fi")
+        second_id = db.create_course(1, None, "Course without code 2", "", 1, '', 5, "fi")
+        expected = [first_id, second_id, 1, 2, 3]
+        for browse in [db.browse_courses, db.browse_course_list]:
+            for descending in [False, True]:
+                for limit in [1, 2, 3]:
+                    courses, after = [], None
+                    while True:
+                        page = browse(1, sort='course_code', descending=descending, limit=limit, after=after)
+                        courses += page
+                        if len(page) < limit:
+                            break
+                        after = (page[-1]['course_code'], page[-1]['course_id'])
+                    self.assertListEqual(course_ids(courses), expected[::-1] if descending else expected)
+
+    def test_browse_course_list_columns(self):
+        '''
+        Test that browse_course_list returns only the requested columns, the sort column and the course id, and that
+        unknown columns are refused
+        '''
+        print '(' + self.test_browse_course_list_columns.__name__ + ')', self.test_browse_course_list_columns.__doc__
+
+        courses = db.browse_course_list(1, columns=['course_name'])
+        self.assertListEqual([sorted(course) for course in courses], [['course_id', 'course_name']] * 3)
+        courses = db.browse_course_list(1, sort='last_modified', limit=1, columns=['archive_id'])
+        self.assertListEqual(sorted(courses[0]), ['archive_id', 'course_id', 'last_modified'])
+        self.assertListEqual(sorted(db.browse_users(columns=['username'])[0]), ['user_id', 'username'])
+        self.assertRaises(ValueError, db.browse_course_list, 1, columns=['course_name', 'password'])
+        self.assertRaises(ValueError, db.browse_courses, 1, columns=['course_id FROM user --'])
+
+    def test_browse_sorted_query_plans(self):
+        '''
+        Test that every sort column and page of the browse functions is read from an index in the sort order, without
+        sorting the rows
+        '''
+        print '(' + self.test_browse_sorted_query_plans.__name__ + ')', self.test_browse_sorted_query_plans.__doc__
+
+        parents = {'course': 'archive_id', 'exam': 'course_id', 'course_list_view': 'archive_id',
+                   'exam_list_view': 'course_id'}
+        con = sqlite3.connect(db_path)
+        try:
+            for table, columns in SORT_KEYS.items():
+                table_id = table.replace('_list_view', '') + '_id'
+                for sort in columns:
+                    for descending in [False, True]:
+                        for after in [None, ('2015', 2), (None, 2)]:
+                            ranges, order = db._sort_clauses(table, table_id, sort, descending, after)
+                            for keyset, pvalue in ranges:
+                                conditions = [parents[table] + ' = 1'] if table in parents else []
+                                conditions += [keyset] if keyset else []
+                                sql_query = 'EXPLAIN QUERY PLAN SELECT * FROM %s%s%s LIMIT 10' % \
+                                            (table, ' WHERE ' + ' AND '.join(conditions) if conditions else '', order)
+                                plan = ' '.join(row[3] for row in con.execute(sql_query, pvalue))
+                                self.assertIn('USING INDEX', plan)
+                                self.assertNotIn('TEMP B-TREE', plan)
+        finally:
+            con.close()
+
 
 if __name__ == '__main__':
     print 'Start running tests'
@@ -8,7 +8,7 @@ Originally adopted from Ivan's exercise 1 test class.
 import sqlite3, unittest, pytest
 
 from database_api_test_common import BaseTestCase, db, db_path
-from exam_archive import ExamDatabaseErrorNotFound, ExamDatabaseErrorExists
+from exam_archive import ExamDatabaseError, ExamDatabaseErrorNotFound, ExamDatabaseErrorExists
 
 
 class ExamTestCase(BaseTestCase):
@@ -311,6 +311,228 @@ class ExamTestCase(BaseTestCase):
         self.assertEquals(len(exams), 0)
         self.assertListEqual(exams, [])
 
+    def test_browse_archive_exams(self):
+        '''
+        Test that browse_archive_exams returns the exams of all the courses of an archive
+        '''
+        print '(' + self.test_browse_archive_exams.__name__ + ')', self.test_browse_archive_exams.__doc__
+
+        exams = db.browse_archive_exams(1)
+        self.assertListEqual([exam['exam_id'] for exam in exams], [1, 2, 3, 4, 5])
+        self.assertListEqual(exams[:3], self.expected_exam)
+
+        # An archive without courses and an archive that does not exist
+        self.assertListEqual(db.browse_archive_exams(2), [])
+        self.assertListEqual(db.browse_archive_exams(999), [])
+
+    def test_summaries(self):
+        '''
+        Test that the summary tables are kept up to date when exams and courses are created, edited and removed
+        '''
+        print '(' + self.test_summaries.__name__ + ')', self.test_summaries.__doc__
+
+        self.assertDictEqual(db.get_archive_summary(1), {'archive_id': 1, 'course_count': 3, 'exam_count': 5,
+                                                         'latest_exam_date': '2015-05-05'})
+        self.assertDictEqual(db.get_course_summary(2), {'course_id': 2, 'exam_count': 1,
+                                                        'latest_exam_date': '2013-02-21',
+                                                        'exam_counts': [{'language_id': 'en', 'year': '2013',
+                                                                         'exam_count': 1}]})
+        self.assertListEqual([summary['exam_count'] for summary in db.browse_course_summaries(1)], [3, 1, 1])
+        self.assertIsNone(db.get_archive_summary(999))
+        self.assertIsNone(db.get_course_summary(999))
+        self.assertListEqual(db.browse_archive_summaries([3, 1, 999]), [db.get_archive_summary(1),
+                                                                        db.get_archive_summary(3)])
+        self.assertListEqual(db.browse_archive_summaries([]), [])
+
+        # Move an exam to another course and year, then remove it
+        db.edit_exam(4, 3, 1, '2016-01-01', None, 'en')
+        self.assertEquals(db.get_course_summary(2)['exam_count'], 0)
+        self.assertIsNone(db.get_course_summary(2)['latest_exam_date'])
+        self.assertEquals(db.get_course_summary(3)['latest_exam_date'], '2016-01-01')
+        self.assertEquals(db.get_archive_summary(1)['latest_exam_date'], '2016-01-01')
+        db.remove_exam(4)
+        self.assertEquals(db.get_archive_summary(1)['exam_count'], 4)
+        self.assertEquals(db.get_archive_summary(1)['latest_exam_date'], '2015-05-05')
+
+        # Removing a course removes its exams from the summary of the archive
+        db.remove_course(1)
+        self.assertDictEqual(db.get_archive_summary(1), {'archive_id': 1, 'course_count': 2, 'exam_count': 1,
+                                                         'latest_exam_date': '2015-02-28'})
+        self.assertListEqual(db.verify_summaries(), [])
+
+        # Summaries modified by hand are detected and rebuilt
+        con = sqlite3.connect(db_path)
+        with con:
+            con.execute('UPDATE archive_summary SET exam_count = 100')
+        con.close()
+        self.assertListEqual(db.verify_summaries(), ['archive_summary'])
+        db.rebuild_summaries()
+        self.assertListEqual(db.verify_summaries(), [])
+
+    def test_list_views(self):
+        '''
+        Test that the list view tables are kept up to date when exams, courses and teachers are created, edited and
+        removed
+        '''
+        print '(' + self.test_list_views.__name__ + ')', self.test_list_views.__doc__
+
+        courses = db.browse_course_list(1)
+        self.assertListEqual([course['course_id'] for course in courses], [1, 2, 3])
+        self.assertEquals(courses[1]['course_name'], 'Usability Testing')
+        self.assertEquals(courses[1]['teacher_name'], 'Tero Testaaja')
+        self.assertEquals(courses[1]['modifier_name'], 'bigboss')
+        self.assertEquals(courses[1]['exam_count'], 1)
+        self.assertEquals(courses[1]['latest_exam_date'], '2013-02-21')
+
+        exams = db.browse_exam_list(2)
+        self.assertListEqual([exam['exam_id'] for exam in exams], [4])
+        self.assertEquals(exams[0]['course_code'], '812671S')
+        self.assertEquals(exams[0]['examiner_name'], 'Terhi Testi')
+        self.assertListEqual([(exam['course_id'], exam['exam_id']) for exam in db.browse_archive_exam_list(1)],
+                             [(1, 1), (1, 2), (1, 3), (2, 4), (3, 5)])
+        self.assertListEqual(db.browse_course_list(999), [])
+        self.assertListEqual(db.browse_exam_list(999), [])
+
+        # New exams, and edited courses and teachers are reflected to the list views
+        db.create_exam(2, 1, '2015-06-06', None, 'en')
+        db.edit_course(2, '812671S', 'Usability Testing 2', 'Lorem ipsum', 1, 'http://weboodi.oulu.fi/', 5, 'en')
+        db.edit_teacher(2, 'Terhi', 'Tentaattori')
+        course = db.browse_course_list(1)[1]
+        self.assertEquals(course['course_name'], 'Usability Testing 2')
+        self.assertEquals(course['exam_count'], 2)
+        self.assertEquals(course['latest_exam_date'], '2015-06-06')
+        exams = db.browse_exam_list(2)
+        self.assertListEqual([exam['course_name'] for exam in exams], ['Usability Testing 2'] * 2)
+        self.assertListEqual([exam['examiner_name'] for exam in exams], ['Terhi Tentaattori', 'Tero Testaaja'])
+
+        # Removing a teacher or a course is reflected to the list views
+        db.remove_teacher(2)
+        self.assertIsNone(db.browse_exam_list(2)[0]['examiner_name'])
+        db.remove_course(2)
+        self.assertListEqual([course['course_id'] for course in db.browse_course_list(1)], [1, 3])
+        self.assertListEqual(db.browse_exam_list(2), [])
+        self.assertListEqual(db.verify_list_views(), [])
+
+        # List views modified by hand are detected and rebuilt
+        con = sqlite3.connect(db_path)
+        with con:
+            con.execute("UPDATE exam_list_view SET examiner_name = 'Nobody'")
+        con.close()
+        self.assertListEqual(db.verify_list_views(), ['exam_list_view'])
+        db.rebuild_list_views()
+        self.assertListEqual(db.verify_list_views(), [])
+
+    def test_upgrade_schema(self):
+        '''
+        Test that upgrading a database created before the unique index of the exams reports the duplicate exams,
+        and creates the index once they are removed
+        '''
+        print '(' + self.test_upgrade_schema.__name__ + ')', self.test_upgrade_schema.__doc__
+
+        con = sqlite3.connect(db_path)
+        with con:
+            con.execute('DROP INDEX exam_course_date')
+            con.execute('INSERT INTO exam (course_id, examiner_id, date, file_attachment, language_id, last_modified) '
+                        'SELECT course_id, examiner_id, date, file_attachment, language_id, last_modified FROM exam '
+                        'WHERE exam_id = 1')
+            duplicate_id = con.execute('SELECT MAX(exam_id) FROM exam').fetchone()[0]
+        con.close()
+
+        self.assertListEqual(db.find_duplicate_exams(), [(1, '2013-02-21', 2)])
+        with self.assertRaises(ExamDatabaseError) as context:
+            db.upgrade_schema()
+        self.assertIn('course 1 on 2013-02-21 (2 exams)', str(context.exception))
+
+        db.remove_exam(duplicate_id)
+        db.upgrade_schema()
+        db.upgrade_schema()
+        self.assertListEqual(db.find_duplicate_exams(), [])
+        self.assertRaises(ExamDatabaseErrorExists, db.create_exam, 1, 2, '2013-02-21', None, 'fi')
+
+    def test_upgrade_schema_list_views(self):
+        '''
+        Test that upgrading a database created before the summary, list view and generation tables creates and fills
+        them, so that the lists can be browsed
+        '''
+        print '(' + self.test_upgrade_schema_list_views.__name__ + ')', self.test_upgrade_schema_list_views.__doc__
+
+        courses, exams = db.browse_course_list(1), db.browse_exam_list(1)
+        con = sqlite3.connect(db_path)
+        with con:
+            for name, in con.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall():
+                con.execute('DROP TRIGGER %s' % name)
+            for table in ['course_list_view', 'exam_list_view', 'archive_summary', 'course_summary', 'exam_summary',
+                          'user_token_generation', 'table_generation']:
+                con.execute('DROP TABLE %s' % table)
+        con.close()
+        self.assertRaises(sqlite3.OperationalError, db.browse_course_list, 1)
+
+        db.upgrade_schema()
+        self.assertListEqual(db.browse_course_list(1), courses)
+        self.assertListEqual(db.browse_exam_list(1), exams)
+        self.assertListEqual(db.verify_summaries(), [])
+        self.assertListEqual(db.verify_list_views(), [])
+
+        # The triggers were created as well
+        db.create_exam(1, 2, '2016-01-01', None, 'fi')
+        self.assertEquals(len(db.browse_exam_list(1)), len(exams) + 1)
+        self.assertListEqual(db.verify_list_views(), [])
+
+    def test_search_exams(self):
+        '''
+        Test that search_exams filters the exams of the courses by archive, course, dates, language and examiner, and
+        returns them ordered by date
+        '''
+        print '(' + self.test_search_exams.__name__ + ')', self.test_search_exams.__doc__
+
+        exam_ids = lambda exams: [exam['exam_id'] for exam in exams]
+        self.assertListEqual(exam_ids(db.search_exams(archive_id=1)), [1, 4, 2, 5, 3])
+        self.assertListEqual(exam_ids(db.search_exams(archive_id=1, date_from='2014-01-01', date_to='2015-02-28')),
+                             [2, 5])
+        self.assertListEqual(exam_ids(db.search_exams(archive_id=1, language_id='en')), [4])
+        self.assertListEqual(exam_ids(db.search_exams(course_id=1, date_to='2014-12-31')), [1, 2])
+        self.assertListEqual(exam_ids(db.search_exams(date_from='2015-01-01', language_id='fi')), [5, 3])
+        self.assertListEqual(db.search_exams(archive_id=2), [])
+        self.assertListEqual(db.search_exams(archive_id=1, date_from='2016-01-01'), [])
+        self.assertDictEqual(db.search_exams(archive_id=1)[0], db.browse_exam_list(1)[0])
+
+        # Pages continue after the date and exam_id of the last exam of the previous page
+        page = db.search_exams(archive_id=1, limit=2)
+        self.assertListEqual(exam_ids(page), [1, 4])
+        page = db.search_exams(archive_id=1, limit=2, after=(page[-1]['date'], page[-1]['exam_id']))
+        self.assertListEqual(exam_ids(page), [2, 5])
+        self.assertListEqual(exam_ids(db.search_exams(archive_id=1, descending=True, limit=2)), [3, 5])
+        self.assertListEqual(exam_ids(db.search_exams(archive_id=1, descending=True,
+                                                      after=(page[0]['date'], page[0]['exam_id']))), [4, 1])
+
+        new_exam_id = db.create_exam(2, 1, '2014-06-06', None, 'en')
+        self.assertListEqual(exam_ids(db.search_exams(archive_id=1, examiner_id=1)), [new_exam_id])
+        self.assertListEqual(exam_ids(db.search_exams(archive_id=1, language_id='en')), [4, new_exam_id])
+
+    def test_search_exams_query_plans(self):
+        '''
+        Test that every combination of the filters of search_exams is served by an index of exam_list_view, except
+        the language alone, and that the exams are not sorted after the search
+        '''
+        print '(' + self.test_search_exams_query_plans.__name__ + ')', self.test_search_exams_query_plans.__doc__
+
+        filters = [('archive_id', '=', 1), ('course_id', '=', 1), ('language_id', '=', 'fi'),
+                   ('examiner_id', '=', 2), ('date', '>=', '2013-01-01'), ('date', '<=', '2015-12-31')]
+        con = sqlite3.connect(db_path)
+        try:
+            for mask in range(1, 2 ** len(filters)):
+                combination = [f for i, f in enumerate(filters) if mask & (1 << i)]
+                sql_query = 'EXPLAIN QUERY PLAN SELECT * FROM exam_list_view WHERE ' + \
+                            ' AND '.join('%s %s ?' % (column, operator) for column, operator, value in combination) + \
+                            ' ORDER BY date, exam_id'
+                plan = ' '.join(row[3] for row in con.execute(sql_query, [value for _, _, value in combination]))
+                self.assertIn('USING INDEX exam_list_view_', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+                if combination != [('language_id', '=', 'fi')]:
+                    self.assertIn('SEARCH', plan)
+        finally:
+            con.close()
+
 
 if __name__ == '__main__':
     print 'Start running tests'
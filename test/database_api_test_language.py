@@ -13,10 +13,31 @@ from exam_archive import ExamDatabaseErrorNotFound, ExamDatabaseErrorExists
 
 class LanguageTestCase(BaseTestCase):
     '''
-    Test cases for language are not implemented as language related functions are outside of this project scope.
+    LanguageTestCase contains language related unit tests of the database API.
     '''
-    pass
+
+    # Define a list of the sample contents of the database, so we can later compare it to the test results
+    expected_languages = [{'language_id': 'en', 'language_name': 'English'},
+                          {'language_id': 'fi', 'language_name': 'Finnish'},
+                          {'language_id': 'sv', 'language_name': 'Swedish'}]
+
+    @classmethod
+    def setUpClass(cls):
+        print "Testing ", cls.__name__
+
+    def test_browse_languages(self):
+        '''
+        Test that browse_languages returns all the languages ordered by their IDs
+        '''
+        print '(' + self.test_browse_languages.__name__ + ')', self.test_browse_languages.__doc__
+
+        self.assertListEqual(db.browse_languages(), self.expected_languages)
+
+        # The languages are also in the lookup snapshot
+        lookups = db.get_lookups()
+        self.assertTupleEqual(lookups.languages, tuple(self.expected_languages))
+        self.assertDictEqual(lookups.languages_by_id['fi'], self.expected_languages[1])
 
 if __name__ == '__main__':
-    print 'No tests to run'
+    print 'Start running tests'
     unittest.main()
@@ -0,0 +1,159 @@
+'''
+Testing class for the connection pool and the statement cache of the database API.
+
+Authors: Ari Kairala, Petteri Ponsimaa
+'''
+
+import sqlite3, threading, unittest
+
+from database_api_test_common import BaseTestCase, db, db_path
+import exam_archive
+from exam_archive import ExamArchiveDatabase, ExamDatabaseError, STATEMENTS
+
+
+class PoolTestCase(BaseTestCase):
+    '''
+    PoolTestCase contains unit tests of the pooled connections of the database API.
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        print "Testing ", cls.__name__
+
+    def test_statement_cache(self):
+        '''
+        Test that the statements of repeated gets are prepared only once per connection
+        '''
+        print '(' + self.test_statement_cache.__name__ + ')', self.test_statement_cache.__doc__
+
+        db.get_course(1)
+        stats = db.statement_stats()
+        for i in range(10):
+            self.assertIsNotNone(db.get_course(1))
+            db.browse_courses(1)
+
+        new_stats = db.statement_stats()
+        self.assertEquals(new_stats['misses'] - stats['misses'], 1)
+        self.assertEquals(new_stats['hits'] - stats['hits'], 19)
+        self.assertIn(('get', 'course'), STATEMENTS)
+
+        # Each thread has a connection of its own
+        thread = threading.Thread(target=db.get_course, args=(1,))
+        thread.start()
+        thread.join()
+        self.assertEquals(db.statement_stats()['connections'], new_stats['connections'] + 1)
+
+    def test_nested_transaction(self):
+        '''
+        Test that the calls made while a pooled connection is in use do not commit the outer transaction
+        '''
+        print '(' + self.test_nested_transaction.__name__ + ')', self.test_nested_transaction.__doc__
+
+        con = db._connect()
+        try:
+            with con:
+                con.execute("UPDATE course SET course_name = 'Renamed' WHERE course_id = 1")
+                self.assertEquals(db.get_course(1)['course_name'], 'Renamed')
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertNotEquals(db.get_course(1)['course_name'], 'Renamed')
+
+        # A database API object without pooling uses a new connection for every call
+        unpooled = ExamArchiveDatabase(db_path, pooled=False)
+        self.assertIsNot(unpooled._connect(), unpooled._connect())
+        self.assertDictEqual(unpooled.get_course(1), db.get_course(1))
+
+    def test_transaction(self):
+        '''
+        Test that the calls made within transaction are committed together, or rolled back on an exception
+        '''
+        print '(' + self.test_transaction.__name__ + ')', self.test_transaction.__doc__
+
+        course_name = db.get_course(1)['course_name']
+        try:
+            with db.transaction():
+                db._connect().execute("UPDATE course SET course_name = 'Renamed' WHERE course_id = 1")
+                with db.transaction():
+                    self.assertEquals(db.get_course(1)['course_name'], 'Renamed')
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEquals(db.get_course(1)['course_name'], course_name)
+
+        # Statements other than INSERT, UPDATE, DELETE and REPLACE made by nested calls do not commit the transaction
+        try:
+            with db.transaction():
+                db._connect().execute("UPDATE course SET course_name = 'Renamed' WHERE course_id = 1")
+                con = db._connect()
+                with con:
+                    con.execute('PRAGMA data_version')
+                    con.execute('PRAGMA table_info(course)')
+                db.get_lookups()
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEquals(db.get_course(1)['course_name'], course_name)
+
+        with db.transaction():
+            db._connect().execute("UPDATE course SET course_name = 'Renamed' WHERE course_id = 1")
+        self.assertEquals(ExamArchiveDatabase(db_path, pooled=False).get_course(1)['course_name'], 'Renamed')
+        self.assertFalse(db._connect().in_transaction)
+
+        unpooled = ExamArchiveDatabase(db_path, pooled=False)
+        with self.assertRaises(ExamDatabaseError):
+            with unpooled.transaction():
+                pass
+
+    def test_reset_pool(self):
+        '''
+        Test that a forked worker process discards the connections and lookup snapshots inherited from its parent
+        '''
+        print '(' + self.test_reset_pool.__name__ + ')', self.test_reset_pool.__doc__
+
+        db.get_course(1)
+        lookups = db.get_lookups()
+        self.assertGreater(db.statement_stats()['connections'], 0)
+
+        exam_archive.reset_pool()
+        self.assertEquals(db.statement_stats()['connections'], 0)
+        self.assertIsNotNone(db.get_course(1))
+        self.assertEquals(db.statement_stats()['connections'], 1)
+        self.assertIsNot(db.get_lookups(), lookups)
+
+    def test_table_generations(self):
+        '''
+        Test that the changes made by other processes are detected, and that the caches are rebuilt only after the
+        tables they were built from have changed
+        '''
+        print '(' + self.test_table_generations.__name__ + ')', self.test_table_generations.__doc__
+
+        generations = db.table_generations()
+        self.assertIs(db.table_generations(), generations)
+        lookups = db.get_lookups()
+        token_generations = db.get_token_generations()
+
+        # Another process writes to the database without going through the database API of this process
+        con = sqlite3.connect(db_path)
+        with con:
+            con.execute("UPDATE teacher SET city = 'RAAHE' WHERE teacher_id = 1")
+        con.close()
+
+        new_generations = db.table_generations()
+        self.assertEquals(new_generations['teacher'], generations['teacher'] + 1)
+        self.assertEquals(new_generations['exam'], generations['exam'])
+        self.assertEquals(db.get_lookups().teachers_by_id[u'1']['city'], 'RAAHE')
+        self.assertIsNot(db.get_lookups(), lookups)
+        self.assertIs(db.get_token_generations(), token_generations)
+
+        # The changes made by the connection of the current thread are detected as well
+        lookups = db.get_lookups()
+        db.edit_user(3, 'testuser', 'changed', user_type='basic', archive_id=1, modifier_id=1)
+        self.assertEquals(db.table_generations()['user'], generations['user'] + 1)
+        self.assertIs(db.get_lookups(), lookups)
+        self.assertEquals(db.get_token_generations()[3], token_generations[3] + 1)
+
+
+if __name__ == '__main__':
+    print 'Start running tests'
+    unittest.main()
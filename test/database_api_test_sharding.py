@@ -0,0 +1,180 @@
+'''
+Testing class for the sharded variant of the database API.
+
+Authors: Ari Kairala, Petteri Ponsimaa
+'''
+
+import os, sqlite3, threading, unittest
+
+from database_api_test_common import BaseTestCase, db, db_path
+from sharded_exam_archive import split_database, SHARD_ID_RANGE
+from exam_archive import ExamArchiveDatabase, ExamDatabaseErrorNotFound, ExamDatabaseErrorExists
+
+# Paths to the catalog database and the archive databases split from the test database
+catalog_path = 'db/exam_archive_test_catalog.db'
+shard_folder = 'db/exam_archive_test_shards'
+
+
+class ShardingTestCase(BaseTestCase):
+    '''
+    ShardingTestCase contains unit tests of the sharded database API.
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        print "Testing ", cls.__name__
+
+    def setUp(self):
+        super(ShardingTestCase, self).setUp()
+        if os.path.exists(catalog_path):
+            os.remove(catalog_path)
+        self.sharded_db = split_database(db_path, catalog_path, shard_folder)
+
+    def tearDown(self):
+        self.sharded_db.clean()
+        super(ShardingTestCase, self).tearDown()
+
+    def test_split_database(self):
+        '''
+        Test that the courses and exams are moved to the database of their archive and found with the same IDs
+        '''
+        print '(' + self.test_split_database.__name__ + ')', self.test_split_database.__doc__
+
+        # All the courses of the test database are in the archive 1
+        shard = ExamArchiveDatabase(os.path.join(shard_folder, 'archive_1.db'))
+        self.assertListEqual(shard.browse_courses(1), db.browse_courses(1))
+        self.assertListEqual(ExamArchiveDatabase(catalog_path).browse_courses(1), [])
+
+        # The routing finds the courses and exams with their original IDs
+        self.assertListEqual(self.sharded_db.browse_courses(1), db.browse_courses(1))
+        self.assertDictEqual(self.sharded_db.get_course(2), db.get_course(2))
+        self.assertListEqual(self.sharded_db.browse_exams(1), db.browse_exams(1))
+        self.assertDictEqual(self.sharded_db.get_exam(1), db.get_exam(1))
+        self.assertDictEqual(self.sharded_db.get_course_by_name('Usability Testing'), db.get_course(2))
+        self.assertListEqual(self.sharded_db.browse_archives(), db.browse_archives())
+
+        # Courses and exams that do not exist
+        self.assertIsNone(self.sharded_db.get_course(999))
+        self.assertIsNone(self.sharded_db.get_exam(999))
+        self.assertListEqual(self.sharded_db.browse_exams(999), [])
+
+    def test_sharded_create_and_remove(self):
+        '''
+        Test that new courses and exams are stored to the database of their archive with unique IDs
+        '''
+        print '(' + self.test_sharded_create_and_remove.__name__ + ')', self.test_sharded_create_and_remove.__doc__
+
+        # The first course of the archive 2 creates the database of the archive
+        course_id = self.sharded_db.create_course(2, "123456A", "TestCourse", "Test description", 1,
+                                                  'http://example.com', 5, "fi")
+        self.assertTrue(os.path.exists(os.path.join(shard_folder, 'archive_2.db')))
+        self.assertEquals(course_id, 2 * SHARD_ID_RANGE + 1)
+        self.assertEquals(self.sharded_db.get_course(course_id)['archive_id'], 2)
+
+        exam_id = self.sharded_db.create_exam(course_id, 1, '2015-05-05', None, 'fi')
+        self.assertEquals(exam_id, 2 * SHARD_ID_RANGE + 1)
+        self.assertEquals(self.sharded_db.get_exam(exam_id)['course_id'], course_id)
+
+        # The summaries are maintained in the database of the archive
+        self.assertDictEqual(self.sharded_db.get_archive_summary(2), {'archive_id': 2, 'course_count': 1,
+                                                                      'exam_count': 1,
+                                                                      'latest_exam_date': '2015-05-05'})
+        self.assertEquals(self.sharded_db.get_course_summary(course_id)['exam_count'], 1)
+        self.assertListEqual(self.sharded_db.browse_archive_summaries(), [
+            db.get_archive_summary(1), self.sharded_db.get_archive_summary(2), db.get_archive_summary(3)])
+        self.assertListEqual(self.sharded_db.browse_archive_summaries([2]), [self.sharded_db.get_archive_summary(2)])
+        self.assertListEqual(self.sharded_db.verify_summaries(), [])
+
+        # The list views are maintained in the database of the archive
+        self.assertListEqual([course['course_id'] for course in self.sharded_db.browse_course_list(2)], [course_id])
+        self.assertListEqual([exam['exam_id'] for exam in self.sharded_db.browse_exam_list(course_id)], [exam_id])
+        self.assertListEqual(self.sharded_db.browse_archive_exam_list(1), db.browse_archive_exam_list(1))
+
+        # The pages of the searches over all the archives are merged from the pages of the archives
+        exams = self.sharded_db.search_exams()
+        self.assertEquals(len(exams), len(db.search_exams()) + 1)
+        self.assertListEqual(self.sharded_db.search_exams(limit=3), exams[:3])
+        self.assertListEqual(self.sharded_db.search_exams(limit=3, after=(exams[2]['date'], exams[2]['exam_id'])),
+                             exams[3:6])
+        self.assertListEqual(self.sharded_db.search_exams(descending=True), exams[::-1])
+        self.assertListEqual(self.sharded_db.verify_list_views(), [])
+
+        # Constraints are checked in the database of the archive
+        self.assertRaises(ExamDatabaseErrorExists, self.sharded_db.create_exam, course_id, 1, '2015-05-05', None,
+                          'fi')
+        self.assertRaises(ExamDatabaseErrorNotFound, self.sharded_db.create_course, 999, "123456A", "TestCourse",
+                          "Test description", 1, 'http://example.com', 5, "fi")
+        self.assertRaises(ExamDatabaseErrorNotFound, self.sharded_db.create_exam, 999, 1, '2015-05-05', None, 'fi')
+
+        # Removing a teacher is reflected to the courses of all archives
+        self.assertTrue(self.sharded_db.remove_teacher(1))
+        self.assertIsNone(self.sharded_db.get_course(course_id)['teacher_id'])
+        self.assertIsNone(self.sharded_db.get_course(1)['teacher_id'])
+        self.assertIsNone(self.sharded_db.browse_course_list(2)[0]['teacher_name'])
+
+        # Removing the course removes its exams, removing the archive removes its database
+        self.assertTrue(self.sharded_db.remove_course(course_id))
+        self.assertIsNone(self.sharded_db.get_exam(exam_id))
+        self.assertTrue(self.sharded_db.remove_archive(2))
+        self.assertFalse(os.path.exists(os.path.join(shard_folder, 'archive_2.db')))
+
+    def test_concurrent_shard_creation(self):
+        '''
+        Test that the courses created at the same time as the database of their archive get the IDs reserved for the
+        archive, and that a course can not be routed to two archives
+        '''
+        print '(' + self.test_concurrent_shard_creation.__name__ + ')', self.test_concurrent_shard_creation.__doc__
+
+        archive_id = self.sharded_db.create_archive('New archive', 'University')
+        self.assertFalse(os.path.exists(os.path.join(shard_folder, 'archive_%d.db' % archive_id)))
+        course_ids, errors = [], []
+        def create_course(i):
+            try:
+                course_ids.append(self.sharded_db.create_course(archive_id, "12345%dA" % i, "TestCourse %d" % i, "",
+                                                                1, '', 5, "fi"))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=create_course, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertListEqual(errors, [])
+        self.assertListEqual(sorted(course_ids), [archive_id * SHARD_ID_RANGE + i for i in range(1, 9)])
+        self.assertFalse([name for name in os.listdir(shard_folder) if name.endswith('.tmp')])
+        self.assertEquals(self.sharded_db.get_course(1)['archive_id'], 1)
+
+    def test_derived_routes(self):
+        '''
+        Test that the new courses and exams are routed by their IDs without the routing table of the catalog
+        '''
+        print '(' + self.test_derived_routes.__name__ + ')', self.test_derived_routes.__doc__
+
+        course_id = self.sharded_db.create_course(2, "123456A", "TestCourse", "", 1, '', 5, "fi")
+        exam_id = self.sharded_db.create_exam(course_id, 1, '2015-05-05', None, 'fi')
+
+        # Only the courses and exams moved by split_database are in the routing table
+        con = sqlite3.connect(catalog_path)
+        routes = con.execute('SELECT COUNT(*) FROM shard_route WHERE key_id >= ?', (SHARD_ID_RANGE,)).fetchone()[0]
+        con.close()
+        self.assertEquals(routes, 0)
+        self.assertEquals(self.sharded_db.get_exam(exam_id)['course_id'], course_id)
+
+        # IDs of missing rows or of archives without a database are not found, and do not create databases
+        self.assertIsNone(self.sharded_db.get_course(course_id + 1))
+        self.assertIsNone(self.sharded_db.get_course(4 * SHARD_ID_RANGE + 1))
+        self.assertFalse(os.path.exists(os.path.join(shard_folder, 'archive_4.db')))
+        self.assertRaises(ExamDatabaseErrorNotFound, self.sharded_db.create_exam, 4 * SHARD_ID_RANGE + 1, 1,
+                          '2015-05-05', None, 'fi')
+        self.assertRaises(ExamDatabaseErrorNotFound, self.sharded_db.create_exam, course_id + 1, 1, '2015-05-05',
+                          None, 'fi')
+
+        self.assertTrue(self.sharded_db.remove_exam(exam_id))
+        self.assertTrue(self.sharded_db.remove_course(course_id))
+        self.assertIsNone(self.sharded_db.get_course(course_id))
+
+if __name__ == '__main__':
+    print 'Start running tests'
+    unittest.main()
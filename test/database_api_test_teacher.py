@@ -236,6 +236,32 @@ class TeacherTestCase(BaseTestCase):
         self.assertEquals(len(teachers), 0)
         self.assertListEqual(teachers, [])
 
+    def test_get_lookups(self):
+        '''
+        Test that the lookup snapshot is reused until the teachers are created, edited or removed
+        '''
+        print '(' + self.test_get_lookups.__name__ + ')', self.test_get_lookups.__doc__
+
+        lookups = db.get_lookups()
+        self.assertTupleEqual(lookups.teachers, tuple(self.expected_teachers))
+        self.assertDictEqual(lookups.teachers_by_id[u'2'], self.expected_teachers[1])
+        self.assertIs(db.get_lookups(), lookups)
+        self.assertRaises(AttributeError, setattr, lookups, 'teachers', ())
+
+        # Every modification of the teachers creates a new snapshot with a new entity tag
+        teacher_id = db.create_teacher('Testi', 'Opettaja')
+        self.assertIsNot(db.get_lookups(), lookups)
+        self.assertIn(unicode(teacher_id), db.get_lookups().teachers_by_id)
+        self.assertNotEquals(db.get_lookups().teachers_etag, lookups.teachers_etag)
+        self.assertEquals(db.get_lookups().languages_etag, lookups.languages_etag)
+
+        db.edit_teacher(teacher_id, 'Testi', 'Opettaja', city='OULU')
+        self.assertEquals(db.get_lookups().teachers_by_id[unicode(teacher_id)]['city'], 'OULU')
+
+        db.remove_teacher(teacher_id)
+        self.assertEquals(db.get_lookups().teachers_etag, lookups.teachers_etag)
+        self.assertNotIn(unicode(teacher_id), db.get_lookups().teachers_by_id)
+
 
 if __name__ == '__main__':
     print 'Start running tests'
@@ -352,6 +352,26 @@ class UserTestCase(BaseTestCase):
         self.assertEquals(len(users), 0)
         self.assertListEqual(users, [])
 
+    def test_token_generations(self):
+        '''
+        Test that the token generation of a user is incremented when the user is edited, and that removed users have
+        no generation
+        '''
+        print '(' + self.test_token_generations.__name__ + ')', self.test_token_generations.__doc__
+
+        generations = db.get_token_generations()
+        self.assertDictEqual(generations, {1: 0, 2: 0, 3: 0})
+        self.assertIs(db.get_token_generations(), generations)
+
+        db.edit_user(3, 'testuser', encrypt('changed'), user_type='basic', archive_id=1, modifier_id=1)
+        self.assertEquals(db.get_token_generations()[3], 1)
+
+        user_id = db.create_user('newuser', encrypt('newuser'), 'basic', 1)
+        self.assertEquals(db.get_token_generations()[user_id], 0)
+
+        db.remove_user(3)
+        self.assertNotIn(3, db.get_token_generations())
+
 if __name__ == '__main__':
     print 'Start running tests'
     unittest.main()
@@ -129,6 +129,35 @@ class RestArchiveTestCase(BaseTestCase):
             archive = db.get_archive(obj['archiveId'])
             assert self._isIdentical(obj, archive)
 
+            summary = db.get_archive_summary(obj['archiveId'])
+            self.assertEquals(obj['courseCount'], summary['course_count'])
+            self.assertEquals(obj['examCount'], summary['exam_count'])
+            self.assertEquals(obj['latestExamDate'], summary['latest_exam_date'])
+
+    def test_archive_get_expand(self):
+        '''
+        Check that courses and their exams are embedded to Archive/GET with ?expand=courses.exams.
+        '''
+        print '(' + self.test_archive_get_expand.__name__ + ')', \
+            self.test_archive_get_expand.__doc__
+
+        resource_url = self.archivelist_resource_url + '1/'
+
+        rv = self.app.get(resource_url + '?expand=courses', headers=self.header_auth)
+        self.assertEquals(rv.status_code,200)
+        item = json.loads(rv.data)['collection']['items'][0]
+        self.assertEquals(len(item['courses']), 3)
+        self.assertNotIn('exams', item['courses'][0])
+
+        rv = self.app.get(resource_url + '?expand=courses.exams', headers=self.header_auth)
+        self.assertEquals(rv.status_code,200)
+        item = json.loads(rv.data)['collection']['items'][0]
+        self.assertListEqual([len(course['exams']) for course in item['courses']], [3, 1, 1])
+
+        rv = self.app.get(resource_url + '?expand=exams', headers=self.header_auth)
+        self.assertEquals(rv.status_code,400)
+        self.assertEquals(PROBLEMJSON,rv.mimetype)
+
     def test_archive_post(self):
         '''
         Check that a new archive can be created.
@@ -0,0 +1,102 @@
+'''
+Testing class for RESTful API's backup related resources.
+
+Authors: Ari Kairala, Petteri Ponsimaa
+'''
+
+import unittest, hashlib, shutil
+import base64, json, server
+from database_api_test_common import BaseTestCase, db
+from resources_common import COLLECTIONJSON, PROBLEMJSON, BACKUP_PROFILE
+
+# Path to the backup folder used in the tests
+backup_folder = 'db/exam_archive_test_backups'
+
+class RestBackupTestCase(BaseTestCase):
+    '''
+    RestBackupTestCase contains unit tests of the Backup and BackupList resources.
+    '''
+
+    # List of user credentials in exam_archive_data_dump.sql for testing purposes
+    super_user = "bigboss"
+    super_pw = hashlib.sha256("ultimatepw").hexdigest()
+    admin_user = "antti.admin"
+    admin_pw = hashlib.sha256("qwerty1234").hexdigest()
+
+    backuplist_resource_url = '/exam_archive/api/backups/'
+
+    # Set a ready header for authorized super user
+    header_auth = {'Authorization': 'Basic ' + base64.b64encode(super_user + ":" + super_pw)}
+
+    @classmethod
+    def setUpClass(cls):
+        print "Testing ", cls.__name__
+
+    def setUp(self):
+        super(RestBackupTestCase, self).setUp()
+        server.app.config.update({'BACKUP_FOLDER': backup_folder})
+
+    def tearDown(self):
+        shutil.rmtree(backup_folder, True)
+        super(RestBackupTestCase, self).tearDown()
+
+    def test_backup_not_authorized(self):
+        '''
+        Check that only super user is able to create and list backups.
+        '''
+        print '(' + self.test_backup_not_authorized.__name__ + ')', \
+            self.test_backup_not_authorized.__doc__
+
+        rv = self.app.post(self.backuplist_resource_url)
+        self.assertEquals(rv.status_code, 401)
+        self.assertIn(PROBLEMJSON, rv.mimetype)
+
+        header_admin = {'Authorization': 'Basic ' + base64.b64encode(self.admin_user + ":" + self.admin_pw)}
+        rv = self.app.post(self.backuplist_resource_url, headers=header_admin)
+        self.assertEquals(rv.status_code, 403)
+        rv = self.app.get(self.backuplist_resource_url, headers=header_admin)
+        self.assertEquals(rv.status_code, 403)
+
+    def test_backup_post(self):
+        '''
+        Check that a backup is created with BackupList/POST, listed with BackupList/GET, verified with Backup/POST
+        and that the result of the verification is returned with Backup/GET.
+        '''
+        print '(' + self.test_backup_post.__name__ + ')', \
+            self.test_backup_post.__doc__
+
+        rv = self.app.post(self.backuplist_resource_url, headers=self.header_auth)
+        self.assertEquals(rv.status_code, 201)
+        backup_url = rv.headers['Location']
+
+        rv = self.app.get(self.backuplist_resource_url, headers=self.header_auth)
+        self.assertEquals(rv.status_code, 200)
+        self.assertEquals(COLLECTIONJSON+";"+BACKUP_PROFILE, rv.content_type)
+        items = json.loads(rv.data)['collection']['items']
+        self.assertEquals(len(items), 1)
+        self.assertTrue(backup_url.endswith(items[0]['href']))
+
+        # The backup is not verified by Backup/GET
+        rv = self.app.get(backup_url, headers=self.header_auth)
+        self.assertEquals(rv.status_code, 200)
+        data = dict((d['name'], d['value']) for d in json.loads(rv.data)['collection']['items'][0]['data'])
+        self.assertNotIn('valid', data)
+
+        rv = self.app.post(backup_url, headers=self.header_auth)
+        self.assertEquals(rv.status_code, 200)
+        data = dict((d['name'], d['value']) for d in json.loads(rv.data)['collection']['items'][0]['data'])
+        self.assertTrue(data['valid'])
+        self.assertListEqual(data['problems'], [])
+
+        rv = self.app.get(backup_url, headers=self.header_auth)
+        recorded = dict((d['name'], d['value']) for d in json.loads(rv.data)['collection']['items'][0]['data'])
+        self.assertDictEqual(recorded, data)
+
+        rv = self.app.get(self.backuplist_resource_url + 'backup_missing/', headers=self.header_auth)
+        self.assertEquals(rv.status_code, 404)
+        rv = self.app.post(self.backuplist_resource_url + 'backup_missing/', headers=self.header_auth)
+        self.assertEquals(rv.status_code, 404)
+
+if __name__ == '__main__':
+    print 'Start running tests'
+    unittest.main()
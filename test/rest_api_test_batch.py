@@ -0,0 +1,156 @@
+'''
+Testing class for the Batch resource of the RESTful API.
+
+Authors: Ari Kairala, Petteri Ponsimaa
+'''
+
+import unittest, hashlib
+import base64, json, server
+from database_api_test_common import BaseTestCase, db
+from resources_common import DEFAULTJSON, PROBLEMJSON, COLLECTIONJSON
+
+class RestBatchTestCase(BaseTestCase):
+    '''
+    RestBatchTestCase contains unit tests of the Batch resource.
+    '''
+
+    # List of user credentials in exam_archive_data_dump.sql for testing purposes
+    super_user = "bigboss"
+    super_pw = hashlib.sha256("ultimatepw").hexdigest()
+    basic_user = "testuser"
+    basic_pw = hashlib.sha256("testuser").hexdigest()
+
+    batch_resource_url = '/exam_archive/api/batch/'
+    courselist_resource_url = '/exam_archive/api/archives/1/courses/'
+
+    # Set ready headers for authorized super and basic users
+    header_auth = {'Authorization': 'Basic ' + base64.b64encode(super_user + ":" + super_pw)}
+    header_basic_auth = {'Authorization': 'Basic ' + base64.b64encode(basic_user + ":" + basic_pw)}
+
+    test_course_template = {"template": {
+        "data": [
+                 {"name": "archiveId", "value": 1},
+                 {"name": "courseCode", "value": "810136P"},
+                 {"name": "name", "value": "Batch course"},
+                 {"name": "inLanguage", "value": "fi"},
+                 {"name": "creditPoints", "value": 4}]
+    }
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        print "Testing ", cls.__name__
+
+    def post_batch(self, batch, headers=None):
+        '''
+        Post a batch and return the response.
+        '''
+        return self.app.post(self.batch_resource_url, headers=self.header_auth if headers is None else headers,
+                             data=json.dumps(batch))
+
+    def test_batch_post(self):
+        '''
+        Check that the requests of a batch are run in order as the user of the batch, and that their responses are
+        returned with status code 207.
+        '''
+        print '(' + self.test_batch_post.__name__ + ')', self.test_batch_post.__doc__
+
+        # The user is authenticated once for the whole batch
+        authorize_user = db.authorize_user
+        calls = []
+        database = server.app.config['DATABASE']
+        database.authorize_user = lambda *args: calls.append(args) or authorize_user(*args)
+        try:
+            rv = self.post_batch({'requests': [
+                {'method': 'GET', 'href': '/exam_archive/api/users/testuser/'},
+                {'method': 'GET', 'href': self.courselist_resource_url + '?fields=courseId&limit=2'},
+                {'method': 'POST', 'href': self.courselist_resource_url, 'body': self.test_course_template},
+                {'method': 'GET', 'href': '/exam_archive/api/archives/1/courses/999/'},
+                {'method': 'PUT', 'href': '/exam_archive/api/archives/1/courses/1/', 'body': {},
+                 'headers': {'If-Match': '"none"'}}]})
+        finally:
+            del database.authorize_user
+        self.assertEquals(len(calls), 1)
+
+        self.assertEquals(rv.status_code, 207)
+        self.assertEquals(rv.mimetype, DEFAULTJSON)
+        responses = json.loads(rv.data)['responses']
+        self.assertListEqual([response['status'] for response in responses], [200, 200, 201, 404, 412])
+        self.assertNotIn('committed', json.loads(rv.data))
+        self.assertEquals(responses[0]['body']['collection']['items'][0]['href'], '/exam_archive/api/users/testuser/')
+        self.assertIn(COLLECTIONJSON, responses[1]['headers']['Content-Type'])
+        self.assertEquals(len(responses[1]['body']['collection']['items']), 2)
+        self.assertEquals(responses[3]['body']['status'], 404)
+        self.assertIsNotNone(db.get_course_by_name('Batch course'))
+
+        # The requests are authorized as the user of the batch
+        rv = self.post_batch({'requests': [{'method': 'GET', 'href': '/exam_archive/api/archives/2/courses/'}]},
+                             self.header_basic_auth)
+        self.assertEquals(json.loads(rv.data)['responses'][0]['status'], 403)
+
+    def test_batch_transaction(self):
+        '''
+        Check that the changes of a batch run in a transaction are committed together, or rolled back when a request
+        fails.
+        '''
+        print '(' + self.test_batch_transaction.__name__ + ')', self.test_batch_transaction.__doc__
+
+        course_count = len(db.browse_courses(1))
+        failing = {'requests': [
+            {'method': 'POST', 'href': self.courselist_resource_url, 'body': self.test_course_template},
+            {'method': 'GET', 'href': self.courselist_resource_url},
+            {'method': 'GET', 'href': '/exam_archive/api/teachers/'},
+            {'method': 'GET', 'href': self.courselist_resource_url + '?fields=name'},
+            {'method': 'POST', 'href': self.courselist_resource_url, 'body': {'template': {}}},
+            {'method': 'DELETE', 'href': '/exam_archive/api/archives/1/courses/1/'}],
+            'transaction': True}
+        rv = self.post_batch(failing)
+        self.assertEquals(rv.status_code, 207)
+        body = json.loads(rv.data)
+        self.assertFalse(body['committed'])
+        self.assertListEqual([response['status'] for response in body['responses']], [201, 200, 200, 200, 400, 424])
+
+        # The lists in the transaction contained the new course, but it was rolled back, even though the lookups and
+        # the selected columns were read within the transaction
+        self.assertEquals(len(body['responses'][1]['body']['collection']['items']), course_count + 1)
+        self.assertEquals(len(body['responses'][3]['body']['collection']['items']), course_count + 1)
+        self.assertEquals(len(db.browse_courses(1)), course_count)
+        self.assertIsNotNone(db.get_course(1))
+
+        failing['requests'].pop(4)
+        body = json.loads(self.post_batch(failing).data)
+        self.assertTrue(body['committed'])
+        self.assertListEqual([response['status'] for response in body['responses']], [201, 200, 200, 200, 204])
+        self.assertEquals(len(db.browse_courses(1)), course_count)
+        self.assertIsNone(db.get_course(1))
+
+    def test_batch_invalid(self):
+        '''
+        Check that invalid and unauthenticated batches are refused.
+        '''
+        print '(' + self.test_batch_invalid.__name__ + ')', self.test_batch_invalid.__doc__
+
+        batch = {'requests': [{'method': 'GET', 'href': self.courselist_resource_url}]}
+        self.assertEquals(self.post_batch(batch, {}).status_code, 401)
+
+        for invalid in [[], {'requests': []}, {'requests': [{'method': 'PATCH', 'href': self.courselist_resource_url}]},
+                        {'requests': [{'method': 'GET', 'href': '/exams/exam.pdf'}]},
+                        {'requests': [{'method': 'GET', 'href': self.courselist_resource_url,
+                                       'headers': {'Authorization': 'Basic Og=='}}]},
+                        {'requests': batch['requests'], 'transaction': 'yes'}]:
+            rv = self.post_batch(invalid)
+            self.assertEquals(rv.status_code, 400)
+            self.assertEquals(rv.mimetype, PROBLEMJSON)
+
+        server.app.config['MAX_BATCH_REQUESTS'] = 2
+        try:
+            self.assertEquals(self.post_batch({'requests': batch['requests'] * 3}).status_code, 400)
+        finally:
+            server.app.config['MAX_BATCH_REQUESTS'] = 50
+
+        rv = self.post_batch({'requests': [{'method': 'POST', 'href': self.batch_resource_url, 'body': batch}]})
+        self.assertEquals(json.loads(rv.data)['responses'][0]['status'], 400)
+
+if __name__ == '__main__':
+    print 'Start running tests'
+    unittest.main()
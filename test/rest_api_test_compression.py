@@ -0,0 +1,102 @@
+'''
+Testing class for the compression of the RESTful API's responses.
+
+Authors: Ari Kairala, Petteri Ponsimaa
+'''
+
+import unittest, hashlib, zlib
+import base64, json, server
+import compression
+from database_api_test_common import BaseTestCase, db
+
+class RestCompressionTestCase(BaseTestCase):
+    '''
+    RestCompressionTestCase contains unit tests of the content coding of the responses.
+    '''
+
+    # List of user credentials in exam_archive_data_dump.sql for testing purposes
+    super_user = "bigboss"
+    super_pw = hashlib.sha256("ultimatepw").hexdigest()
+
+    examlist_resource_url = '/exam_archive/api/archives/1/courses/1/exams/'
+    exam_resource_url = '/exam_archive/api/archives/1/courses/1/exams/1/'
+    teacherlist_resource_url = '/exam_archive/api/teachers/'
+
+    # Set ready headers for authorized super user with and without gzip
+    header_auth = {'Authorization': 'Basic ' + base64.b64encode(super_user + ":" + super_pw)}
+    header_gzip = dict(header_auth, **{'Accept-Encoding': 'gzip, deflate'})
+
+    @classmethod
+    def setUpClass(cls):
+        print "Testing ", cls.__name__
+
+    def setUp(self):
+        super(RestCompressionTestCase, self).setUp()
+        compression.clear_cache()
+
+    def tearDown(self):
+        server.app.config['COMPRESS_MIN_SIZE'] = compression.DEFAULT_MIN_SIZE
+        super(RestCompressionTestCase, self).tearDown()
+
+    def test_gzip(self):
+        '''
+        Check that a large response is compressed with gzip only if the client accepts it, and that each response
+        body is compressed only once.
+        '''
+        print '(' + self.test_gzip.__name__ + ')', self.test_gzip.__doc__
+
+        rv = self.app.get(self.examlist_resource_url, headers=self.header_auth)
+        self.assertEquals(rv.status_code, 200)
+        self.assertNotIn('Content-Encoding', rv.headers)
+        self.assertIn('Accept-Encoding', rv.headers['Vary'])
+        plain = rv.data
+
+        rv = self.app.get(self.examlist_resource_url, headers=self.header_gzip)
+        self.assertEquals(rv.status_code, 200)
+        self.assertEquals(rv.headers['Content-Encoding'], 'gzip')
+        self.assertEquals(int(rv.headers['Content-Length']), len(rv.data))
+        self.assertLess(len(rv.data), len(plain))
+        self.assertEquals(zlib.decompress(rv.data, 16 + zlib.MAX_WBITS), plain)
+
+        compressed = rv.data
+        rv = self.app.get(self.examlist_resource_url, headers=self.header_gzip)
+        self.assertEquals(rv.data, compressed)
+        self.assertEquals(len(compression.CACHE), 1)
+
+        # Responses smaller than the threshold are not compressed
+        server.app.config['COMPRESS_MIN_SIZE'] = len(plain) + 1
+        rv = self.app.get(self.examlist_resource_url, headers=self.header_gzip)
+        self.assertNotIn('Content-Encoding', rv.headers)
+        self.assertEquals(rv.data, plain)
+
+        # Refused content codings are not used
+        rv = self.app.get(self.examlist_resource_url, headers=dict(self.header_auth, **{'Accept-Encoding': 'gzip;q=0'}))
+        self.assertNotIn('Content-Encoding', rv.headers)
+
+    def test_etag_suffix(self):
+        '''
+        Check that the entity tags of compressed representations have a suffix, which is accepted in If-None-Match
+        and If-Match headers.
+        '''
+        print '(' + self.test_etag_suffix.__name__ + ')', self.test_etag_suffix.__doc__
+
+        server.app.config['COMPRESS_MIN_SIZE'] = 0
+        rv = self.app.get(self.teacherlist_resource_url, headers=self.header_gzip)
+        self.assertEquals(rv.status_code, 200)
+        etag = rv.headers['ETag']
+        self.assertTrue(etag.endswith('-gzip"'))
+
+        rv = self.app.get(self.teacherlist_resource_url, headers=dict(self.header_gzip, **{'If-None-Match': etag}))
+        self.assertEquals(rv.status_code, 304)
+        self.assertEquals(rv.headers['ETag'], etag)
+
+        rv = self.app.get(self.exam_resource_url, headers=self.header_gzip)
+        etag = rv.headers['ETag']
+        self.assertTrue(etag.endswith('-gzip"'))
+        rv = self.app.delete(self.exam_resource_url, headers=dict(self.header_auth, **{'If-Match': etag}))
+        self.assertEquals(rv.status_code, 204)
+        self.assertIsNone(db.get_exam(1))
+
+if __name__ == '__main__':
+    print 'Start running tests'
+    unittest.main()
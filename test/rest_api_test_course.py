@@ -283,6 +283,151 @@ class RestCourseTestCase(BaseTestCase):
         rv = self.app.delete(location, headers=self.header_auth)
         self.assertEquals(rv.status_code,204)
 
+    def test_course_put_if_match(self):
+        '''
+        Check that a course is modified and deleted only if the If-Match header matches the ETag of the course.
+        '''
+        print '(' + self.test_course_put_if_match.__name__ + ')', \
+            self.test_course_put_if_match.__doc__
+
+        # Get the ETag of the course
+        rv = self.app.get(self.course_resource_url, headers=self.header_auth)
+        self.assertEquals(rv.status_code,200)
+        etag = rv.headers.get('ETag')
+        self.assertIsNotNone(etag)
+
+        # Modify the course with the fetched ETag
+        headers = dict(self.header_auth, **{'If-Match': etag})
+        rv = self.app.put(self.course_resource_url, headers=headers, data=json.dumps(self.test_course_template_2))
+        self.assertEquals(rv.status_code,200)
+
+        # The course has changed, so the same ETag must not be accepted anymore
+        rv = self.app.put(self.course_resource_url, headers=headers, data=json.dumps(self.test_course_template_1))
+        self.assertEquals(rv.status_code,412)
+        self.assertEquals(PROBLEMJSON,rv.mimetype)
+        rv = self.app.delete(self.course_resource_url, headers=headers)
+        self.assertEquals(rv.status_code,412)
+
+        # Delete the course with the new ETag
+        rv = self.app.get(self.course_resource_url, headers=self.header_auth)
+        self.assertNotEquals(rv.headers.get('ETag'), etag)
+        headers = dict(self.header_auth, **{'If-Match': rv.headers.get('ETag')})
+        rv = self.app.delete(self.course_resource_url, headers=headers)
+        self.assertEquals(rv.status_code,204)
+
+    def test_courselist_expand(self):
+        '''
+        Check that exams are embedded to the course list with ?expand=exams and that the expansion is limited.
+        '''
+        print '(' + self.test_courselist_expand.__name__ + ')', \
+            self.test_courselist_expand.__doc__
+
+        rv = self.app.get(self.courselist_resource_url, headers=self.header_auth)
+        self.assertEquals(rv.status_code,200)
+        items = json.loads(rv.data)['collection']['items']
+        self.assertNotIn('exams', items[0])
+
+        rv = self.app.get(self.courselist_resource_url + '?expand=exams', headers=self.header_auth)
+        self.assertEquals(rv.status_code,200)
+        items = json.loads(rv.data)['collection']['items']
+        self.assertEquals(len(items), 3)
+        for item in items:
+            course_id = [d['value'] for d in item['data'] if d['name'] == 'courseId'][0]
+            exam_ids = [[d['value'] for d in exam['data'] if d['name'] == 'examId'][0] for exam in item['exams']]
+            self.assertListEqual(exam_ids, [exam['exam_id'] for exam in db.browse_exams(course_id)])
+
+        rv = self.app.get(self.courselist_resource_url + '?expand=teachers', headers=self.header_auth)
+        self.assertEquals(rv.status_code,400)
+
+        # 3 courses and 5 exams do not fit into 7 items
+        server.app.config['MAX_EXPANDED_ITEMS'] = 7
+        try:
+            rv = self.app.get(self.courselist_resource_url + '?expand=exams', headers=self.header_auth)
+            self.assertEquals(rv.status_code,400)
+            rv = self.app.get(self.courselist_resource_url, headers=self.header_auth)
+            self.assertEquals(rv.status_code,200)
+        finally:
+            server.app.config['MAX_EXPANDED_ITEMS'] = 1000
+
+    def test_courselist_sort(self):
+        '''
+        Check that the course list and the exam list are sorted by the sort query parameter, and that the pages are
+        followed with the next links.
+        '''
+        print '(' + self.test_courselist_sort.__name__ + ')', self.test_courselist_sort.__doc__
+
+        def get_page(url, id_name='courseId'):
+            rv = self.app.get(url, headers=self.header_auth)
+            self.assertEquals(rv.status_code, 200)
+            collection = json.loads(rv.data)['collection']
+            ids = [d['value'] for item in collection['items'] for d in item['data'] if d['name'] == id_name]
+            next_links = [link['href'] for link in collection['links'] if link['rel'] == 'next']
+            return ids, next_links[0] if next_links else None
+
+        ids, next_url = get_page(self.courselist_resource_url + '?sort=course_name&limit=2')
+        self.assertListEqual(ids, [1, 3])
+        ids, next_url = get_page(next_url)
+        self.assertListEqual(ids, [2])
+        self.assertIsNone(next_url)
+
+        self.assertEquals(get_page(self.courselist_resource_url + '?sort=-course_code')[0], [3, 2, 1])
+        self.assertEquals(get_page(self.courselist_resource_url + '?limit=5'), ([1, 2, 3], None))
+
+        examlist_resource_url = '/exam_archive/api/archives/1/courses/1/exams/'
+        ids, next_url = get_page(examlist_resource_url + '?sort=-date&limit=2', 'examId')
+        self.assertListEqual(ids, [3, 2])
+        self.assertIn('sort=-date', next_url)
+        self.assertListEqual(get_page(next_url, 'examId')[0], [1])
+
+        for url in [self.courselist_resource_url + '?sort=description', self.courselist_resource_url + '?limit=0',
+                    self.courselist_resource_url + '?sort=course_name&after=abc',
+                    examlist_resource_url + '?sort=last_modified&date_from=2014-01-01']:
+            rv = self.app.get(url, headers=self.header_auth)
+            self.assertEquals(rv.status_code, 400)
+            self.assertIn(PROBLEMJSON, rv.mimetype)
+
+    def test_courselist_fields(self):
+        '''
+        Check that the items of the course, exam and user lists contain only the fields given by the fields query
+        parameter.
+        '''
+        print '(' + self.test_courselist_fields.__name__ + ')', self.test_courselist_fields.__doc__
+
+        def get_items(url):
+            rv = self.app.get(url, headers=self.header_auth)
+            self.assertEquals(rv.status_code, 200)
+            return json.loads(rv.data)['collection']['items']
+
+        items = get_items(self.courselist_resource_url + '?fields=courseId,name')
+        self.assertEquals(len(items), 3)
+        for item in items:
+            self.assertListEqual([d['name'] for d in item['data']], ['courseId', 'name'])
+            self.assertListEqual(item['links'], [])
+        self.assertTrue(items[0]['href'].endswith('/archives/1/courses/1/'))
+
+        items = get_items(self.courselist_resource_url + '?fields=links&expand=exams&sort=-course_code')
+        self.assertListEqual([item['data'] for item in items], [[]] * 3)
+        self.assertEquals(items[0]['links'][0]['rel'], 'exams')
+        self.assertGreater(len(items[0]['exams'][0]['data']), 1)
+
+        examlist_resource_url = '/exam_archive/api/archives/1/courses/1/exams/'
+        for url in [examlist_resource_url + '?fields=date&sort=-date',
+                    examlist_resource_url + '?fields=date&date_from=2000-01-01',
+                    '/exam_archive/api/archives/1/exams/?fields=date']:
+            for item in get_items(url):
+                self.assertListEqual([d['name'] for d in item['data']], ['date'])
+                self.assertListEqual(item['links'], [])
+
+        for item in get_items('/exam_archive/api/users/?fields=name,userType'):
+            self.assertListEqual([d['name'] for d in item['data']], ['userType', 'name'])
+            self.assertListEqual(item['links'], [])
+
+        for url in [self.courselist_resource_url + '?fields=courseId,password', examlist_resource_url + '?fields=name',
+                    '/exam_archive/api/users/?fields=archiveId']:
+            rv = self.app.get(url, headers=self.header_auth)
+            self.assertEquals(rv.status_code, 400)
+            self.assertIn(PROBLEMJSON, rv.mimetype)
+
     def test_course_delete(self):
         '''
         Check that course in not able to get course list without authenticating.
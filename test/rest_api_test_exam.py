@@ -5,13 +5,13 @@ Authors: Ari Kairala, Petteri Ponsimaa
 Originally adopted from Ivan's exercise 1 test class.
 '''
 
-import unittest, hashlib
-import re, base64, copy, json, server
+import unittest, hashlib, threading, time
+import re, base64, copy, json, server, serialization
 from database_api_test_common import BaseTestCase, db
 from flask import json, jsonify
 from exam_archive import ExamDatabaseErrorNotFound, ExamDatabaseErrorExists
 from unittest import TestCase
-from resources_common import COLLECTIONJSON, PROBLEMJSON, EXAM_PROFILE, API_VERSION
+from resources_common import COLLECTIONJSON, PROBLEMJSON, EXAM_PROFILE, API_VERSION, href, LIST_BUILDS
 
 class RestExamTestCase(BaseTestCase):
     '''
@@ -330,6 +330,153 @@ class RestExamTestCase(BaseTestCase):
         rv = self.app.post(self.exam_resource_url, headers=self.header_auth)
         self.assertEquals(rv.status_code,405)
 
+    def test_href(self):
+        '''
+        Check that the cached URL format strings of href build the same URLs as api.url_for.
+        '''
+        print '(' + self.test_href.__name__ + ')', self.test_href.__doc__
+
+        with server.app.test_request_context():
+            for resource, values in [(server.ExamList, {'archive_id': 1, 'course_id': 2}),
+                                     (server.Exam, {'archive_id': 1, 'course_id': 2, 'exam_id': 3}),
+                                     (server.Exam, {'archive_id': 10, 'course_id': 200, 'exam_id': 3000}),
+                                     (server.ArchiveList, {}),
+                                     (server.User, {'username': u'test user%'}),
+                                     (server.Language, {'language_id': u'fi'})]:
+                self.assertEquals(href(resource, **values), server.api.url_for(resource, **values))
+
+    def test_item_fragments(self):
+        '''
+        Check that the cached items of ExamList are rebuilt when the exams or the names of the examiners change, and
+        that the pre-encoded fragments are spliced into the JSON output.
+        '''
+        print '(' + self.test_item_fragments.__name__ + ')', self.test_item_fragments.__doc__
+
+        def examiner_names():
+            rv = self.app.get(self.examlist_resource_url, headers=self.header_auth)
+            self.assertEquals(rv.status_code, 200)
+            items = json.loads(rv.data)['collection']['items']
+            return [dict((d['name'], d['value']) for d in item['data']).get('examinerName') for item in items]
+
+        self.assertListEqual(examiner_names(), ['Terhi Testi'] * 3)
+        self.assertListEqual(examiner_names(), ['Terhi Testi'] * 3)
+        db.edit_teacher(2, 'Terhi', 'Tentaattori')
+        db.edit_exam(1, 1, 1, '2013-02-21', '810136P_exam01.pdf', 'fi')
+        self.assertListEqual(examiner_names(), ['Tero Testaaja', 'Terhi Tentaattori', 'Terhi Tentaattori'])
+
+        fragment = serialization.fragment({'name': u'\xe4'})
+        self.assertEquals(json.loads(serialization.dumps({'items': [fragment, fragment], 'text': u'\x00'})),
+                          {'items': [{'name': u'\xe4'}] * 2, 'text': u'\x00'})
+        self.assertRaises(TypeError, serialization.dumps, {'items': object()})
+
+    def test_examlist_single_flight(self):
+        '''
+        Check that concurrent identical requests for an exam list query the database once, and share the response.
+        '''
+        print '(' + self.test_examlist_single_flight.__name__ + ')', self.test_examlist_single_flight.__doc__
+
+        # Hold the first build of the list until the other requests are waiting for it
+        database = server.app.config['DATABASE']
+        browse_exam_list = database.browse_exam_list
+        calls = []
+        release = threading.Event()
+
+        def slow_browse_exam_list(course_id, **kwargs):
+            calls.append(course_id)
+            release.wait(5)
+            return browse_exam_list(course_id, **kwargs)
+
+        responses = []
+        requests = [threading.Thread(target=lambda: responses.append(
+                        self.app.get(self.examlist_resource_url, headers=self.header_auth))) for i in range(8)]
+        database.browse_exam_list = slow_browse_exam_list
+        try:
+            for request in requests:
+                request.start()
+            deadline = time.time() + 5
+            while time.time() < deadline and [call.waiters for call in LIST_BUILDS.calls.values()] != [7]:
+                time.sleep(0.01)
+            release.set()
+            for request in requests:
+                request.join()
+            self.assertListEqual(calls, [1])
+
+            # Requests after the build has finished build the list again
+            rv = self.app.get(self.examlist_resource_url, headers=self.header_auth)
+            self.assertListEqual(calls, [1, 1])
+        finally:
+            del database.browse_exam_list
+
+        self.assertEquals(len(responses), 8)
+        for response in responses + [rv]:
+            self.assertEquals(response.status_code, 200)
+            self.assertEquals(response.data, responses[0].data)
+        self.assertEquals(len(json.loads(responses[0].data)['collection']['items']), 3)
+        self.assertEquals(LIST_BUILDS.calls, {})
+
+    def test_exam_filters(self):
+        '''
+        Check that the exam list of a course and the exam list of an archive are filtered by dates, language and
+        examiner, and that invalid filter values are refused.
+        '''
+        print '(' + self.test_exam_filters.__name__ + ')', self.test_exam_filters.__doc__
+
+        def exam_ids(url):
+            rv = self.app.get(url, headers=self.header_auth)
+            self.assertEquals(rv.status_code, 200)
+            items = json.loads(rv.data)['collection']['items']
+            return [data['value'] for item in items for data in item['data'] if data['name'] == 'examId']
+
+        archive_examlist_resource_url = '/exam_archive/api/archives/1/exams/'
+        self.assertListEqual(exam_ids(archive_examlist_resource_url), [1, 4, 2, 5, 3])
+        self.assertListEqual(exam_ids(archive_examlist_resource_url + '?date_from=2014-01-01&date_to=2015-02-28'),
+                             [2, 5])
+        self.assertListEqual(exam_ids(archive_examlist_resource_url + '?language_id=en'), [4])
+        self.assertListEqual(exam_ids(archive_examlist_resource_url + '?examiner_id=1'), [])
+        self.assertListEqual(exam_ids(self.examlist_resource_url + '?date_from=2014-01-01'), [2, 3])
+        self.assertListEqual(exam_ids(self.examlist_resource_url + '?examiner_id=2&language_id=fi'), [1, 2, 3])
+
+        for query in ['?date_from=2014', '?date_to=2014-13-01', '?examiner_id=abc']:
+            for url in [archive_examlist_resource_url, self.examlist_resource_url]:
+                rv = self.app.get(url + query, headers=self.header_auth)
+                self.assertEquals(rv.status_code, 400)
+                self.assertIn(PROBLEMJSON, rv.mimetype)
+
+        rv = self.app.get('/exam_archive/api/archives/999/exams/', headers=self.header_auth)
+        self.assertEquals(rv.status_code, 404)
+
+    def test_exam_filters_paging(self):
+        '''
+        Check that the filtered exam lists are paged by date with the limit and the cursor of the next link.
+        '''
+        print '(' + self.test_exam_filters_paging.__name__ + ')', self.test_exam_filters_paging.__doc__
+
+        def pages(url):
+            exam_ids = []
+            while url:
+                rv = self.app.get(url, headers=self.header_auth)
+                self.assertEquals(rv.status_code, 200)
+                collection = json.loads(rv.data)['collection']
+                exam_ids.append([data['value'] for item in collection['items'] for data in item['data']
+                                 if data['name'] == 'examId'])
+                url = ([link['href'] for link in collection['links'] if link['rel'] == 'next'] or [None])[0]
+            return exam_ids
+
+        archive_examlist_resource_url = '/exam_archive/api/archives/1/exams/'
+        self.assertListEqual(pages(archive_examlist_resource_url + '?limit=2'), [[1, 4], [2, 5], [3]])
+        self.assertListEqual(pages(archive_examlist_resource_url + '?date_from=2014-01-01&sort=-date&limit=1'),
+                             [[3], [5], [2], []])
+        self.assertListEqual(pages(self.examlist_resource_url + '?examiner_id=2&language_id=fi&limit=2'),
+                             [[1, 2], [3]])
+
+        for url in [archive_examlist_resource_url + '?sort=last_modified',
+                    archive_examlist_resource_url + '?limit=0',
+                    self.examlist_resource_url + '?date_from=2014-01-01&sort=last_modified',
+                    self.examlist_resource_url + '?date_from=2014-01-01&after=WzJd']:
+            rv = self.app.get(url, headers=self.header_auth)
+            self.assertEquals(rv.status_code, 400)
+            self.assertIn(PROBLEMJSON, rv.mimetype)
+
     def _isIdentical(self, api_item, db_item):
         '''
         Check whether template data corresponds to data stored in the database.
@@ -0,0 +1,138 @@
+'''
+Testing class for RESTful API's exam export resources.
+
+Authors: Ari Kairala, Petteri Ponsimaa
+'''
+
+import unittest, hashlib, os, io, zipfile
+import base64, json, server
+import zip_stream
+from database_api_test_common import BaseTestCase, db
+from resources_common import PROBLEMJSON
+
+class RestExportTestCase(BaseTestCase):
+    '''
+    RestExportTestCase contains unit tests of the CourseExport and ArchiveExport resources.
+    '''
+
+    # List of user credentials in exam_archive_data_dump.sql for testing purposes
+    super_user = "bigboss"
+    super_pw = hashlib.sha256("ultimatepw").hexdigest()
+    basic_user = "testuser"
+    basic_pw = hashlib.sha256("testuser").hexdigest()
+
+    course_export_url = '/exam_archive/api/archives/1/courses/1/exams/export.zip'
+    archive_export_url = '/exam_archive/api/archives/1/export.zip'
+
+    # Exam file created to the upload folder for the tests
+    exam_file = 'test_export_810136P_2013-02-21.pdf'
+
+    # Set a ready header for authorized super user
+    header_auth = {'Authorization': 'Basic ' + base64.b64encode(super_user + ":" + super_pw)}
+
+    @classmethod
+    def setUpClass(cls):
+        print "Testing ", cls.__name__
+
+    def setUp(self):
+        super(RestExportTestCase, self).setUp()
+        with open(os.path.join(server.app.static_folder, self.exam_file), 'wb') as f:
+            f.write('%PDF-1.4 test exam')
+        db.edit_exam_file(1, 'exams/' + self.exam_file)
+
+    def tearDown(self):
+        os.remove(os.path.join(server.app.static_folder, self.exam_file))
+        super(RestExportTestCase, self).tearDown()
+
+    def test_course_export(self):
+        '''
+        Check that CourseExport/GET returns a ZIP file with the exam files and a manifest, and supports ETags.
+        '''
+        print '(' + self.test_course_export.__name__ + ')', \
+            self.test_course_export.__doc__
+
+        rv = self.app.get(self.course_export_url, headers=self.header_auth)
+        self.assertEquals(rv.status_code, 200)
+        self.assertEquals(rv.mimetype, 'application/zip')
+
+        archive = zipfile.ZipFile(io.BytesIO(rv.data))
+        self.assertIsNone(archive.testzip())
+        self.assertListEqual(archive.namelist(), ['manifest.json', '810136P/' + self.exam_file])
+        self.assertEquals(archive.getinfo('810136P/' + self.exam_file).compress_type, zipfile.ZIP_STORED)
+        self.assertEquals(archive.read('810136P/' + self.exam_file), '%PDF-1.4 test exam')
+
+        # The exams without a file are listed in the manifest too
+        manifest = json.loads(archive.read('manifest.json'))
+        self.assertListEqual([exam['examId'] for exam in manifest['exams']], [1, 2, 3])
+        self.assertEquals(manifest['exams'][0]['file'], '810136P/' + self.exam_file)
+        self.assertIsNone(manifest['exams'][1]['file'])
+
+        # The same exams produce the same ZIP file
+        etag = rv.headers['ETag']
+        headers = dict(self.header_auth)
+        headers['If-None-Match'] = etag
+        rv = self.app.get(self.course_export_url, headers=headers)
+        self.assertEquals(rv.status_code, 304)
+
+        db.edit_exam(2, 1, 2, '2014-03-01', None, 'fi')
+        rv = self.app.get(self.course_export_url, headers=headers)
+        self.assertEquals(rv.status_code, 200)
+        self.assertNotEquals(rv.headers['ETag'], etag)
+
+    def test_zip64(self):
+        '''
+        Check that the ZIP64 extensions are written for the large entries, the large offsets and many entries, with
+        the limits lowered so that the test files stay small.
+        '''
+        print '(' + self.test_zip64.__name__ + ')', self.test_zip64.__doc__
+
+        path = os.path.join(server.app.static_folder, self.exam_file)
+        entries = [('manifest.json', None, '{}'), ('large.txt', None, 'exam ' * 100), ('exam.pdf', path, None),
+                   ('other.pdf', path, None)]
+        limits = zip_stream.ZIP64_LIMIT, zip_stream.ZIP64_COUNT_LIMIT
+        zip_stream.ZIP64_LIMIT, zip_stream.ZIP64_COUNT_LIMIT = 200, 3
+        try:
+            data = ''.join(zip_stream.stream_zip(entries, 315532800))
+        finally:
+            zip_stream.ZIP64_LIMIT, zip_stream.ZIP64_COUNT_LIMIT = limits
+
+        self.assertIn('PK\x06\x06', data)
+        self.assertIn('PK\x06\x07', data)
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        self.assertIsNone(archive.testzip())
+        self.assertListEqual(archive.namelist(), ['manifest.json', 'large.txt', 'exam.pdf', 'other.pdf'])
+        self.assertEquals(archive.read('large.txt'), 'exam ' * 100)
+        self.assertEquals(archive.read('other.pdf'), '%PDF-1.4 test exam')
+        self.assertGreater(archive.getinfo('other.pdf').header_offset, 200)
+
+        # Small ZIP files are written without the extensions
+        data = ''.join(zip_stream.stream_zip(entries, 315532800))
+        self.assertNotIn('PK\x06\x06', data)
+        self.assertIsNone(zipfile.ZipFile(io.BytesIO(data)).testzip())
+
+    def test_archive_export(self):
+        '''
+        Check that ArchiveExport/GET lists the exams of all the courses, and that other archives are forbidden.
+        '''
+        print '(' + self.test_archive_export.__name__ + ')', \
+            self.test_archive_export.__doc__
+
+        rv = self.app.get(self.archive_export_url, headers=self.header_auth)
+        self.assertEquals(rv.status_code, 200)
+        manifest = json.loads(zipfile.ZipFile(io.BytesIO(rv.data)).read('manifest.json'))
+        self.assertEquals(len(manifest['exams']), len(db.browse_archive_exams(1)))
+
+        rv = self.app.get(self.archive_export_url)
+        self.assertEquals(rv.status_code, 401)
+        self.assertIn(PROBLEMJSON, rv.mimetype)
+
+        header_basic = {'Authorization': 'Basic ' + base64.b64encode(self.basic_user + ":" + self.basic_pw)}
+        rv = self.app.get('/exam_archive/api/archives/2/export.zip', headers=header_basic)
+        self.assertEquals(rv.status_code, 403)
+
+        rv = self.app.get('/exam_archive/api/archives/1/courses/999/exams/export.zip', headers=self.header_auth)
+        self.assertEquals(rv.status_code, 404)
+
+if __name__ == '__main__':
+    print 'Start running tests'
+    unittest.main()
@@ -0,0 +1,63 @@
+'''
+Testing class for RESTful API's language related resources.
+
+Authors: Ari Kairala, Petteri Ponsimaa
+'''
+
+import unittest, hashlib
+import base64, json, server
+from database_api_test_common import BaseTestCase, db
+from resources_common import COLLECTIONJSON, PROBLEMJSON, LANGUAGE_PROFILE
+
+class RestLanguageTestCase(BaseTestCase):
+    '''
+    RestLanguageTestCase contains unit tests of the Language and LanguageList resources.
+    '''
+
+    # List of user credentials in exam_archive_data_dump.sql for testing purposes
+    basic_user = "testuser"
+    basic_pw = hashlib.sha256("testuser").hexdigest()
+
+    languagelist_resource_url = '/exam_archive/api/languages/'
+
+    # Set a ready header for authorized basic user
+    header_auth = {'Authorization': 'Basic ' + base64.b64encode(basic_user + ":" + basic_pw)}
+
+    @classmethod
+    def setUpClass(cls):
+        print "Testing ", cls.__name__
+
+    def test_languagelist_get(self):
+        '''
+        Check data consistency of LanguageList/GET and Language/GET, and that the ETag can be revalidated.
+        '''
+        print '(' + self.test_languagelist_get.__name__ + ')', \
+            self.test_languagelist_get.__doc__
+
+        rv = self.app.get(self.languagelist_resource_url)
+        self.assertEquals(rv.status_code, 401)
+
+        rv = self.app.get(self.languagelist_resource_url, headers=self.header_auth)
+        self.assertEquals(rv.status_code, 200)
+        self.assertEquals(COLLECTIONJSON+";"+LANGUAGE_PROFILE, rv.content_type)
+        items = json.loads(rv.data)['collection']['items']
+        self.assertListEqual([item['data'] for item in items],
+                             [[{'name': 'inLanguage', 'value': language['language_id']},
+                               {'name': 'name', 'value': language['language_name']}]
+                              for language in db.browse_languages()])
+
+        headers = dict(self.header_auth)
+        headers['If-None-Match'] = rv.headers['ETag']
+        rv = self.app.get(self.languagelist_resource_url, headers=headers)
+        self.assertEquals(rv.status_code, 304)
+
+        rv = self.app.get(self.languagelist_resource_url + 'fi/', headers=self.header_auth)
+        self.assertEquals(rv.status_code, 200)
+        self.assertEquals(json.loads(rv.data)['collection']['items'][0]['href'],
+                          self.languagelist_resource_url + 'fi/')
+        rv = self.app.get(self.languagelist_resource_url + 'xx/', headers=self.header_auth)
+        self.assertEquals(rv.status_code, 404)
+
+if __name__ == '__main__':
+    print 'Start running tests'
+    unittest.main()
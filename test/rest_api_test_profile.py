@@ -0,0 +1,147 @@
+'''
+Testing class for the profiling of the live requests of the RESTful API.
+
+Authors: Ari Kairala, Petteri Ponsimaa
+'''
+
+import unittest, hashlib, tempfile, shutil, marshal, time
+import base64, json, server
+import profiler
+from database_api_test_common import BaseTestCase
+from resources_common import COLLECTIONJSON, PROBLEMJSON
+
+class RestProfileTestCase(BaseTestCase):
+    '''
+    RestProfileTestCase contains unit tests of the Profile and ProfileList resources.
+    '''
+
+    # List of user credentials in exam_archive_data_dump.sql for testing purposes
+    super_user = "bigboss"
+    super_pw = hashlib.sha256("ultimatepw").hexdigest()
+    admin_user = "antti.admin"
+    admin_pw = hashlib.sha256("qwerty1234").hexdigest()
+
+    profilelist_resource_url = '/exam_archive/api/profiles/'
+    profile_resource_url = '/exam_archive/api/profiles/examlist/'
+    examlist_resource_url = '/exam_archive/api/archives/1/courses/1/exams/'
+
+    # Set ready headers for authorized super and admin users
+    header_auth = {'Authorization': 'Basic ' + base64.b64encode(super_user + ":" + super_pw)}
+    header_admin_auth = {'Authorization': 'Basic ' + base64.b64encode(admin_user + ":" + admin_pw)}
+
+    @classmethod
+    def setUpClass(cls):
+        print "Testing ", cls.__name__
+
+    def setUp(self):
+        super(RestProfileTestCase, self).setUp()
+        self.profile_folder = tempfile.mkdtemp()
+        server.app.config['PROFILE_FOLDER'] = self.profile_folder
+
+    def tearDown(self):
+        server.app.config['PROFILE_FOLDER'] = profiler.DEFAULT_FOLDER
+        server.app.config['PROFILE_SAMPLE_INTERVAL'] = profiler.DEFAULT_SAMPLE_INTERVAL
+        shutil.rmtree(self.profile_folder)
+        super(RestProfileTestCase, self).tearDown()
+
+    def switch(self, fraction, mode=None):
+        '''
+        Set the profiling switch of the exam list and return the response.
+        '''
+        data = [{'name': 'fraction', 'value': fraction}] + ([{'name': 'mode', 'value': mode}] if mode else [])
+        return self.app.put(self.profile_resource_url, headers=self.header_auth,
+                            data=json.dumps({'template': {'data': data}}))
+
+    def test_profile_cprofile(self):
+        '''
+        Check that the requests to a switched on endpoint are profiled with cProfile, and that the profile is
+        downloaded in the pstats format.
+        '''
+        print '(' + self.test_profile_cprofile.__name__ + ')', self.test_profile_cprofile.__doc__
+
+        self.assertEquals(self.app.get(self.examlist_resource_url, headers=self.header_auth).status_code, 200)
+        rv = self.app.get(self.profile_resource_url + '?format=pstats', headers=self.header_auth)
+        self.assertEquals(rv.status_code, 404)
+
+        self.assertEquals(self.switch(1).status_code, 200)
+        for i in range(2):
+            self.assertEquals(self.app.get(self.examlist_resource_url, headers=self.header_auth).status_code, 200)
+
+        rv = self.app.get(self.profilelist_resource_url, headers=self.header_auth)
+        self.assertEquals(rv.status_code, 200)
+        self.assertIn(COLLECTIONJSON, rv.mimetype)
+        items = json.loads(rv.data)['collection']['items']
+        self.assertEquals(len(items), 1)
+        data = dict((d['name'], d['value']) for d in items[0]['data'])
+        self.assertDictEqual(data, {'endpoint': 'examlist', 'fraction': 1, 'mode': 'cprofile', 'requests': 2})
+
+        rv = self.app.get(self.profile_resource_url + '?format=pstats', headers=self.header_auth)
+        self.assertEquals(rv.status_code, 200)
+        self.assertIn('attachment', rv.headers['Content-Disposition'])
+        stats = marshal.loads(rv.data)
+        self.assertTrue(any(function[2] == 'browse_exam_list' for function in stats))
+        self.assertEquals(self.app.get(self.profile_resource_url + '?format=collapsed',
+                                       headers=self.header_auth).status_code, 404)
+
+        # Switching off keeps the profile, deleting removes it
+        self.assertEquals(self.switch(0).status_code, 200)
+        self.app.get(self.examlist_resource_url, headers=self.header_auth)
+        rv = self.app.get(self.profile_resource_url, headers=self.header_auth)
+        data = dict((d['name'], d['value']) for d in json.loads(rv.data)['collection']['items'][0]['data'])
+        self.assertEquals((data['fraction'], data['requests']), (0, 2))
+
+        self.assertEquals(self.app.delete(self.profile_resource_url, headers=self.header_auth).status_code, 204)
+        rv = self.app.get(self.profilelist_resource_url, headers=self.header_auth)
+        self.assertListEqual(json.loads(rv.data)['collection']['items'], [])
+
+    def test_profile_sampler(self):
+        '''
+        Check that the requests are sampled with the stack sampler, and that the stacks are downloaded collapsed.
+        '''
+        print '(' + self.test_profile_sampler.__name__ + ')', self.test_profile_sampler.__doc__
+
+        server.app.config['PROFILE_SAMPLE_INTERVAL'] = 0.001
+        self.assertEquals(self.switch(1, 'sampler').status_code, 200)
+        database = server.app.config['DATABASE']
+        browse_exam_list = database.browse_exam_list
+
+        def slow_browse_exam_list(course_id, **kwargs):
+            time.sleep(0.05)
+            return browse_exam_list(course_id, **kwargs)
+
+        database.browse_exam_list = slow_browse_exam_list
+        try:
+            self.assertEquals(self.app.get(self.examlist_resource_url, headers=self.header_auth).status_code, 200)
+        finally:
+            del database.browse_exam_list
+
+        rv = self.app.get(self.profile_resource_url + '?format=collapsed', headers=self.header_auth)
+        self.assertEquals(rv.status_code, 200)
+        self.assertEquals(rv.mimetype, 'text/plain')
+        stacks = [line.rsplit(' ', 1) for line in rv.data.splitlines()]
+        self.assertTrue(all(int(count) > 0 for stack, count in stacks))
+        self.assertTrue(any('slow_browse_exam_list' in stack for stack, count in stacks))
+
+    def test_profile_invalid(self):
+        '''
+        Check that only super users can profile, and that unknown endpoints and invalid switches are refused.
+        '''
+        print '(' + self.test_profile_invalid.__name__ + ')', self.test_profile_invalid.__doc__
+
+        self.assertEquals(self.app.get(self.profilelist_resource_url).status_code, 401)
+        self.assertEquals(self.app.get(self.profilelist_resource_url, headers=self.header_admin_auth).status_code,
+                          403)
+        self.assertEquals(self.app.delete(self.profile_resource_url, headers=self.header_admin_auth).status_code, 403)
+        self.assertEquals(self.app.get('/exam_archive/api/profiles/nothing/', headers=self.header_auth).status_code,
+                          404)
+        rv = self.app.get(self.profile_resource_url + '?format=svg', headers=self.header_auth)
+        self.assertEquals(rv.status_code, 400)
+        self.assertEquals(rv.mimetype, PROBLEMJSON)
+
+        for fraction, mode in [(2, None), (-0.5, None), ('half', None), (0.5, 'trace')]:
+            self.assertEquals(self.switch(fraction, mode).status_code, 400)
+        self.assertDictEqual(profiler.profiler(self.profile_folder).get_switches(now=0), {})
+
+if __name__ == '__main__':
+    print 'Start running tests'
+    unittest.main()
@@ -0,0 +1,190 @@
+'''
+Testing class for the rate limits and the admission control of the RESTful API.
+
+Authors: Ari Kairala, Petteri Ponsimaa
+'''
+
+import unittest, hashlib, threading, tempfile, shutil, time, os
+import base64, json, server
+import rate_limit
+from database_api_test_common import BaseTestCase, rate_limit_path
+from resources_common import PROBLEMJSON
+
+class RestRateLimitTestCase(BaseTestCase):
+    '''
+    RestRateLimitTestCase contains unit tests of the token buckets and the limit of concurrent requests.
+    '''
+
+    # List of user credentials in exam_archive_data_dump.sql for testing purposes
+    super_user = "bigboss"
+    super_pw = hashlib.sha256("ultimatepw").hexdigest()
+    basic_user = "testuser"
+    basic_pw = hashlib.sha256("testuser").hexdigest()
+
+    archivelist_resource_url = '/exam_archive/api/archives/'
+    examlist_resource_url = '/exam_archive/api/archives/1/courses/1/exams/'
+    token_resource_url = '/exam_archive/api/tokens/'
+
+    # Set ready headers for authorized super and basic users
+    header_auth = {'Authorization': 'Basic ' + base64.b64encode(super_user + ":" + super_pw)}
+    header_basic_auth = {'Authorization': 'Basic ' + base64.b64encode(basic_user + ":" + basic_pw)}
+
+    @classmethod
+    def setUpClass(cls):
+        print "Testing ", cls.__name__
+
+    def tearDown(self):
+        server.app.config['RATE_LIMITS'] = dict(rate_limit.DEFAULT_RATES)
+        server.app.config['MAX_CONCURRENT_REQUESTS'] = rate_limit.DEFAULT_MAX_CONCURRENT
+        super(RestRateLimitTestCase, self).tearDown()
+
+    def test_token_buckets(self):
+        '''
+        Check that a token bucket allows bursts up to its size, and is refilled at its rate.
+        '''
+        print '(' + self.test_token_buckets.__name__ + ')', self.test_token_buckets.__doc__
+
+        buckets = rate_limit.token_buckets(rate_limit_path)
+        self.assertIs(rate_limit.token_buckets(rate_limit_path), buckets)
+        self.assertEquals(buckets.take('read:user', 2.0, 3, now=100), 0)
+        self.assertEquals(buckets.take('read:user', 2.0, 3, now=100), 0)
+        self.assertEquals(buckets.take('read:user', 2.0, 3, now=100), 0)
+        self.assertAlmostEquals(buckets.take('read:user', 2.0, 3, now=100), 0.5)
+        self.assertAlmostEquals(buckets.take('read:user', 2.0, 3, now=100.25), 0.25)
+        self.assertEquals(buckets.take('read:user', 2.0, 3, now=100.5), 0)
+
+        # Other buckets are not affected, and a bucket is never filled over its size
+        self.assertEquals(buckets.take('write:user', 2.0, 3, now=100.5), 0)
+        for i in range(3):
+            self.assertEquals(buckets.take('read:user', 2.0, 3, now=1000), 0)
+        self.assertGreater(buckets.take('read:user', 2.0, 3, now=1000), 0)
+
+        buckets.prune(now=1000 + 3601)
+        self.assertEquals(buckets.take('read:user', 2.0, 3, now=1000), 0)
+
+    def test_rate_limit(self):
+        '''
+        Check that the requests exceeding the rate limit of the user and the endpoint class are refused with status
+        code 429 and a Retry-After header.
+        '''
+        print '(' + self.test_rate_limit.__name__ + ')', self.test_rate_limit.__doc__
+
+        server.app.config['RATE_LIMITS'] = {'read': (0.1, 2), 'write': (0.1, 1)}
+        for i in range(2):
+            rv = self.app.get(self.archivelist_resource_url, headers=self.header_auth)
+            self.assertEquals(rv.status_code, 200)
+        rv = self.app.get(self.archivelist_resource_url, headers=self.header_auth)
+        self.assertEquals(rv.status_code, 429)
+        self.assertEquals(rv.mimetype, PROBLEMJSON)
+        self.assertEquals(rv.headers['Retry-After'], '10')
+
+        # The writes and the requests of other users have buckets of their own
+        self.assertEquals(self.app.post(self.token_resource_url, headers=self.header_auth).status_code, 200)
+        self.assertEquals(self.app.post(self.token_resource_url, headers=self.header_auth).status_code, 429)
+        self.assertEquals(self.app.get(self.archivelist_resource_url, headers=self.header_basic_auth).status_code, 200)
+
+        # The anonymous requests are limited by the address of the client
+        for i in range(2):
+            self.assertEquals(self.app.get(self.archivelist_resource_url).status_code, 401)
+        self.assertEquals(self.app.get(self.archivelist_resource_url).status_code, 429)
+
+        server.app.config['RATE_LIMITS'] = None
+        self.assertEquals(self.app.get(self.archivelist_resource_url, headers=self.header_auth).status_code, 200)
+
+    def test_concurrency_limit(self):
+        '''
+        Check that the requests exceeding the limit of concurrent requests are refused with status code 503.
+        '''
+        print '(' + self.test_concurrency_limit.__name__ + ')', self.test_concurrency_limit.__doc__
+
+        server.app.config['MAX_CONCURRENT_REQUESTS'] = 1
+
+        # Hold a request in flight
+        database = server.app.config['DATABASE']
+        browse_exam_list = database.browse_exam_list
+        started, release = threading.Event(), threading.Event()
+
+        def slow_browse_exam_list(course_id, **kwargs):
+            started.set()
+            release.wait(5)
+            return browse_exam_list(course_id, **kwargs)
+
+        responses = []
+        request = threading.Thread(target=lambda: responses.append(
+            self.app.get(self.examlist_resource_url, headers=self.header_auth)))
+        database.browse_exam_list = slow_browse_exam_list
+        try:
+            request.start()
+            self.assertTrue(started.wait(5))
+            rv = self.app.get(self.archivelist_resource_url, headers=self.header_basic_auth)
+            self.assertEquals(rv.status_code, 503)
+            self.assertEquals(rv.headers['Retry-After'], '1')
+            release.set()
+            request.join()
+        finally:
+            del database.browse_exam_list
+
+        self.assertEquals(responses[0].status_code, 200)
+        rv = self.app.get(self.archivelist_resource_url, headers=self.header_basic_auth)
+        self.assertEquals(rv.status_code, 200)
+
+    def test_download_admission(self):
+        '''
+        Check that the downloads of the exam files are rate limited, and counted as concurrent requests until their
+        bodies have been sent.
+        '''
+        print '(' + self.test_download_admission.__name__ + ')', self.test_download_admission.__doc__
+
+        upload_folder = server.app.config['UPLOAD_FOLDER']
+        server.app.config['UPLOAD_FOLDER'] = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(server.app.config['UPLOAD_FOLDER'], 'exam.pdf'), 'wb') as f:
+                f.write('x' * 100000)
+
+            server.app.config['RATE_LIMITS'] = {'download': (0.1, 3)}
+            for i in range(3):
+                self.assertEquals(self.app.get('/exams/exam.pdf', buffered=True).status_code, 200)
+            rv = self.app.get('/exams/exam.pdf', buffered=True)
+            self.assertEquals(rv.status_code, 429)
+            self.assertEquals(rv.headers['Retry-After'], '10')
+            self.assertEquals(self.app.get(self.archivelist_resource_url, headers=self.header_auth).status_code, 200)
+
+            # A download holds its slot until its body is closed
+            server.app.config['RATE_LIMITS'] = None
+            server.app.config['MAX_CONCURRENT_REQUESTS'] = 1
+            download = self.app.get('/exams/exam.pdf')
+            self.assertEquals(download.status_code, 200)
+            self.assertEquals(self.app.get('/exams/exam.pdf', buffered=True).status_code, 503)
+            self.assertEquals(self.app.get(self.archivelist_resource_url, headers=self.header_auth).status_code, 503)
+            self.assertEquals(len(download.data), 100000)
+            download.close()
+            self.assertEquals(self.app.get('/exams/exam.pdf', buffered=True).status_code, 200)
+
+            # Hammer the downloads from many threads, the refused ones get 503 and every slot is released
+            server.app.config['MAX_CONCURRENT_REQUESTS'] = 4
+            statuses = []
+            def download_files():
+                for i in range(10):
+                    rv = self.app.get('/exams/exam.pdf', buffered=True)
+                    statuses.append((rv.status_code, len(rv.data)))
+            threads = [threading.Thread(target=download_files) for i in range(16)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEquals(len(statuses), 160)
+            self.assertTrue(set(status for status, size in statuses) <= set([200, 503]))
+            self.assertTrue(all(size == 100000 for status, size in statuses if status == 200))
+
+            semaphore = rate_limit.concurrency_limit(4)
+            acquired = [semaphore.acquire(False) for i in range(4)]
+            for i in range(acquired.count(True)):
+                semaphore.release()
+            self.assertListEqual(acquired, [True] * 4)
+        finally:
+            shutil.rmtree(server.app.config['UPLOAD_FOLDER'])
+            server.app.config['UPLOAD_FOLDER'] = upload_folder
+
+if __name__ == '__main__':
+    print 'Start running tests'
+    unittest.main()
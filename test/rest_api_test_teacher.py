@@ -0,0 +1,94 @@
+'''
+Testing class for RESTful API's teacher related resources.
+
+Authors: Ari Kairala, Petteri Ponsimaa
+'''
+
+import unittest, hashlib
+import base64, json, server
+from database_api_test_common import BaseTestCase, db
+from resources_common import COLLECTIONJSON, PROBLEMJSON, TEACHER_PROFILE, API_VERSION
+
+class RestTeacherTestCase(BaseTestCase):
+    '''
+    RestTeacherTestCase contains unit tests of the Teacher and TeacherList resources.
+    '''
+
+    # List of user credentials in exam_archive_data_dump.sql for testing purposes
+    basic_user = "testuser"
+    basic_pw = hashlib.sha256("testuser").hexdigest()
+
+    teacherlist_resource_url = '/exam_archive/api/teachers/'
+
+    # Set a ready header for authorized basic user
+    header_auth = {'Authorization': 'Basic ' + base64.b64encode(basic_user + ":" + basic_pw)}
+
+    @classmethod
+    def setUpClass(cls):
+        print "Testing ", cls.__name__
+
+    def test_teacher_not_authorized(self):
+        '''
+        Check that the teachers cannot be listed without authenticating.
+        '''
+        print '(' + self.test_teacher_not_authorized.__name__ + ')', \
+            self.test_teacher_not_authorized.__doc__
+
+        rv = self.app.get(self.teacherlist_resource_url)
+        self.assertEquals(rv.status_code, 401)
+        self.assertIn(PROBLEMJSON, rv.mimetype)
+
+    def test_teacherlist_get(self):
+        '''
+        Check data consistency of TeacherList/GET and Teacher/GET.
+        '''
+        print '(' + self.test_teacherlist_get.__name__ + ')', \
+            self.test_teacherlist_get.__doc__
+
+        rv = self.app.get(self.teacherlist_resource_url, headers=self.header_auth)
+        self.assertEquals(rv.status_code, 200)
+        self.assertEquals(COLLECTIONJSON+";"+TEACHER_PROFILE, rv.content_type)
+
+        collection = json.loads(rv.data)['collection']
+        self.assertEquals(collection['version'], API_VERSION)
+        self.assertEquals(len(collection['items']), len(db.browse_teachers()))
+
+        data = dict((d['name'], d['value']) for d in collection['items'][0]['data'])
+        self.assertEquals(data['teacherId'], 1)
+        self.assertEquals(data['firstName'], 'Tero')
+        self.assertEquals(data['lastName'], 'Testaaja')
+
+        rv = self.app.get(collection['items'][1]['href'], headers=self.header_auth)
+        self.assertEquals(rv.status_code, 200)
+        data = dict((d['name'], d['value']) for d in json.loads(rv.data)['collection']['items'][0]['data'])
+        self.assertEquals(data['firstName'], 'Terhi')
+
+        rv = self.app.get(self.teacherlist_resource_url + '999/', headers=self.header_auth)
+        self.assertEquals(rv.status_code, 404)
+
+    def test_teacherlist_etag(self):
+        '''
+        Check that TeacherList/GET returns 304 with a matching If-None-Match header until the teachers change.
+        '''
+        print '(' + self.test_teacherlist_etag.__name__ + ')', \
+            self.test_teacherlist_etag.__doc__
+
+        rv = self.app.get(self.teacherlist_resource_url, headers=self.header_auth)
+        etag = rv.headers['ETag']
+        self.assertFalse(etag.startswith('W/'))
+
+        headers = dict(self.header_auth)
+        headers['If-None-Match'] = etag
+        rv = self.app.get(self.teacherlist_resource_url, headers=headers)
+        self.assertEquals(rv.status_code, 304)
+        self.assertEquals(rv.data, '')
+
+        # Editing a teacher changes the entity tag
+        db.edit_teacher(1, 'Tero', 'Testaaja', city='HELSINKI')
+        rv = self.app.get(self.teacherlist_resource_url, headers=headers)
+        self.assertEquals(rv.status_code, 200)
+        self.assertNotEquals(rv.headers['ETag'], etag)
+
+if __name__ == '__main__':
+    print 'Start running tests'
+    unittest.main()
@@ -0,0 +1,117 @@
+'''
+Testing class for the access tokens of the RESTful API.
+
+Authors: Ari Kairala, Petteri Ponsimaa
+'''
+
+import unittest, hashlib
+import base64, json, server
+import tokens
+from database_api_test_common import BaseTestCase, db
+from resources_common import DEFAULTJSON
+
+class RestTokenTestCase(BaseTestCase):
+    '''
+    RestTokenTestCase contains unit tests of the Token resource and the authorization with access tokens.
+    '''
+
+    # List of user credentials in exam_archive_data_dump.sql for testing purposes
+    super_user = "bigboss"
+    super_pw = hashlib.sha256("ultimatepw").hexdigest()
+    basic_user = "testuser"
+    basic_pw = hashlib.sha256("testuser").hexdigest()
+
+    token_resource_url = '/exam_archive/api/tokens/'
+    userlist_resource_url = '/exam_archive/api/users/'
+    archive_resource_url = '/exam_archive/api/archives/1/'
+
+    # Set ready headers for authorized super and basic users
+    header_auth = {'Authorization': 'Basic ' + base64.b64encode(super_user + ":" + super_pw)}
+    header_basic_auth = {'Authorization': 'Basic ' + base64.b64encode(basic_user + ":" + basic_pw)}
+
+    @classmethod
+    def setUpClass(cls):
+        print "Testing ", cls.__name__
+
+    def get_token(self, headers):
+        '''
+        Exchange the credentials in headers to an access token, and return a header authorizing with the token.
+        '''
+        rv = self.app.post(self.token_resource_url, headers=headers)
+        self.assertEquals(rv.status_code, 200)
+        return {'Authorization': 'Bearer ' + json.loads(rv.data)['access_token']}
+
+    def test_token_post(self):
+        '''
+        Check that an access token is issued for a user name and password, and that it authorizes the requests like
+        the credentials of the user.
+        '''
+        print '(' + self.test_token_post.__name__ + ')', self.test_token_post.__doc__
+
+        rv = self.app.post(self.token_resource_url)
+        self.assertEquals(rv.status_code, 401)
+
+        rv = self.app.post(self.token_resource_url, headers=self.header_auth)
+        self.assertEquals(rv.status_code, 200)
+        self.assertEquals(rv.mimetype, DEFAULTJSON)
+        self.assertEquals(rv.headers['Cache-Control'], 'no-store')
+        body = json.loads(rv.data)
+        self.assertEquals(body['token_type'], 'Bearer')
+        self.assertEquals(body['expires_in'], tokens.DEFAULT_LIFETIME)
+
+        header_token = {'Authorization': 'Bearer ' + body['access_token']}
+        rv = self.app.get(self.userlist_resource_url, headers=header_token)
+        self.assertEquals(rv.status_code, 200)
+        self.assertEquals(rv.data, self.app.get(self.userlist_resource_url, headers=self.header_auth).data)
+
+        # A basic user gets the rights of a basic user only
+        header_token = self.get_token(self.header_basic_auth)
+        self.assertEquals(self.app.get(self.archive_resource_url, headers=header_token).status_code, 200)
+        self.assertEquals(self.app.delete(self.archive_resource_url, headers=header_token).status_code, 403)
+
+        # Tokens are not exchanged to new tokens
+        rv = self.app.post(self.token_resource_url, headers=header_token)
+        self.assertEquals(rv.status_code, 403)
+
+    def test_token_invalid(self):
+        '''
+        Check that tampered and expired access tokens are refused.
+        '''
+        print '(' + self.test_token_invalid.__name__ + ')', self.test_token_invalid.__doc__
+
+        header_token = self.get_token(self.header_basic_auth)
+        payload, signature = str(header_token['Authorization'][len('Bearer '):]).split('.')
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        claims['user_type'] = 'super'
+        forged = base64.urlsafe_b64encode(json.dumps(claims)).rstrip('=') + '.' + signature
+
+        for token in [forged, payload, 'garbage', payload + '.' + signature[:-2]]:
+            rv = self.app.get(self.userlist_resource_url, headers={'Authorization': 'Bearer ' + token})
+            self.assertEquals(rv.status_code, 401)
+
+        user = db.get_user(1)
+        expired = tokens.issue_token(server.app.config['SECRET_KEY'], user, 0, lifetime=-1)
+        rv = self.app.get(self.userlist_resource_url, headers={'Authorization': 'Bearer ' + expired})
+        self.assertEquals(rv.status_code, 401)
+
+    def test_token_revoked(self):
+        '''
+        Check that the access tokens of a user are revoked when the user is edited or removed.
+        '''
+        print '(' + self.test_token_revoked.__name__ + ')', self.test_token_revoked.__doc__
+
+        header_token = self.get_token(self.header_basic_auth)
+        self.assertEquals(self.app.get(self.archive_resource_url, headers=header_token).status_code, 200)
+
+        db.edit_user(3, self.basic_user, self.basic_pw, user_type='basic', archive_id=2, modifier_id=1)
+        self.assertEquals(self.app.get(self.archive_resource_url, headers=header_token).status_code, 401)
+
+        header_token = self.get_token(self.header_basic_auth)
+        self.assertEquals(self.app.get(self.archive_resource_url, headers=header_token).status_code, 403)
+
+        db.remove_user(3)
+        self.assertEquals(self.app.get(self.archive_resource_url, headers=header_token).status_code, 401)
+
+if __name__ == '__main__':
+    print 'Start running tests'
+    unittest.main()
@@ -0,0 +1,153 @@
+'''
+Testing class for the request tracing of the RESTful API.
+
+Authors: Ari Kairala, Petteri Ponsimaa
+'''
+
+import unittest, hashlib, tempfile, shutil, os
+import base64, json, server
+import tracing
+from database_api_test_common import BaseTestCase
+from resources_common import REQUEST_ID_HEADER
+
+class RestTracingTestCase(BaseTestCase):
+    '''
+    RestTracingTestCase contains unit tests of the spans of the traced requests and the request IDs.
+    '''
+
+    # List of user credentials in exam_archive_data_dump.sql for testing purposes
+    super_user = "bigboss"
+    super_pw = hashlib.sha256("ultimatepw").hexdigest()
+
+    examlist_resource_url = '/exam_archive/api/archives/1/courses/1/exams/'
+    batch_resource_url = '/exam_archive/api/batch/'
+
+    # Set a ready header for authorized super user
+    header_auth = {'Authorization': 'Basic ' + base64.b64encode(super_user + ":" + super_pw)}
+
+    @classmethod
+    def setUpClass(cls):
+        print "Testing ", cls.__name__
+
+    def setUp(self):
+        super(RestTracingTestCase, self).setUp()
+        handle, self.trace_file = tempfile.mkstemp(suffix='.jsonl')
+        os.close(handle)
+        server.app.config['TRACE_FILE'] = self.trace_file
+
+    def tearDown(self):
+        server.app.config['TRACE_FILE'] = None
+        os.remove(self.trace_file)
+        super(RestTracingTestCase, self).tearDown()
+
+    def read_spans(self):
+        '''
+        Read the spans written to the trace file.
+        '''
+        with open(self.trace_file) as f:
+            return [json.loads(line) for line in f]
+
+    def test_request_trace(self):
+        '''
+        Check that a request is traced with child spans of the authentication, the database calls and the JSON
+        serialization, and that the request ID is the ID of the trace.
+        '''
+        print '(' + self.test_request_trace.__name__ + ')', self.test_request_trace.__doc__
+
+        headers = dict(self.header_auth)
+        headers[REQUEST_ID_HEADER] = 'client-request-1'
+        rv = self.app.get(self.examlist_resource_url, headers=headers, buffered=True)
+        self.assertEquals(rv.status_code, 200)
+        self.assertEquals(rv.headers[REQUEST_ID_HEADER], 'client-request-1')
+
+        spans = self.read_spans()
+        self.assertTrue(all(span['args']['trace_id'] == 'client-request-1' for span in spans))
+        self.assertTrue(all(span['ph'] == 'X' and span['dur'] >= 0 for span in spans))
+        roots = [span for span in spans if span['args']['parent_id'] is None]
+        self.assertEquals(len(roots), 1)
+        self.assertEquals(roots[0]['name'], 'request')
+        self.assertEquals(roots[0]['args']['endpoint'], 'examlist')
+        self.assertEquals(roots[0]['args']['status'], 200)
+
+        names = set(span['name'] for span in spans)
+        self.assertTrue(set(['verify_password', 'db.authorize_user', 'db.browse_exam_list', 'json.dumps',
+                             'response.body']) <= names)
+        span_ids = set(span['args']['span_id'] for span in spans)
+        self.assertTrue(all(span['args']['parent_id'] in span_ids for span in spans if span is not roots[0]))
+        authorize = [span for span in spans if span['name'] == 'db.authorize_user'][0]
+        verify = [span for span in spans if span['name'] == 'verify_password'][0]
+        self.assertEquals(authorize['args']['parent_id'], verify['args']['span_id'])
+
+        # An invalid request ID is replaced with a generated one
+        headers[REQUEST_ID_HEADER] = 'not a valid id'
+        rv = self.app.get(self.examlist_resource_url, headers=headers, buffered=True)
+        self.assertRegexpMatches(rv.headers[REQUEST_ID_HEADER], '^[0-9a-f]{32}$')
+        self.assertEquals(self.read_spans()[-1]['args']['trace_id'], rv.headers[REQUEST_ID_HEADER])
+
+    def test_batch_trace(self):
+        '''
+        Check that the sub-requests of a batch are traced as child spans of the batch with the same request ID.
+        '''
+        print '(' + self.test_batch_trace.__name__ + ')', self.test_batch_trace.__doc__
+
+        batch = {'requests': [{'method': 'GET', 'href': self.examlist_resource_url},
+                              {'method': 'GET', 'href': self.examlist_resource_url + '999/'}]}
+        rv = self.app.post(self.batch_resource_url, headers=self.header_auth, data=json.dumps(batch), buffered=True)
+        self.assertEquals(rv.status_code, 207)
+        request_id = rv.headers[REQUEST_ID_HEADER]
+        for response in json.loads(rv.data)['responses']:
+            self.assertEquals(response['headers'][REQUEST_ID_HEADER], request_id)
+
+        spans = self.read_spans()
+        requests = [span for span in spans if span['name'] == 'request']
+        self.assertListEqual([span['args']['endpoint'] for span in requests], ['examlist', 'exam', 'batch'])
+        self.assertListEqual([span['args']['status'] for span in requests], [200, 404, 207])
+        self.assertEquals(requests[0]['args']['parent_id'], requests[2]['args']['span_id'])
+        self.assertTrue(all(span['args']['trace_id'] == request_id for span in spans))
+
+    def test_streamed_trace(self):
+        '''
+        Check that the span of a downloaded file and the span of the request end only when the file has been sent.
+        '''
+        print '(' + self.test_streamed_trace.__name__ + ')', self.test_streamed_trace.__doc__
+
+        upload_folder = server.app.config['UPLOAD_FOLDER']
+        server.app.config['UPLOAD_FOLDER'] = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(server.app.config['UPLOAD_FOLDER'], 'exam.pdf'), 'wb') as f:
+                f.write('x' * 100000)
+
+            rv = self.app.get('/exams/exam.pdf')
+            self.assertEquals(rv.status_code, 200)
+            self.assertListEqual(self.read_spans(), [])
+            self.assertIsNone(getattr(tracing.LOCAL, 'trace', None))
+            self.assertEquals(len(rv.data), 100000)
+            rv.close()
+        finally:
+            shutil.rmtree(server.app.config['UPLOAD_FOLDER'])
+            server.app.config['UPLOAD_FOLDER'] = upload_folder
+
+        spans = self.read_spans()
+        self.assertListEqual([span['name'] for span in spans], ['file.read', 'request'])
+        read, request = spans
+        self.assertEquals(read['args']['parent_id'], request['args']['span_id'])
+        self.assertEquals(read['args']['bytes'], 100000)
+        self.assertEquals(request['args']['status'], 200)
+        self.assertLessEqual(read['ts'] + read['dur'], request['ts'] + request['dur'])
+
+    def test_tracing_off(self):
+        '''
+        Check that nothing is traced without TRACE_FILE, but the request ID is still returned.
+        '''
+        print '(' + self.test_tracing_off.__name__ + ')', self.test_tracing_off.__doc__
+
+        server.app.config['TRACE_FILE'] = None
+        rv = self.app.get(self.examlist_resource_url, headers=self.header_auth)
+        self.assertEquals(rv.status_code, 200)
+        self.assertIn(REQUEST_ID_HEADER, rv.headers)
+        self.assertListEqual(self.read_spans(), [])
+        self.assertIsNone(getattr(tracing.LOCAL, 'trace', None))
+
+if __name__ == '__main__':
+    print 'Start running tests'
+    unittest.main()